@@ -12,15 +12,21 @@ CSV 格式：
   - 選填欄：carrier_name, memo
   - 支援有無 header 行（偵測首行是否為純文字）
   - ON CONFLICT(cell_id) DO UPDATE → 冪等安全，可重複匯入
+  - 串流讀取 + 分批驗證 + COPY 進 staging 表 + 單一 set-based upsert（2026-10）
+
+匯入 / 清空在同一交易內 bump cell_towers_version，提交後 invalidate 本 process 的
+常駐索引（services/tower_index.py）；其他 process 依版本號自行重載。
 """
+import codecs
 import csv
 import io
-from typing import Optional
+from typing import BinaryIO, Iterable, Iterator, Optional
 
 from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Request, UploadFile
 
 from app.db.session import get_conn
 from app.security import require_admin
+from app.services import tower_index
 from app.services.audit import write_audit
 
 router = APIRouter(prefix="/admin/cell-towers", tags=["cell-towers"])
@@ -58,10 +64,25 @@ def get_stats(_user: dict = Depends(require_admin)):
         "total": total,
         "carriers": carriers,
         "latest_import": latest.isoformat() if latest else None,
+        "index": tower_index.stats(),
     }
 
 
 # ---------- POST /import ----------
+# 串流匯入（2026-10）：全國基地台表動輒 30 萬列，舊版 list(reader) 整檔進記憶體、
+# 每列一次 INSERT ... ON CONFLICT ... RETURNING，要跑好幾分鐘且全程佔著一條連線。
+# 改為：逐行讀 → 每 _BATCH_ROWS 列驗證一批 → 合格列 binary COPY 進 TEMP staging 表
+# → 最後一次 set-based INSERT ... SELECT ... ON CONFLICT，以 CTE 數出新增 / 更新。
+# 逐行錯誤回報、座標範圍把關與舊版一致；整批在單一 transaction，失敗不留半套資料。
+# 同檔內重複的 cell_id 以最後一行為準（同舊版逐列 upsert 的結果），重複者計入 updated。
+_BATCH_ROWS = 5000
+_MAX_ERRORS = 20          # 回傳前 20 條錯誤；總數照算
+_SNIFF_BYTES = 64 * 1024
+
+_STAGE_COLS = ("lineno", "cell_id", "lat", "lng", "carrier_name", "memo")
+_STAGE_TYPES = ("int4", "text", "float8", "float8", "text", "text")
+
+
 @router.post("/import")
 def import_csv(
     request: Request,
@@ -70,23 +91,17 @@ def import_csv(
     source: Optional[str] = Form(default=None),
     user: dict = Depends(require_admin),
 ):
-    raw = file.file.read()
-    try:
-        text = raw.decode("utf-8-sig")  # utf-8-sig 自動去掉 BOM
-    except UnicodeDecodeError:
-        text = raw.decode("big5", errors="replace")
-
-    reader = csv.reader(io.StringIO(text))
-    rows = list(reader)
-    if not rows:
+    text = _open_text(file.file)
+    reader = csv.reader(text)
+    first_row = next(reader, None)
+    if first_row is None:
         raise HTTPException(400, "CSV 檔案為空")
 
     # 偵測 header：首行含非數字的 cell_id 欄或明確的欄名
-    first = [c.strip().lower() for c in rows[0]]
+    first = [c.strip().lower() for c in first_row]
     has_header = any(
         k in first for k in ("cell_id", "cell", "lat", "lng", "latitude", "longitude")
-    ) or not _is_data_row(rows[0])
-    data_rows = rows[1:] if has_header else rows
+    ) or not _is_data_row(first_row)
 
     # 如果有 header，解析欄位位置
     if has_header:
@@ -99,75 +114,50 @@ def import_csv(
     else:
         idx_id, idx_lat, idx_lng = 0, 1, 2
         idx_carrier = idx_memo = None
+    layout = (idx_id, idx_lat, idx_lng, idx_carrier, idx_memo)
 
-    inserted = updated = skipped = 0
+    def _numbered():
+        if not has_header:
+            yield 1, first_row
+        for lineno, row in enumerate(reader, start=2):
+            yield lineno, row
+
+    staged = skipped = error_count = 0
     errors: list[str] = []
 
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            for lineno, row in enumerate(data_rows, start=2 if has_header else 1):
-                if not row or all(c.strip() == "" for c in row):
-                    continue
-                try:
-                    cid  = row[idx_id].strip()
-                    lat  = float(row[idx_lat])
-                    lng  = float(row[idx_lng])
-                except (IndexError, ValueError) as e:
-                    errors.append(f"第 {lineno} 行格式錯誤：{e}")
-                    skipped += 1
-                    continue
-
-                if not cid:
-                    errors.append(f"第 {lineno} 行 cell_id 為空，跳過")
-                    skipped += 1
-                    continue
-
-                # 座標合理性把關：寧可拒收也不要靜默寫進錯誤座標。
-                # 基地台座標本身就是證據，一旦寫錯，地圖仍會畫出漂亮但錯誤的點位，
-                # 事後幾乎無從察覺 —— 故此處採「拒絕該列 + 明確記錯誤」而非修正或猜測。
-                if not (_LAT_MIN <= lat <= _LAT_MAX) or not (_LNG_MIN <= lng <= _LNG_MAX):
-                    errors.append(
-                        f"第 {lineno} 行座標超出合理範圍（lat={lat}, lng={lng}），跳過"
-                        "：請確認欄位順序是否為經緯度對調"
+    try:
+        with get_conn() as conn:
+            with conn.transaction():
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "CREATE TEMP TABLE _cell_towers_stage ("
+                        "  lineno int4, cell_id text, lat float8, lng float8,"
+                        "  carrier_name text, memo text"
+                        ") ON COMMIT DROP",
+                        prepare=False,
                     )
-                    skipped += 1
-                    continue
-
-                # carrier_name: Form 參數 > CSV 欄位 > None
-                c_name = carrier_name
-                if c_name is None and idx_carrier is not None:
-                    try:
-                        c_name = row[idx_carrier].strip() or None
-                    except IndexError:
-                        c_name = None
-
-                memo_val = None
-                if idx_memo is not None:
-                    try:
-                        memo_val = row[idx_memo].strip() or None
-                    except IndexError:
-                        pass
-
-                cur.execute(
-                    """
-                    INSERT INTO cell_towers (cell_id, lat, lng, carrier_name, source, memo, imported_by)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (cell_id) DO UPDATE
-                        SET lat=EXCLUDED.lat, lng=EXCLUDED.lng,
-                            carrier_name=EXCLUDED.carrier_name,
-                            source=EXCLUDED.source, memo=EXCLUDED.memo,
-                            imported_by=EXCLUDED.imported_by,
-                            imported_at=now()
-                    RETURNING (xmax = 0) AS was_insert
-                    """,
-                    (cid, lat, lng, c_name, source, memo_val, user["id"]),
-                    prepare=False,
-                )
-                was_insert = cur.fetchone()[0]
-                if was_insert:
-                    inserted += 1
-                else:
-                    updated += 1
+                    with cur.copy(
+                        f"COPY _cell_towers_stage ({', '.join(_STAGE_COLS)}) FROM STDIN (FORMAT BINARY)"
+                    ) as cp:
+                        cp.set_types(list(_STAGE_TYPES))
+                        for batch in _batched(_numbered(), _BATCH_ROWS):
+                            good, errs = _validate_batch(batch, layout, carrier_name)
+                            for rec in good:
+                                cp.write_row(rec)
+                            staged += len(good)
+                            skipped += len(errs)
+                            error_count += len(errs)
+                            errors.extend(errs[:max(0, _MAX_ERRORS - len(errors))])
+                    inserted, updated = _upsert_from_stage(cur, source, user["id"])
+                    updated += staged - inserted - updated     # 同檔重複 cell_id
+                    if inserted or updated:
+                        tower_index.bump_version(cur)
+    except UnicodeDecodeError as e:
+        raise HTTPException(400, f"檔案編碼無法辨識（請存成 UTF-8 或 Big5）：{e}")
+    finally:
+        text.detach()
+    if inserted or updated:
+        tower_index.invalidate()
 
     write_audit(
         action="import_cell_towers",
@@ -178,7 +168,7 @@ def import_csv(
             "inserted": inserted,
             "updated": updated,
             "skipped": skipped,
-            "error_count": len(errors),
+            "error_count": error_count,
             "source": source,
         },
         status_code=200,
@@ -187,10 +177,125 @@ def import_csv(
         "inserted": inserted,
         "updated": updated,
         "skipped": skipped,
-        "errors": errors[:20],  # 最多回傳前 20 條錯誤
+        "errors": errors,  # 最多回傳前 20 條錯誤
     }
 
 
+def _open_text(raw: BinaryIO) -> io.TextIOWrapper:
+    """上傳檔 → 逐行讀取的文字串流，不整檔 decode。
+
+    編碼判定沿用舊版「UTF-8（含 BOM）優先、否則 Big5」：先看開頭 _SNIFF_BYTES，
+    是合法 UTF-8（切在多位元組字元中間也算）就用 utf-8-sig 嚴格解碼，否則 Big5
+    （errors=replace，同舊版）。開頭像 UTF-8、後段才壞掉的檔案會在讀到時丟
+    UnicodeDecodeError，由呼叫端回 400 並整批回滾。
+    """
+    head = raw.read(_SNIFF_BYTES)
+    raw.seek(0)
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        enc, errs = "utf-8-sig", "strict"
+    except UnicodeDecodeError:
+        enc, errs = "big5", "replace"
+    return io.TextIOWrapper(raw, encoding=enc, errors=errs, newline="")
+
+
+def _batched(rows: Iterable[tuple[int, list[str]]], size: int) -> Iterator[list[tuple[int, list[str]]]]:
+    batch: list[tuple[int, list[str]]] = []
+    for item in rows:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _validate_batch(
+    batch: list[tuple[int, list[str]]],
+    layout: tuple[int, int, int, Optional[int], Optional[int]],
+    carrier_name: Optional[str],
+) -> tuple[list[tuple], list[str]]:
+    """驗證一批 (行號, 欄位) → (staging 列, 錯誤訊息)。空白行直接略過、不算錯誤。"""
+    idx_id, idx_lat, idx_lng, idx_carrier, idx_memo = layout
+    good: list[tuple] = []
+    errors: list[str] = []
+    for lineno, row in batch:
+        if not row or all(c.strip() == "" for c in row):
+            continue
+        try:
+            cid  = row[idx_id].strip()
+            lat  = float(row[idx_lat])
+            lng  = float(row[idx_lng])
+        except (IndexError, ValueError) as e:
+            errors.append(f"第 {lineno} 行格式錯誤：{e}")
+            continue
+
+        if not cid:
+            errors.append(f"第 {lineno} 行 cell_id 為空，跳過")
+            continue
+
+        # 座標合理性把關：寧可拒收也不要靜默寫進錯誤座標。
+        # 基地台座標本身就是證據，一旦寫錯，地圖仍會畫出漂亮但錯誤的點位，
+        # 事後幾乎無從察覺 —— 故此處採「拒絕該列 + 明確記錯誤」而非修正或猜測。
+        # （float("nan") 不落在任何範圍內，也在這裡被擋下）
+        if not (_LAT_MIN <= lat <= _LAT_MAX) or not (_LNG_MIN <= lng <= _LNG_MAX):
+            errors.append(
+                f"第 {lineno} 行座標超出合理範圍（lat={lat}, lng={lng}），跳過"
+                "：請確認欄位順序是否為經緯度對調"
+            )
+            continue
+
+        # carrier_name: Form 參數 > CSV 欄位 > None
+        c_name = carrier_name
+        if c_name is None and idx_carrier is not None:
+            try:
+                c_name = row[idx_carrier].strip() or None
+            except IndexError:
+                c_name = None
+
+        memo_val = None
+        if idx_memo is not None:
+            try:
+                memo_val = row[idx_memo].strip() or None
+            except IndexError:
+                pass
+
+        good.append((lineno, cid, lat, lng, c_name, memo_val))
+    return good, errors
+
+
+def _upsert_from_stage(cur, source: Optional[str], user_id) -> tuple[int, int]:
+    """staging → cell_towers 一次 set-based upsert；回傳 (新增, 更新)。
+
+    DISTINCT ON 取每個 cell_id 的最後一行：ON CONFLICT DO UPDATE 不允許同一列在
+    一個指令內被更新兩次。計數用 CTE 聚合，不把 30 萬列 RETURNING 傳回 client。
+    """
+    cur.execute(
+        """
+        WITH src AS (
+            SELECT DISTINCT ON (cell_id) cell_id, lat, lng, carrier_name, memo
+              FROM _cell_towers_stage
+             ORDER BY cell_id, lineno DESC
+        ), up AS (
+            INSERT INTO cell_towers (cell_id, lat, lng, carrier_name, source, memo, imported_by)
+            SELECT cell_id, lat, lng, carrier_name, %s, memo, %s FROM src
+            ON CONFLICT (cell_id) DO UPDATE
+                SET lat=EXCLUDED.lat, lng=EXCLUDED.lng,
+                    carrier_name=EXCLUDED.carrier_name,
+                    source=EXCLUDED.source, memo=EXCLUDED.memo,
+                    imported_by=EXCLUDED.imported_by,
+                    imported_at=now()
+            RETURNING (xmax = 0) AS was_insert
+        )
+        SELECT count(*) FILTER (WHERE was_insert), count(*) FILTER (WHERE NOT was_insert) FROM up
+        """,
+        (source, user_id),
+        prepare=False,
+    )
+    row = cur.fetchone() or (0, 0)
+    return int(row[0] or 0), int(row[1] or 0)
+
+
 # ---------- DELETE / ----------
 @router.delete("")
 def clear_all(
@@ -206,6 +311,8 @@ def clear_all(
             deleted_count = cur.rowcount
             cur.execute("SELECT COUNT(*) FROM cell_towers", prepare=False)
             remaining = cur.fetchone()[0]
+            tower_index.bump_version(cur)
+    tower_index.invalidate()
 
     write_audit(
         action="clear_cell_towers",
@@ -0,0 +1,46 @@
+# backend/app/api/coverage.py
+"""
+涵蓋率彙總表校驗（2026-10；服務見 services/coverage.py）
+
+端點（均需 admin）：
+  POST /api/admin/coverage/verify[?project_id=P&repair=false]   由 raw_traces 重算並比對 trace_coverage
+  GET  /api/admin/coverage/verify                               本 process 最近一次校驗報告
+
+排程版由 main.py 依 COVERAGE_VERIFY_HOURS 執行（預設每 24 小時全量一次）。
+drifted > 0 代表有寫入路徑繞過了 trigger（或 trigger 被停用），報告的 sample 列出差異組。
+"""
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+
+from app.security import require_admin
+from app.services import coverage
+from app.services.audit import write_audit
+
+router = APIRouter(prefix="/admin/coverage", tags=["coverage"])
+
+
+@router.post("/verify")
+def verify(
+    request: Request,
+    project_id: Optional[str] = Query(default=None, min_length=1),
+    repair: bool = Query(default=True),
+    user: dict = Depends(require_admin),
+):
+    try:
+        report = coverage.verify(project_id, repair=repair)
+    except RuntimeError as e:
+        raise HTTPException(503, str(e))
+    write_audit(
+        action="coverage_verify",
+        user=user, request=request,
+        target_type="trace_coverage", project_id=project_id,
+        details={"drifted": report["drifted"], "repaired": report["repaired"]},
+        status_code=200,
+    )
+    return report
+
+
+@router.get("/verify")
+def last_verify(_user: dict = Depends(require_admin)):
+    return coverage.last_report()
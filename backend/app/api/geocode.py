@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException
 import os, requests, json, re, hashlib
 import redis
 
+from app.security import require_admin
+from app.services import geocode as geocode_svc
+
 router = APIRouter()
 
 GOOGLE_KEY      = os.getenv("GOOGLE_MAPS_API_KEY", "")
@@ -75,4 +78,10 @@ def geocode(address: str = Query(..., min_length=1, description="完整門牌或
         except Exception as e:
             print(f"[geocode] redis setex skipped: {type(e).__name__}: {e}")
     result["cache"] = "miss"
-    return result
\ No newline at end of file
+    return result
+
+
+@router.get("/geocode/cache-stats", dependencies=[Depends(require_admin)])
+def geocode_cache_stats():
+    """匯入用 geocode 各快取層（LRU / Redis / SQL / 負快取）命中計數，process 啟動以來累計。"""
+    return geocode_svc.cache_stats()
@@ -0,0 +1,120 @@
+# backend/app/api/geocode_bundle.py
+"""
+geocode 快取匯出入包與暖機（2026-10；服務見 services/geocode_bundle.py）
+
+端點（均需 admin）：
+  GET  /api/admin/geocode/bundle[?sections=geocode_cache,cell_towers]  下載 gzip 匯出包
+  POST /api/admin/geocode/bundle                                        上傳匯出包合併進本環境
+  POST /api/admin/geocode/warmup[?days=N]                               背景暖機（已有在跑 → started=false）
+  GET  /api/admin/geocode/warmup                                        本 process 最近一次暖機狀態
+
+典型用法：新環境上線前，從舊環境 GET bundle、在新環境 POST bundle；或開機設
+GEOCODE_WARMUP_ON_START=1。命令列版見 scripts/geocode_bundle.py。
+"""
+import gzip
+import tempfile
+from datetime import datetime
+from typing import Iterator, Optional
+
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, UploadFile
+from fastapi.responses import StreamingResponse
+
+from app.security import require_admin
+from app.services import geocode_bundle
+from app.services.audit import write_audit
+
+router = APIRouter(prefix="/admin/geocode", tags=["geocode-bundle"])
+
+# 匯出先寫進 spooled 暫存檔（小包留在記憶體、大包落地），寫完才開始回傳：
+# 不在串流回應期間佔著 DB 連線。
+_SPOOL_BYTES = 16 * 1024 * 1024
+_READ_CHUNK = 256 * 1024
+
+
+def _iter_file(f) -> Iterator[bytes]:
+    try:
+        while True:
+            chunk = f.read(_READ_CHUNK)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        f.close()
+
+
+@router.get("/bundle")
+def export_bundle(
+    request: Request,
+    sections: Optional[str] = Query(default=None, description="逗號分隔；預設全部"),
+    user: dict = Depends(require_admin),
+):
+    wanted = [s.strip() for s in sections.split(",") if s.strip()] if sections else list(geocode_bundle.SECTIONS)
+    spool = tempfile.SpooledTemporaryFile(max_size=_SPOOL_BYTES)
+    try:
+        counts = geocode_bundle.export_bundle(spool, wanted)
+    except ValueError as e:
+        spool.close()
+        raise HTTPException(400, str(e))
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+
+    write_audit(
+        action="export_geocode_bundle",
+        user=user, request=request,
+        target_type="geocode_cache",
+        details={"sections": wanted, "rows": counts},
+        status_code=200,
+    )
+    fname = f"geocode-bundle-{datetime.now().strftime('%Y%m%d-%H%M%S')}.txt.gz"
+    return StreamingResponse(
+        _iter_file(spool),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{fname}"'},
+    )
+
+
+@router.post("/bundle")
+def import_bundle(
+    request: Request,
+    file: UploadFile = File(...),
+    user: dict = Depends(require_admin),
+):
+    try:
+        # 匿名 admin（AUTH_ENABLED=false）id=0 → NULL，否則違反 users(id) FK
+        result = geocode_bundle.import_bundle(file.file, user_id=user["id"] if user.get("id") else None)
+    except (ValueError, EOFError, gzip.BadGzipFile, UnicodeDecodeError) as e:
+        raise HTTPException(400, f"匯出包無法匯入：{e}")
+
+    write_audit(
+        action="import_geocode_bundle",
+        user=user, request=request,
+        target_type="geocode_cache",
+        details={"filename": file.filename, "sections": result},
+        status_code=200,
+    )
+    return {"sections": result}
+
+
+@router.post("/warmup", status_code=202)
+def start_warmup(
+    request: Request,
+    days: Optional[int] = Query(default=None, ge=1, le=365),
+    user: dict = Depends(require_admin),
+):
+    started = geocode_bundle.start_warmup(days)
+    if started:
+        write_audit(
+            action="geocode_warmup",
+            user=user, request=request,
+            target_type="geocode_cache",
+            details={"days": days or geocode_bundle.warmup_days()},
+            status_code=202,
+        )
+    return {"started": started, "status": geocode_bundle.warmup_status()}
+
+
+@router.get("/warmup")
+def warmup_status(_user: dict = Depends(require_admin)):
+    return geocode_bundle.warmup_status()
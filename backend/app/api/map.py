@@ -1,13 +1,16 @@
 # backend/app/api/map.py
 import csv
 import io
+from datetime import datetime
 
 from fastapi import APIRouter, Query, Depends, HTTPException, Request
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional
+from app.core.env import env_int
 from app.db.session import get_conn
 from app.security import assert_project_access, get_current_user
+from app.services import coverage, geojson_stream, osm_queue, response_cache
 from app.services.audit import write_audit
 
 router = APIRouter()
@@ -23,26 +26,50 @@ router = APIRouter()
 #                            cell_towers）。匯入對照表後可重跑 geocode 救回。
 #   3. addr_geocode_failed ── 有 cell_addr 但 Google/OSM 都找不到。通常是
 #                            社區名 / 巷弄描述模糊。可由偵查員人工指定座標。
+#   4. geocode_pending     ── 有 cell_addr、Google 沒查到，已排給背景 OSM worker
+#                            （2026-10，services/osm_queue.py）；稍後會自動回填，
+#                            不是失敗。worker 收尾後才落到 3。
 #
 # SQL 與 Python 兩處表達需保持同義，避免 coverage 計數與 unlocated 列表不一致。
 # ============================================================================
-_REASON_KEYS = ("no_signal", "cellid_only", "addr_geocode_failed")
+_REASON_KEYS = ("no_signal", "cellid_only", "geocode_pending", "addr_geocode_failed")
 
-_REASON_SQL_CASE = """
+
+def _reason_sql_case() -> str:
+    return f"""
 CASE
   WHEN (cell_addr IS NULL OR cell_addr = '')
    AND (cell_id   IS NULL OR cell_id   = '') THEN 'no_signal'
   WHEN (cell_addr IS NULL OR cell_addr = '') THEN 'cellid_only'
+  WHEN cell_addr IN ({osm_queue.pending_addrs_sql()}) THEN 'geocode_pending'
   ELSE 'addr_geocode_failed'
 END
 """
 
 # --- 主要：回傳 GeoJSON（已定位：geom IS NOT NULL） ---
+def _parse_bbox(bbox: str) -> tuple:
+    """'minLng,minLat,maxLng,maxLat' → 4 個 float；格式 / 範圍不符 → 400。"""
+    try:
+        x1, y1, x2, y2 = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox 應為 minLng,minLat,maxLng,maxLat")
+    if not (-180 <= x1 < x2 <= 180 and -90 <= y1 < y2 <= 90):
+        raise HTTPException(status_code=400, detail="bbox 範圍不合理（需 min < max 且在經緯度範圍內）")
+    return x1, y1, x2, y2
+
+
 @router.get("/projects/{project_id}/map-layers")
 def project_map_layers(
     project_id: str,
+    request: Request,
     target_id: Optional[str] = None,
     limit: int = Query(50000, ge=1, le=200000),
+    stream: Optional[str] = Query(None, pattern="^(ndjson|json)$",
+                                  description="串流輸出：ndjson（每行一個 Feature）或 json"),
+    from_ts: Optional[datetime] = Query(None, description="start_ts 下界（含）"),
+    to_ts: Optional[datetime] = Query(None, description="start_ts 上界（不含）"),
+    bbox: Optional[str] = Query(None, description="minLng,minLat,maxLng,maxLat（WGS84）"),
+    after: Optional[str] = Query(None, description="分頁游標：上一頁回應的 next_after"),
     current_user: dict = Depends(get_current_user),
 ):
     """
@@ -52,19 +79,71 @@ def project_map_layers(
     回應的 FeatureCollection 另附 total / returned / truncated 三欄：
     當符合條件的點數超過 limit 上限時 truncated=true，前端據此提醒使用者
     「地圖未顯示完整軌跡」，避免靜默截斷導致偵查員誤判軌跡已完整。
+
+    stream=ndjson|json（2026-10）：改走 services/geojson_stream 逐列串流，三欄改放在
+    結尾（ndjson 為最後一行 Summary），並依 Accept-Encoding 壓縮（br / gzip）。
+    同時串流數有上限（GEOJSON_STREAM_MAX），滿了回 503 + Retry-After。
+
+    時間窗 / 範圍 / 分頁（2026-10）：
+      - from_ts / to_ts 篩 start_ts（半開區間），bbox 以 geom && envelope 篩；
+        start_ts 為 NULL 的列不落在任何時間窗內。
+      - truncated 時回應帶 next_after（本頁最後一列的 (start_ts, id)），原樣帶回 after=
+        即取下一頁；total 為「從 after 起」仍符合條件的列數。
+      - 排序 (start_ts NULLS LAST, id) 配合 idx_raw_traces_map_keyset
+        (project_id, target_id, start_ts, id) WHERE 未軟刪且已定位：帶 target_id 時
+        時間窗 + 游標直接是索引範圍掃描，拖時間軸只讀可見那一段。
+
+    條件式 GET（2026-10，services/response_cache）：回應帶強 ETag（案件資料版本 + 查詢參數），
+    If-None-Match 相符回 304；非串流回應另進伺服端快取。串流的 ETag 另依壓縮編碼區分。
     """
     assert_project_access(current_user, project_id, "viewer")
+    if from_ts and to_ts and from_ts >= to_ts:
+        raise HTTPException(status_code=400, detail="from_ts 必須早於 to_ts")
     # 軟刪過濾：永遠不顯示已刪除的紀錄（deleted_at IS NULL）
     where = ["project_id = %s", "geom IS NOT NULL", "deleted_at IS NULL"]
     params = [project_id]
     if target_id:
         where.append("target_id = %s")
         params.append(target_id)
+    if from_ts:
+        where.append("start_ts >= %s")
+        params.append(from_ts)
+    if to_ts:
+        where.append("start_ts < %s")
+        params.append(to_ts)
+    if bbox:
+        where.append("geom && ST_MakeEnvelope(%s, %s, %s, %s, 4326)")
+        params.extend(_parse_bbox(bbox))
+    if after:
+        try:
+            cond, cond_params = geojson_stream.keyset_sql(geojson_stream.decode_cursor(after))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"after 游標無效：{e}")
+        where.append(cond)
+        params.extend(cond_params)
     where_sql = " AND ".join(where)
 
+    if stream:
+        encoding = geojson_stream.negotiate_encoding(
+            request.headers.get("accept-encoding"))
+        tag, early = response_cache.precheck(request, "map-layers", project_id, encoding or "identity")
+        if early is not None:
+            return early
+        return StreamingResponse(
+            geojson_stream.encode(
+                geojson_stream.stream_features(where_sql, params, limit, stream), encoding),
+            media_type=geojson_stream.MEDIA_TYPES[stream],
+            headers={**geojson_stream.response_headers(encoding), **response_cache.headers(tag)},
+        )
+
+    tag, early = response_cache.precheck(request, "map-layers", project_id)
+    if early is not None:
+        return early
+
     sql = f"""
     WITH rows AS (
       SELECT
+        id,
         target_id,
         start_ts,
         end_ts,
@@ -81,6 +160,12 @@ def project_map_layers(
       WHERE {where_sql}
       ORDER BY start_ts NULLS LAST, id
       LIMIT %s
+    ),
+    -- 本頁最後一列 → next_after 游標
+    last AS (
+      SELECT start_ts, id FROM rows
+       ORDER BY start_ts DESC NULLS FIRST, id DESC
+       LIMIT 1
     )
     SELECT jsonb_build_object(
       'type', 'FeatureCollection',
@@ -109,7 +194,9 @@ def project_map_layers(
           ),
           '[]'::jsonb
         )
-    ) AS fc
+    ) AS fc,
+      (SELECT start_ts FROM last) AS last_ts,
+      (SELECT id FROM last)       AS last_id
     FROM rows;
     """
     count_sql = f"SELECT count(*) FROM raw_traces WHERE {where_sql}"
@@ -121,6 +208,7 @@ def project_map_layers(
         cur.execute(sql, params + [limit], prepare=False)  # ← 不使用 prepared
         row = cur.fetchone()
         fc = (row[0] if row else None) or {"type": "FeatureCollection", "features": []}
+        last = (row[1], row[2]) if row and row[2] is not None else None
 
     # 把真實總數與是否截斷一併回傳，讓前端能在點數超過上限時提醒使用者，
     # 避免偵查員誤以為地圖上的軌跡已完整（GeoJSON 允許 foreign members）。
@@ -128,12 +216,165 @@ def project_map_layers(
     fc["total"] = total
     fc["returned"] = returned
     fc["truncated"] = total > returned
-    return fc
+    if fc["truncated"] and last is not None:
+        fc["next_after"] = geojson_stream.encode_cursor(*last)
+    return response_cache.finish(tag, fc)
+
+# --- 向量圖磚（MVT，2026-10）---
+# 為什麼：map-layers 把最多 20 萬點在 DB 端 jsonb_agg 成一整包 GeoJSON，另做一次
+# count 全掃，前端再整包丟給 MarkerCluster 分群 —— 案件越大越慢、越吃前端記憶體。
+# 圖磚只回「這一格」的點，用 PostGIS ST_AsMVTGeom / ST_AsMVT 直接編成 protobuf：
+#   - 低縮放（z < MVT_THIN_BELOW_ZOOM）在伺服端疏化：以 MVT_GRID_PX 像素為格聚合，每格
+#     一個點（格內點的中心），帶 point_count / target_count（只有一個 target 時帶 target_id）。
+#     每磚輸出上限 (4096 / 格寬)² 個 feature，與案件大小無關。
+#   - 高縮放逐點輸出（同 map-layers 的屬性 + id），每磚最多 MVT_MAX_FEATURES 點
+#     （依 start_ts 排序取前段），超過時回應 header X-Tile-Truncated: 1。
+#   - 過濾同 map-layers：project、可選 target、geom IS NOT NULL、deleted_at IS NULL。
+#   - 以 geom && 磚範圍（4326，含 buffer）走 idx_raw_traces_geom。
+# 回應大小與前端工作量有上界；DB 端仍需掃過磚內的點（走索引），低縮放的大磚由
+# Cache-Control 讓瀏覽器短暫重用。
+_MVT_EXTENT = 4096
+_MVT_BUFFER = 64
+_MVT_LAYER = "traces"
+_MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+
+
+def _mvt_thin_below_zoom() -> int:
+    """低於此縮放層級的圖磚做格點聚合（env `MVT_THIN_BELOW_ZOOM`，預設 13，合理 0~22）。"""
+    return env_int("MVT_THIN_BELOW_ZOOM", 13, 0, 22)
+
+
+def _mvt_grid_px() -> int:
+    """聚合格寬（圖磚座標，磚寬 4096；env `MVT_GRID_PX`，預設 64，合理 8~512）。"""
+    return env_int("MVT_GRID_PX", 64, 8, 512)
+
+
+def _mvt_max_features() -> int:
+    """逐點圖磚的點數上限（env `MVT_MAX_FEATURES`，預設 20000，合理 1000~100000）。"""
+    return env_int("MVT_MAX_FEATURES", 20000, 1000, 100000)
+
+
+_MVT_SRC_SQL = """
+WITH b AS (
+  SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS env
+), q AS (
+  SELECT ST_Transform(
+           ST_Expand(env, (ST_XMax(env) - ST_XMin(env)) * {buffer} / {extent}.0), 4326) AS bbox
+    FROM b
+)
+"""
+
+_MVT_THIN_SQL = _MVT_SRC_SQL + """
+, pts AS (
+  SELECT t.target_id,
+         ST_AsMVTGeom(ST_Transform(t.geom, 3857), b.env, {extent}, {buffer}, true) AS g
+    FROM raw_traces t, b, q
+   WHERE {where} AND t.geom && q.bbox
+), cells AS (
+  SELECT ST_Centroid(ST_Collect(g)) AS geom,
+         count(*) AS point_count,
+         count(DISTINCT target_id) AS target_count,
+         CASE WHEN count(DISTINCT target_id) = 1 THEN min(target_id) END AS target_id
+    FROM pts
+   WHERE g IS NOT NULL
+   GROUP BY floor(ST_X(g) / %(grid)s), floor(ST_Y(g) / %(grid)s)
+)
+SELECT (SELECT ST_AsMVT(cells, '{layer}', {extent}, 'geom') FROM cells), false
+"""
+
+_MVT_POINTS_SQL = _MVT_SRC_SQL + """
+, src AS (
+  SELECT t.id, t.target_id, t.start_ts, t.end_ts, t.cell_id, t.cell_addr, t.sector_name,
+         t.site_code, t.sector_id, t.azimuth, t.azimuth_ref, t.accuracy_m, t.geom
+    FROM raw_traces t, q
+   WHERE {where} AND t.geom && q.bbox
+   ORDER BY t.start_ts NULLS LAST, t.id
+   LIMIT %(cap)s + 1
+), feats AS (
+  SELECT s.id, s.target_id, s.start_ts::text AS start_ts, s.end_ts::text AS end_ts,
+         s.cell_id, s.cell_addr, s.sector_name, s.site_code, s.sector_id,
+         s.azimuth, s.azimuth_ref, s.accuracy_m,
+         ST_AsMVTGeom(ST_Transform(s.geom, 3857), b.env, {extent}, {buffer}, true) AS geom
+    FROM (SELECT * FROM src ORDER BY start_ts NULLS LAST, id LIMIT %(cap)s) s, b
+)
+SELECT (SELECT ST_AsMVT(feats, '{layer}', {extent}, 'geom') FROM feats WHERE geom IS NOT NULL),
+       (SELECT count(*) FROM src) > %(cap)s
+"""
+
+
+@router.get("/projects/{project_id}/tiles/{z}/{x}/{y}.mvt")
+def project_map_tile(
+    project_id: str,
+    z: int,
+    x: int,
+    y: int,
+    target_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+):
+    """已定位 raw_traces 的向量圖磚（Mapbox Vector Tile，圖層名 traces）。需 viewer 以上權限。"""
+    if not (0 <= z <= 22) or not (0 <= x < 2 ** z) or not (0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail="圖磚座標超出範圍")
+    assert_project_access(current_user, project_id, "viewer")
+
+    where = ["t.project_id = %(pid)s", "t.geom IS NOT NULL", "t.deleted_at IS NULL"]
+    params = {"z": z, "x": x, "y": y, "pid": project_id}
+    if target_id:
+        where.append("t.target_id = %(tid)s")
+        params["tid"] = target_id
+    thin = z < _mvt_thin_below_zoom()
+    if thin:
+        params["grid"] = _mvt_grid_px()
+        template = _MVT_THIN_SQL
+    else:
+        params["cap"] = _mvt_max_features()
+        template = _MVT_POINTS_SQL
+    sql = template.format(where=" AND ".join(where), extent=_MVT_EXTENT, buffer=_MVT_BUFFER,
+                          layer=_MVT_LAYER)
+
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(sql, params, prepare=False)
+        row = cur.fetchone()
+    tile = bytes(row[0]) if row and row[0] is not None else b""
+    headers = {"Cache-Control": "private, max-age=60"}
+    if row and row[1]:
+        headers["X-Tile-Truncated"] = "1"
+    return Response(content=tile, media_type=_MVT_MEDIA_TYPE, headers=headers)
+
 
 # --- 聚合：定位涵蓋率（前端 L1 收據 + L2 banner 用）---
+def _coverage_scan(where_sql: str, params: list, pending_sql: str) -> tuple:
+    """彙總表不可用（建表失敗等）時的退路：單次全掃 raw_traces。"""
+    # 單次掃描，用 FILTER 表達 6 個欄位 —— 避免分 6 次 query 帶來不一致風險
+    sql = f"""
+    SELECT
+      count(*) AS total,
+      count(*) FILTER (WHERE geom IS NOT NULL) AS with_geom,
+      count(*) FILTER (WHERE geom IS NULL)     AS without_geom,
+      count(*) FILTER (WHERE geom IS NULL
+                         AND (cell_addr IS NULL OR cell_addr='')
+                         AND (cell_id   IS NULL OR cell_id  ='')) AS no_signal,
+      count(*) FILTER (WHERE geom IS NULL
+                         AND (cell_addr IS NULL OR cell_addr='')
+                         AND cell_id IS NOT NULL AND cell_id<>'') AS cellid_only,
+      count(*) FILTER (WHERE geom IS NULL
+                         AND cell_addr IS NOT NULL AND cell_addr<>''
+                         AND cell_addr IN ({pending_sql})) AS geocode_pending,
+      count(*) FILTER (WHERE geom IS NULL
+                         AND cell_addr IS NOT NULL AND cell_addr<>''
+                         AND cell_addr NOT IN ({pending_sql})) AS addr_geocode_failed
+    FROM raw_traces
+    WHERE {where_sql}
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(sql, params, prepare=False)
+        row = cur.fetchone() or (0, 0, 0, 0, 0, 0, 0)
+    return tuple(int(x or 0) for x in row)
+
+
 @router.get("/projects/{project_id}/coverage")
 def project_coverage(
     project_id: str,
+    request: Request,
     target_id: Optional[str] = None,
     current_user: dict = Depends(get_current_user),
 ):
@@ -158,12 +399,16 @@ def project_coverage(
       "by_reason": {
         "no_signal":            3,   # cell_id 與 cell_addr 皆缺
         "cellid_only":         80,   # 有 cell_id 但無 cell_addr（需業者對照表）
-        "addr_geocode_failed": 15    # 有 cell_addr 但 geocode 失敗
+        "geocode_pending":      5,   # 已排給背景 OSM worker，稍後自動回填（2026-10）
+        "addr_geocode_failed": 10    # 有 cell_addr 但 geocode 失敗
       }
     }
-    需 viewer 以上權限。
+    需 viewer 以上權限。帶強 ETag / If-None-Match → 304 / 伺服端快取，同 map-layers（2026-10）。
     """
     assert_project_access(current_user, project_id, "viewer")
+    tag, early = response_cache.precheck(request, "coverage", project_id)
+    if early is not None:
+        return early
 
     where = ["project_id = %s", "deleted_at IS NULL"]
     params = [project_id]
@@ -171,30 +416,35 @@ def project_coverage(
         where.append("target_id = %s")
         params.append(target_id)
     where_sql = " AND ".join(where)
-
-    # 單次掃描，用 FILTER 表達 5 個欄位 —— 避免分 5 次 query 帶來不一致風險
-    sql = f"""
-    SELECT
-      count(*) AS total,
-      count(*) FILTER (WHERE geom IS NOT NULL) AS with_geom,
-      count(*) FILTER (WHERE geom IS NULL)     AS without_geom,
-      count(*) FILTER (WHERE geom IS NULL
-                         AND (cell_addr IS NULL OR cell_addr='')
-                         AND (cell_id   IS NULL OR cell_id  ='')) AS no_signal,
-      count(*) FILTER (WHERE geom IS NULL
-                         AND (cell_addr IS NULL OR cell_addr='')
-                         AND cell_id IS NOT NULL AND cell_id<>'') AS cellid_only,
-      count(*) FILTER (WHERE geom IS NULL
-                         AND cell_addr IS NOT NULL AND cell_addr<>'') AS addr_geocode_failed
-    FROM raw_traces
-    WHERE {where_sql}
-    """
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, params, prepare=False)
-        row = cur.fetchone() or (0, 0, 0, 0, 0, 0)
-    total, with_geom, without_geom, no_sig, cid_only, addr_fail = (int(x or 0) for x in row)
-
-    return {
+    pending_sql = osm_queue.pending_addrs_sql()
+
+    # 彙總表（services/coverage.py，2026-10）：各桶在寫入時由 trigger 記帳，這裡只加總
+    # 該案的幾列。geocode_pending 看的是 OSM 佇列當下狀態，只能即時細分 —— 且只掃
+    # 「有地址但未定位」的列（通常很少），沒有這種列就完全不碰 raw_traces。
+    cov = coverage.summary(project_id, target_id)
+    if cov is not None:
+        pending = 0
+        if cov["addr_unlocated"]:
+            with get_conn() as conn, conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    SELECT count(*) FROM raw_traces
+                     WHERE {where_sql} AND geom IS NULL
+                       AND cell_addr IS NOT NULL AND cell_addr <> ''
+                       AND cell_addr IN ({pending_sql})
+                    """,
+                    params, prepare=False,
+                )
+                pending = int((cur.fetchone() or [0])[0])
+        total, with_geom = cov["total"], cov["with_geom"]
+        without_geom = total - with_geom
+        no_sig, cid_only = cov["no_signal"], cov["cellid_only"]
+        addr_fail = cov["addr_unlocated"] - pending
+    else:
+        total, with_geom, without_geom, no_sig, cid_only, pending, addr_fail = \
+            _coverage_scan(where_sql, params, pending_sql)
+
+    return response_cache.finish(tag, {
         "project_id": project_id,
         "target_id":  target_id,
         "total":         total,
@@ -203,9 +453,10 @@ def project_coverage(
         "by_reason": {
             "no_signal":            no_sig,
             "cellid_only":          cid_only,
+            "geocode_pending":      pending,
             "addr_geocode_failed":  addr_fail,
         },
-    }
+    })
 
 
 # --- 附加：未定位清單（方便除錯）---
@@ -213,7 +464,7 @@ def project_coverage(
 def project_unlocated_list(
     project_id: str,
     target_id: Optional[str] = None,
-    reason: Optional[str] = Query(None, description="篩選原因：no_signal / cellid_only / addr_geocode_failed"),
+    reason: Optional[str] = Query(None, description="篩選原因：no_signal / cellid_only / geocode_pending / addr_geocode_failed"),
     limit: int = Query(1000, ge=1, le=10000),
     current_user: dict = Depends(get_current_user),
 ):
@@ -224,6 +475,7 @@ def project_unlocated_list(
     新增（2026-05-23）：
       - 每列附 reason 標籤（no_signal / cellid_only / addr_geocode_failed）
       - 可用 ?reason= 篩選單一類別，給 L3 modal 的分區檢視
+    新增（2026-10）：geocode_pending —— 排隊等背景 OSM worker 補座標的列
     """
     assert_project_access(current_user, project_id, "viewer")
     if reason is not None and reason not in _REASON_KEYS:
@@ -237,13 +489,13 @@ def project_unlocated_list(
         where.append("target_id = %s")
         params.append(target_id)
     if reason:
-        where.append(f"({_REASON_SQL_CASE.strip()}) = %s")
+        where.append(f"({_reason_sql_case().strip()}) = %s")
         params.append(reason)
     where_sql = " AND ".join(where)
 
     sql = f"""
     SELECT id, target_id, start_ts, end_ts, cell_id, cell_addr, azimuth, accuracy_m,
-           {_REASON_SQL_CASE} AS reason
+           {_reason_sql_case()} AS reason
     FROM raw_traces
     WHERE {where_sql}
     ORDER BY start_ts NULLS LAST, id
@@ -296,13 +548,13 @@ def project_unlocated_csv(
         where.append("target_id = %s")
         params.append(target_id)
     if reason:
-        where.append(f"({_REASON_SQL_CASE.strip()}) = %s")
+        where.append(f"({_reason_sql_case().strip()}) = %s")
         params.append(reason)
     where_sql = " AND ".join(where)
 
     sql = f"""
     SELECT id, target_id, start_ts, end_ts, cell_id, cell_addr,
-           azimuth, accuracy_m, {_REASON_SQL_CASE} AS reason
+           azimuth, accuracy_m, {_reason_sql_case()} AS reason
     FROM raw_traces
     WHERE {where_sql}
     ORDER BY start_ts NULLS LAST, id
@@ -0,0 +1,54 @@
+# backend/app/api/metrics.py
+"""
+行程內 metrics（2026-10；registry 見 core/metrics.py）
+
+端點（需 admin）：
+  GET /api/metrics   Prometheus text exposition format（0.0.4）
+
+內容：
+  - celltrail_geocode_tier_seconds{tier}          lookup_bulk 各層耗時 histogram
+  - celltrail_geocode_tier_keys_total{tier,result} 各層處理 key 數（hit / neg / miss / queued）
+  - celltrail_geocode_hit_ratio{tier}             各層命中率
+  - celltrail_geocode_bulk_seconds                lookup_bulk 單次總耗時
+  - celltrail_ingest_stage_seconds{stage}         每塊 geocode / write 耗時
+  - celltrail_ingest_run_seconds{sink}、celltrail_ingest_rows_total{sink,outcome}
+  - celltrail_queue_depth{queue}                  osm / ingest / regeocode 佇列深度（抓取時查 DB）
+  - celltrail_tower_index_towers                  常駐基地台索引筆數
+
+計數為本 process 啟動以來累計；多 worker 部署時各 process 分別回報，由抓取端加總。
+"""
+from typing import Dict, Tuple
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from app.core import metrics
+from app.security import require_admin
+from app.services import ingest_jobs, osm_queue, regeocode, tower_index
+
+router = APIRouter(tags=["metrics"])
+
+_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _queue_depth() -> Dict[Tuple[str, ...], float]:
+    """各佇列 queued / pending + running 數；單一佇列查詢失敗只略過那一個。"""
+    out: Dict[Tuple[str, ...], float] = {}
+    for name, fn in (("osm", osm_queue.pending_count),
+                     ("ingest", ingest_jobs.pending_count),
+                     ("regeocode", regeocode.pending_count)):
+        try:
+            out[(name,)] = fn()
+        except Exception as e:
+            print(f"[metrics] queue_depth {name} skipped: {type(e).__name__}: {e}")
+    return out
+
+
+metrics.gauge("queue_depth", "Pending plus running items per background queue", _queue_depth, ("queue",))
+metrics.gauge("tower_index_towers", "Towers loaded in the in-process cell_towers index",
+              lambda: tower_index.stats()["towers"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics(_user: dict = Depends(require_admin)):
+    return PlainTextResponse(metrics.render(), media_type=_CONTENT_TYPE)
@@ -18,7 +18,7 @@ import traceback
 from fastapi import APIRouter, File, Form, HTTPException, Request, UploadFile
 from fastapi.responses import JSONResponse
 
-from app.services.ingest import parse_file_only, ParseDiagnosisError, EncryptedFileError
+from app.services.ingest import parse_file_geojson, ParseDiagnosisError, EncryptedFileError
 from app.services.limiter import limiter
 
 router = APIRouter()
@@ -69,9 +69,9 @@ async def parse_only(
 
     try:
         t1 = time.perf_counter()
-        records = parse_file_only(target_id, filename, content, mapping=user_mapping)
+        geo = parse_file_geojson(target_id, filename, content, mapping=user_mapping)
         t_parse = time.perf_counter() - t1
-        print(f"[parse-only][timing] parse_total={t_parse*1000:.0f}ms records={len(records)} file={filename}")
+        print(f"[parse-only][timing] parse_total={t_parse*1000:.0f}ms records={geo['total']} file={filename}")
     except EncryptedFileError as e:
         raise HTTPException(status_code=422, detail=str(e))
     except ParseDiagnosisError as e:
@@ -92,41 +92,5 @@ async def parse_only(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"解析失敗：{type(e).__name__}: {e}")
 
-    features = []
-    skipped = 0
-    for r in records:
-        if r.get("lat") is None or r.get("lng") is None:
-            skipped += 1
-            continue
-        features.append(
-            {
-                "type": "Feature",
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [r["lng"], r["lat"]],
-                },
-                "properties": {
-                    "target_id":   r["target_id"],
-                    "cell_addr":   r.get("cell_addr"),
-                    "start_ts":    r.get("start_ts"),
-                    "end_ts":      r.get("end_ts"),
-                    "cell_id":     r.get("cell_id"),
-                    "accuracy_m":  r.get("accuracy_m"),
-                    "azimuth":     r.get("azimuth"),
-                    "azimuth_ref": r.get("azimuth_ref", "unknown"),
-                    "sector_id":   r.get("sector_id"),
-                    "sector_name": r.get("sector_name"),
-                    "site_code":   r.get("site_code"),
-                },
-            }
-        )
-
-    return {
-        "type":     "FeatureCollection",
-        "features": features,
-        "total":    len(records),
-        "plotted":  len(features),
-        "skipped":  skipped,
-        "_source":  "parse-only",
-        "_records": records,
-    }
+    # features 在解析時逐塊組好（parse_file_geojson），不再整檔 records 轉一輪
+    return {**geo, "_source": "parse-only"}
@@ -0,0 +1,52 @@
+# backend/app/api/regeocode.py
+"""
+未定位列重新 geocode 回填（2026-10；服務見 services/regeocode.py）
+
+端點（均需 admin）：
+  POST /api/admin/regeocode?project_id=P     排入該案件的回填 run（已有進行中的 → 回那個）
+  GET  /api/admin/regeocode[?project_id=P]   最近的 run（含進度）
+  GET  /api/admin/regeocode/{run_id}         單一 run 進度
+  POST /api/admin/regeocode/{run_id}/cancel  取消（已 commit 的批保留）
+
+典型用法：匯入新的 cell_towers 對照表後，對 /coverage 仍有大量 cellid_only 的案件各排一個。
+"""
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+
+from app.security import require_admin
+from app.services import regeocode
+
+router = APIRouter(prefix="/admin/regeocode", tags=["regeocode"])
+
+
+@router.post("", status_code=202)
+def start_run(
+    request: Request,
+    project_id: str = Query(..., min_length=1),
+    user: dict = Depends(require_admin),
+):
+    return regeocode.enqueue(project_id, user, request=request)
+
+
+@router.get("")
+def list_runs(
+    project_id: Optional[str] = Query(default=None),
+    _user: dict = Depends(require_admin),
+):
+    return {"runs": regeocode.list_runs(project_id)}
+
+
+@router.get("/{run_id}")
+def get_run(run_id: str, _user: dict = Depends(require_admin)):
+    run = regeocode.get_run(run_id)
+    if run is None:
+        raise HTTPException(404, "找不到此回填工作")
+    return run
+
+
+@router.post("/{run_id}/cancel")
+def cancel_run(run_id: str, request: Request, user: dict = Depends(require_admin)):
+    if not regeocode.cancel(run_id, user, request=request):
+        raise HTTPException(409, "此回填工作不存在或已結束")
+    return {"cancelled": True, "run_id": run_id}
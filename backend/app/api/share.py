@@ -7,6 +7,7 @@
   GET    /api/projects/{project_id}/share-links   列出此專案的分享連結（owner / admin）
   DELETE /api/share-links/{token}                 撤銷分享連結（owner / admin）
   GET    /api/share/{token}                       公開：免登入取得專案地圖（純檢視）
+                                                  ?stream=ndjson|json 改為串流輸出（2026-10）
 
 安全模型（詳見 migration_share_links.sql 開頭）：
   - 「任何人持連結即可免登入檢視」；唯一防線是 token 不可猜測（192-bit 熵）。
@@ -16,11 +17,14 @@
 """
 import secrets
 from datetime import datetime, timedelta, timezone
+from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 
 from app.db.session import get_conn
 from app.security import get_current_user
+from app.services import geojson_stream, response_cache
 from app.services.audit import write_audit
 
 router = APIRouter(tags=["share"])
@@ -48,7 +52,12 @@ def _require_project_owner(project_id: str, user: dict) -> None:
         raise HTTPException(status_code=403, detail="需要此案件的 owner 或 admin 身份")
 
 
-def _fetch_map_geojson(project_id: str, limit: int = 50000) -> dict:
+# 分享頁的篩選條件（串流模式交給 services/geojson_stream，Feature 結構相同）
+_MAP_WHERE = "project_id = %s AND geom IS NOT NULL AND deleted_at IS NULL"
+_MAP_LIMIT = 50000
+
+
+def _fetch_map_geojson(project_id: str, limit: int = _MAP_LIMIT) -> dict:
     """
     取地圖 GeoJSON：與 /api/projects/{id}/map-layers 相同的篩選與排序規則
     —— 只回「已定位（geom IS NOT NULL）」且「未軟刪（deleted_at IS NULL）」的列，
@@ -61,7 +70,7 @@ def _fetch_map_geojson(project_id: str, limit: int = 50000) -> dict:
              sector_name, site_code, sector_id, azimuth, azimuth_ref,
              accuracy_m, geom
         FROM raw_traces
-       WHERE project_id = %s AND geom IS NOT NULL AND deleted_at IS NULL
+       WHERE {where}
        ORDER BY start_ts NULLS LAST, id
        LIMIT %s
     )
@@ -79,13 +88,21 @@ def _fetch_map_geojson(project_id: str, limit: int = 50000) -> dict:
               'accuracy_m',  accuracy_m))
       )), '[]'::jsonb)
     ) FROM rows
-    """
+    """.format(where=_MAP_WHERE)
     with get_conn() as conn, conn.cursor() as cur:
         cur.execute(sql, (project_id, limit), prepare=False)
         r = cur.fetchone()
     return r[0] if r and r[0] else {"type": "FeatureCollection", "features": []}
 
 
+def _mark_used(token: str) -> None:
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            "UPDATE share_links SET use_count = use_count + 1, last_used_at = now() WHERE token=%s",
+            (token,), prepare=False,
+        )
+
+
 # ---------- POST 建立分享連結 ----------
 @router.post("/projects/{project_id}/share-links")
 def create_share_link(
@@ -212,12 +229,26 @@ def revoke_share_link(
 
 # ---------- GET 公開檢視（免登入） ----------
 @router.get("/share/{token}")
-def view_shared_project(token: str, request: Request):
+def view_shared_project(
+    token: str,
+    request: Request,
+    stream: Optional[str] = Query(None, pattern="^(ndjson|json)$"),
+):
     """
     公開端點（無 auth dependency）：憑 token 取得該專案地圖 GeoJSON（純檢視）。
       - token 不存在            → 404
       - token 已撤銷 / 已過期    → 410 Gone
     每次成功檢視都會 use_count+1、更新 last_used_at，並寫一筆 audit。
+
+    stream=ndjson|json：回應本體直接是 FeatureCollection（或 ndjson Feature 行），
+    project_id / expires_at 與 total / returned / truncated 一起放在結尾摘要；
+    audit 於開始串流前寫入，feature_count 無法預知故改記 stream 格式。
+
+    條件式 GET（2026-10，services/response_cache）：ETag 依案件資料版本 + token；
+    If-None-Match 相符回 304。304 仍算一次檢視（use_count、audit 照記），只是不送本體。
+
+    串流名額滿（geojson_stream.GEOJSON_STREAM_MAX）→ 503 + Retry-After；名額在記檢視
+    之前就拿，503 不算一次檢視。
     """
     with get_conn() as conn, conn.cursor() as cur:
         cur.execute(
@@ -234,20 +265,49 @@ def view_shared_project(token: str, request: Request):
     if expires_at <= datetime.now(timezone.utc):
         raise HTTPException(status_code=410, detail="此分享連結已過期（連結有效期為 30 分鐘）")
 
-    geojson = _fetch_map_geojson(project_id)
+    if stream:
+        encoding = geojson_stream.negotiate_encoding(request.headers.get("accept-encoding"))
+        tag, early = response_cache.precheck(request, "share", project_id, token, encoding or "identity")
+        pieces = None
+        if early is None:
+            pieces = geojson_stream.stream_features(
+                _MAP_WHERE, [project_id], _MAP_LIMIT, stream,
+                extra={"project_id": project_id, "expires_at": expires_at.isoformat()},
+            )
+        _mark_used(token)
+        write_audit(
+            action="share_link.view", project_id=project_id,
+            target_type="share_link", target_ref=token, request=request,
+            details={"stream": stream, "cache": "not_modified"} if early is not None else {"stream": stream},
+        )
+        if early is not None:
+            return early
+        return StreamingResponse(
+            geojson_stream.encode(pieces, encoding),
+            media_type=geojson_stream.MEDIA_TYPES[stream],
+            headers={**geojson_stream.response_headers(encoding), **response_cache.headers(tag)},
+        )
 
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(
-            "UPDATE share_links SET use_count = use_count + 1, last_used_at = now() WHERE token=%s",
-            (token,), prepare=False,
+    tag, early = response_cache.precheck(request, "share", project_id, token)
+    if early is not None:
+        _mark_used(token)
+        write_audit(
+            action="share_link.view", project_id=project_id,
+            target_type="share_link", target_ref=token, request=request,
+            details={"cache": "not_modified" if early.status_code == 304 else "hit"},
         )
+        return early
+
+    geojson = _fetch_map_geojson(project_id)
+
+    _mark_used(token)
     write_audit(
         action="share_link.view", project_id=project_id,
         target_type="share_link", target_ref=token, request=request,
         details={"feature_count": len(geojson.get("features", []))},
     )
-    return {
+    return response_cache.finish(tag, {
         "project_id": project_id,
         "expires_at": expires_at.isoformat(),
         "geojson": geojson,
-    }
+    })
@@ -17,8 +17,9 @@ from pydantic import BaseModel, Field
 
 from app.db.session import get_conn
 from app.security import AUTH_ENABLED, assert_project_access, get_current_user, require_admin
+from app.services import data_version, response_cache
 from app.services.audit import write_audit
-from app.services.ingest import _insert_records, _parse_ts
+from app.services.ingest import _ensure_row_fp_column, _insert_records, _parse_ts
 
 router = APIRouter()
 
@@ -110,23 +111,52 @@ def restore_target(
     body: RestoreTargetIn,
     current_user: dict = Depends(get_current_user),
 ):
-    """還原軟刪的 target 紀錄；強制填還原理由。需系統管理員（admin）。"""
+    """還原軟刪的 target 紀錄；強制填還原理由。需系統管理員（admin）。
+
+    row_fp（重傳冪等，2026-10）：刪除後又重傳同一檔，未刪列已有相同 row_fp；
+    這些軟刪列還原會撞 uq_raw_traces_row_fp，故只還原「目前沒有同內容未刪列」者，
+    同 row_fp 的多份軟刪副本（刪→傳→刪）只還原最早一份。其餘保持軟刪，
+    以 kept_deleted 回報筆數（還原後仍為軟刪的列 = 內容已有未刪列的副本）。
+    """
     try:
+        _ensure_row_fp_column()
         with get_conn() as conn, conn.cursor() as cur:
             cur.execute(
                 """
-                UPDATE raw_traces
+                UPDATE raw_traces r
                    SET deleted_at = NULL,
                        deleted_by = NULL,
                        delete_reason = NULL
-                 WHERE project_id = %s
-                   AND target_id  = %s
-                   AND deleted_at IS NOT NULL
+                 WHERE r.project_id = %s
+                   AND r.target_id  = %s
+                   AND r.deleted_at IS NOT NULL
+                   AND (
+                        r.row_fp IS NULL
+                     OR (
+                        NOT EXISTS (
+                            SELECT 1 FROM raw_traces a
+                             WHERE a.project_id = r.project_id AND a.target_id = r.target_id
+                               AND a.row_fp = r.row_fp AND a.deleted_at IS NULL)
+                        AND r.id = (
+                            SELECT min(d.id) FROM raw_traces d
+                             WHERE d.project_id = r.project_id AND d.target_id = r.target_id
+                               AND d.row_fp = r.row_fp AND d.deleted_at IS NOT NULL)
+                     )
+                   )
                 """,
                 (project_id, target_id),
                 prepare=False,
             )
             restored = cur.rowcount
+            cur.execute(
+                """
+                SELECT count(*) FROM raw_traces
+                 WHERE project_id = %s AND target_id = %s AND deleted_at IS NOT NULL
+                """,
+                (project_id, target_id),
+                prepare=False,
+            )
+            kept_deleted = int(cur.fetchone()[0])
     except Exception as e:
         write_audit(
             action="restore_target_failed",
@@ -137,17 +167,18 @@ def restore_target(
         )
         raise HTTPException(status_code=500, detail=f"還原失敗：{type(e).__name__}: {e}")
 
-    if restored == 0:
+    if restored == 0 and kept_deleted == 0:
         raise HTTPException(status_code=404, detail="找不到已軟刪的紀錄可還原")
 
     write_audit(
         action="restore_target",
         user=current_user, request=request,
         target_type="target", target_ref=target_id, project_id=project_id,
-        details={"restored_rows": restored, "reason": body.reason},
+        details={"restored_rows": restored, "kept_deleted": kept_deleted, "reason": body.reason},
         status_code=200,
     )
-    return {"ok": True, "restored": restored, "project_id": project_id, "target_id": target_id}
+    return {"ok": True, "restored": restored, "kept_deleted": kept_deleted,
+            "project_id": project_id, "target_id": target_id}
 
 
 # ============================================================
@@ -241,6 +272,9 @@ def update_azimuth_ref(
         },
         status_code=200,
     )
+    # UPDATE 的 trigger 已遞增版本，但專案彙總還讀 audit 的最後標註人：
+    # audit 寫入後再 +1，夾在兩者之間被快取的回應不會再被命中
+    data_version.bump(project_id)
     return {
         "ok": True,
         "project_id": project_id,
@@ -255,6 +289,7 @@ def update_azimuth_ref(
 def get_azimuth_ref_summary(
     project_id: str,
     target_id: str,
+    request: Request,
     current_user: dict = Depends(get_current_user),
 ):
     """
@@ -266,9 +301,12 @@ def get_azimuth_ref_summary(
           "total": 100,
           "by_ref": { "magnetic": 80, "unknown": 20 }
         }
-    需 viewer 以上。
+    需 viewer 以上。帶強 ETag / 304 / 伺服端快取（services/response_cache，2026-10）。
     """
     assert_project_access(current_user, project_id, "viewer")
+    tag, early = response_cache.precheck(request, "azimuth-ref", project_id, target_id)
+    if early is not None:
+        return early
     sql = """
     SELECT azimuth_ref, COUNT(*)
       FROM raw_traces
@@ -284,12 +322,12 @@ def get_azimuth_ref_summary(
         for r in cur.fetchall():
             by_ref[r[0]] = int(r[1])
             total += int(r[1])
-    return {
+    return response_cache.finish(tag, {
         "project_id": project_id,
         "target_id": target_id,
         "total": total,
         "by_ref": by_ref,
-    }
+    })
 
 
 @router.get(
@@ -333,6 +371,7 @@ def list_deleted_traces(project_id: str, target_id: str):
 @router.get("/projects/{project_id}/azimuth-ref-summary")
 def get_project_azimuth_ref_summary(
     project_id: str,
+    request: Request,
     current_user: dict = Depends(get_current_user),
 ):
     """
@@ -360,9 +399,12 @@ def get_project_azimuth_ref_summary(
           ...
         ]
       }
-    需 viewer 以上。
+    需 viewer 以上。帶強 ETag / 304 / 伺服端快取，同單一 target 的彙總。
     """
     assert_project_access(current_user, project_id, "viewer")
+    tag, early = response_cache.precheck(request, "azimuth-ref-summary", project_id)
+    if early is not None:
+        return early
     ref_sql = """
     SELECT target_id, azimuth_ref, COUNT(*) AS cnt
       FROM raw_traces
@@ -411,11 +453,11 @@ def get_project_azimuth_ref_summary(
     all_total   = sum(t["total"] for t in items)
     all_unknown = sum(t["by_ref"].get("unknown", 0) for t in items)
 
-    return {
+    return response_cache.finish(tag, {
         "project_id": project_id,
         "project_unknown_pct": round(all_unknown / all_total * 100, 1) if all_total else 0.0,
         "targets": items,
-    }
+    })
 
 
 # ============================================================
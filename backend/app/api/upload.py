@@ -7,6 +7,12 @@ P0+P2 改動（2026-04-26）：
   - 上傳成功 → write_audit(action='upload', evidence_id=..., sha256_full=...)
   - 上傳失敗 → write_audit(action='upload_failed', ...)
   - audit_logs 內含 evidence_id，可雙向 join：證物 ↔ 操作紀錄
+
+背景匯入（2026-10）：
+  - async_job=1 → register_evidence 之後只排入 ingest_jobs、立即回 202 + job_id，
+    不在 request 內 parse / geocode / insert（避開 Render 120s 上限的 502）
+  - GET /api/upload/jobs/{job_id} 輪詢進度（已讀 / 已定位 / 已寫入筆數 + ETA）
+  - 成功 / 失敗的 evidence 統計與 audit 改由 worker 在 job 結束時寫（services.ingest_jobs）
 """
 import traceback
 
@@ -19,13 +25,14 @@ from app.security import (
     project_has_members,
     AUTH_ENABLED,
 )
+from app.services import crypto_box, ingest_jobs
 from app.services.audit import write_audit
 from app.services.evidence import register_evidence, update_evidence_stats
 import json as _json
 import time as _time
 from fastapi.responses import JSONResponse
 from app.services.ingest import (
-    ingest_auto, ingest_pdf, parse_file_only,
+    ingest_auto, parse_file_geojson,
     ParseDiagnosisError, EncryptedFileError,
 )
 
@@ -44,6 +51,7 @@ async def upload_file(
     project_id: str = Form(...),
     target_id: str = Form(""),
     file: UploadFile = File(...),
+    async_job: bool = Form(False),
     current_user: dict = Depends(get_current_user),
 ):
     filename = file.filename or ""
@@ -105,12 +113,33 @@ async def upload_file(
         )
         raise HTTPException(status_code=500, detail=f"證物指紋封存失敗：{type(e).__name__}: {e}")
 
+    # ---- (B') 背景匯入：排入 job 即回 202 ----
+    # 金鑰缺失（PreviewKeyError，fail-closed 不存明文）→ 退回下面的同步路徑，不讓上傳失敗
+    if async_job:
+        try:
+            job = ingest_jobs.enqueue(
+                project_id=project_id, target_id=target_id,
+                filename=filename, ext=ext, content=content,
+                evidence=evidence, mime_hint=mime, user=current_user,
+            )
+            return JSONResponse(status_code=202, content={
+                "ok": True,
+                "filename": filename,
+                "project_id": project_id,
+                "target_id": target_id,
+                "evidence_id":  evidence["id"],
+                "sha256_full":  evidence["sha256_full"],
+                "prior_uploads": evidence["prior_uploads"],
+                **job,
+            })
+        except crypto_box.PreviewKeyError as e:
+            print(f"[upload] 背景匯入不可用，改同步匯入：{e}")
+
     # ---- (B) 解析 + 入庫 ----
     try:
-        if ext == "pdf":
-            result = ingest_pdf(project_id, target_id, content)
-        else:
-            result = ingest_auto(project_id, target_id, filename, content)
+        # 同 sha256 上傳過 → 多半是重傳：先查 row_fp 丟掉已落地的列，重跑近乎 no-op
+        result = ingest_auto(project_id, target_id, filename, content,
+                             skip_existing=evidence["prior_uploads"] > 0)
 
         # 回填 evidence 統計
         update_evidence_stats(
@@ -202,6 +231,24 @@ async def upload_file(
         raise HTTPException(status_code=400, detail=f"匯入失敗：{type(e).__name__}: {e}")
 
 
+# ---------- 背景匯入進度 ----------
+@router.get("/jobs/{job_id}")
+def get_upload_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user),
+):
+    """背景匯入 job 進度：status（queued/running/done/failed）、各階段筆數、ETA。
+
+    status=done 時 result 與同步 POST /api/upload 的成功回應同形。
+    權限：需對該 job 的 project 具 viewer 以上（job_id 本身不當授權憑證）。
+    """
+    job = ingest_jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="找不到此匯入工作")
+    assert_project_access(current_user, job["project_id"], "viewer")
+    return job
+
+
 # ---------- 臨時解析端點（不寫 DB，回傳 GeoJSON）----------
 @router.post("/parse-temp")
 async def parse_temp(
@@ -241,8 +288,8 @@ async def parse_temp(
 
     try:
         _t1 = _time.perf_counter()
-        records = parse_file_only(target_id, filename, content, mapping=user_mapping)
-        print(f"[parse-temp][timing] parse_total={(_time.perf_counter()-_t1)*1000:.0f}ms records={len(records)} file={filename}")
+        geo = parse_file_geojson(target_id, filename, content, mapping=user_mapping)
+        print(f"[parse-temp][timing] parse_total={(_time.perf_counter()-_t1)*1000:.0f}ms records={geo['total']} file={filename}")
     except EncryptedFileError as e:
         raise HTTPException(status_code=422, detail=str(e))
     except ParseDiagnosisError as e:
@@ -262,36 +309,5 @@ async def parse_temp(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"解析失敗：{type(e).__name__}: {e}")
 
-    features = []
-    skipped = 0
-    for r in records:
-        if r.get("lat") is None or r.get("lng") is None:
-            skipped += 1
-            continue
-        features.append({
-            "type": "Feature",
-            "geometry": {"type": "Point", "coordinates": [r["lng"], r["lat"]]},
-            "properties": {
-                "target_id":   r["target_id"],
-                "cell_addr":   r.get("cell_addr"),
-                "start_ts":    r.get("start_ts"),
-                "end_ts":      r.get("end_ts"),
-                "cell_id":     r.get("cell_id"),
-                "accuracy_m":  r.get("accuracy_m"),
-                "azimuth":     r.get("azimuth"),
-                "azimuth_ref": r.get("azimuth_ref", "unknown"),
-                "sector_id":   r.get("sector_id"),
-                "sector_name": r.get("sector_name"),
-                "site_code":   r.get("site_code"),
-            },
-        })
-
-    return {
-        "type": "FeatureCollection",
-        "features": features,
-        "total":   len(records),
-        "plotted": len(features),
-        "skipped": skipped,
-        "_source":  "parse-temp",
-        "_records": records,  # 完整記錄供「儲存為專案」時使用（含無座標列）
-    }
+    # features 在解析時逐塊組好；_records = 完整記錄供「儲存為專案」時使用（含無座標列）
+    return {**geo, "_source": "parse-temp"}
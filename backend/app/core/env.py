@@ -0,0 +1,37 @@
+# backend/app/core/env.py
+"""
+env 數值設定的共用解析（2026-10）。
+
+原本定義在 services/ingest_jobs.py（_env_int），之後的 regeocode / geocode_bundle /
+response_cache / api.map / main 都從那裡 import 私有名稱，只為了讀一個整數 env。
+搬到 core，慣例不變：未設、空字串、非法、超出 [lo, hi] 一律 fallback default
+（不 raise：設錯 env 不該讓服務起不來，同 ingest._ingest_chunk_size）。
+env_float 是同慣例的浮點版（geocode_client 的 QPS）；nan / inf 落在範圍外，同樣 fallback。
+"""
+from __future__ import annotations
+
+import os
+
+
+def env_int(name: str, default: int, lo: int, hi: int) -> int:
+    """env 整數；非法 / 超出 [lo, hi] fallback default。"""
+    raw = os.getenv(name)
+    if raw is None or not str(raw).strip():
+        return default
+    try:
+        n = int(str(raw).strip())
+    except (TypeError, ValueError):
+        return default
+    return n if lo <= n <= hi else default
+
+
+def env_float(name: str, default: float, lo: float, hi: float) -> float:
+    """env 浮點數；非法 / 超出 [lo, hi] fallback default。"""
+    raw = os.getenv(name)
+    if raw is None or not str(raw).strip():
+        return default
+    try:
+        n = float(str(raw).strip())
+    except (TypeError, ValueError):
+        return default
+    return n if lo <= n <= hi else default
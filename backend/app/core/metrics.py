@@ -0,0 +1,235 @@
+# backend/app/core/metrics.py
+"""
+行程內 metrics registry（2026-10）。
+
+為什麼：lookup_bulk / ingest 管線的耗時原本只散在一行行 print 與 log 事件裡，要回答
+「這次上傳慢在哪一層（本地對照 / Redis / SQL 快取 / Google / OSM）」得去翻 log 自己加總。
+這裡提供最小的 counter / histogram / gauge，累計在本 process 記憶體，由
+GET /api/metrics 以 Prometheus text exposition format（0.0.4）輸出，可直接給
+Prometheus / Grafana Agent 抓。
+
+設計：
+  - 不引入 prometheus_client：需要的只有三種型別與文字輸出，自己寫約百行，也不必
+    處理它的 multiprocess 模式。多個 worker process 各自累計，由抓取端加總。
+  - 同名重複註冊回傳同一物件（模組 reload / 測試重複 import 不會炸）。
+  - label 值一律轉字串；名稱固定加 celltrail_ 前綴。
+  - gauge 用 callback：抓取當下才算（佇列深度要查 DB、命中率由 counter 推得），
+    callback 例外只略過該 gauge，不讓整個 /metrics 失敗。
+  - 全部操作持鎖，單次 observe 只是幾個整數加法，熱路徑成本可忽略。
+"""
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+
+_PREFIX = "celltrail_"
+
+# 秒：涵蓋 LRU / 索引（<1ms）到整批 Google（數十秒）
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+LabelKey = Tuple[str, ...]
+GaugeValue = Union[float, int, None, Mapping[LabelKey, float]]
+
+_lock = threading.Lock()
+_registry: Dict[str, "_Metric"] = {}
+
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    if isinstance(v, int) or float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Mapping[str, object]) -> LabelKey:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: labels 應為 {self.labelnames}，收到 {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> List[str]:  # pragma: no cover - 子類實作
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        pass
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, doc, labelnames=()):
+        super().__init__(name, doc, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, n: float = 1, **labels) -> None:
+        if not n:
+            return
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + n
+
+    def value(self, **labels) -> float:
+        with _lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with _lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+    def clear(self) -> None:
+        with _lock:
+            self._values.clear()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key → [各 bucket 非累積計數…, +Inf 計數, sum]
+        self._values: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[i] += 1
+            row[-1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def count(self, **labels) -> int:
+        with _lock:
+            row = self._values.get(self._key(labels))
+            return int(sum(row[:-1])) if row else 0
+
+    def samples(self) -> List[str]:
+        with _lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        out: List[str] = []
+        for key, row in items:
+            acc = 0
+            for le, n in zip(self.buckets + (math.inf,), row[:-1]):
+                acc += n
+                le_label = 'le="' + _fmt(le) + '"'
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, key, le_label)} {int(acc)}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(row[-1])}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {int(acc)}")
+        return out
+
+    def clear(self) -> None:
+        with _lock:
+            self._values.clear()
+
+
+class Gauge(_Metric):
+    """抓取當下呼叫 fn；回傳單一數值，或 {label 值 tuple: 數值}；None 表示略過。"""
+
+    kind = "gauge"
+
+    def __init__(self, name, doc, fn: Callable[[], GaugeValue], labelnames=()):
+        super().__init__(name, doc, labelnames)
+        self.fn = fn
+
+    def samples(self) -> List[str]:
+        try:
+            v = self.fn()
+        except Exception as e:
+            print(f"[metrics] gauge {self.name} skipped: {type(e).__name__}: {e}")
+            return []
+        if v is None:
+            return []
+        if isinstance(v, Mapping):
+            return [f"{self.name}{_labels(self.labelnames, k)} {_fmt(x)}"
+                    for k, x in sorted(v.items()) if x is not None]
+        return [f"{self.name} {_fmt(v)}"]
+
+
+def _register(cls, name: str, *args, **kwargs):
+    full = name if name.startswith(_PREFIX) else _PREFIX + name
+    with _lock:
+        m = _registry.get(full)
+        if m is None:
+            m = _registry[full] = cls(full, *args, **kwargs)
+    if not isinstance(m, cls):
+        raise ValueError(f"metric {full} 已註冊為 {m.kind}")
+    return m
+
+
+def counter(name: str, doc: str, labelnames: Sequence[str] = ()) -> Counter:
+    return _register(Counter, name, doc, labelnames)
+
+
+def histogram(name: str, doc: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram, name, doc, labelnames, buckets)
+
+
+def gauge(name: str, doc: str, fn: Callable[[], GaugeValue], labelnames: Sequence[str] = ()) -> Gauge:
+    return _register(Gauge, name, doc, fn, labelnames)
+
+
+def render() -> str:
+    """全部 metrics 的 Prometheus text exposition（依名稱排序）。"""
+    with _lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+    lines: List[str] = []
+    for m in metrics:
+        samples = m.samples()
+        if samples:
+            lines.extend(m.header())
+            lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+def get(name: str) -> Optional[_Metric]:
+    full = name if name.startswith(_PREFIX) else _PREFIX + name
+    with _lock:
+        return _registry.get(full)
+
+
+def reset() -> None:
+    """清空所有 counter / histogram 的累計值（測試用；註冊與 gauge 保留）。"""
+    with _lock:
+        metrics = list(_registry.values())
+    for m in metrics:
+        m.clear()
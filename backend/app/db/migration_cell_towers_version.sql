@@ -0,0 +1,17 @@
+-- migration_cell_towers_version.sql（2026-10）
+-- cell_towers 版本戳：單列（id=1）version，對照表每次匯入 / 清空 +1。
+--
+-- 背景：geocode 改查行程內常駐索引（services/tower_index.py），不再每塊 / 每列打
+-- `SELECT … FROM cell_towers`。各 process 以本表的 version 判斷自己的快照是否過期：
+-- 每 CELL_TOWER_INDEX_CHECK_SEC 秒（預設 30）最多比對一次，不同才整表重載。
+-- POST /api/admin/cell-towers/import、DELETE /api/admin/cell-towers 在寫入同一交易內 bump。
+--
+-- 冪等：CREATE TABLE IF NOT EXISTS / ON CONFLICT DO NOTHING 重跑安全。
+-- 注意：tower_index._ensure_version_table() 執行期也會自動建立；本檔供審計之用。
+
+CREATE TABLE IF NOT EXISTS cell_towers_version (
+    id          INT         PRIMARY KEY,
+    version     BIGINT      NOT NULL DEFAULT 0,
+    updated_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+INSERT INTO cell_towers_version (id) VALUES (1) ON CONFLICT DO NOTHING;
@@ -0,0 +1,18 @@
+-- migration_geocode_cache_addr_norm.sql（2026-10）
+-- geocode_cache 加正規化 key（addr_norm）與索引，讓同一門牌的不同寫法共用一筆快取。
+--
+-- 背景：舊版 _simplify_addr 只去括號、號後文字與空白，「８０７高雄市…１號」「臺中市」
+-- 「三段 / 3段」「3之2號 / 3-2號」「文福里建國路 / 建國路」各自是一把 key、各打一次
+-- Google。geocode.normalize_addr 把這些收斂成同一字串（規則見 geocode.py「地址清洗」）。
+--
+-- 新寫入的列 addr = addr_norm = 正規化 key；讀取同時比對 addr 與 addr_norm，
+-- 舊 key 寫入的列補上 addr_norm 後即可被新 key 命中，不必重打 Google。
+-- 正規化只在 Python 端做得到，舊列的 addr_norm 由 geocode._backfill_addr_norm()
+-- 分批補齊（冪等）：行程第一次用快取時在背景 thread 跑，補齊前讀取仍以 addr 命中；
+-- 表大時可在部署後先前景跑 `python scripts/geocode_bundle.py backfill-norm`。
+--
+-- 冪等：ADD COLUMN IF NOT EXISTS / CREATE INDEX IF NOT EXISTS 重跑安全。
+-- 注意：geocode.py 的 _ensure_sql_cache() 執行期也會補欄位與索引；本檔供審計之用。
+
+ALTER TABLE geocode_cache ADD COLUMN IF NOT EXISTS addr_norm TEXT NULL;
+CREATE INDEX IF NOT EXISTS idx_geocode_cache_addr_norm ON geocode_cache (addr_norm);
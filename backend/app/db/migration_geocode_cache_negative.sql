@@ -0,0 +1,17 @@
+-- migration_geocode_cache_negative.sql（2026-10）
+-- geocode_cache 加負快取：Google / OSM 都明確查無（ZERO_RESULTS、OSM 空陣列）的地址
+-- 記一筆 status='neg'（lat/lng 為 NULL），GEO_NEG_TTL_SEC（預設 7 天）內不再重打。
+--
+-- 背景：同一批寫錯 / 太籠統的地址在每次重傳都會再打一輪 Google + OSM（OSM 還有
+-- 1 req/s 節流），是大檔重傳時最大的固定開銷。逾時、OVER_QUERY_LIMIT、429 等
+-- 暫時性失敗不記負快取，配額恢復後仍會重查。
+--
+-- 讀取：status='ok' 永遠有效；status='neg' 只在 created_at > now() - TTL 時有效。
+-- 寫入：成功值可覆蓋負快取；負快取不覆蓋成功值（ON CONFLICT ... WHERE status='neg'）。
+--
+-- 冪等：ADD COLUMN IF NOT EXISTS / DROP NOT NULL 重跑安全。
+-- 注意：geocode.py 的 _ensure_sql_cache() 執行期也會補這些欄位；本檔供審計之用。
+
+ALTER TABLE geocode_cache ADD COLUMN IF NOT EXISTS status TEXT NOT NULL DEFAULT 'ok';
+ALTER TABLE geocode_cache ALTER COLUMN lat DROP NOT NULL;
+ALTER TABLE geocode_cache ALTER COLUMN lng DROP NOT NULL;
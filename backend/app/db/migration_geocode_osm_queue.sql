@@ -0,0 +1,47 @@
+-- migration_geocode_osm_queue.sql（2026-10）
+-- 背景 OSM 補座標佇列：lookup_bulk 不再於 request 內序列打 Nominatim（每址最多兩次 ×
+-- 1 秒 sleep，500 址的尾巴就卡十幾分鐘），改把 Google 未命中的地址排入本表、列先以無座標
+-- 落地；由全域唯一的 worker（geocode_osm_lease 租約）以 1 req/s 查完後回填 raw_traces。
+--
+-- 設計：
+--   - addr 為清洗後地址（_simplify_addr）；raw_addrs 收集原始 cell_addr，回填時以
+--     cell_addr = ANY(raw_addrs) 找列，且只動 geom IS NULL（不覆蓋人工定位）。
+--   - status：pending → running → done（查到）/ none（OSM 查無）/ failed（暫時性失敗
+--     重試 3 次仍敗）；running 超過 120 秒未收尾視為 worker 已死，可重新認領。
+--   - neg_ok：排入時 Google 是否「明確查無」；OSM 也查無且 neg_ok 才記負快取。
+--   - /coverage 的 geocode_pending 桶 = pending / running 的 raw_addrs 所涵蓋的未定位列。
+--
+-- 冪等：CREATE TABLE / INDEX IF NOT EXISTS、ON CONFLICT DO NOTHING，重跑安全。
+-- 注意：osm_queue.py 的 _ensure_queue_table() 會自動建立兩張佇列表；raw_traces 上的
+-- 部分索引只在本檔建立（CREATE INDEX 會短暫擋寫入，不適合在執行期自動跑）。
+
+CREATE TABLE IF NOT EXISTS geocode_osm_queue (
+  addr         TEXT        PRIMARY KEY,
+  raw_addrs    TEXT[]      NOT NULL DEFAULT '{}',
+  neg_ok       BOOLEAN     NOT NULL DEFAULT TRUE,
+  status       TEXT        NOT NULL DEFAULT 'pending',   -- pending|running|done|none|failed
+  attempts     INT         NOT NULL DEFAULT 0,
+  not_before   TIMESTAMPTZ NOT NULL DEFAULT now(),       -- 暫時性失敗的延後重試時間
+  lat          DOUBLE PRECISION NULL,
+  lng          DOUBLE PRECISION NULL,
+  rows_filled  INT         NOT NULL DEFAULT 0,           -- 回填了幾列 raw_traces
+  worker_id    TEXT        NULL,
+  created_at   TIMESTAMPTZ NOT NULL DEFAULT now(),
+  claimed_at   TIMESTAMPTZ NULL,
+  finished_at  TIMESTAMPTZ NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_geocode_osm_queue_pending
+  ON geocode_osm_queue (not_before) WHERE status IN ('pending', 'running');
+
+-- 單列租約：同一時間只有 holder 這個 worker 會打 Nominatim（跨 process / instance）
+CREATE TABLE IF NOT EXISTS geocode_osm_lease (
+  id          INT         PRIMARY KEY,
+  holder      TEXT        NULL,
+  expires_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+INSERT INTO geocode_osm_lease (id) VALUES (1) ON CONFLICT DO NOTHING;
+
+-- 回填與 geocode_pending 計數都只看「未定位且在線」的列；部分索引只收這些列，很小
+CREATE INDEX IF NOT EXISTS idx_raw_traces_unlocated_addr
+  ON raw_traces (cell_addr) WHERE geom IS NULL AND deleted_at IS NULL;
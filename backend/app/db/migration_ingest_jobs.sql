@@ -0,0 +1,53 @@
+-- migration_ingest_jobs.sql（2026-10）
+-- 背景匯入 job 表：POST /api/upload（async_job=1）在 register_evidence 之後只排入 job、
+-- 立即回 job_id，由 in-process worker pool 跑 ingest_auto；前端輪詢
+-- GET /api/upload/jobs/{job_id} 取進度。解 Render 120s 請求上限下大檔上傳的 502。
+--
+-- 設計：
+--   - Postgres 即佇列：worker 以 FOR UPDATE SKIP LOCKED 認領，多 worker / 多 instance 安全。
+--   - raw_enc = crypto_box AES-256-GCM(gzip(raw))（同 preview_artifacts）；job 結束即清空。
+--   - 續跑：每塊 commit 後回寫 rows_committed（原始列序號）/ rows_inserted；worker 掛掉後
+--     heartbeat_at 過期（INGEST_JOB_STALE_SEC）的 running job 會被重新認領，從該列之後續寫。
+--   - attempts 超過上限（3）→ failed，不無限重試。
+--
+-- 冪等：CREATE TABLE / INDEX IF NOT EXISTS，重跑安全。
+-- 注意：ingest_jobs.py 的 _ensure_jobs_table() 也會自動建立此表，故新環境忘了套
+-- 也不會壞；本檔供「明確、可審計建立」之用。
+
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+  id                BIGSERIAL   PRIMARY KEY,
+  job_id            TEXT UNIQUE NOT NULL,             -- external token（secrets.token_urlsafe(18)）
+  project_id        TEXT        NOT NULL,
+  target_id         TEXT        NOT NULL,
+  filename          TEXT        NOT NULL,
+  ext               TEXT        NULL,
+  evidence_id       BIGINT      NULL,
+  sha256_full       TEXT        NULL,
+  prior_uploads     INT         NOT NULL DEFAULT 0,
+  size_bytes        BIGINT      NOT NULL,
+  mime_hint         TEXT        NULL,
+  raw_enc           BYTEA       NULL,                 -- AES-256-GCM(gzip(raw))；結束後 NULL
+  status            TEXT        NOT NULL DEFAULT 'queued',   -- queued|running|done|failed
+  rows_estimate     INT         NULL,                 -- 排入時粗估總列數（ETA 用；PDF 為 NULL）
+  rows_parsed       INT         NOT NULL DEFAULT 0,
+  rows_geocoded     INT         NOT NULL DEFAULT 0,
+  rows_inserted     INT         NOT NULL DEFAULT 0,
+  rows_skipped      INT         NOT NULL DEFAULT 0,
+  rows_committed    INT         NOT NULL DEFAULT 0,   -- 已 commit 到第幾列（原始列序號，續跑用）
+  resume_from       INT         NOT NULL DEFAULT 0,   -- 本次 attempt 起跑時的 rows_committed
+  attempts          INT         NOT NULL DEFAULT 0,
+  worker_id         TEXT        NULL,
+  result            JSONB       NULL,                 -- 與同步 /upload 回應同形
+  error_text        TEXT        NULL,
+  created_by        BIGINT      NULL REFERENCES users(id) ON DELETE SET NULL,
+  created_by_name   TEXT        NULL,
+  created_by_role   TEXT        NULL,
+  created_at        TIMESTAMPTZ NOT NULL DEFAULT now(),
+  started_at        TIMESTAMPTZ NULL,                 -- 本次 attempt 起跑時間
+  heartbeat_at      TIMESTAMPTZ NULL,
+  finished_at       TIMESTAMPTZ NULL
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ingest_jobs_jid     ON ingest_jobs (job_id);
+CREATE INDEX        IF NOT EXISTS idx_ingest_jobs_pending ON ingest_jobs (id) WHERE status IN ('queued', 'running');
+CREATE INDEX        IF NOT EXISTS idx_ingest_jobs_project ON ingest_jobs (project_id, created_at DESC);
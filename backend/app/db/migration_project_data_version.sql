@@ -0,0 +1,77 @@
+-- migration_project_data_version.sql（2026-10）
+-- 每案資料版本（services/data_version.py）：map-layers / coverage / azimuth-ref 彙總 / 分享頁
+-- 以此發強 ETag、If-None-Match → 304，並作為伺服端回應快取 key 的一部分
+-- （services/response_cache.py）。
+--
+-- 遞增：raw_traces 上三個 statement-level trigger（INSERT / UPDATE / DELETE，轉移表），
+-- 每個語句把受影響的 project_id 去重後各 +1，與寫入同一交易。匯入、軟刪 / 還原、手動定位、
+-- azimuth_ref 更新、OSM / regeocode 回填都涵蓋。另由程式遞增的兩處：OSM 佇列排入 / 查無收尾
+-- （geocode_pending 變動）、azimuth_ref 更新的 audit 寫入後。
+-- 沒有版本列視同版本 0，不需回填、不需鎖表。
+--
+-- 冪等：CREATE IF NOT EXISTS / CREATE OR REPLACE / 檢查 pg_trigger。
+-- 注意：data_version._ensure_version() 第一次使用時也會做同樣的事，故忘了套不會壞。
+-- 函式本體由 data_version._FUNCTION_SQL 產生，兩邊需保持一致。
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS project_data_version (
+  project_id  TEXT        PRIMARY KEY,
+  version     BIGINT      NOT NULL DEFAULT 1,
+  updated_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION project_data_version_bump() RETURNS trigger
+LANGUAGE plpgsql AS $fn$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO project_data_version AS v (project_id)
+    SELECT DISTINCT project_id FROM (SELECT project_id FROM new_rows) s
+     WHERE project_id IS NOT NULL
+     ORDER BY project_id
+    ON CONFLICT (project_id) DO UPDATE
+       SET version = v.version + 1, updated_at = now();
+  ELSIF TG_OP = 'DELETE' THEN
+    INSERT INTO project_data_version AS v (project_id)
+    SELECT DISTINCT project_id FROM (SELECT project_id FROM old_rows) s
+     WHERE project_id IS NOT NULL
+     ORDER BY project_id
+    ON CONFLICT (project_id) DO UPDATE
+       SET version = v.version + 1, updated_at = now();
+  ELSE
+    INSERT INTO project_data_version AS v (project_id)
+    SELECT DISTINCT project_id FROM (SELECT project_id FROM new_rows UNION SELECT project_id FROM old_rows) s
+     WHERE project_id IS NOT NULL
+     ORDER BY project_id
+    ON CONFLICT (project_id) DO UPDATE
+       SET version = v.version + 1, updated_at = now();
+  END IF;
+  RETURN NULL;
+END
+$fn$;
+
+DO $do$ BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_trigger
+                  WHERE tgname = 'trg_project_data_version_ins' AND tgrelid = 'raw_traces'::regclass) THEN
+    CREATE TRIGGER trg_project_data_version_ins AFTER INSERT ON raw_traces REFERENCING NEW TABLE AS new_rows
+      FOR EACH STATEMENT EXECUTE FUNCTION project_data_version_bump();
+  END IF;
+END $do$;
+
+DO $do$ BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_trigger
+                  WHERE tgname = 'trg_project_data_version_upd' AND tgrelid = 'raw_traces'::regclass) THEN
+    CREATE TRIGGER trg_project_data_version_upd AFTER UPDATE ON raw_traces REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+      FOR EACH STATEMENT EXECUTE FUNCTION project_data_version_bump();
+  END IF;
+END $do$;
+
+DO $do$ BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_trigger
+                  WHERE tgname = 'trg_project_data_version_del' AND tgrelid = 'raw_traces'::regclass) THEN
+    CREATE TRIGGER trg_project_data_version_del AFTER DELETE ON raw_traces REFERENCING OLD TABLE AS old_rows
+      FOR EACH STATEMENT EXECUTE FUNCTION project_data_version_bump();
+  END IF;
+END $do$;
+
+COMMIT;
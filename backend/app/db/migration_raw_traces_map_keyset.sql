@@ -0,0 +1,15 @@
+-- migration_raw_traces_map_keyset.sql（2026-10）
+-- map-layers 時間窗 / keyset 分頁用的索引（見 api/map.py project_map_layers）。
+--
+-- map-layers 一律帶 project_id（常帶 target_id）、只取未軟刪且已定位的列，依
+-- (start_ts NULLS LAST, id) 排序；時間軸拖動帶 from_ts / to_ts，下一頁帶
+-- after=(start_ts, id)。此 partial index 讓「project + target + 時間窗 + 游標」成為
+-- 單一索引範圍掃描，LIMIT 讀到即停，不必排序整個案件。
+-- btree 預設 ASC NULLS LAST，與查詢排序一致（start_ts 為 NULL 的列落在最後）。
+-- 未帶 target_id 時（跨 target）仍可用前綴 project_id 篩選，但需另行排序。
+--
+-- 冪等：IF NOT EXISTS，重跑安全。CONCURRENTLY 不可包在 transaction 內。
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_raw_traces_map_keyset
+    ON raw_traces (project_id, target_id, start_ts, id)
+    WHERE deleted_at IS NULL AND geom IS NOT NULL;
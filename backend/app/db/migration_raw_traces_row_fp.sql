@@ -0,0 +1,18 @@
+-- migration_raw_traces_row_fp.sql（2026-10）
+-- raw_traces 每列內容 fingerprint：讓同一檔重傳（部分匯入後重試、逾時後重傳、
+-- 背景 job 續跑）變成冪等 —— 已落地的列 INSERT ... ON CONFLICT DO NOTHING 略過，
+-- 不必再「開新案件重傳整檔」、也不會重複資料。
+--
+-- row_fp = blake2b-128(證據欄位 canonical 字串 [+ 同內容第幾次出現的序數])，
+-- 見 ingest._RowFingerprinter；檔內真重複列序數不同，仍各自落地。
+-- partial index 只約束未軟刪列：刪除 target 後重傳會正常重新落地。
+-- 舊資料與 save-records 路徑 row_fp 為 NULL，不參與去重。
+--
+-- 冪等：IF NOT EXISTS，重跑安全。大表請在離峰以 CONCURRENTLY 建索引（不可包在 transaction）。
+-- 注意：ingest._ensure_row_fp_column() 也會在第一次寫入時自動補上，故忘了套不會壞。
+
+ALTER TABLE raw_traces ADD COLUMN IF NOT EXISTS row_fp BYTEA NULL;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_raw_traces_row_fp
+    ON raw_traces (project_id, target_id, row_fp)
+    WHERE row_fp IS NOT NULL AND deleted_at IS NULL;
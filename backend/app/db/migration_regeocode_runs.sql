@@ -0,0 +1,49 @@
+-- migration_regeocode_runs.sql（2026-10）
+-- 未定位 raw_traces 重新 geocode 回填（services/regeocode.py、POST /api/admin/regeocode）。
+--
+-- 背景：匯入新的 cell_towers 對照表後，/coverage 的 cellid_only 桶理論上救得回來，但過去
+-- 只有一次性 script。regeocode_runs 一列 = 一個案件的回填 run：keyset 分批（id > last_id）
+-- 找 geom IS NULL 的列 → 批內去重丟 lookup_bulk → UPDATE … FROM (VALUES …) 回填；
+-- 回填與 last_id checkpoint 同一 transaction，中斷後從 last_id 精確續跑。
+--
+-- 設計：
+--   - status：queued → running → done / failed / cancelled；heartbeat 超過
+--     REGEOCODE_STALE_SEC（預設 300）的 running 視為 worker 已死、可重新認領。
+--   - uq_regeocode_runs_active：同一案件同時只有一個進行中的 run。
+--   - idx_raw_traces_unlocated_pid：分批掃描用的部分索引（只含未定位、未軟刪的列，
+--     案件大半已定位時索引很小）。
+--
+-- 冪等：CREATE TABLE / INDEX IF NOT EXISTS，重跑安全。
+-- 注意：regeocode._ensure_runs_table() 會自動建立 regeocode_runs；raw_traces 上的
+-- 部分索引只在本檔建立（CREATE INDEX 會短暫擋寫入，大表請改用 CONCURRENTLY 手動套）。
+
+CREATE TABLE IF NOT EXISTS regeocode_runs (
+  id               BIGSERIAL   PRIMARY KEY,
+  run_id           TEXT UNIQUE NOT NULL,
+  project_id       TEXT        NOT NULL,
+  status           TEXT        NOT NULL DEFAULT 'queued',   -- queued|running|done|failed|cancelled
+  rows_estimate    BIGINT      NULL,
+  last_id          BIGINT      NOT NULL DEFAULT 0,
+  rows_scanned     BIGINT      NOT NULL DEFAULT 0,
+  rows_located     BIGINT      NOT NULL DEFAULT 0,
+  keys_resolved    BIGINT      NOT NULL DEFAULT 0,
+  keys_unresolved  BIGINT      NOT NULL DEFAULT 0,
+  batches          INT         NOT NULL DEFAULT 0,
+  attempts         INT         NOT NULL DEFAULT 0,
+  worker_id        TEXT        NULL,
+  error_text       TEXT        NULL,
+  created_by       BIGINT      NULL REFERENCES users(id) ON DELETE SET NULL,
+  created_by_name  TEXT        NULL,
+  created_by_role  TEXT        NULL,
+  created_at       TIMESTAMPTZ NOT NULL DEFAULT now(),
+  started_at       TIMESTAMPTZ NULL,
+  heartbeat_at     TIMESTAMPTZ NULL,
+  finished_at      TIMESTAMPTZ NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_regeocode_runs_active
+    ON regeocode_runs (project_id) WHERE status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS idx_regeocode_runs_project
+    ON regeocode_runs (project_id, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_raw_traces_unlocated_pid
+    ON raw_traces (project_id, id) WHERE geom IS NULL AND deleted_at IS NULL;
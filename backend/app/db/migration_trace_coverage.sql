@@ -0,0 +1,143 @@
+-- migration_trace_coverage.sql（2026-10）
+-- 每 (project_id, target_id) 的定位涵蓋率彙總表（services/coverage.py、GET /projects/{id}/coverage）。
+--
+-- 背景：/coverage 每次開地圖、每張上傳回執都對 raw_traces 全案掃描做 6 個 FILTER 計數。
+-- 改由 raw_traces 上的 statement-level trigger（INSERT / UPDATE / DELETE，轉移表）在寫入
+-- 同一交易內把增量記進 trace_coverage，端點只加總該案的幾列。
+--
+-- 分類（與 api/map.py _reason_sql_case 同義；geocode_pending 依 OSM 佇列即時細分，不記帳）：
+--   total / with_geom / no_signal / cellid_only / addr_unlocated（有地址但未定位）
+-- 只計未軟刪（deleted_at IS NULL）的列；UPDATE 記 -舊 +新，軟刪 / 還原自然反映。
+-- drift_at：校驗（coverage.verify，排程 COVERAGE_VERIFY_HOURS）發現不一致並修正的時間。
+--
+-- 套用：整檔一個交易；LOCK 擋住 raw_traces 寫入直到回填完成（讀取不受影響），
+-- trigger 上線前後不會有漏記的列。大表請在離峰套用。
+-- 冪等：CREATE IF NOT EXISTS / CREATE OR REPLACE / 檢查 pg_trigger；回填 ON CONFLICT DO NOTHING。
+-- 注意：coverage._ensure_coverage() 第一次使用時也會做同樣的事，故忘了套不會壞。
+-- 函式本體由 coverage._FUNCTION_SQL 產生，兩邊需保持一致。
+
+BEGIN;
+
+LOCK TABLE raw_traces IN SHARE ROW EXCLUSIVE MODE;
+
+CREATE TABLE IF NOT EXISTS trace_coverage (
+  project_id      TEXT        NOT NULL,
+  target_id       TEXT        NOT NULL,
+  total           BIGINT      NOT NULL DEFAULT 0,
+  with_geom       BIGINT      NOT NULL DEFAULT 0,
+  no_signal       BIGINT      NOT NULL DEFAULT 0,
+  cellid_only     BIGINT      NOT NULL DEFAULT 0,
+  addr_unlocated  BIGINT      NOT NULL DEFAULT 0,
+  updated_at      TIMESTAMPTZ NOT NULL DEFAULT now(),
+  drift_at        TIMESTAMPTZ NULL,
+  PRIMARY KEY (project_id, target_id)
+);
+
+CREATE OR REPLACE FUNCTION trace_coverage_apply() RETURNS trigger
+LANGUAGE plpgsql AS $fn$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO trace_coverage AS c (project_id, target_id, total, with_geom, no_signal, cellid_only, addr_unlocated)
+    SELECT * FROM (
+      SELECT project_id, target_id,
+       COALESCE(sum(w), 0)::bigint AS total,
+       COALESCE(sum(w) FILTER (WHERE geom IS NOT NULL), 0)::bigint AS with_geom,
+       COALESCE(sum(w) FILTER (WHERE geom IS NULL AND COALESCE(cell_addr, '') = '' AND COALESCE(cell_id, '') = ''), 0)::bigint AS no_signal,
+       COALESCE(sum(w) FILTER (WHERE geom IS NULL AND COALESCE(cell_addr, '') = '' AND NOT COALESCE(cell_id, '') = ''), 0)::bigint AS cellid_only,
+       COALESCE(sum(w) FILTER (WHERE geom IS NULL AND NOT COALESCE(cell_addr, '') = ''), 0)::bigint AS addr_unlocated
+        FROM (SELECT 1 AS w, project_id, target_id, geom, cell_id, cell_addr FROM new_rows WHERE deleted_at IS NULL) d
+       GROUP BY project_id, target_id
+    ) g
+     WHERE total <> 0 OR with_geom <> 0 OR no_signal <> 0 OR cellid_only <> 0 OR addr_unlocated <> 0
+     ORDER BY project_id, target_id
+    ON CONFLICT (project_id, target_id) DO UPDATE
+       SET total = c.total + EXCLUDED.total,
+         with_geom = c.with_geom + EXCLUDED.with_geom,
+         no_signal = c.no_signal + EXCLUDED.no_signal,
+         cellid_only = c.cellid_only + EXCLUDED.cellid_only,
+         addr_unlocated = c.addr_unlocated + EXCLUDED.addr_unlocated,
+         updated_at = now();
+  ELSIF TG_OP = 'DELETE' THEN
+    INSERT INTO trace_coverage AS c (project_id, target_id, total, with_geom, no_signal, cellid_only, addr_unlocated)
+    SELECT * FROM (
+      SELECT project_id, target_id,
+       COALESCE(sum(w), 0)::bigint AS total,
+       COALESCE(sum(w) FILTER (WHERE geom IS NOT NULL), 0)::bigint AS with_geom,
+       COALESCE(sum(w) FILTER (WHERE geom IS NULL AND COALESCE(cell_addr, '') = '' AND COALESCE(cell_id, '') = ''), 0)::bigint AS no_signal,
+       COALESCE(sum(w) FILTER (WHERE geom IS NULL AND COALESCE(cell_addr, '') = '' AND NOT COALESCE(cell_id, '') = ''), 0)::bigint AS cellid_only,
+       COALESCE(sum(w) FILTER (WHERE geom IS NULL AND NOT COALESCE(cell_addr, '') = ''), 0)::bigint AS addr_unlocated
+        FROM (SELECT -1 AS w, project_id, target_id, geom, cell_id, cell_addr FROM old_rows WHERE deleted_at IS NULL) d
+       GROUP BY project_id, target_id
+    ) g
+     WHERE total <> 0 OR with_geom <> 0 OR no_signal <> 0 OR cellid_only <> 0 OR addr_unlocated <> 0
+     ORDER BY project_id, target_id
+    ON CONFLICT (project_id, target_id) DO UPDATE
+       SET total = c.total + EXCLUDED.total,
+         with_geom = c.with_geom + EXCLUDED.with_geom,
+         no_signal = c.no_signal + EXCLUDED.no_signal,
+         cellid_only = c.cellid_only + EXCLUDED.cellid_only,
+         addr_unlocated = c.addr_unlocated + EXCLUDED.addr_unlocated,
+         updated_at = now();
+  ELSE
+    INSERT INTO trace_coverage AS c (project_id, target_id, total, with_geom, no_signal, cellid_only, addr_unlocated)
+    SELECT * FROM (
+      SELECT project_id, target_id,
+       COALESCE(sum(w), 0)::bigint AS total,
+       COALESCE(sum(w) FILTER (WHERE geom IS NOT NULL), 0)::bigint AS with_geom,
+       COALESCE(sum(w) FILTER (WHERE geom IS NULL AND COALESCE(cell_addr, '') = '' AND COALESCE(cell_id, '') = ''), 0)::bigint AS no_signal,
+       COALESCE(sum(w) FILTER (WHERE geom IS NULL AND COALESCE(cell_addr, '') = '' AND NOT COALESCE(cell_id, '') = ''), 0)::bigint AS cellid_only,
+       COALESCE(sum(w) FILTER (WHERE geom IS NULL AND NOT COALESCE(cell_addr, '') = ''), 0)::bigint AS addr_unlocated
+        FROM (SELECT 1 AS w, project_id, target_id, geom, cell_id, cell_addr FROM new_rows WHERE deleted_at IS NULL UNION ALL SELECT -1 AS w, project_id, target_id, geom, cell_id, cell_addr FROM old_rows WHERE deleted_at IS NULL) d
+       GROUP BY project_id, target_id
+    ) g
+     WHERE total <> 0 OR with_geom <> 0 OR no_signal <> 0 OR cellid_only <> 0 OR addr_unlocated <> 0
+     ORDER BY project_id, target_id
+    ON CONFLICT (project_id, target_id) DO UPDATE
+       SET total = c.total + EXCLUDED.total,
+         with_geom = c.with_geom + EXCLUDED.with_geom,
+         no_signal = c.no_signal + EXCLUDED.no_signal,
+         cellid_only = c.cellid_only + EXCLUDED.cellid_only,
+         addr_unlocated = c.addr_unlocated + EXCLUDED.addr_unlocated,
+         updated_at = now();
+  END IF;
+  RETURN NULL;
+END
+$fn$;
+
+DO $do$ BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_trigger
+                  WHERE tgname = 'trg_trace_coverage_ins' AND tgrelid = 'raw_traces'::regclass) THEN
+    CREATE TRIGGER trg_trace_coverage_ins AFTER INSERT ON raw_traces REFERENCING NEW TABLE AS new_rows
+      FOR EACH STATEMENT EXECUTE FUNCTION trace_coverage_apply();
+  END IF;
+END $do$;
+
+DO $do$ BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_trigger
+                  WHERE tgname = 'trg_trace_coverage_upd' AND tgrelid = 'raw_traces'::regclass) THEN
+    CREATE TRIGGER trg_trace_coverage_upd AFTER UPDATE ON raw_traces REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+      FOR EACH STATEMENT EXECUTE FUNCTION trace_coverage_apply();
+  END IF;
+END $do$;
+
+DO $do$ BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_trigger
+                  WHERE tgname = 'trg_trace_coverage_del' AND tgrelid = 'raw_traces'::regclass) THEN
+    CREATE TRIGGER trg_trace_coverage_del AFTER DELETE ON raw_traces REFERENCING OLD TABLE AS old_rows
+      FOR EACH STATEMENT EXECUTE FUNCTION trace_coverage_apply();
+  END IF;
+END $do$;
+
+INSERT INTO trace_coverage (project_id, target_id, total, with_geom, no_signal, cellid_only, addr_unlocated)
+SELECT project_id, target_id,
+   COALESCE(sum(1), 0)::bigint AS total,
+   COALESCE(sum(1) FILTER (WHERE geom IS NOT NULL), 0)::bigint AS with_geom,
+   COALESCE(sum(1) FILTER (WHERE geom IS NULL AND COALESCE(cell_addr, '') = '' AND COALESCE(cell_id, '') = ''), 0)::bigint AS no_signal,
+   COALESCE(sum(1) FILTER (WHERE geom IS NULL AND COALESCE(cell_addr, '') = '' AND NOT COALESCE(cell_id, '') = ''), 0)::bigint AS cellid_only,
+   COALESCE(sum(1) FILTER (WHERE geom IS NULL AND NOT COALESCE(cell_addr, '') = ''), 0)::bigint AS addr_unlocated
+  FROM raw_traces
+ WHERE deleted_at IS NULL AND true
+ GROUP BY project_id, target_id
+ON CONFLICT (project_id, target_id) DO NOTHING;
+
+COMMIT;
@@ -86,6 +86,9 @@ ALTER TABLE raw_traces ADD COLUMN IF NOT EXISTS delete_reason TEXT        NULL;
 
 -- 方位角基準（P2.5）：對既有資料補預設 'unknown'，新資料由 ingest 預設填入
 ALTER TABLE raw_traces ADD COLUMN IF NOT EXISTS azimuth_ref TEXT NOT NULL DEFAULT 'unknown';
+
+-- 重傳冪等（2026-10）：每列內容 fingerprint，見 migration_raw_traces_row_fp.sql
+ALTER TABLE raw_traces ADD COLUMN IF NOT EXISTS row_fp BYTEA NULL;
 -- CHECK 約束在新建表已有；對既有 DB 補上同名約束（IF NOT EXISTS 不適用 CHECK，
 -- 改用 DO 區塊偵測；多次重跑安全）
 DO $$
@@ -115,6 +118,11 @@ CREATE INDEX IF NOT EXISTS idx_raw_traces_active
     ON raw_traces (project_id, target_id)
     WHERE deleted_at IS NULL;
 
+-- 重傳冪等：同 project/target 內未軟刪列的 row_fp 唯一，INSERT ... ON CONFLICT DO NOTHING
+CREATE UNIQUE INDEX IF NOT EXISTS uq_raw_traces_row_fp
+    ON raw_traces (project_id, target_id, row_fp)
+    WHERE row_fp IS NOT NULL AND deleted_at IS NULL;
+
 -- ---------- Audit Logs（P0 法庭可防禦性核心） ----------
 -- 為什麼要這張表：
 --   1. 證據鏈完整性（chain of custody）：誰在何時對哪筆證物做了什麼
@@ -387,12 +395,307 @@ WHERE NOT EXISTS (
 --   - addr 為「清洗後」地址（_simplify_addr 結果）；ON CONFLICT 冪等。
 --   - geocode.py 內 _ensure_sql_cache() 也會 CREATE TABLE IF NOT EXISTS 自動建立，
 --     此處列入 schema 供新環境完整建立與文件化。
+--   - 負快取（2026-10）：status='neg'、lat/lng 為 NULL → Google / OSM 都明確查無；
+--     created_at 起 GEO_NEG_TTL_SEC（預設 7 天）內有效。見 migration_geocode_cache_negative.sql。
+--   - 正規化 key（2026-10）：addr_norm = geocode.normalize_addr(addr)，同址不同寫法共用一筆；
+--     舊列由 _backfill_addr_norm() 補齊。見 migration_geocode_cache_addr_norm.sql。
 CREATE TABLE IF NOT EXISTS geocode_cache (
     addr        TEXT PRIMARY KEY,
-    lat         DOUBLE PRECISION NOT NULL,
-    lng         DOUBLE PRECISION NOT NULL,
+    addr_norm   TEXT NULL,
+    lat         DOUBLE PRECISION NULL,
+    lng         DOUBLE PRECISION NULL,
+    status      TEXT NOT NULL DEFAULT 'ok',          -- ok | neg
     created_at  TIMESTAMPTZ NOT NULL DEFAULT now()
 );
+CREATE INDEX IF NOT EXISTS idx_geocode_cache_addr_norm ON geocode_cache (addr_norm);
+
+-- ---------- 背景匯入 job（2026-10） ----------
+-- POST /api/upload（async_job=1）只排入 job、立即回 job_id，由 in-process worker pool 跑
+-- ingest（services/ingest_jobs.py）；Postgres 即佇列（FOR UPDATE SKIP LOCKED）。
+-- 見 migration_ingest_jobs.sql；ingest_jobs._ensure_jobs_table() 也會自動建立。
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+  id                BIGSERIAL   PRIMARY KEY,
+  job_id            TEXT UNIQUE NOT NULL,             -- external token（secrets.token_urlsafe(18)）
+  project_id        TEXT        NOT NULL,
+  target_id         TEXT        NOT NULL,
+  filename          TEXT        NOT NULL,
+  ext               TEXT        NULL,
+  evidence_id       BIGINT      NULL,
+  sha256_full       TEXT        NULL,
+  prior_uploads     INT         NOT NULL DEFAULT 0,
+  size_bytes        BIGINT      NOT NULL,
+  mime_hint         TEXT        NULL,
+  raw_enc           BYTEA       NULL,                 -- AES-256-GCM(gzip(raw))；結束後 NULL
+  status            TEXT        NOT NULL DEFAULT 'queued',   -- queued|running|done|failed
+  rows_estimate     INT         NULL,                 -- 排入時粗估總列數（ETA 用；PDF 為 NULL）
+  rows_parsed       INT         NOT NULL DEFAULT 0,
+  rows_geocoded     INT         NOT NULL DEFAULT 0,
+  rows_inserted     INT         NOT NULL DEFAULT 0,
+  rows_skipped      INT         NOT NULL DEFAULT 0,
+  rows_committed    INT         NOT NULL DEFAULT 0,   -- 已 commit 到第幾列（原始列序號，續跑用）
+  resume_from       INT         NOT NULL DEFAULT 0,   -- 本次 attempt 起跑時的 rows_committed
+  attempts          INT         NOT NULL DEFAULT 0,
+  worker_id         TEXT        NULL,
+  result            JSONB       NULL,                 -- 與同步 /upload 回應同形
+  error_text        TEXT        NULL,
+  created_by        BIGINT      NULL REFERENCES users(id) ON DELETE SET NULL,
+  created_by_name   TEXT        NULL,
+  created_by_role   TEXT        NULL,
+  created_at        TIMESTAMPTZ NOT NULL DEFAULT now(),
+  started_at        TIMESTAMPTZ NULL,                 -- 本次 attempt 起跑時間
+  heartbeat_at      TIMESTAMPTZ NULL,
+  finished_at       TIMESTAMPTZ NULL
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ingest_jobs_jid     ON ingest_jobs (job_id);
+CREATE INDEX        IF NOT EXISTS idx_ingest_jobs_pending ON ingest_jobs (id) WHERE status IN ('queued', 'running');
+CREATE INDEX        IF NOT EXISTS idx_ingest_jobs_project ON ingest_jobs (project_id, created_at DESC);
+
+-- ---------- 背景 OSM 補座標佇列（2026-10） ----------
+-- Google 未命中的地址排入 geocode_osm_queue，由全域唯一 worker（geocode_osm_lease 租約）
+-- 以 1 req/s 打 Nominatim，查到後回填 raw_traces（只動 geom IS NULL 的列）。
+-- 見 migration_geocode_osm_queue.sql；osm_queue.py 的 _ensure_queue_table() 也會自動建立。
+CREATE TABLE IF NOT EXISTS geocode_osm_queue (
+    addr         TEXT        PRIMARY KEY,             -- normalize_addr 後地址
+    raw_addrs    TEXT[]      NOT NULL DEFAULT '{}',   -- 原始 cell_addr（回填用）
+    neg_ok       BOOLEAN     NOT NULL DEFAULT TRUE,
+    status       TEXT        NOT NULL DEFAULT 'pending',   -- pending|running|done|none|failed
+    attempts     INT         NOT NULL DEFAULT 0,
+    not_before   TIMESTAMPTZ NOT NULL DEFAULT now(),
+    lat          DOUBLE PRECISION NULL,
+    lng          DOUBLE PRECISION NULL,
+    rows_filled  INT         NOT NULL DEFAULT 0,
+    worker_id    TEXT        NULL,
+    created_at   TIMESTAMPTZ NOT NULL DEFAULT now(),
+    claimed_at   TIMESTAMPTZ NULL,
+    finished_at  TIMESTAMPTZ NULL
+);
+CREATE INDEX IF NOT EXISTS idx_geocode_osm_queue_pending
+    ON geocode_osm_queue (not_before) WHERE status IN ('pending', 'running');
+
+CREATE TABLE IF NOT EXISTS geocode_osm_lease (
+    id          INT         PRIMARY KEY,
+    holder      TEXT        NULL,
+    expires_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+INSERT INTO geocode_osm_lease (id) VALUES (1) ON CONFLICT DO NOTHING;
+
+CREATE INDEX IF NOT EXISTS idx_raw_traces_unlocated_addr
+    ON raw_traces (cell_addr) WHERE geom IS NULL AND deleted_at IS NULL;
+
+-- ---------- 未定位列重新 geocode 回填（2026-10） ----------
+-- 一列 = 一個案件的回填 run（services/regeocode.py）；keyset 分批、回填與 last_id checkpoint
+-- 同一 transaction。見 migration_regeocode_runs.sql；regeocode._ensure_runs_table() 也會自動建立。
+CREATE TABLE IF NOT EXISTS regeocode_runs (
+  id               BIGSERIAL   PRIMARY KEY,
+  run_id           TEXT UNIQUE NOT NULL,
+  project_id       TEXT        NOT NULL,
+  status           TEXT        NOT NULL DEFAULT 'queued',   -- queued|running|done|failed|cancelled
+  rows_estimate    BIGINT      NULL,
+  last_id          BIGINT      NOT NULL DEFAULT 0,
+  rows_scanned     BIGINT      NOT NULL DEFAULT 0,
+  rows_located     BIGINT      NOT NULL DEFAULT 0,
+  keys_resolved    BIGINT      NOT NULL DEFAULT 0,
+  keys_unresolved  BIGINT      NOT NULL DEFAULT 0,
+  batches          INT         NOT NULL DEFAULT 0,
+  attempts         INT         NOT NULL DEFAULT 0,
+  worker_id        TEXT        NULL,
+  error_text       TEXT        NULL,
+  created_by       BIGINT      NULL REFERENCES users(id) ON DELETE SET NULL,
+  created_by_name  TEXT        NULL,
+  created_by_role  TEXT        NULL,
+  created_at       TIMESTAMPTZ NOT NULL DEFAULT now(),
+  started_at       TIMESTAMPTZ NULL,
+  heartbeat_at     TIMESTAMPTZ NULL,
+  finished_at      TIMESTAMPTZ NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_regeocode_runs_active
+    ON regeocode_runs (project_id) WHERE status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS idx_regeocode_runs_project
+    ON regeocode_runs (project_id, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_raw_traces_unlocated_pid
+    ON raw_traces (project_id, id) WHERE geom IS NULL AND deleted_at IS NULL;
+
+-- map-layers 時間窗 / keyset 分頁（2026-10，見 migration_raw_traces_map_keyset.sql）
+CREATE INDEX IF NOT EXISTS idx_raw_traces_map_keyset
+    ON raw_traces (project_id, target_id, start_ts, id)
+    WHERE deleted_at IS NULL AND geom IS NOT NULL;
+
+-- ---------- 定位涵蓋率彙總（2026-10）----------
+-- 每 (project_id, target_id) 的 /coverage 計數，由 raw_traces 上的 statement-level trigger
+-- 在寫入同一交易內記帳。詳見 migration_trace_coverage.sql（既有資料的回填也在那裡）。
+-- 既有 DB 請套該 migration；只重跑本檔會得到空的彙總表，要等排程校驗（coverage.verify）補正。
+CREATE TABLE IF NOT EXISTS trace_coverage (
+  project_id      TEXT        NOT NULL,
+  target_id       TEXT        NOT NULL,
+  total           BIGINT      NOT NULL DEFAULT 0,
+  with_geom       BIGINT      NOT NULL DEFAULT 0,
+  no_signal       BIGINT      NOT NULL DEFAULT 0,
+  cellid_only     BIGINT      NOT NULL DEFAULT 0,
+  addr_unlocated  BIGINT      NOT NULL DEFAULT 0,
+  updated_at      TIMESTAMPTZ NOT NULL DEFAULT now(),
+  drift_at        TIMESTAMPTZ NULL,
+  PRIMARY KEY (project_id, target_id)
+);
+
+CREATE OR REPLACE FUNCTION trace_coverage_apply() RETURNS trigger
+LANGUAGE plpgsql AS $fn$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO trace_coverage AS c (project_id, target_id, total, with_geom, no_signal, cellid_only, addr_unlocated)
+    SELECT * FROM (
+      SELECT project_id, target_id,
+       COALESCE(sum(w), 0)::bigint AS total,
+       COALESCE(sum(w) FILTER (WHERE geom IS NOT NULL), 0)::bigint AS with_geom,
+       COALESCE(sum(w) FILTER (WHERE geom IS NULL AND COALESCE(cell_addr, '') = '' AND COALESCE(cell_id, '') = ''), 0)::bigint AS no_signal,
+       COALESCE(sum(w) FILTER (WHERE geom IS NULL AND COALESCE(cell_addr, '') = '' AND NOT COALESCE(cell_id, '') = ''), 0)::bigint AS cellid_only,
+       COALESCE(sum(w) FILTER (WHERE geom IS NULL AND NOT COALESCE(cell_addr, '') = ''), 0)::bigint AS addr_unlocated
+        FROM (SELECT 1 AS w, project_id, target_id, geom, cell_id, cell_addr FROM new_rows WHERE deleted_at IS NULL) d
+       GROUP BY project_id, target_id
+    ) g
+     WHERE total <> 0 OR with_geom <> 0 OR no_signal <> 0 OR cellid_only <> 0 OR addr_unlocated <> 0
+     ORDER BY project_id, target_id
+    ON CONFLICT (project_id, target_id) DO UPDATE
+       SET total = c.total + EXCLUDED.total,
+         with_geom = c.with_geom + EXCLUDED.with_geom,
+         no_signal = c.no_signal + EXCLUDED.no_signal,
+         cellid_only = c.cellid_only + EXCLUDED.cellid_only,
+         addr_unlocated = c.addr_unlocated + EXCLUDED.addr_unlocated,
+         updated_at = now();
+  ELSIF TG_OP = 'DELETE' THEN
+    INSERT INTO trace_coverage AS c (project_id, target_id, total, with_geom, no_signal, cellid_only, addr_unlocated)
+    SELECT * FROM (
+      SELECT project_id, target_id,
+       COALESCE(sum(w), 0)::bigint AS total,
+       COALESCE(sum(w) FILTER (WHERE geom IS NOT NULL), 0)::bigint AS with_geom,
+       COALESCE(sum(w) FILTER (WHERE geom IS NULL AND COALESCE(cell_addr, '') = '' AND COALESCE(cell_id, '') = ''), 0)::bigint AS no_signal,
+       COALESCE(sum(w) FILTER (WHERE geom IS NULL AND COALESCE(cell_addr, '') = '' AND NOT COALESCE(cell_id, '') = ''), 0)::bigint AS cellid_only,
+       COALESCE(sum(w) FILTER (WHERE geom IS NULL AND NOT COALESCE(cell_addr, '') = ''), 0)::bigint AS addr_unlocated
+        FROM (SELECT -1 AS w, project_id, target_id, geom, cell_id, cell_addr FROM old_rows WHERE deleted_at IS NULL) d
+       GROUP BY project_id, target_id
+    ) g
+     WHERE total <> 0 OR with_geom <> 0 OR no_signal <> 0 OR cellid_only <> 0 OR addr_unlocated <> 0
+     ORDER BY project_id, target_id
+    ON CONFLICT (project_id, target_id) DO UPDATE
+       SET total = c.total + EXCLUDED.total,
+         with_geom = c.with_geom + EXCLUDED.with_geom,
+         no_signal = c.no_signal + EXCLUDED.no_signal,
+         cellid_only = c.cellid_only + EXCLUDED.cellid_only,
+         addr_unlocated = c.addr_unlocated + EXCLUDED.addr_unlocated,
+         updated_at = now();
+  ELSE
+    INSERT INTO trace_coverage AS c (project_id, target_id, total, with_geom, no_signal, cellid_only, addr_unlocated)
+    SELECT * FROM (
+      SELECT project_id, target_id,
+       COALESCE(sum(w), 0)::bigint AS total,
+       COALESCE(sum(w) FILTER (WHERE geom IS NOT NULL), 0)::bigint AS with_geom,
+       COALESCE(sum(w) FILTER (WHERE geom IS NULL AND COALESCE(cell_addr, '') = '' AND COALESCE(cell_id, '') = ''), 0)::bigint AS no_signal,
+       COALESCE(sum(w) FILTER (WHERE geom IS NULL AND COALESCE(cell_addr, '') = '' AND NOT COALESCE(cell_id, '') = ''), 0)::bigint AS cellid_only,
+       COALESCE(sum(w) FILTER (WHERE geom IS NULL AND NOT COALESCE(cell_addr, '') = ''), 0)::bigint AS addr_unlocated
+        FROM (SELECT 1 AS w, project_id, target_id, geom, cell_id, cell_addr FROM new_rows WHERE deleted_at IS NULL UNION ALL SELECT -1 AS w, project_id, target_id, geom, cell_id, cell_addr FROM old_rows WHERE deleted_at IS NULL) d
+       GROUP BY project_id, target_id
+    ) g
+     WHERE total <> 0 OR with_geom <> 0 OR no_signal <> 0 OR cellid_only <> 0 OR addr_unlocated <> 0
+     ORDER BY project_id, target_id
+    ON CONFLICT (project_id, target_id) DO UPDATE
+       SET total = c.total + EXCLUDED.total,
+         with_geom = c.with_geom + EXCLUDED.with_geom,
+         no_signal = c.no_signal + EXCLUDED.no_signal,
+         cellid_only = c.cellid_only + EXCLUDED.cellid_only,
+         addr_unlocated = c.addr_unlocated + EXCLUDED.addr_unlocated,
+         updated_at = now();
+  END IF;
+  RETURN NULL;
+END
+$fn$;
+
+DO $do$ BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_trigger
+                  WHERE tgname = 'trg_trace_coverage_ins' AND tgrelid = 'raw_traces'::regclass) THEN
+    CREATE TRIGGER trg_trace_coverage_ins AFTER INSERT ON raw_traces REFERENCING NEW TABLE AS new_rows
+      FOR EACH STATEMENT EXECUTE FUNCTION trace_coverage_apply();
+  END IF;
+END $do$;
+
+DO $do$ BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_trigger
+                  WHERE tgname = 'trg_trace_coverage_upd' AND tgrelid = 'raw_traces'::regclass) THEN
+    CREATE TRIGGER trg_trace_coverage_upd AFTER UPDATE ON raw_traces REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+      FOR EACH STATEMENT EXECUTE FUNCTION trace_coverage_apply();
+  END IF;
+END $do$;
+
+DO $do$ BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_trigger
+                  WHERE tgname = 'trg_trace_coverage_del' AND tgrelid = 'raw_traces'::regclass) THEN
+    CREATE TRIGGER trg_trace_coverage_del AFTER DELETE ON raw_traces REFERENCING OLD TABLE AS old_rows
+      FOR EACH STATEMENT EXECUTE FUNCTION trace_coverage_apply();
+  END IF;
+END $do$;
+
+-- ---------- 每案資料版本（2026-10）----------
+-- ETag / 伺服端回應快取的依據（services/data_version.py、services/response_cache.py）：
+-- raw_traces 上的 statement-level trigger 把每個寫入語句涉及的案件版本 +1。
+-- 沒有版本列視同版本 0，不需回填。詳見 migration_project_data_version.sql。
+CREATE TABLE IF NOT EXISTS project_data_version (
+  project_id  TEXT        PRIMARY KEY,
+  version     BIGINT      NOT NULL DEFAULT 1,
+  updated_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION project_data_version_bump() RETURNS trigger
+LANGUAGE plpgsql AS $fn$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO project_data_version AS v (project_id)
+    SELECT DISTINCT project_id FROM (SELECT project_id FROM new_rows) s
+     WHERE project_id IS NOT NULL
+     ORDER BY project_id
+    ON CONFLICT (project_id) DO UPDATE
+       SET version = v.version + 1, updated_at = now();
+  ELSIF TG_OP = 'DELETE' THEN
+    INSERT INTO project_data_version AS v (project_id)
+    SELECT DISTINCT project_id FROM (SELECT project_id FROM old_rows) s
+     WHERE project_id IS NOT NULL
+     ORDER BY project_id
+    ON CONFLICT (project_id) DO UPDATE
+       SET version = v.version + 1, updated_at = now();
+  ELSE
+    INSERT INTO project_data_version AS v (project_id)
+    SELECT DISTINCT project_id FROM (SELECT project_id FROM new_rows UNION SELECT project_id FROM old_rows) s
+     WHERE project_id IS NOT NULL
+     ORDER BY project_id
+    ON CONFLICT (project_id) DO UPDATE
+       SET version = v.version + 1, updated_at = now();
+  END IF;
+  RETURN NULL;
+END
+$fn$;
+
+DO $do$ BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_trigger
+                  WHERE tgname = 'trg_project_data_version_ins' AND tgrelid = 'raw_traces'::regclass) THEN
+    CREATE TRIGGER trg_project_data_version_ins AFTER INSERT ON raw_traces REFERENCING NEW TABLE AS new_rows
+      FOR EACH STATEMENT EXECUTE FUNCTION project_data_version_bump();
+  END IF;
+END $do$;
+
+DO $do$ BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_trigger
+                  WHERE tgname = 'trg_project_data_version_upd' AND tgrelid = 'raw_traces'::regclass) THEN
+    CREATE TRIGGER trg_project_data_version_upd AFTER UPDATE ON raw_traces REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+      FOR EACH STATEMENT EXECUTE FUNCTION project_data_version_bump();
+  END IF;
+END $do$;
+
+DO $do$ BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_trigger
+                  WHERE tgname = 'trg_project_data_version_del' AND tgrelid = 'raw_traces'::regclass) THEN
+    CREATE TRIGGER trg_project_data_version_del AFTER DELETE ON raw_traces REFERENCING OLD TABLE AS old_rows
+      FOR EACH STATEMENT EXECUTE FUNCTION project_data_version_bump();
+  END IF;
+END $do$;
 
 -- ---------- Preview Evidence Artifact（P9A，2026-07-01） ----------
 -- preview 的「加密原始檔 + 雙 hash + provenance」暫存表；供「儲存為專案」時 server
@@ -455,6 +758,15 @@ CREATE UNIQUE INDEX IF NOT EXISTS idx_cell_towers_cell_id
 CREATE INDEX IF NOT EXISTS idx_cell_towers_carrier
     ON cell_towers (carrier_name);
 
+-- cell_towers 版本戳（2026-10）：匯入 / 清空時 +1，各 process 的常駐索引
+-- （services/tower_index.py）據此判斷是否重載。見 migration_cell_towers_version.sql。
+CREATE TABLE IF NOT EXISTS cell_towers_version (
+    id          INT         PRIMARY KEY,
+    version     BIGINT      NOT NULL DEFAULT 0,
+    updated_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+INSERT INTO cell_towers_version (id) VALUES (1) ON CONFLICT DO NOTHING;
+
 -- ---------- 格式回報（使用者上傳無法解析的檔案 → 回報管理員加新方言） ----------
 -- 設計考量：
 --   - 不存原始檔案內容（隱私 + 容量考量），只存 headers 清單與診斷結果
@@ -26,11 +26,12 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from app.db.session import pool, get_conn
 from app.services.limiter import limiter
 from app.security import SECRET_KEY, AUTH_ENABLED
-from app.services import preview_artifact
+from app.services import coverage, geocode_bundle, ingest_jobs, osm_queue, preview_artifact, regeocode
 from app.services.audit import write_audit
 from app.core.request_context import RequestContextMiddleware
 from app.core.error_handlers import register_error_handlers
 from app.core import logging_utils as clog
+from app.core.env import env_int
 
 logger = logging.getLogger("celltrail")
 
@@ -48,7 +49,7 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"[DB] pool warmup error: {type(e).__name__}: {e}")
 
-    # APScheduler 背景 job（keepalive 每 6h + preview cleanup 每 10m）。
+    # APScheduler 背景 job（keepalive 每 6h + preview cleanup 每 10m + 涵蓋率校驗）。
     # 整段包 try-catch；pytest 下不啟動（測試不需，避免背景執行緒干擾）。
     if "pytest" not in sys.modules:
         try:
@@ -56,16 +57,52 @@ async def lifespan(app: FastAPI):
             _register_jobs(scheduler)
             scheduler.start()
             app.state.keepalive_scheduler = scheduler
-            print("[scheduler] started（keepalive 6h + preview cleanup 10m）")
+            print(f"[scheduler] started（keepalive 6h + preview cleanup 10m + coverage verify {_coverage_verify_hours()}h）")
         except Exception as e:
             app.state.keepalive_scheduler = None
             print(f"[scheduler] 啟動失敗（不影響主程式）: {type(e).__name__}: {e}")
     else:
         app.state.keepalive_scheduler = None
 
+    # 背景匯入 worker pool（POST /api/upload async_job=1）；pytest 下同樣不啟動。
+    if "pytest" not in sys.modules:
+        try:
+            pool_ = ingest_jobs.start_workers()
+            print(f"[ingest_jobs] workers started（n={pool_.n}）")
+        except Exception as e:
+            print(f"[ingest_jobs] 啟動失敗（背景匯入 job 會停在 queued）: {type(e).__name__}: {e}")
+
+    # 背景 OSM 補座標 worker（GEO_OSM_FALLBACK=1 且 GEO_OSM_ASYNC 未關時）；pytest 下不啟動。
+    if "pytest" not in sys.modules:
+        try:
+            if osm_queue.start_worker() is not None:
+                print("[osm_queue] worker started")
+        except Exception as e:
+            print(f"[osm_queue] 啟動失敗（排隊中的地址會等其他 instance 處理）: {type(e).__name__}: {e}")
+
+    # 未定位列回填 worker（POST /api/admin/regeocode）；pytest 下不啟動。
+    if "pytest" not in sys.modules:
+        try:
+            regeocode.start_worker()
+            print("[regeocode] worker started")
+        except Exception as e:
+            print(f"[regeocode] 啟動失敗（回填 run 會停在 queued）: {type(e).__name__}: {e}")
+
+    # geocode 快取暖機（GEOCODE_WARMUP_ON_START=1；預設關，冷地址會打 Google 計費）；pytest 下不啟動。
+    if "pytest" not in sys.modules and geocode_bundle.warmup_on_start():
+        try:
+            geocode_bundle.start_warmup()
+            print(f"[geocode] warmup started（近 {geocode_bundle.warmup_days()} 天）")
+        except Exception as e:
+            print(f"[geocode] warmup 啟動失敗（不影響主程式）: {type(e).__name__}: {e}")
+
     yield
 
     # === shutdown ===
+    # 正在跑的 job 不等它做完：heartbeat 過期後由下一個 worker 從最後 commit 的塊續跑
+    ingest_jobs.stop_workers()
+    osm_queue.stop_worker()
+    regeocode.stop_worker()
     try:
         sched = getattr(app.state, "keepalive_scheduler", None)
         if sched is not None:
@@ -201,8 +238,26 @@ def _preview_cleanup() -> None:
         )
 
 
+# ---------- 涵蓋率彙總表校驗（2026-10，services/coverage.py）----------
+def _coverage_verify_hours() -> int:
+    """全量校驗間隔（env `COVERAGE_VERIFY_HOURS`，預設 24，合理 1~168）。"""
+    return env_int("COVERAGE_VERIFY_HOURS", 24, 1, 168)
+
+
+def _coverage_verify() -> None:
+    """由 raw_traces 重算 trace_coverage 並修正 drift（APScheduler 呼叫）。
+
+    同 _preview_cleanup：全程包 try/except，失敗只寫 log。drift 的明細由
+    coverage.verify 逐組寫 coverage.drift 事件。
+    """
+    try:
+        coverage.verify(repair=True)
+    except Exception as e:
+        clog.log_error("coverage.verify.failed", error_type=type(e).__name__)
+
+
 def _register_jobs(scheduler) -> None:
-    """把背景 job 掛上傳入的 scheduler（keepalive + preview cleanup）。
+    """把背景 job 掛上傳入的 scheduler（keepalive + preview cleanup + 涵蓋率校驗）。
 
     抽成 helper 供測試直接驗證註冊（不需真的 start scheduler）。keepalive 參數不變。
     """
@@ -218,6 +273,12 @@ def _register_jobs(scheduler) -> None:
         next_run_time=datetime.now(timezone.utc),  # 啟動後立即清一次，之後每 10m
         max_instances=1, coalesce=True,
     )
+    # 全量重算會掃整張 raw_traces：不在啟動時跑，第一次在一個間隔之後
+    scheduler.add_job(
+        _coverage_verify,
+        trigger="interval", hours=_coverage_verify_hours(), id="coverage_verify",
+        max_instances=1, coalesce=True,
+    )
 
 
 # ---------- FastAPI App ----------
@@ -276,6 +337,10 @@ from app.api.parse_only      import router as parse_only_router       # noqa: E4
 from app.api.format_reports  import router as format_reports_router   # noqa: E402
 from app.api.share           import router as share_router            # noqa: E402
 from app.api.preview          import router as preview_router          # noqa: E402
+from app.api.regeocode        import router as regeocode_router        # noqa: E402
+from app.api.geocode_bundle   import router as geocode_bundle_router   # noqa: E402
+from app.api.metrics          import router as metrics_router          # noqa: E402
+from app.api.coverage         import router as coverage_router         # noqa: E402
 
 app.include_router(health_router,          prefix="/api/health", tags=["health"])
 app.include_router(auth_router,            prefix="/api",        tags=["auth"])
@@ -295,6 +360,10 @@ app.include_router(parse_only_router,      prefix="/api",        tags=["parse-on
 app.include_router(format_reports_router,  prefix="/api",        tags=["format-reports"])
 app.include_router(share_router,           prefix="/api",        tags=["share"])
 app.include_router(preview_router,         prefix="/api",        tags=["preview"])
+app.include_router(regeocode_router,       prefix="/api",        tags=["regeocode"])
+app.include_router(geocode_bundle_router,  prefix="/api",        tags=["geocode-bundle"])
+app.include_router(metrics_router,         prefix="/api",        tags=["metrics"])
+app.include_router(coverage_router,        prefix="/api",        tags=["coverage"])
 
 
 @app.get("/api")
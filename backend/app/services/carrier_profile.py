@@ -198,3 +198,15 @@ def invalidate_cache() -> None:
     with _LOCK:
         _HEADER_MAP_CACHE = None
         _DEFAULT_PROFILE_CACHE = None
+
+
+def prime_cache(header_map: Dict[str, str]) -> None:
+    """
+    直接以既有的 header map 填入快取（不查 DB）。
+    呼叫時機：ingest 多分頁平行解析（INGEST_SHEET_WORKERS）的 worker process
+    啟動時，把主程序正在用的 header map 帶進子程序 —— 子程序不必各自連 DB，
+    且保證整個檔案用的是同一版對照表。
+    """
+    global _HEADER_MAP_CACHE
+    with _LOCK:
+        _HEADER_MAP_CACHE = dict(header_map)
@@ -0,0 +1,298 @@
+# backend/app/services/coverage.py
+"""
+每 (project_id, target_id) 的定位涵蓋率彙總表 trace_coverage（2026-10）。
+
+為什麼：/projects/{id}/coverage 每次開地圖、每張上傳回執都對 raw_traces 做一次帶 6 個
+FILTER 的全案掃描；百萬列的案件這支端點本身就是秒級。涵蓋率只在寫入時改變，
+寫入時順手記帳、讀取時加總幾列即可。
+
+維護方式：raw_traces 上三個 statement-level AFTER trigger（INSERT / UPDATE / DELETE，
+REFERENCING 轉移表），每個語句把受影響列依 (project_id, target_id) 彙總成增量，一次
+upsert 進 trace_coverage：
+  - 與觸發的寫入在同一交易：回滾就一起回滾，不會記錯帳。
+  - 涵蓋所有寫入路徑而不必逐一改 code：匯入（COPY → INSERT … SELECT、executemany、
+    save-records）、軟刪 / 還原 target 與整個案件、手動定位、OSM 佇列與 regeocode 回填、
+    以及直接下的 SQL。
+  - UPDATE 一律計 -舊 +新（只算未軟刪的列），沒有淨變化的組不寫，
+    azimuth_ref 之類不影響分類的批次更新不會碰彙總列。
+  - 同一 target 的並行寫入會在彙總列上排隊（鎖到 commit）；寫入交易都短，可接受。
+
+分類與 map.py 的 _reason_sql_case 同義（geocode_pending 除外，見下）：
+  total / with_geom / no_signal（cell_id、cell_addr 皆空）/ cellid_only / addr_unlocated（有地址未定位）
+geocode_pending 取決於 OSM 佇列當下狀態、不是 raw_traces 的屬性，無法記帳；/coverage
+只在 addr_unlocated > 0 時，另對「該案未定位列」（idx_raw_traces_unlocated_pid）細分。
+
+校驗：verify() 由 raw_traces 重算、與彙總表比對，差異（drift）寫 log + metrics，
+repair=True 時在擋寫入的短鎖內改回重算值。main.py 依 COVERAGE_VERIFY_HOURS 排程。
+
+建表（_ensure_coverage）：第一次建立 trace_coverage 時，同一交易內鎖住 raw_traces 的寫入、
+裝 trigger、從現有資料回填，之後才放行寫入 —— 不會有漏記的窗口。
+"""
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.core import logging_utils as clog
+from app.core import metrics
+from app.db.session import get_conn
+
+COUNTERS = ("total", "with_geom", "no_signal", "cellid_only", "addr_unlocated")
+
+_DRIFT_SAMPLE = 50  # 報告裡列出的 drift 組數上限
+
+_m_drift = metrics.counter("coverage_drift_pairs_total",
+                           "trace_coverage rows found out of sync with raw_traces by verify()")
+
+
+def _sums(weight: str) -> str:
+    """依 COUNTERS 順序的 5 個加總欄（帶別名）；weight 為每列權重（1 或轉移表的 ±1）。"""
+    unlocated = "geom IS NULL"
+    no_addr = "COALESCE(cell_addr, '') = ''"
+    no_cid = "COALESCE(cell_id, '') = ''"
+    filters = [
+        None,
+        "geom IS NOT NULL",
+        f"{unlocated} AND {no_addr} AND {no_cid}",
+        f"{unlocated} AND {no_addr} AND NOT {no_cid}",
+        f"{unlocated} AND NOT {no_addr}",
+    ]
+    return ",\n       ".join(
+        f"COALESCE(sum({weight}){f' FILTER (WHERE {f})' if f else ''}, 0)::bigint AS {c}"
+        for c, f in zip(COUNTERS, filters)
+    )
+
+
+def _delta_upsert(source: str) -> str:
+    """把 source（欄位 w, project_id, target_id, geom, cell_id, cell_addr）彙總後加進彙總表。"""
+    cols = ", ".join(COUNTERS)
+    nonzero = " OR ".join(f"{c} <> 0" for c in COUNTERS)
+    sets = ",\n         ".join(f"{c} = c.{c} + EXCLUDED.{c}" for c in COUNTERS)
+    return f"""
+    INSERT INTO trace_coverage AS c (project_id, target_id, {cols})
+    SELECT * FROM (
+      SELECT project_id, target_id,
+       {_sums("w")}
+        FROM ({source}) d
+       GROUP BY project_id, target_id
+    ) g
+     WHERE {nonzero}
+     ORDER BY project_id, target_id
+    ON CONFLICT (project_id, target_id) DO UPDATE
+       SET {sets},
+         updated_at = now();
+    """
+
+
+_ROW_COLS = "project_id, target_id, geom, cell_id, cell_addr"
+
+_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION trace_coverage_apply() RETURNS trigger
+LANGUAGE plpgsql AS $fn$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    {_delta_upsert(f"SELECT 1 AS w, {_ROW_COLS} FROM new_rows WHERE deleted_at IS NULL")}
+  ELSIF TG_OP = 'DELETE' THEN
+    {_delta_upsert(f"SELECT -1 AS w, {_ROW_COLS} FROM old_rows WHERE deleted_at IS NULL")}
+  ELSE
+    {_delta_upsert(
+        f"SELECT 1 AS w, {_ROW_COLS} FROM new_rows WHERE deleted_at IS NULL "
+        f"UNION ALL SELECT -1 AS w, {_ROW_COLS} FROM old_rows WHERE deleted_at IS NULL")}
+  END IF;
+  RETURN NULL;
+END
+$fn$
+"""
+
+_TRIGGERS = {
+    "trg_trace_coverage_ins": "AFTER INSERT ON raw_traces REFERENCING NEW TABLE AS new_rows",
+    "trg_trace_coverage_upd": "AFTER UPDATE ON raw_traces REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "trg_trace_coverage_del": "AFTER DELETE ON raw_traces REFERENCING OLD TABLE AS old_rows",
+}
+
+
+def _trigger_sql(name: str, spec: str, func: str = "trace_coverage_apply") -> str:
+    """建 raw_traces 上 statement-level trigger 的冪等 DO 區塊（data_version 亦共用）。"""
+    return f"""
+    DO $do$ BEGIN
+      IF NOT EXISTS (SELECT 1 FROM pg_trigger
+                      WHERE tgname = '{name}' AND tgrelid = 'raw_traces'::regclass) THEN
+        CREATE TRIGGER {name} {spec}
+          FOR EACH STATEMENT EXECUTE FUNCTION {func}();
+      END IF;
+    END $do$
+    """
+
+
+_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS trace_coverage (
+  project_id      TEXT        NOT NULL,
+  target_id       TEXT        NOT NULL,
+  total           BIGINT      NOT NULL DEFAULT 0,
+  with_geom       BIGINT      NOT NULL DEFAULT 0,
+  no_signal       BIGINT      NOT NULL DEFAULT 0,
+  cellid_only     BIGINT      NOT NULL DEFAULT 0,
+  addr_unlocated  BIGINT      NOT NULL DEFAULT 0,
+  updated_at      TIMESTAMPTZ NOT NULL DEFAULT now(),
+  drift_at        TIMESTAMPTZ NULL,
+  PRIMARY KEY (project_id, target_id)
+)
+"""
+
+
+def _recompute_sql(where: str) -> str:
+    """由 raw_traces 重算（未軟刪列）；where 為額外條件（不含 deleted_at）。"""
+    return f"""
+    SELECT project_id, target_id,
+       {_sums("1")}
+      FROM raw_traces
+     WHERE deleted_at IS NULL AND {where}
+     GROUP BY project_id, target_id
+    """
+
+
+# ── 建表（idempotent；仿 regeocode._ensure_runs_table）────────────────
+_table_ready = False
+
+
+def _ensure_coverage() -> bool:
+    global _table_ready
+    if _table_ready:
+        return True
+    try:
+        with get_conn() as conn:
+            with conn.transaction():
+                with conn.cursor() as cur:
+                    cur.execute("SELECT to_regclass('trace_coverage') IS NULL", prepare=False)
+                    fresh = bool(cur.fetchone()[0])
+                    if fresh:
+                        # 擋住寫入到交易結束：回填與 trigger 上線之間不能有漏記的列
+                        cur.execute("LOCK TABLE raw_traces IN SHARE ROW EXCLUSIVE MODE", prepare=False)
+                    cur.execute(_TABLE_SQL, prepare=False)
+                    cur.execute(_FUNCTION_SQL, prepare=False)
+                    for name, spec in _TRIGGERS.items():
+                        cur.execute(_trigger_sql(name, spec), prepare=False)
+                    if fresh:
+                        cur.execute(
+                            f"INSERT INTO trace_coverage (project_id, target_id, {', '.join(COUNTERS)}) "
+                            + _recompute_sql("true")
+                            # 兩個 process 同時首建：後到者等鎖後 fresh 判斷已過時，別重複回填
+                            + " ON CONFLICT (project_id, target_id) DO NOTHING",
+                            prepare=False,
+                        )
+                        clog.log_info("coverage.backfilled", pairs=max(cur.rowcount, 0))
+        _table_ready = True
+    except Exception as e:
+        print(f"[coverage] ensure table failed: {type(e).__name__}: {e}")
+    return _table_ready
+
+
+# ── 讀取 ───────────────────────────────────────────────────
+def summary(project_id: str, target_id: Optional[str] = None) -> Optional[Dict[str, int]]:
+    """該案（或單一 target）的彙總計數；彙總表不可用時回 None（呼叫端改走全掃）。"""
+    if not _ensure_coverage():
+        return None
+    where, params = "project_id = %s", [project_id]
+    if target_id:
+        where += " AND target_id = %s"
+        params.append(target_id)
+    cols = ", ".join(f"COALESCE(sum({c}), 0)" for c in COUNTERS)
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(f"SELECT {cols} FROM trace_coverage WHERE {where}", params, prepare=False)
+        row = cur.fetchone() or (0,) * len(COUNTERS)
+    return {c: int(v or 0) for c, v in zip(COUNTERS, row)}
+
+
+# ── 校驗 ───────────────────────────────────────────────────
+_last_report: Dict[str, Any] = {}
+_verify_lock = threading.Lock()
+
+
+def _drift_sql(where: str) -> str:
+    cols = ", ".join(COUNTERS)
+    actual = ", ".join(f"COALESCE(a.{c}, 0)" for c in COUNTERS)
+    stored = ", ".join(f"COALESCE(s.{c}, 0)" for c in COUNTERS)
+    return f"""
+    WITH a AS ({_recompute_sql(where)}),
+         s AS (SELECT project_id, target_id, {cols} FROM trace_coverage WHERE {where})
+    SELECT COALESCE(a.project_id, s.project_id), COALESCE(a.target_id, s.target_id),
+           {actual}, {stored}
+      FROM a FULL JOIN s ON s.project_id = a.project_id AND s.target_id = a.target_id
+     WHERE ({actual}) IS DISTINCT FROM ({stored})
+     ORDER BY 1, 2
+    """
+
+
+def _repair(pairs: List[tuple]) -> int:
+    """在擋寫入的短鎖內，把指定 (project_id, target_id) 改回重算值。"""
+    cols = ", ".join(COUNTERS)
+    sets = ", ".join(f"{c} = EXCLUDED.{c}" for c in COUNTERS)
+    pids = [p for p, _ in pairs]
+    tids = [t for _, t in pairs]
+    with get_conn() as conn:
+        with conn.transaction():
+            with conn.cursor() as cur:
+                cur.execute("LOCK TABLE raw_traces IN SHARE MODE", prepare=False)
+                cur.execute(
+                    f"""
+                    WITH p AS (SELECT * FROM unnest(%s::text[], %s::text[]) AS p(project_id, target_id))
+                    INSERT INTO trace_coverage AS c (project_id, target_id, {cols}, drift_at)
+                    SELECT p.project_id, p.target_id,
+                           {", ".join(f"COALESCE(r.{c}, 0)" for c in COUNTERS)}, now()
+                      FROM p
+                      LEFT JOIN ({_recompute_sql("(project_id, target_id) IN (SELECT project_id, target_id FROM p)")}) r
+                        ON r.project_id = p.project_id AND r.target_id = p.target_id
+                    ON CONFLICT (project_id, target_id) DO UPDATE
+                       SET {sets}, drift_at = now(), updated_at = now()
+                    """,
+                    (pids, tids),
+                    prepare=False,
+                )
+                return max(cur.rowcount, 0)
+
+
+def verify(project_id: Optional[str] = None, repair: bool = True) -> Dict[str, Any]:
+    """
+    由 raw_traces 重算、與 trace_coverage 比對（單一語句，同一 snapshot，不擋寫入）。
+    有 drift → 每組寫一筆 coverage.drift log；repair=True 時改回重算值並標 drift_at。
+    """
+    if not _ensure_coverage():
+        raise RuntimeError("trace_coverage 無法建立")
+    t0 = time.perf_counter()
+    where, params = ("project_id = %s", [project_id, project_id]) if project_id else ("true", [])
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(_drift_sql(where), params, prepare=False)
+        rows = cur.fetchall()
+
+    n = len(COUNTERS)
+    drifted = []
+    for r in rows:
+        actual = dict(zip(COUNTERS, (int(v) for v in r[2:2 + n])))
+        stored = dict(zip(COUNTERS, (int(v) for v in r[2 + n:2 + 2 * n])))
+        drifted.append({"project_id": r[0], "target_id": r[1], "actual": actual, "stored": stored})
+        clog.log_error("coverage.drift", project_id=r[0], target_id=r[1],
+                       actual=actual, stored=stored)
+    _m_drift.inc(len(drifted))
+
+    repaired = _repair([(d["project_id"], d["target_id"]) for d in drifted]) if (drifted and repair) else 0
+    report = {
+        "project_id": project_id,
+        "drifted": len(drifted),
+        "repaired": repaired,
+        "sample": drifted[:_DRIFT_SAMPLE],
+        "duration_ms": round((time.perf_counter() - t0) * 1000, 1),
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+    }
+    with _verify_lock:
+        _last_report.clear()
+        _last_report.update(report)
+    clog.log_info("coverage.verify.completed", project_id=project_id, drifted=len(drifted),
+                  repaired=repaired, duration_ms=report["duration_ms"])
+    return report
+
+
+def last_report() -> Dict[str, Any]:
+    with _verify_lock:
+        return dict(_last_report)
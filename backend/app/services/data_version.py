@@ -0,0 +1,148 @@
+# backend/app/services/data_version.py
+"""
+每案資料版本 project_data_version（2026-10；ETag / 回應快取的依據）。
+
+為什麼：map-layers / coverage / azimuth-ref 彙總 / 分享頁每次請求都重算，而偵查員會一直
+按重新整理，案件多半沒變。有一個「這案的資料變了沒」的單調版本號，就能發強 ETag、
+If-None-Match 相符回 304，並把算好的回應以 (案件, 版本, 查詢參數) 為 key 快取
+（services/response_cache.py）。
+
+遞增方式：同 trace_coverage（services/coverage.py），raw_traces 上三個 statement-level
+AFTER trigger，每個語句把受影響列的 project_id 去重後各 +1：
+  - 匯入、軟刪 / 還原 target 與整個案件、手動定位、azimuth_ref 更新、OSM 佇列與
+    regeocode 回填、直接下的 SQL 全部涵蓋，不必逐一改寫入端。
+  - 與寫入同一交易：回滾就不遞增；同一案的並行寫入在版本列上排隊到 commit。
+  - 與 trace_coverage 不同，任何欄位的更新都算（azimuth_ref 會改 map-layers 的屬性）。
+raw_traces 以外的變因只有一個：/coverage 的 geocode_pending 取決於 OSM 佇列狀態。佇列
+排入 / 以查無或失敗收尾時，osm_queue 以 bump_for_addrs() 替「有這些地址的未定位列」
+所屬的案件遞增（查到的情形由回填 UPDATE 的 trigger 負責）。
+
+沒有版本列 = 版本 0（建表後還沒寫入過）。不需回填：版本只用來比對「跟上次是否相同」，
+trigger 裝好之前不會有人拿版本做快取。
+
+讀取端必須「先讀版本、再讀資料」：反過來的話，讀到舊資料 + 新版本會把舊內容快取在
+新版本底下；先讀版本最多是把新內容記在舊版本下，下次請求版本不同自然重算。
+"""
+from __future__ import annotations
+
+from typing import Iterable, Optional
+
+from app.db.session import get_conn
+from app.services.coverage import _trigger_sql
+
+
+def _bump_sql(source: str) -> str:
+    """把 source（含 project_id 欄）涉及的案件各 +1；依 project_id 排序上鎖，避免並行死結。"""
+    return f"""
+    INSERT INTO project_data_version AS v (project_id)
+    SELECT DISTINCT project_id FROM ({source}) s
+     WHERE project_id IS NOT NULL
+     ORDER BY project_id
+    ON CONFLICT (project_id) DO UPDATE
+       SET version = v.version + 1, updated_at = now();
+    """
+
+
+_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION project_data_version_bump() RETURNS trigger
+LANGUAGE plpgsql AS $fn$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    {_bump_sql("SELECT project_id FROM new_rows")}
+  ELSIF TG_OP = 'DELETE' THEN
+    {_bump_sql("SELECT project_id FROM old_rows")}
+  ELSE
+    {_bump_sql("SELECT project_id FROM new_rows UNION SELECT project_id FROM old_rows")}
+  END IF;
+  RETURN NULL;
+END
+$fn$
+"""
+
+_TRIGGERS = {
+    "trg_project_data_version_ins": "AFTER INSERT ON raw_traces REFERENCING NEW TABLE AS new_rows",
+    "trg_project_data_version_upd": "AFTER UPDATE ON raw_traces REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "trg_project_data_version_del": "AFTER DELETE ON raw_traces REFERENCING OLD TABLE AS old_rows",
+}
+
+_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS project_data_version (
+  project_id  TEXT        PRIMARY KEY,
+  version     BIGINT      NOT NULL DEFAULT 1,
+  updated_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+)
+"""
+
+# OSM 佇列狀態變動：有這些原始地址、仍未定位的列所屬案件（走 idx_raw_traces_unlocated_addr）
+_BUMP_ADDRS_SQL = _bump_sql(
+    "SELECT project_id FROM raw_traces "
+    "WHERE geom IS NULL AND deleted_at IS NULL AND cell_addr = ANY(%s)"
+)
+
+
+# ── 建表（idempotent；仿 coverage._ensure_coverage，但不需鎖表回填）──────────
+_table_ready = False
+
+
+def _ensure_version() -> bool:
+    global _table_ready
+    if _table_ready:
+        return True
+    try:
+        with get_conn() as conn:
+            with conn.transaction():
+                with conn.cursor() as cur:
+                    cur.execute(_TABLE_SQL, prepare=False)
+                    cur.execute(_FUNCTION_SQL, prepare=False)
+                    for name, spec in _TRIGGERS.items():
+                        cur.execute(_trigger_sql(name, spec, "project_data_version_bump"), prepare=False)
+        _table_ready = True
+    except Exception as e:
+        print(f"[data_version] ensure table failed: {type(e).__name__}: {e}")
+    return _table_ready
+
+
+def current(project_id: str) -> Optional[int]:
+    """該案目前的資料版本；表不可用或查詢失敗回 None（呼叫端照舊重算、不發 ETag）。"""
+    if not _ensure_version():
+        return None
+    try:
+        with get_conn() as conn, conn.cursor() as cur:
+            cur.execute("SELECT version FROM project_data_version WHERE project_id = %s",
+                        (project_id,), prepare=False)
+            row = cur.fetchone()
+    except Exception as e:
+        print(f"[data_version] read failed: {type(e).__name__}: {e}")
+        return None
+    return int(row[0]) if row else 0
+
+
+def bump(project_id: str) -> None:
+    """
+    顯式 +1，給「raw_traces 以外、但會改變該案回應」的寫入在寫完之後呼叫
+    （例：azimuth_ref 更新的 audit 紀錄 —— 專案彙總會帶最後標註人）。失敗只記錄。
+    """
+    if not _ensure_version():
+        return
+    try:
+        with get_conn() as conn, conn.cursor() as cur:
+            cur.execute(_bump_sql("SELECT %s::text AS project_id"), (project_id,), prepare=False)
+    except Exception as e:
+        print(f"[data_version] bump failed: {type(e).__name__}: {e}")
+
+
+def bump_for_addrs(cur, raw_addrs: Iterable[str]) -> int:
+    """
+    以呼叫端的 cursor 遞增「有 raw_addrs 中地址、仍未定位」的案件版本；回傳遞增的案件數。
+    失敗只記錄不 raise：版本沒跟上的代價是 /coverage 的 geocode_pending 晚一版才更新。
+    cur 需在 autocommit 連線上（pool 預設）：交易內失敗的語句會讓整個交易作廢。
+    """
+    addrs = sorted({a for a in raw_addrs if a})
+    if not addrs or not _ensure_version():
+        return 0
+    try:
+        cur.execute(_BUMP_ADDRS_SQL, (addrs,), prepare=False)
+        return max(cur.rowcount, 0)
+    except Exception as e:
+        print(f"[data_version] bump failed: {type(e).__name__}: {e}")
+        return 0
@@ -1,8 +1,13 @@
 # backend/app/services/geocode.py
-import os, json, time, re
+import os, json, threading, time, re, unicodedata
 from typing import Optional, Tuple, List, Dict, Iterable
 import requests
 
+from app.core import logging_utils as clog
+from app.core import metrics
+from app.core.env import env_int
+from app.services import geocode_client, tower_index
+
 try:
     import redis  # optional
 except Exception:
@@ -39,12 +44,197 @@ def _cache_set(addr: str, lat: float, lng: float) -> None:
     except Exception:
         pass
 
+# ---------- 行程內 LRU（最前層，2026-10） ----------
+# 為什麼：Redis 在雲端多半沒有，SQL geocode_cache 每次仍要一趟 round-trip；同一個
+# 基地台地址在同一 process 內會被上百次上傳 / 重傳 / 預覽反覆查。最前面放一層有界
+# LRU，命中就完全不出 process。值為 (lat, lng) 或 None（負快取，帶到期時間）。
+# 多執行緒共用（bulk 的 Google ThreadPool、ingest 管線執行緒）→ 一把 lock 保護。
+def _mem_cache_size() -> int:
+    """行程內 LRU 上限（env `GEO_MEM_CACHE_SIZE`，預設 50000 筆，0 = 關閉，合理 0~1000000，非法 fallback 50000）。"""
+    return env_int("GEO_MEM_CACHE_SIZE", 50000, 0, 1_000_000)
+
+
+def _neg_ttl_sec() -> int:
+    """負快取存活秒數（env `GEO_NEG_TTL_SEC`，預設 7 天，合理 1 小時 ~ 90 天，非法 fallback 7 天）。
+
+    負快取只擋「Google / OSM 都明確查無」的地址；到期後會再被查一次（地圖資料會更新、
+    地址清洗規則也可能改善）。成功值不設到期（門牌不會搬家）。
+    """
+    return env_int("GEO_NEG_TTL_SEC", 604800, 3600, 90 * 86400)
+
+
+class _MemCache:
+    """有界 LRU：addr → ((lat, lng) | None, 到期時間 | None)。"""
+
+    __slots__ = ("maxsize", "_data", "_lock")
+
+    def __init__(self, maxsize: int):
+        from collections import OrderedDict
+
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, addr: str) -> Tuple[bool, Optional[Tuple[float, float]]]:
+        """回 (命中與否, 值)；值為 None 代表負快取命中。過期的負快取視為未命中並移除。"""
+        with self._lock:
+            item = self._data.get(addr)
+            if item is None:
+                return False, None
+            ll, expires = item
+            if expires is not None and expires <= time.time():
+                del self._data[addr]
+                return False, None
+            self._data.move_to_end(addr)
+            return True, ll
+
+    def put(self, addr: str, ll: Optional[Tuple[float, float]], ttl: Optional[float] = None) -> None:
+        expires = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[addr] = (ll, expires)
+            self._data.move_to_end(addr)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_mem: Optional[_MemCache] = None
+
+
+def _mem_cache() -> Optional[_MemCache]:
+    """第一次使用時依 env 建立；GEO_MEM_CACHE_SIZE=0 → None（此層關閉）。"""
+    global _mem
+    if _mem is None:
+        size = _mem_cache_size()
+        if size <= 0:
+            return None
+        _mem = _MemCache(size)
+    return _mem
+
+
+def _mem_get(addr: str) -> Tuple[bool, Optional[Tuple[float, float]]]:
+    mc = _mem_cache()
+    if mc is None:
+        return False, None
+    hit, ll = mc.get(addr)
+    _count("mem_neg_hit" if hit and ll is None else "mem_hit" if hit else "mem_miss")
+    return hit, ll
+
+
+def _mem_put(addr: str, ll: Optional[Tuple[float, float]]) -> None:
+    mc = _mem_cache()
+    if mc is not None and addr:
+        mc.put(addr, ll, None if ll else _neg_ttl_sec())
+
+
+# ---------- 各層命中計數（cache_stats() 對外） ----------
+_STATS_KEYS = (
+    "mem_hit", "mem_neg_hit", "mem_miss",
+    "redis_hit", "redis_miss",
+    "sql_hit", "sql_neg_hit", "sql_miss",
+    "local_hit",
+    "google_call", "google_hit", "osm_call", "osm_hit",
+    "neg_stored", "osm_queued",
+)
+_stats: Dict[str, int] = dict.fromkeys(_STATS_KEYS, 0)
+_stats_lock = threading.Lock()
+
+
+def _count(key: str, n: int = 1) -> None:
+    if n:
+        with _stats_lock:
+            _stats[key] += n
+
+
+def cache_stats() -> Dict[str, object]:
+    """各層 hit / miss 計數（process 啟動以來累計）+ LRU 使用量，供管理端觀測。"""
+    with _stats_lock:
+        counters = dict(_stats)
+    mc = _mem_cache()
+    return {
+        "counters": counters,
+        "mem_size": len(mc) if mc is not None else 0,
+        "mem_capacity": mc.maxsize if mc is not None else 0,
+        "neg_ttl_sec": _neg_ttl_sec(),
+    }
+
+
+# ---------- metrics（2026-10；GET /api/metrics） ----------
+# 各層耗時 histogram + 各層處理 key 數（result=hit/neg/miss/queued），命中率由後者推得。
+# 層名：local（cell_towers 對照）、mem（LRU）、redis、sql、google、osm（實際打 Nominatim，
+# 含 request 內序列與背景 worker）、osm_enqueue（只是排入佇列）。
+TIERS = ("local", "mem", "redis", "sql", "google", "osm")
+_m_tier_seconds = metrics.histogram(
+    "geocode_tier_seconds", "lookup_bulk per-tier latency in seconds (one sample per call that used the tier)",
+    ("tier",),
+)
+_m_tier_keys = metrics.counter(
+    "geocode_tier_keys_total", "Keys handled per geocode tier by result (hit/neg/miss/queued)",
+    ("tier", "result"),
+)
+_m_bulk_seconds = metrics.histogram("geocode_bulk_seconds", "lookup_bulk total latency in seconds")
+_m_bulk_keys = metrics.counter("geocode_bulk_keys_total", "Unique keys passed to lookup_bulk")
+
+
+def _tier_keys(tier: str, hit: int = 0, miss: int = 0, neg: int = 0, queued: int = 0) -> None:
+    for result, n in (("hit", hit), ("neg", neg), ("miss", miss), ("queued", queued)):
+        if n > 0:
+            _m_tier_keys.inc(n, tier=tier, result=result)
+
+
+def _hit_ratios() -> Dict[Tuple[str, ...], float]:
+    """各層命中率（hit + neg）/ 全部；該層沒處理過任何 key 就不輸出。"""
+    out: Dict[Tuple[str, ...], float] = {}
+    for tier in TIERS:
+        n = {r: _m_tier_keys.value(tier=tier, result=r) for r in ("hit", "neg", "miss", "queued")}
+        total = sum(n.values())
+        if total:
+            out[(tier,)] = round((n["hit"] + n["neg"]) / total, 4)
+    return out
+
+
+metrics.gauge("geocode_hit_ratio", "Per-tier geocode hit ratio since process start", _hit_ratios, ("tier",))
+
+
+def reset_cache() -> None:
+    """清空行程內 LRU 與計數（測試、或管理端改了對照資料後想立即生效時用）。"""
+    global _mem
+    _mem = None
+    with _stats_lock:
+        for k in _stats:
+            _stats[k] = 0
+
+
+# ---------- 負快取判定 ----------
+# _google_geocode / _osm_geocode 失敗一律回 None，但「查無此址」與「暫時性失敗」
+# （逾時、OVER_QUERY_LIMIT、429、key 沒設）必須分開：後者若記成負快取，一次配額
+# 爆掉就會讓一大批地址好幾天都定位不到。暫時性失敗由兩支函式寫進呼叫端傳入的
+# transient set（每次 lookup / lookup_bulk / resolve_osm 各自一個），收尾時
+# _neg_eligible 判斷。原本是 process 全域 set（2026-10 改）：並行的兩個請求查到同一
+# 地址時，一方的 pop / forget 會吃掉另一方的標記 → 暫時性失敗被記成負快取。
+def _neg_eligible(addr: str, transient: set) -> bool:
+    """此次查無能否記負快取：本次呼叫沒有暫時性失敗，且至少有一個來源真的被問過。"""
+    if addr in transient:
+        return False
+    return bool((_google_enabled() and GMAPS_KEY) or USE_OSM)
+
+
 # ---------- SQL 持久快取（Supabase 無 Redis 時的跨請求快取） ----------
 # 為什麼：雲端移除 Redis 後 geocode 結果不跨請求保存 → 每次大檔上傳都重打 Google，
 # 易超過 Render 120s 請求上限回 502。SQL 快取讓結果持久化：首次上傳分批灌、之後
 # （含逾時重傳）跳過已快取者 → 漸進變快、最終必然成功。
 # 表用 CREATE TABLE IF NOT EXISTS 自動建立（冪等），不需手動在 Supabase 跑 migration。
 # 所有 cur.execute 帶 prepare=False（pooler 不支援 server-side prepared statements）。
+#
+# 負快取（2026-10）：status='neg' 的列（lat/lng 為 NULL）代表 Google / OSM 都明確
+# 查無；只在 created_at 起 GEO_NEG_TTL_SEC 內有效，過期視同沒快取、會再查一次。
+# 見 migration_geocode_cache_negative.sql。
 _sql_cache_ready = False
 
 def _ensure_sql_cache() -> bool:
@@ -57,66 +247,240 @@ def _ensure_sql_cache() -> bool:
             cur.execute(
                 "CREATE TABLE IF NOT EXISTS geocode_cache ("
                 "  addr TEXT PRIMARY KEY,"
-                "  lat DOUBLE PRECISION NOT NULL,"
-                "  lng DOUBLE PRECISION NOT NULL,"
+                "  lat DOUBLE PRECISION NULL,"
+                "  lng DOUBLE PRECISION NULL,"
+                "  status TEXT NOT NULL DEFAULT 'ok',"
                 "  created_at TIMESTAMPTZ NOT NULL DEFAULT now())",
                 prepare=False,
             )
+            # 既有表（2026-06 版）補負快取欄位；皆冪等
+            cur.execute("ALTER TABLE geocode_cache ADD COLUMN IF NOT EXISTS status TEXT NOT NULL DEFAULT 'ok'",
+                        prepare=False)
+            cur.execute("ALTER TABLE geocode_cache ALTER COLUMN lat DROP NOT NULL", prepare=False)
+            cur.execute("ALTER TABLE geocode_cache ALTER COLUMN lng DROP NOT NULL", prepare=False)
+            # 正規化 key（2026-10）：見 normalize_addr / migration_geocode_cache_addr_norm.sql
+            cur.execute("ALTER TABLE geocode_cache ADD COLUMN IF NOT EXISTS addr_norm TEXT NULL", prepare=False)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_geocode_cache_addr_norm ON geocode_cache (addr_norm)",
+                        prepare=False)
             conn.commit()
         _sql_cache_ready = True
     except Exception as e:
         print(f"[geocode] ensure sql cache table failed: {type(e).__name__}: {e}")
-    return _sql_cache_ready
+        return False
+    # DDL 好了 SQL 層就可用；舊列的 addr_norm 交給背景補（補齊前讀取仍以 addr 命中）
+    _start_addr_norm_backfill()
+    return True
+
+_NORM_BACKFILL_BATCH = 5000
+_norm_backfill_started = False
+_norm_backfill_lock = threading.Lock()
+
+
+def _start_addr_norm_backfill() -> None:
+    """每行程只起一次背景 thread 補 addr_norm，不讓第一個 lookup 付整張表的成本。"""
+    global _norm_backfill_started
+    with _norm_backfill_lock:
+        if _norm_backfill_started:
+            return
+        _norm_backfill_started = True
+    threading.Thread(target=backfill_addr_norm, name="geocode-addr-norm-backfill", daemon=True).start()
+
 
-def _sql_cache_get_bulk(addrs: List[str]) -> Dict[str, Tuple[float, float]]:
-    out: Dict[str, Tuple[float, float]] = {}
+def backfill_addr_norm() -> int:
+    """以自己的連線跑完 _backfill_addr_norm；失敗只記錄（下次行程啟動再補）。
+
+    背景 thread 與 scripts/geocode_bundle.py backfill-norm（部署後前景先跑完）共用。
+    """
+    try:
+        from app.db.session import get_conn
+        with get_conn() as conn, conn.cursor() as cur:
+            n = _backfill_addr_norm(cur)
+            conn.commit()
+    except Exception as e:
+        print(f"[geocode] addr_norm backfill failed: {type(e).__name__}: {e}")
+        return 0
+    if n:
+        print(f"[geocode] geocode_cache addr_norm backfilled: {n} rows")
+    return n
+
+
+def _backfill_addr_norm(cur) -> int:
+    """舊列（addr_norm IS NULL）補上 normalize_addr(addr)；分批、冪等，回傳補了幾列。
+
+    正規化只在 Python 端做得到，所以不能寫成單一 UPDATE；每行程第一次用快取時在背景
+    跑一次（backfill_addr_norm），之後新寫入的列都帶 addr_norm，這裡就只剩一個走索引的空查詢。
+    """
+    n = 0
+    while True:
+        cur.execute(
+            "SELECT addr FROM geocode_cache WHERE addr_norm IS NULL LIMIT %s",
+            (_NORM_BACKFILL_BATCH,),
+            prepare=False,
+        )
+        addrs = [str(r[0]) for r in cur.fetchall()]
+        if not addrs:
+            return n
+        cur.execute(
+            "UPDATE geocode_cache g SET addr_norm = v.n "
+            "FROM unnest(%s::text[], %s::text[]) AS v(a, n) WHERE g.addr = v.a",
+            (addrs, [normalize_addr(a) or a for a in addrs]),
+            prepare=False,
+        )
+        n += len(addrs)
+        if len(addrs) < _NORM_BACKFILL_BATCH:
+            return n
+
+def _sql_cache_get_bulk(addrs: List[str]) -> Dict[str, Optional[Tuple[float, float]]]:
+    """addr → (lat, lng)；未過期的負快取回 None；查不到的 addr 不在回傳 dict 內。
+
+    addrs 為 normalize_addr 後的 key；同時比對 addr 與 addr_norm，舊版 key 寫入的列
+    （同址不同寫法）也能命中。同一 key 對到多列時，成功值優先於負快取。
+    """
+    out: Dict[str, Optional[Tuple[float, float]]] = {}
     if not addrs or not _ensure_sql_cache():
         return out
     try:
         from app.db.session import get_conn
         with get_conn() as conn, conn.cursor() as cur:
             cur.execute(
-                "SELECT addr, lat, lng FROM geocode_cache WHERE addr = ANY(%s)",
-                (list(addrs),),
+                "SELECT COALESCE(addr_norm, addr), lat, lng, status FROM geocode_cache "
+                "WHERE (addr = ANY(%s) OR addr_norm = ANY(%s)) "
+                "  AND (status = 'ok' OR created_at > now() - make_interval(secs => %s))",
+                (list(addrs), list(addrs), _neg_ttl_sec()),
                 prepare=False,
             )
             for r in cur.fetchall():
-                out[str(r[0])] = (float(r[1]), float(r[2]))
+                k = str(r[0])
+                if r[3] == "ok" and r[1] is not None and r[2] is not None:
+                    out[k] = (float(r[1]), float(r[2]))
+                elif r[3] == "neg" and k not in out:
+                    out[k] = None
     except Exception as e:
         print(f"[geocode] sql cache get error: {type(e).__name__}: {e}")
     return out
 
-def _sql_cache_set_bulk(items: List[Tuple[str, float, float]]) -> None:
+def _sql_cache_set_bulk(items: List[Tuple[str, Optional[float], Optional[float]]]) -> None:
+    """寫入 (addr, lat, lng)；lat 為 None 者寫成負快取。
+
+    成功值覆蓋負快取（之前查無、後來查到）；負快取只刷新既有負快取的時間，
+    絕不覆蓋成功值。同一批內 addr 先去重（ON CONFLICT DO UPDATE 不允許同一列被更新兩次）。
+    """
     if not items or not _ensure_sql_cache():
         return
+    ok: Dict[str, Tuple[float, float]] = {}
+    neg: Dict[str, None] = {}
+    for a, lat, lng in items:
+        if lat is None or lng is None:
+            neg[a] = None
+        else:
+            ok[a] = (lat, lng)
     try:
         from app.db.session import get_conn
-        # 單一多列 INSERT（一次 round-trip），ON CONFLICT 冪等
-        placeholders = ",".join(["(%s,%s,%s)"] * len(items))
-        args: List[object] = []
-        for a, lat, lng in items:
-            args.extend([a, lat, lng])
         with get_conn() as conn, conn.cursor() as cur:
-            cur.execute(
-                "INSERT INTO geocode_cache(addr,lat,lng) VALUES "
-                + placeholders
-                + " ON CONFLICT(addr) DO NOTHING",
-                args,
-                prepare=False,
-            )
+            # 單一多列 INSERT（一次 round-trip），ON CONFLICT 冪等
+            if ok:
+                args: List[object] = []
+                for a, (lat, lng) in ok.items():
+                    args.extend([a, a, lat, lng])
+                cur.execute(
+                    "INSERT INTO geocode_cache(addr,addr_norm,lat,lng,status) VALUES "
+                    + ",".join(["(%s,%s,%s,%s,'ok')"] * len(ok))
+                    + " ON CONFLICT(addr) DO UPDATE SET lat = EXCLUDED.lat, lng = EXCLUDED.lng,"
+                      " status = 'ok', created_at = now() WHERE geocode_cache.status <> 'ok'",
+                    args,
+                    prepare=False,
+                )
+            if neg:
+                cur.execute(
+                    "INSERT INTO geocode_cache(addr,addr_norm,lat,lng,status) "
+                    "SELECT a, a, NULL, NULL, 'neg' FROM unnest(%s::text[]) AS a "
+                    "ON CONFLICT(addr) DO UPDATE SET created_at = now() "
+                    "WHERE geocode_cache.status = 'neg'",
+                    (list(neg),),
+                    prepare=False,
+                )
             conn.commit()
     except Exception as e:
         print(f"[geocode] sql cache set error: {type(e).__name__}: {e}")
 
 # ---------- 地址清洗 ----------
-def _simplify_addr(addr: str) -> str:
+# 台灣地址正規化（2026-10）：同一地址的常見寫法差異收斂成同一把 key，讓它們共用
+# 一筆 LRU / Redis / geocode_cache，而不是各打一次 Google。
+#
+# 收斂的差異（皆為「同一門牌、不同寫法」，不會把兩個不同地址併成一個）：
+#   - 全形數字 / 括號 / 空白（NFKC）、臺 → 台
+#   - 開頭的郵遞區號、「中華民國」「台灣（省）」
+#   - 段 / 巷 / 弄 / 號 / 鄰 前的國字數字 → 阿拉伯數字（三段 → 3段、十二巷 → 12巷）；
+#     路名本身的數字（中山二路、中正四路）是專有名詞，不動
+#   - 「12之3號」→「12-3號」、各種破折號 → "-"、數字前導 0
+#   - 「N鄰」「X里」：行政區劃、非郵遞地址的一部分；里名只在「區/鄉/鎮/市」之後、
+#     且後面不是「區/鄉/鎮/市/路/街/道」時才剝（避免把「萬里區」「里港鄉」當成里名）；
+#     後面接數字（國字或阿拉伯）也不剝：「仁里一街」「東里2路」是路名，剝掉會變成
+#     「一街」而與真正的「一街」撞 key（2026-10 補）
+#   - 括號註記、「號」之後的樓層 / 之N（沿用舊版）
+#
+# 產出同時是快取 key 與送給 Google / OSM 的查詢字串（阿拉伯數字、去里名對兩者命中率
+# 都較好，見 scripts/geocode_verify.py 的實測）。舊版 key 寫進的 geocode_cache 列
+# 靠 addr_norm 欄位（_backfill_addr_norm）接上，不必重打。
+# 量測：scripts/bench_addr_normalize.py。
+_CN_DIGITS = {"零": 0, "〇": 0, "一": 1, "二": 2, "兩": 2, "三": 3, "四": 4,
+              "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_CN_UNITS = {"十": 10, "百": 100, "千": 1000}
+_CN_NUM = "零〇一二兩三四五六七八九十百千"
+_RE_CN_BEFORE_UNIT = re.compile(rf"([{_CN_NUM}]+)(?=[段巷弄號鄰])")
+_RE_CN_AFTER_ZHI = re.compile(rf"(?<=之)([{_CN_NUM}]+)")
+_RE_DASHES = re.compile(r"[‐‑‒–—―－~～]")
+_RE_PREFIX = re.compile(r"^(?:中華民國)?(?:台灣省?)?(?=\D{2}[縣市])")
+_RE_POSTCODE = re.compile(r"^\d{3}(?:\d{2,3})?(?=\D)")
+_RE_VILLAGE = re.compile(rf"(?<=[區鄉鎮市])[^市縣區鄉鎮里鄰路街道段巷弄號\d]{{1,3}}里(?![區鄉鎮市路街道\d{_CN_NUM}])")
+
+
+def _cn_to_int(s: str) -> Optional[int]:
+    """國字數字 → int（支援到千位）；無法解析回 None（原樣保留，不猜）。"""
+    total, cur = 0, None
+    for ch in s:
+        if ch in _CN_DIGITS:
+            if cur is not None and cur != 0:
+                # 「一二三」這類逐字寫法：當十進位數字串
+                cur = cur * 10 + _CN_DIGITS[ch]
+            else:
+                cur = _CN_DIGITS[ch]
+        elif ch in _CN_UNITS:
+            total += (cur if cur else 1) * _CN_UNITS[ch]
+            cur = None
+        else:
+            return None
+    return total + (cur or 0)
+
+
+def _cn_sub(m: "re.Match[str]") -> str:
+    n = _cn_to_int(m.group(1))
+    return m.group(1) if n is None else str(n)
+
+
+def normalize_addr(addr: str) -> str:
+    """台灣地址 → 正規化 key（同一門牌的不同寫法得到同一字串）；空字串表示無可查地址。"""
     if not addr:
         return ""
-    s = addr.strip().replace("臺", "台")
+    s = unicodedata.normalize("NFKC", str(addr)).strip().replace("臺", "台")
     s = re.sub(r"（.*?）|\(.*?\)", "", s)  # 去括號註記
-    s = re.sub(r"號.*$", "號", s)         # 「號」後面常是樓層/頂/之N，砍掉
     s = re.sub(r"\s+", "", s)
-    return s
+    s = _RE_PREFIX.sub("", s)
+    s = _RE_POSTCODE.sub("", s)
+    s = _RE_CN_BEFORE_UNIT.sub(_cn_sub, s)
+    s = _RE_CN_AFTER_ZHI.sub(_cn_sub, s)
+    s = _RE_DASHES.sub("-", s)
+    s = re.sub(r"(\d+)之(\d+)", r"\1-\2", s)
+    s = re.sub(r"(?<!\d)0+(?=\d)", "", s)
+    s = re.sub(r"號.*$", "號", s)         # 「號」後面常是樓層/頂/之N，砍掉
+    t = re.sub(r"\d+鄰", "", s)
+    t = _RE_VILLAGE.sub("", t)
+    # 剝完連路/街/段都不剩 → 剝過頭了，退回未剝版本
+    return t if re.search(r"[路街道段巷弄]", t) or not re.search(r"[路街道段巷弄]", s) else s
+
+
+def _simplify_addr(addr: str) -> str:
+    return normalize_addr(addr)
 
 # ---------- Google ----------
 GMAPS_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
@@ -127,6 +491,8 @@ GMAPS_LANG = os.getenv("GOOGLE_LANGUAGE", "zh-TW")
 # Google Geocoding 預設配額約 50 QPS；10 個 worker × 每個約 4 req/s ≈ 40 QPS，留安全邊際。
 # 為什麼要並行：雲端無 Redis 快取 + cell_towers 空時，大檔（如 test3 ~2400 唯一地址）
 # 序列逐筆打 Google 累積 >110s → 超過 Render 請求上限 502。並行把它壓進請求窗口。
+# 走非同步引擎（GEO_GOOGLE_ASYNC，預設）時為「同時在途請求數 / 連線池大小」，實際送出速率
+# 另由 GEO_GOOGLE_QPS 的自適應 token bucket 控制（見 geocode_client.py）。
 GEO_GOOGLE_CONCURRENCY = max(1, int(os.getenv("GEO_GOOGLE_CONCURRENCY", "10") or "10"))
 
 
@@ -137,13 +503,23 @@ def _google_enabled() -> bool:
     return os.getenv("GEO_GOOGLE_ENABLED", "1").strip().lower() not in {"0", "false", "no", "off"}
 
 
-def _google_geocode(addr: str) -> Optional[Tuple[float, float]]:
+def _google_async_enabled() -> bool:
+    """lookup_bulk 是否走 geocode_client 的非同步引擎（共用連線池 + 自適應限速 + 重試）。
+    `GEO_GOOGLE_ASYNC` ∈ {0,false,no,off} → 退回 ThreadPool + requests；沒裝 httpx 或沒設
+    key 也退回（後者讓舊路徑照常印「key 未設定」）。"""
+    if os.getenv("GEO_GOOGLE_ASYNC", "1").strip().lower() in {"0", "false", "no", "off"}:
+        return False
+    return bool(GMAPS_KEY) and geocode_client.available()
+
+
+def _google_geocode(addr: str, transient: Optional[set] = None) -> Optional[Tuple[float, float]]:
     """
     打 Google Maps Geocoding API。失敗一律回 None（不 raise），
     但會把原因 print 到 stdout（uvicorn 終端可見），方便排查：
       - Google disabled（GEO_GOOGLE_ENABLED=0）/ API key 未設定 / 無效
       - status != OK（REQUEST_DENIED、OVER_QUERY_LIMIT、ZERO_RESULTS ...）
       - HTTP / 網路 / JSON 例外
+    非 ZERO_RESULTS 的失敗把 addr 加進 transient（有給才加；見 _neg_eligible）。
     """
     if not _google_enabled():
         # 硬止血：GEO_GOOGLE_ENABLED 關閉 → 在建立任何 requests 呼叫之前即回傳（靜默，無錯誤 log）
@@ -168,22 +544,60 @@ def _google_geocode(addr: str) -> Optional[Tuple[float, float]]:
             f"[geocode] Google 非 OK: status={status!r} "
             f"error_message={j.get('error_message')!r} addr={addr!r}"
         )
+        if status != "ZERO_RESULTS" and transient is not None:
+            transient.add(addr)     # 配額 / 權限 / 伺服器錯誤：不是「查無此址」，不可記負快取
     except Exception as e:
         print(f"[geocode] Google 例外: {type(e).__name__}: {e} addr={addr!r}")
+        if transient is not None:
+            transient.add(addr)
     return None
 
 # ---------- OSM（Nominatim）備援 ----------
 USE_OSM = os.getenv("GEO_OSM_FALLBACK") == "1"
+
+
+def _osm_async_enabled() -> bool:
+    """lookup_bulk 的 OSM 備援是否交給背景 worker（services/osm_queue.py）。
+    `GEO_OSM_ASYNC` ∈ {0,false,no,off} → 退回 request 內序列查詢（每址最多兩次 × 1 秒）。"""
+    return os.getenv("GEO_OSM_ASYNC", "1").strip().lower() not in {"0", "false", "no", "off"}
+
+
+def _osm_inline_max() -> int:
+    """不寫 DB 的解析（parse-only / 預覽）在 request 內序列查 OSM 的地址數上限
+    （env `GEO_OSM_INLINE_MAX`，預設 10，0 = 全部交給背景 worker，合理 0~200，非法 fallback 10）。
+
+    背景 worker 只回填 raw_traces；不落地的預覽拿不到事後的座標，只有 OSM 查得到的地址
+    會整批顯示為未定位。保留一小段 request 內備援（每址最壞約 2 秒），其餘照常排入佇列
+    （查到後寫入快取，下次預覽即命中）。
+    """
+    return env_int("GEO_OSM_INLINE_MAX", 10, 0, 200)
+
+
+class OsmInlineBudget:
+    """一次解析（跨塊）共用的 request 內 OSM 查詢額度；lookup_bulk 每用一址扣一。"""
+
+    __slots__ = ("left",)
+
+    def __init__(self, n: int):
+        self.left = max(int(n), 0)
+
+    def take(self, want: int) -> int:
+        k = min(self.left, max(want, 0))
+        self.left -= k
+        return k
+
+
 OSM_URL = "https://nominatim.openstreetmap.org/search"
 OSM_EMAIL = os.getenv("NOMINATIM_EMAIL", "")
 
-def _osm_geocode(addr: str) -> Optional[Tuple[float, float]]:
+def _osm_geocode(addr: str, transient: Optional[set] = None) -> Optional[Tuple[float, float]]:
     """
     OSM Nominatim 備援，兩段式查詢：
     Pass 1 — 自由格式（q=addr）：對較知名地點有效。
     Pass 2 — 結構化（city + street）：Nominatim 對台灣中文地址的自由格式命中率低，
              但結構化查詢且街道號碼置前（e.g. "211號中正四路"）可大幅提升命中率。
              實測：自由格式 0/3，結構化 1/1（高雄市前金區中正四路211號）。
+    請求例外（含 429）把 addr 加進 transient（同 _google_geocode）。
     """
     if not USE_OSM:
         return None
@@ -206,6 +620,8 @@ def _osm_geocode(addr: str) -> Optional[Tuple[float, float]]:
                 return float(data[0]["lat"]), float(data[0]["lon"])
         except Exception as e:
             print(f"[geocode] OSM 例外: {type(e).__name__}: {e} addr={addr!r}")
+            if transient is not None:
+                transient.add(addr)     # 含 429：暫時性失敗，不可記負快取
         finally:
             # 節流必須對「每一次送出的請求」生效（2026-07-21 修）。
             # 原本 sleep 寫在 `if data:` 內 → **只有命中才節流**，而未命中是多數
@@ -239,10 +655,42 @@ def _osm_geocode(addr: str) -> Optional[Tuple[float, float]]:
     print(f"[geocode] OSM 查無結果 addr={addr!r}")
     return None
 
+def resolve_osm(addr: str, neg_ok: bool = True) -> Tuple[str, Optional[Tuple[float, float]]]:
+    """
+    背景 OSM worker 用：查一個（已清洗的）地址並寫回各層快取。
+      - ("ok", (lat, lng))：寫 Redis / SQL / LRU 正快取
+      - ("none", None)：OSM 明確查無；neg_ok（排入時 Google 沒有暫時性失敗）才記負快取
+      - ("transient", None)：逾時 / 429 等，呼叫端稍後重試
+    節流仍由 _osm_geocode 內每次請求後的 1 秒 sleep 負責；worker 全域只有一個在跑。
+    """
+    transient: set = set()
+    with _m_tier_seconds.time(tier="osm"):
+        ll = _osm_geocode(addr, transient)
+    _count("osm_call")
+    _tier_keys("osm", hit=1 if ll else 0, miss=0 if ll else 1)
+    if ll:
+        _count("osm_hit")
+        _cache_set(addr, ll[0], ll[1])
+        _sql_cache_set_bulk([(addr, ll[0], ll[1])])
+        _mem_put(addr, ll)
+        return "ok", ll
+    if addr in transient:
+        return "transient", None
+    if neg_ok:
+        _count("neg_stored")
+        _sql_cache_set_bulk([(addr, None, None)])
+        _mem_put(addr, None)
+    return "none", None
+
+
 # ---------- cell_id 本地對照（查 cell_towers 表） ----------
+# 2026-10：優先查行程內常駐索引（tower_index，版本戳觸發重載），不再逐列打 DB；
+# 索引停用（CELL_TOWER_INDEX=0）或從未載入成功時才退回下面的 SQL。
 def _lookup_from_local(cell_id: Optional[str], addr: Optional[str]) -> Optional[Tuple[float, float]]:
     if not cell_id or not str(cell_id).strip():
         return None
+    if tower_index.available():
+        return tower_index.get(cell_id)
     try:
         from app.db.session import get_conn  # lazy import：避免 test 環境循環依賴
         with get_conn() as conn:
@@ -262,11 +710,13 @@ def _lookup_from_local(cell_id: Optional[str], addr: Optional[str]) -> Optional[
 # ---------- 對外 API ----------
 def lookup(cell_id: Optional[str], cell_addr: Optional[str]) -> Optional[Tuple[float, float]]:
     """
-    查詢順序：本地對照 → 地址清洗 → Redis 快取 → Google → OSM 備援
+    查詢順序：本地對照 → 地址清洗 → 行程內 LRU → Redis 快取 → SQL 快取 → Google → OSM 備援
     失敗（無法定位）回 None；上層（ingest）可依此決定要不要跳過該筆。
 
     排查盲點小抄：
-      - 同一個地址如果先前被快取為失敗，這裡不會重試（目前快取只存成功值）
+      - Google / OSM 都「明確查無」的地址會記負快取（LRU + geocode_cache status='neg'），
+        GEO_NEG_TTL_SEC（預設 7 天）內不重打；逾時 / 配額 / 429 等暫時性失敗不記
+      - 改了對照資料想立即重查：reset_cache() 清 LRU；負快取列可直接從 geocode_cache 刪
       - 若 Google 一直回 REQUEST_DENIED，通常是 API key 未啟用 Geocoding API
         或設了 Referer/IP 限制，需到 GCP Console → APIs & Services → Credentials 檢查
       - OSM 備援預設關閉（GEO_OSM_FALLBACK=1 才會啟用）
@@ -274,9 +724,10 @@ def lookup(cell_id: Optional[str], cell_addr: Optional[str]) -> Optional[Tuple[f
     # 1) 本地對照
     ll = _lookup_from_local(cell_id, cell_addr)
     if ll:
+        _count("local_hit")
         return ll
 
-    # 2) 地址 → 清洗 → 快取 → Google → OSM
+    # 2) 地址 → 清洗 → LRU → Redis → SQL → Google → OSM
     addr = _simplify_addr(cell_addr or "")
     if not addr:
         # 沒地址、也沒本地對照資料，就只能放棄
@@ -284,37 +735,80 @@ def lookup(cell_id: Optional[str], cell_addr: Optional[str]) -> Optional[Tuple[f
             print(f"[geocode] 地址清洗後為空，放棄：raw={cell_addr!r}")
         return None
 
+    hit, ll = _mem_get(addr)
+    if hit:
+        return ll
     ll = _cache_get(addr)
+    if _r is not None:
+        _count("redis_hit" if ll else "redis_miss")
     if ll:
+        _mem_put(addr, ll)
         return ll
-    # SQL 持久快取（無 Redis 時的後盾）
+    # SQL 持久快取（無 Redis 時的後盾）；值為 None = 未過期的負快取
     sql = _sql_cache_get_bulk([addr])
     if addr in sql:
-        _cache_set(addr, *sql[addr])
-        return sql[addr]
+        ll = sql[addr]
+        _count("sql_hit" if ll else "sql_neg_hit")
+        if ll:
+            _cache_set(addr, *ll)
+        _mem_put(addr, ll)
+        return ll
+    _count("sql_miss")
 
-    ll = _google_geocode(addr) or _osm_geocode(addr)
+    transient: set = set()
+    if _google_enabled():
+        _count("google_call")
+    ll = _google_geocode(addr, transient)
+    if ll:
+        _count("google_hit")
+    else:
+        if USE_OSM:
+            _count("osm_call")
+        ll = _osm_geocode(addr, transient)
+        if ll:
+            _count("osm_hit")
     if ll:
         _cache_set(addr, ll[0], ll[1])
         _sql_cache_set_bulk([(addr, ll[0], ll[1])])
+        _mem_put(addr, ll)
     else:
         # 兩個來源都敗：印一條彙總訊息，對照前面 Google/OSM 個別的錯誤
         print(f"[geocode] 所有來源均無結果 addr={addr!r}")
+        if _neg_eligible(addr, transient):
+            _count("neg_stored")
+            _sql_cache_set_bulk([(addr, None, None)])
+            _mem_put(addr, None)
     return ll
 
 
 # ---------- 批次查詢（ingest 大檔上傳用，避免逐筆 round-trip） ----------
+def _observe_tier(tier: str, t0: float) -> float:
+    """記一筆該層耗時（秒）進 histogram；回傳毫秒供 log。"""
+    dt = time.perf_counter() - t0
+    _m_tier_seconds.observe(dt, tier=tier)
+    return round(dt * 1000, 1)
+
+
 def lookup_bulk(
     unique_keys: List[Tuple[Optional[str], Optional[str]]],
+    osm_inline: Optional[OsmInlineBudget] = None,
 ) -> Dict[Tuple[Optional[str], Optional[str]], Optional[Tuple[float, float]]]:
     """
     批次解析 (cell_id, cell_addr) → (lat, lng)。
     優化重點（查詢順序，逐層收斂）：
-      1. 本地 cell_towers 一次 SQL `ANY()` 全撈
-      2. Redis 一次 MGET 批次（雲端通常無 Redis，視為選配）
-      3. SQL geocode_cache 一次 `ANY()` 批次讀（跨請求持久快取）
-      4. 仍未命中 → 並行打 Google（ThreadPool），失敗者序列 OSM 備援
-      5. 成功結果增量寫回 SQL 快取（逾時被切也保住已完成的）
+      1. 本地 cell_towers：行程內常駐索引（tower_index）一次查完；索引不可用才 SQL `ANY()`
+      2. 行程內 LRU（含負快取；不出 process）
+      3. Redis 一次 MGET 批次（雲端通常無 Redis，視為選配）
+      4. SQL geocode_cache 一次 `ANY()` 批次讀（跨請求持久快取；含未過期負快取）
+      5. 仍未命中 → 並行打 Google（geocode_client 非同步引擎；GEO_GOOGLE_ASYNC=0 或
+         無 httpx 時退回 ThreadPool），失敗者排入背景 OSM worker（本次回 None，
+         之後回填；GEO_OSM_ASYNC=0 時改為 request 內序列 OSM 備援）
+      6. 成功結果增量寫回 SQL 快取（逾時被切也保住已完成的）；
+         兩來源都明確查無者記負快取（GEO_NEG_TTL_SEC 內不再重打）
+    各層命中數累計進 cache_stats()。
+
+    osm_inline（不寫 DB 的呼叫端才傳）：背景模式下先在 request 內序列查額度內的地址，
+    其餘才排入佇列（見 _osm_inline_max）。
 
     回傳 dict：key 為原始 (cell_id, cell_addr)，值為 (lat, lng) 或 None。
     """
@@ -324,15 +818,23 @@ def lookup_bulk(
         return result
 
     _t_start = _time.perf_counter()
+    ms_local = ms_mem = ms_redis = ms_sql = ms_google = ms_osm = None
     n_local_hit = 0
     n_redis_hit = 0
     n_google_call = 0
     n_no_addr = 0
 
     # ── Step 1: 本地 cell_towers 一次撈 ─────────────────────────
+    _t = _time.perf_counter()
     cell_ids = list({k[0] for k in unique_keys if k[0]})
     local_map: Dict[str, Tuple[float, float]] = {}
-    if cell_ids:
+    if cell_ids and tower_index.available():
+        towers = tower_index.get_many(cell_ids)
+        for cid in cell_ids:
+            ll = towers.get(str(cid).strip())
+            if ll is not None:
+                local_map[str(cid)] = ll
+    elif cell_ids:
         try:
             from app.db.session import get_conn
             with get_conn() as conn, conn.cursor() as cur:
@@ -345,11 +847,15 @@ def lookup_bulk(
                     local_map[str(row[0])] = (float(row[1]), float(row[2]))
         except Exception as e:
             print(f"[bulk_geocode] local lookup error: {type(e).__name__}: {e}")
+    if cell_ids:
+        ms_local = _observe_tier("local", _t)
 
     # ── Step 2: 拆分尚未解決的，準備地址清洗 ──────────────────────
+    _t = _time.perf_counter()
     pending: List[Tuple[Tuple[Optional[str], Optional[str]], str]] = []  # (orig_key, simplified)
     addr_keys: List[str] = []                                            # Redis keys for MGET
 
+    n_mem_hit = 0
     for k in unique_keys:
         cell_id, cell_addr = k
         # 先嘗試本地
@@ -363,12 +869,25 @@ def lookup_bulk(
             result[k] = None
             n_no_addr += 1
             continue
+        # 行程內 LRU：成功值或未過期負快取都直接用
+        hit, ll = _mem_get(simplified)
+        if hit:
+            result[k] = ll
+            n_mem_hit += 1
+            continue
         pending.append((k, simplified))
         addr_keys.append(f"addr:{simplified}")
+    _count("local_hit", n_local_hit)
+    _tier_keys("local", hit=n_local_hit,
+               miss=sum(1 for k in unique_keys if k[0]) - n_local_hit)
+    if n_mem_hit or pending:
+        ms_mem = _observe_tier("mem", _t)
+        _tier_keys("mem", hit=n_mem_hit, miss=len(pending))
 
     # ── Step 3: Redis 一次 MGET ─────────────────────────────────
     redis_hits: Dict[str, Tuple[float, float]] = {}
     if addr_keys and _r is not None:
+        _t = _time.perf_counter()
         try:
             values = _r.mget(addr_keys)
             for ak, v in zip(addr_keys, values):
@@ -381,6 +900,7 @@ def lookup_bulk(
                     pass
         except Exception as e:
             print(f"[bulk_geocode] redis mget error: {type(e).__name__}: {e}")
+        ms_redis = _observe_tier("redis", _t)
 
     # ── Step 4: 解析 pending：Redis 有就用、沒有的進下一關 ────
     after_redis: List[Tuple[Tuple[Optional[str], Optional[str]], str]] = []
@@ -389,28 +909,44 @@ def lookup_bulk(
         if ak in redis_hits:
             result[orig_key] = redis_hits[ak]
             n_redis_hit += 1
+            _mem_put(simplified, redis_hits[ak])
         else:
             after_redis.append((orig_key, simplified))
+    if _r is not None:
+        _count("redis_hit", n_redis_hit)
+        _count("redis_miss", len(after_redis))
+        _tier_keys("redis", hit=n_redis_hit, miss=len(after_redis))
 
     # ── Step 4.5: SQL 持久快取批次讀（取代失效的雲端 Redis）──────
-    n_sql_hit = 0
+    n_sql_hit = n_sql_neg = 0
     miss_for_google: List[Tuple[Tuple[Optional[str], Optional[str]], str]] = []
     if after_redis:
+        _t = _time.perf_counter()
         sql_hits = _sql_cache_get_bulk(list({s for _, s in after_redis}))
+        ms_sql = _observe_tier("sql", _t)
         for orig_key, simplified in after_redis:
             if simplified in sql_hits:
-                result[orig_key] = sql_hits[simplified]
-                n_sql_hit += 1
-                # 順手回填 Redis（若有），下次更快
-                _cache_set(simplified, *sql_hits[simplified])
+                ll = sql_hits[simplified]
+                result[orig_key] = ll
+                _mem_put(simplified, ll)
+                if ll:
+                    n_sql_hit += 1
+                    # 順手回填 Redis（若有），下次更快
+                    _cache_set(simplified, *ll)
+                else:
+                    n_sql_neg += 1       # 未過期負快取：不再打 Google / OSM
             else:
                 miss_for_google.append((orig_key, simplified))
+        _count("sql_hit", n_sql_hit)
+        _count("sql_neg_hit", n_sql_neg)
+        _count("sql_miss", len(miss_for_google))
+        _tier_keys("sql", hit=n_sql_hit, neg=n_sql_neg, miss=len(miss_for_google))
 
     # ── Step 5: 未命中 → Google（並行）→ 仍失敗者 OSM（序列）+ 寫回 cache ──
     # 去重：不同 orig_key 可能清洗成同一 simplified（同址不同 cell_id）→ 只打一次。
     uniq_simplified = list({s for _, s in miss_for_google})
     geo_map: Dict[str, Optional[Tuple[float, float]]] = {}
-    n_osm_call = 0
+    n_osm_call = n_neg = n_osm_queued = 0
 
     if uniq_simplified:
         import concurrent.futures as _cf
@@ -420,11 +956,14 @@ def lookup_bulk(
         # 整批白做、重傳從零開始。增量 flush 讓「已完成的地址」確實落地，重傳跳過、
         # 漸進收斂至成功。
         _FLUSH_EVERY = 100
-        pending_writes: List[Tuple[str, float, float]] = []
+        pending_writes: List[Tuple[str, Optional[float], Optional[float]]] = []
+        # 本次呼叫的暫時性失敗（見 _neg_eligible）；Google ThreadPool 各 worker 只做 set.add
+        transient: set = set()
 
         def _record(s: str, ll: Optional[Tuple[float, float]]):
             geo_map[s] = ll
             if ll:
+                _mem_put(s, ll)
                 _cache_set(s, ll[0], ll[1])
                 pending_writes.append((s, ll[0], ll[1]))
                 if len(pending_writes) >= _FLUSH_EVERY:
@@ -434,10 +973,23 @@ def lookup_bulk(
         # Google：I/O bound，並行大幅縮短總時間（thread-safe：requests + 唯讀 GMAPS_KEY）。
         # **僅在 GEO_GOOGLE_ENABLED 啟用時執行**；關閉時完全跳過 ThreadPool、不提交任何
         # _google_geocode task → 硬止血、零 Google 請求（n_google_call 維持 0）。
-        if _google_enabled():
+        # 非同步引擎（預設）：共用 keep-alive 連線池，OVER_QUERY_LIMIT 時自動降速重試，
+        # 不再讓一次配額尖峰把整批打成失敗。
+        _t = _time.perf_counter()
+        if _google_enabled() and _google_async_enabled():
+            for s, status, ll in geocode_client.iter_geocode(
+                uniq_simplified,
+                endpoint=GMAPS_ENDPOINT, api_key=GMAPS_KEY, region=GMAPS_REGION,
+                language=GMAPS_LANG, concurrency=GEO_GOOGLE_CONCURRENCY,
+            ):
+                if status == geocode_client.FAIL:
+                    transient.add(s)        # 重試用盡 / 權限錯誤：不是「查無此址」
+                _record(s, ll)
+            n_google_call = len(uniq_simplified)
+        elif _google_enabled():
             workers = min(GEO_GOOGLE_CONCURRENCY, len(uniq_simplified))
             with _cf.ThreadPoolExecutor(max_workers=workers) as ex:
-                futs = {ex.submit(_google_geocode, s): s for s in uniq_simplified}
+                futs = {ex.submit(_google_geocode, s, transient): s for s in uniq_simplified}
                 for fut in _cf.as_completed(futs):
                     s = futs[fut]
                     try:
@@ -447,27 +999,80 @@ def lookup_bulk(
                         ll = None
                     _record(s, ll)
             n_google_call = len(uniq_simplified)
+        if n_google_call:
+            ms_google = _observe_tier("google", _t)
 
         # 尚未解出者（Google 關閉時=全部；啟用時=Google 失敗者）→ OSM 備援。**刻意序列**：
         # Nominatim 政策 1 req/s（_osm_geocode 內含 sleep），並行會違規且可能被 429 封。
+        n_google_hit = sum(1 for s in uniq_simplified if geo_map.get(s) is not None)
         osm_targets = [s for s in uniq_simplified if geo_map.get(s) is None]
-        for s in osm_targets:
-            _record(s, _osm_geocode(s))
-        n_osm_call = len(osm_targets)
+        deferred: set = set()
+        _t = _time.perf_counter()
+        if osm_targets and USE_OSM and _osm_async_enabled():
+            # 背景 worker 模式（預設）：不在 request 內 sleep —— 500 個未命中地址序列查
+            # 最壞要十幾分鐘。排入 geocode_osm_queue 後這些列先以無座標寫入，worker
+            # 以全域 1 req/s 查完再回填 raw_traces（/coverage 的 geocode_pending）。
+            from app.services import osm_queue
+
+            k = osm_inline.take(len(osm_targets)) if osm_inline is not None else 0
+            for s in osm_targets[:k]:
+                _record(s, _osm_geocode(s, transient))
+            n_osm_call = k
+            osm_targets_q = osm_targets[k:]
+            targets = set(osm_targets_q)
+            raw_by_addr: Dict[str, set] = {}
+            for (_cid, raw), s in miss_for_google:
+                if s in targets and raw:
+                    raw_by_addr.setdefault(s, set()).add(raw)
+            items = [(s, sorted(raw_by_addr.get(s, ())), s not in transient) for s in osm_targets_q]
+            n_osm_queued = osm_queue.enqueue(items) if items else 0
+            deferred = targets          # 排入失敗也不可記負快取：OSM 根本還沒問過
+            ms_osm = _observe_tier("osm_enqueue", _t)
+        else:
+            for s in osm_targets:
+                _record(s, _osm_geocode(s, transient))
+            n_osm_call = len(osm_targets) if USE_OSM else 0
+            if n_osm_call:
+                ms_osm = _observe_tier("osm", _t)
+        n_osm_hit = sum(1 for s in osm_targets if geo_map.get(s) is not None)
+
+        # 負快取：兩來源都明確查無（無暫時性失敗）者，LRU + SQL 各記一筆；
+        # 已排給 OSM worker 的由 worker 收尾時決定
+        misses = [s for s in uniq_simplified if geo_map.get(s) is None and s not in deferred]
+        negs = [s for s in misses if _neg_eligible(s, transient)]
+        for s in negs:
+            _mem_put(s, None)
+            pending_writes.append((s, None, None))
+        n_neg = len(negs)
 
         if pending_writes:
             _sql_cache_set_bulk(pending_writes)
 
+        _count("google_call", n_google_call)
+        _count("google_hit", n_google_hit)
+        _count("osm_call", n_osm_call)
+        _count("osm_hit", n_osm_hit)
+        _count("neg_stored", n_neg)
+        _count("osm_queued", n_osm_queued)
+        _tier_keys("google", hit=n_google_hit, miss=n_google_call - n_google_hit)
+        _tier_keys("osm", hit=n_osm_hit, miss=n_osm_call - n_osm_hit, queued=n_osm_queued)
+
     # 對應回所有 orig_key（含去重前的重複）
     for orig_key, simplified in miss_for_google:
         result[orig_key] = geo_map.get(simplified)
 
     _total = _time.perf_counter() - _t_start
-    print(
-        f"[bulk_geocode][timing] total={_total*1000:.0f}ms "
-        f"unique_keys={len(unique_keys)} "
-        f"local_hit={n_local_hit} redis_hit={n_redis_hit} sql_hit={n_sql_hit} "
-        f"google_calls={n_google_call} osm_calls={n_osm_call} "
-        f"google_workers={GEO_GOOGLE_CONCURRENCY} no_addr={n_no_addr}"
+    _m_bulk_seconds.observe(_total)
+    _m_bulk_keys.inc(len(unique_keys))
+    # 結構化單行（取代舊的 [bulk_geocode][timing] print）：各層 ms 直接看出慢在哪層
+    clog.log_info(
+        "geocode.bulk.done",
+        total_ms=round(_total * 1000, 1), unique_keys=len(unique_keys),
+        local_ms=ms_local, mem_ms=ms_mem, redis_ms=ms_redis, sql_ms=ms_sql,
+        google_ms=ms_google, osm_ms=ms_osm,
+        local_hit=n_local_hit, mem_hit=n_mem_hit, redis_hit=n_redis_hit,
+        sql_hit=n_sql_hit, sql_neg=n_sql_neg,
+        google_calls=n_google_call, osm_calls=n_osm_call, osm_queued=n_osm_queued,
+        neg_stored=n_neg, google_workers=GEO_GOOGLE_CONCURRENCY, no_addr=n_no_addr,
     )
     return result
\ No newline at end of file
@@ -0,0 +1,369 @@
+# backend/app/services/geocode_bundle.py
+"""
+geocode 快取 / 基地台對照表的匯出入包，與快取暖機（2026-10）。
+
+為什麼：新部署、或 Redis 掉了又把 DB 換新的環境，geocode_cache 是空的；第一批大檔
+上傳時每個地址都得打 Google —— 正是 geocode.py 開頭記的 502 情境。把既有環境累積
+的快取與 cell_towers 打包帶過去，或在開機時先把近期案件的地址解一遍，冷啟動就不必
+在使用者的 request 裡付這筆成本。
+
+包格式（gzip 文字串流，一行一筆，逐行讀寫、記憶體與包大小無關）：
+    {"format": "celltrail-geocode-bundle", "version": 1, "created_at": …, "sections": […]}
+    @section geocode_cache addr,addr_norm,lat,lng,status,created_at
+    <COPY TEXT 格式的列…>
+    \\.
+    @section cell_towers cell_id,lat,lng,carrier_name,source,memo
+    …
+    \\.
+    @end {"geocode_cache": n, "cell_towers": m}
+資料列就是 PostgreSQL `COPY … TO STDOUT` 的原樣輸出（換行 / tab 已跳脫），匯入時原樣
+`COPY … FROM STDIN` 進 TEMP staging 表，再一次 set-based 合併。欄位清單寫在包裡但
+必須與本版完全相同才收；缺 @end 視為截斷、整包回滾。
+
+合併規則：
+  - geocode_cache：本地沒有的直接收；本地是負快取、包裡是成功值 → 覆蓋；本地成功值
+    一律不動（同 _sql_cache_set_bulk）。created_at 沿用包內值，負快取的 TTL 照算。
+    匯出時略過已過期的負快取。
+  - cell_towers：同 CSV 匯入（ON CONFLICT(cell_id) DO UPDATE），imported_by 記匯入者；
+    有異動就在同一交易 bump 版本號，提交後 invalidate 常駐索引。
+  - 座標範圍把關同 CSV 匯入：超出範圍的列不收、計入 skipped。
+
+暖機（warmup）：近 GEOCODE_WARMUP_DAYS 天、未軟刪、cell_id 不在對照表內的 raw_traces
+地址，依出現列數由多到少取前 GEOCODE_WARMUP_MAX_ADDRS 個，normalize_addr 去重後分塊
+丟給 geocode.lookup_bulk —— 已有快取的只是一次快取命中，真正打 Google 的只有冷的那些，
+速率照 geocode_client 的自適應節流。GEOCODE_WARMUP_ON_START=1 時 main.py 開機即在
+背景執行緒跑一次；也可由 POST /api/admin/geocode/warmup 或 scripts/geocode_bundle.py
+觸發。同一 process 同時只跑一個。
+
+所有 cur.execute 帶 prepare=False。
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import IO, Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core import logging_utils as clog
+from app.core.env import env_int
+from app.db.session import get_conn
+from app.services import geocode, tower_index
+
+BUNDLE_FORMAT = "celltrail-geocode-bundle"
+BUNDLE_VERSION = 1
+
+# section → (匯出 SELECT, staging 欄位定義)；欄位順序即包內欄位順序
+_SECTIONS: Dict[str, Tuple[str, Tuple[Tuple[str, str], ...]]] = {
+    "geocode_cache": (
+        "SELECT addr, addr_norm, lat, lng, status, created_at FROM geocode_cache "
+        "WHERE status = 'ok' OR created_at > now() - make_interval(secs => {neg_ttl}) ORDER BY addr",
+        (("addr", "text"), ("addr_norm", "text"), ("lat", "float8"), ("lng", "float8"),
+         ("status", "text"), ("created_at", "timestamptz")),
+    ),
+    "cell_towers": (
+        "SELECT cell_id, lat, lng, carrier_name, source, memo FROM cell_towers ORDER BY cell_id",
+        (("cell_id", "text"), ("lat", "float8"), ("lng", "float8"),
+         ("carrier_name", "text"), ("source", "text"), ("memo", "text")),
+    ),
+}
+SECTIONS = tuple(_SECTIONS)
+
+_END_OF_DATA = b"\\.\n"
+_COORD_OK = "lat BETWEEN -90 AND 90 AND lng BETWEEN -180 AND 180"
+
+
+def _cols(section: str) -> List[str]:
+    return [c for c, _ in _SECTIONS[section][1]]
+
+
+# ── 匯出 ───────────────────────────────────────────────────
+def export_bundle(out: IO[bytes], sections: Sequence[str] = SECTIONS) -> Dict[str, int]:
+    """把指定 sections 寫成 gzip 包到 out（可寫的 binary 檔）；回傳各 section 列數。"""
+    unknown = [s for s in sections if s not in _SECTIONS]
+    if unknown:
+        raise ValueError(f"未知的 section：{', '.join(unknown)}")
+    if "geocode_cache" in sections and not geocode._ensure_sql_cache():
+        raise RuntimeError("geocode_cache 表無法使用")
+
+    t0 = time.perf_counter()
+    counts: Dict[str, int] = {}
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "version": BUNDLE_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "sections": list(sections),
+    }
+    with gzip.GzipFile(fileobj=out, mode="wb", compresslevel=6) as gz:
+        gz.write(json.dumps(manifest, ensure_ascii=False).encode("utf-8") + b"\n")
+        with get_conn() as conn, conn.cursor() as cur:
+            for section in sections:
+                select = _SECTIONS[section][0].format(neg_ttl=int(geocode._neg_ttl_sec()))
+                gz.write(f"@section {section} {','.join(_cols(section))}\n".encode("utf-8"))
+                n = 0
+                with cur.copy(f"COPY ({select}) TO STDOUT") as cp:
+                    for chunk in cp:
+                        data = bytes(chunk)
+                        n += data.count(b"\n")
+                        gz.write(data)
+                gz.write(_END_OF_DATA)
+                counts[section] = n
+        gz.write(b"@end " + json.dumps(counts).encode("utf-8") + b"\n")
+
+    clog.log_info("geocode.bundle.exported", ms=round((time.perf_counter() - t0) * 1000, 1), **counts)
+    return counts
+
+
+# ── 匯入 ───────────────────────────────────────────────────
+def _read_manifest(gz: IO[bytes]) -> Dict[str, Any]:
+    try:
+        manifest = json.loads(gz.readline().decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError("不是 geocode 匯出包（檔頭無法解析）")
+    if not isinstance(manifest, dict) or manifest.get("format") != BUNDLE_FORMAT:
+        raise ValueError("不是 geocode 匯出包（format 不符）")
+    if manifest.get("version") != BUNDLE_VERSION:
+        raise ValueError(f"不支援的匯出包版本：{manifest.get('version')}")
+    return manifest
+
+
+def _parse_section_header(line: bytes) -> str:
+    parts = line.decode("utf-8").rstrip("\n").split(" ")
+    if len(parts) != 3 or parts[0] != "@section":
+        raise ValueError("匯出包格式錯誤（預期 @section）")
+    section, cols = parts[1], parts[2].split(",")
+    if section not in _SECTIONS:
+        raise ValueError(f"未知的 section：{section}")
+    if cols != _cols(section):
+        raise ValueError(f"section {section} 欄位不符：{','.join(cols)}")
+    return section
+
+
+def _stage_section(cur, gz: IO[bytes], section: str) -> int:
+    """包內一個 section 的資料列原樣 COPY 進 TEMP staging 表；回傳列數。"""
+    defs = ", ".join(f"{c} {t}" for c, t in _SECTIONS[section][1])
+    cur.execute(f"CREATE TEMP TABLE _bundle_{section} ({defs}) ON COMMIT DROP", prepare=False)
+    n = 0
+    with cur.copy(f"COPY _bundle_{section} ({', '.join(_cols(section))}) FROM STDIN") as cp:
+        while True:
+            line = gz.readline()
+            if not line or not line.endswith(b"\n"):
+                raise ValueError(f"匯出包被截斷（section {section} 未結束）")
+            if line == _END_OF_DATA:
+                return n
+            cp.write(line)
+            n += 1
+
+
+def _merge_geocode_cache(cur) -> Tuple[int, int]:
+    """_bundle_geocode_cache → geocode_cache；回傳 (新增, 負快取被覆蓋成成功值)。"""
+    cur.execute(
+        f"""
+        WITH src AS (
+            SELECT DISTINCT ON (addr) addr, addr_norm, lat, lng, status, created_at
+              FROM _bundle_geocode_cache
+             WHERE addr IS NOT NULL AND addr <> ''
+               AND ((status = 'ok' AND {_COORD_OK})
+                    OR (status = 'neg' AND lat IS NULL AND lng IS NULL))
+             ORDER BY addr, (status = 'ok') DESC, created_at DESC
+        ), up AS (
+            INSERT INTO geocode_cache (addr, addr_norm, lat, lng, status, created_at)
+            SELECT addr, addr_norm, lat, lng, status, COALESCE(created_at, now()) FROM src
+            ON CONFLICT (addr) DO UPDATE
+                SET addr_norm = COALESCE(EXCLUDED.addr_norm, geocode_cache.addr_norm),
+                    lat = EXCLUDED.lat, lng = EXCLUDED.lng,
+                    status = 'ok', created_at = EXCLUDED.created_at
+                WHERE geocode_cache.status <> 'ok' AND EXCLUDED.status = 'ok'
+            RETURNING (xmax = 0) AS was_insert
+        )
+        SELECT count(*) FILTER (WHERE was_insert), count(*) FILTER (WHERE NOT was_insert) FROM up
+        """,
+        prepare=False,
+    )
+    row = cur.fetchone() or (0, 0)
+    return int(row[0] or 0), int(row[1] or 0)
+
+
+def _merge_cell_towers(cur, user_id) -> Tuple[int, int]:
+    """_bundle_cell_towers → cell_towers（同 CSV 匯入的 upsert）；回傳 (新增, 更新)。"""
+    cur.execute(
+        f"""
+        WITH src AS (
+            SELECT DISTINCT ON (cell_id) cell_id, lat, lng, carrier_name, source, memo
+              FROM _bundle_cell_towers
+             WHERE cell_id IS NOT NULL AND btrim(cell_id) <> '' AND {_COORD_OK}
+             ORDER BY cell_id
+        ), up AS (
+            INSERT INTO cell_towers (cell_id, lat, lng, carrier_name, source, memo, imported_by)
+            SELECT btrim(cell_id), lat, lng, carrier_name, source, memo, %s FROM src
+            ON CONFLICT (cell_id) DO UPDATE
+                SET lat=EXCLUDED.lat, lng=EXCLUDED.lng,
+                    carrier_name=EXCLUDED.carrier_name,
+                    source=EXCLUDED.source, memo=EXCLUDED.memo,
+                    imported_by=EXCLUDED.imported_by,
+                    imported_at=now()
+            RETURNING (xmax = 0) AS was_insert
+        )
+        SELECT count(*) FILTER (WHERE was_insert), count(*) FILTER (WHERE NOT was_insert) FROM up
+        """,
+        (user_id,),
+        prepare=False,
+    )
+    row = cur.fetchone() or (0, 0)
+    return int(row[0] or 0), int(row[1] or 0)
+
+
+def import_bundle(src: IO[bytes], user_id: Optional[int] = None) -> Dict[str, Dict[str, int]]:
+    """讀 gzip 包（可讀的 binary 檔）合併進 DB；整包單一交易，格式錯誤丟 ValueError 並回滾。
+
+    回傳 {section: {"rows", "inserted", "updated", "skipped"}}。
+    """
+    t0 = time.perf_counter()
+    result: Dict[str, Dict[str, int]] = {}
+    towers_changed = False
+    if not geocode._ensure_sql_cache():
+        raise RuntimeError("geocode_cache 表無法使用")
+
+    with gzip.GzipFile(fileobj=src, mode="rb") as gz:
+        _read_manifest(gz)
+        with get_conn() as conn:
+            with conn.transaction():
+                with conn.cursor() as cur:
+                    while True:
+                        line = gz.readline()
+                        if line.startswith(b"@end"):
+                            break
+                        if not line:
+                            raise ValueError("匯出包被截斷（缺 @end）")
+                        section = _parse_section_header(line)
+                        if section in result:
+                            raise ValueError(f"section {section} 重複")
+                        rows = _stage_section(cur, gz, section)
+                        if section == "geocode_cache":
+                            inserted, updated = _merge_geocode_cache(cur)
+                        else:
+                            inserted, updated = _merge_cell_towers(cur, user_id)
+                            if inserted or updated:
+                                tower_index.bump_version(cur)
+                                towers_changed = True
+                        result[section] = {
+                            "rows": rows, "inserted": inserted, "updated": updated,
+                            "skipped": rows - inserted - updated,
+                        }
+                    if "geocode_cache" in result:
+                        geocode._backfill_addr_norm(cur)      # 舊版匯出的列可能沒有 addr_norm
+    if towers_changed:
+        tower_index.invalidate()
+
+    clog.log_info(
+        "geocode.bundle.imported",
+        ms=round((time.perf_counter() - t0) * 1000, 1),
+        **{f"{s}_{k}": v for s, r in result.items() for k, v in r.items()},
+    )
+    return result
+
+
+# ── 暖機 ───────────────────────────────────────────────────
+_DEFAULT_WARMUP_DAYS = 30
+_DEFAULT_WARMUP_MAX_ADDRS = 20000
+_WARMUP_CHUNK = 500
+
+
+def warmup_days() -> int:
+    """暖機回看天數（env `GEOCODE_WARMUP_DAYS`，預設 30，合理 1~365）。"""
+    return env_int("GEOCODE_WARMUP_DAYS", _DEFAULT_WARMUP_DAYS, 1, 365)
+
+
+def _warmup_max_addrs() -> int:
+    """暖機最多解幾個相異地址（env `GEOCODE_WARMUP_MAX_ADDRS`，預設 20000，合理 100~1000000）。
+    冷地址每個都是一次 Google 計費呼叫，上限是費用的保險絲。"""
+    return env_int("GEOCODE_WARMUP_MAX_ADDRS", _DEFAULT_WARMUP_MAX_ADDRS, 100, 1000000)
+
+
+def warmup_on_start() -> bool:
+    return os.getenv("GEOCODE_WARMUP_ON_START", "0") == "1"
+
+
+def _recent_addrs(days: int, limit: int) -> List[str]:
+    """近 days 天、本地對照表解不到的 raw_traces 地址（正規化去重，熱門的在前）。"""
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT t.cell_addr
+              FROM raw_traces t
+             WHERE t.created_at > now() - make_interval(days => %s)
+               AND t.deleted_at IS NULL
+               AND t.cell_addr IS NOT NULL AND t.cell_addr <> ''
+               AND NOT EXISTS (SELECT 1 FROM cell_towers ct WHERE ct.cell_id = t.cell_id)
+             GROUP BY t.cell_addr
+             ORDER BY count(*) DESC
+             LIMIT %s
+            """,
+            (days, limit),
+            prepare=False,
+        )
+        rows = cur.fetchall()
+    seen: Dict[str, str] = {}
+    for (addr,) in rows:
+        k = geocode.normalize_addr(str(addr))
+        if k and k not in seen:
+            seen[k] = str(addr)
+    return list(seen.values())
+
+
+def warmup(days: Optional[int] = None, stop: Optional[threading.Event] = None) -> Dict[str, Any]:
+    """把近期案件的地址先解進各層快取；回傳統計。stop 事件被設起時在塊與塊之間停手。"""
+    days = days or warmup_days()
+    t0 = time.perf_counter()
+    addrs = _recent_addrs(days, _warmup_max_addrs())
+    resolved = unresolved = 0
+    stopped = False
+    for i in range(0, len(addrs), _WARMUP_CHUNK):
+        if stop is not None and stop.is_set():
+            stopped = True
+            break
+        out = geocode.lookup_bulk([(None, a) for a in addrs[i:i + _WARMUP_CHUNK]])
+        ok = sum(1 for v in out.values() if v is not None)
+        resolved += ok
+        unresolved += len(out) - ok
+    stats = {
+        "days": days,
+        "addrs": len(addrs),
+        "resolved": resolved,
+        "unresolved": unresolved,
+        "stopped": stopped,
+        "ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
+    clog.log_info("geocode.warmup.done", **stats)
+    return stats
+
+
+_warmup_lock = threading.Lock()
+_warmup_state: Dict[str, Any] = {"running": False}
+
+
+def warmup_status() -> Dict[str, Any]:
+    return dict(_warmup_state)
+
+
+def start_warmup(days: Optional[int] = None) -> bool:
+    """背景執行緒跑一次 warmup；已有一個在跑 → False。"""
+    if not _warmup_lock.acquire(blocking=False):
+        return False
+    _warmup_state.clear()
+    _warmup_state.update(running=True, started_at=datetime.now(timezone.utc).isoformat())
+
+    def _run():
+        try:
+            _warmup_state.update(warmup(days))
+        except Exception as e:
+            _warmup_state["error"] = f"{type(e).__name__}: {e}"
+            clog.log_error("geocode.warmup.failed", error=_warmup_state["error"])
+        finally:
+            _warmup_state.update(running=False, finished_at=datetime.now(timezone.utc).isoformat())
+            _warmup_lock.release()
+
+    threading.Thread(target=_run, name="geocode-warmup", daemon=True).start()
+    return True
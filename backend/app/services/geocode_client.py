@@ -0,0 +1,334 @@
+# backend/app/services/geocode_client.py
+"""
+Google Geocoding 非同步批次引擎（2026-10）。
+
+為什麼：lookup_bulk 原本每個地址在 ThreadPool 裡各打一次 requests.get ——
+沒有連線重用（每筆一次 TCP + TLS 握手）、也不理會 OVER_QUERY_LIMIT（撞到配額
+就整批失敗、只能等下次重傳）。這裡改成：
+
+  - 一條常駐的背景 event loop 執行緒 + 一個共用 httpx.AsyncClient
+    → 連線池跨批次、跨請求保留（keep-alive），大檔不再為每個地址握手
+  - AdaptiveTokenBucket 控制送出速率：起跑 GEO_GOOGLE_QPS；收到 OVER_QUERY_LIMIT /
+    429 → 以「實際觀測到的 QPS」減半（同一秒內多筆同時撞牆只減一次），成功後線性爬回
+  - 可重試的失敗（OVER_QUERY_LIMIT、UNKNOWN_ERROR、429、5xx、連線錯誤）以指數退避 +
+    full jitter 重試 GEO_GOOGLE_RETRIES 次；REQUEST_DENIED / INVALID_REQUEST 不重試
+
+結果三態：OK（有座標）/ ZERO（Google 明確查無，可記負快取）/ FAIL（其餘，不可記負快取）。
+同步呼叫端（lookup_bulk，本身可能跑在 ingest 管線的 worker thread）用 iter_geocode()
+逐筆取回結果；request_id 等 contextvars 會帶進 event loop 的 task。
+
+httpx 為選配：沒裝時 available() 回 False，geocode.py 退回原本的 ThreadPool 路徑。
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import queue
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+try:
+    import httpx  # optional
+except Exception:
+    httpx = None
+
+from app.core.env import env_float, env_int
+from app.core.logging_utils import log_info
+
+OK, ZERO, FAIL = "ok", "zero", "fail"
+_RETRY = "retry"
+
+# 退避：第 n 次重試等 uniform(0, min(cap, base * 2**n)) 秒（full jitter，避免同步重撞）
+_BACKOFF_BASE = 0.5
+_BACKOFF_CAP = 8.0
+
+_RETRYABLE_STATUS = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
+
+# 降速下限：再怎麼撞配額也維持 1 QPS 探測，恢復後才爬得回來
+_MIN_QPS = 1.0
+
+
+def _google_qps() -> float:
+    """GEO_GOOGLE_QPS：送出速率上限（亦為起跑速率）。Google 預設配額約 50 QPS，留邊際取 40。"""
+    return env_float("GEO_GOOGLE_QPS", 40.0, 1.0, 500.0)
+
+
+def _google_retries() -> int:
+    """GEO_GOOGLE_RETRIES：可重試失敗的最多重試次數（0 = 不重試）。"""
+    return env_int("GEO_GOOGLE_RETRIES", 3, 0, 8)
+
+
+def available() -> bool:
+    return httpx is not None
+
+
+class AdaptiveTokenBucket:
+    """
+    只在 event loop 執行緒內使用（不加鎖）。
+
+    rate 在 [min_rate, max_rate] 間調整：
+      - on_throttle()：rate = max(min_rate, min(rate, 觀測 QPS) × 0.5)、清空 token；
+        throttle_window 秒內只減一次（並行中的多筆同時收到 OVER_QUERY_LIMIT 是同一事件）
+      - on_success()：rate += max_rate × 1%（約 50 次成功從半速爬回全速）
+    """
+
+    def __init__(self, rate: float, *, min_rate: float = 1.0, burst: Optional[float] = None,
+                 throttle_window: float = 1.0, clock=time.monotonic):
+        self.max_rate = float(rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.rate = self.max_rate
+        self.capacity = burst if burst is not None else max(1.0, self.max_rate / 4)
+        self.tokens = self.capacity
+        self.throttles = 0
+        self._window = throttle_window
+        self._clock = clock
+        self._stamp = clock()
+        self._last_cut = float("-inf")
+        self._grants: deque = deque()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def try_acquire(self) -> float:
+        """拿到 token 回 0；否則回建議等待秒數。"""
+        now = self._clock()
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self._grants.append(now)
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self) -> None:
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def observed_qps(self) -> float:
+        now = self._clock()
+        while self._grants and self._grants[0] <= now - self._window:
+            self._grants.popleft()
+        return len(self._grants) / self._window
+
+    def on_throttle(self) -> None:
+        now = self._clock()
+        if now - self._last_cut < self._window:
+            return
+        self._last_cut = now
+        self.throttles += 1
+        observed = self.observed_qps() or self.rate
+        self.rate = max(self.min_rate, min(self.rate, observed) * 0.5)
+        self._refill(now)
+        self.tokens = 0.0
+
+    def on_success(self) -> None:
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.01)
+
+
+class GoogleGeocodeClient:
+    """共用連線池 + 速率控制 + 重試。必須在同一個 event loop 內使用。"""
+
+    def __init__(self, endpoint: str, api_key: str, *, region: str, language: str,
+                 concurrency: int, qps: float, retries: int, timeout: float = 12.0, transport=None):
+        self.endpoint = endpoint
+        self.retries = retries
+        self._params = {"key": api_key, "region": region, "language": language}
+        self._sem = asyncio.Semaphore(concurrency)
+        self._http = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+            transport=transport,
+        )
+        self.bucket = AdaptiveTokenBucket(qps, min_rate=_MIN_QPS, burst=max(1.0, min(float(concurrency), qps)))
+        self.stats: Dict[str, int] = {"requests": 0, "retries": 0, "ok": 0, "zero": 0, "fail": 0}
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+    async def geocode(self, addr: str) -> Tuple[str, Optional[Tuple[float, float]]]:
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.stats["retries"] += 1
+                await asyncio.sleep(random.uniform(0, min(_BACKOFF_CAP, _BACKOFF_BASE * 2 ** (attempt - 1))))
+            async with self._sem:
+                await self.bucket.acquire()
+                self.stats["requests"] += 1
+                status, ll = await self._once(addr)
+            if status != _RETRY:
+                self.stats[status] += 1
+                return status, ll
+        print(f"[geocode] Google 重試 {self.retries} 次仍失敗 addr={addr!r}")
+        self.stats[FAIL] += 1
+        return FAIL, None
+
+    async def _once(self, addr: str) -> Tuple[str, Optional[Tuple[float, float]]]:
+        try:
+            r = await self._http.get(self.endpoint, params={"address": addr, **self._params})
+        except httpx.HTTPError as e:
+            print(f"[geocode] Google 連線例外: {type(e).__name__}: {e} addr={addr!r}")
+            return _RETRY, None
+        if r.status_code == 429:
+            self.bucket.on_throttle()
+            return _RETRY, None
+        if r.status_code >= 500:
+            return _RETRY, None
+        if r.status_code >= 400:
+            print(f"[geocode] Google HTTP {r.status_code} addr={addr!r}")
+            return FAIL, None
+        try:
+            j = r.json()
+            status = j.get("status")
+            if status == "OK" and j.get("results"):
+                loc = j["results"][0]["geometry"]["location"]
+                self.bucket.on_success()
+                return OK, (float(loc["lat"]), float(loc["lng"]))
+        except Exception as e:
+            print(f"[geocode] Google 回應無法解析: {type(e).__name__}: {e} addr={addr!r}")
+            return FAIL, None
+        if status == "ZERO_RESULTS":
+            self.bucket.on_success()
+            return ZERO, None
+        if status == "OVER_QUERY_LIMIT":
+            self.bucket.on_throttle()
+        if status in _RETRYABLE_STATUS:
+            return _RETRY, None
+        print(
+            f"[geocode] Google 非 OK: status={status!r} "
+            f"error_message={j.get('error_message')!r} addr={addr!r}"
+        )
+        return FAIL, None
+
+
+# ---------- 常駐 event loop + 共用 client ----------
+# client 綁在這條 loop 上；設定（endpoint / key / 併發 / QPS）變了才重建，否則跨批次沿用
+# 連線池與 bucket 的速率狀態（上一批撞過配額，下一批不會又從全速起跑）。
+_engine_lock = threading.Lock()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_client: Optional[GoogleGeocodeClient] = None
+_client_sig: Optional[tuple] = None
+
+
+def _ensure_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None or not _loop.is_running():
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def _run():
+            asyncio.set_event_loop(loop)
+            loop.call_soon(ready.set)
+            loop.run_forever()
+
+        threading.Thread(target=_run, name="geocode-loop", daemon=True).start()
+        ready.wait()
+        _loop = loop
+    return _loop
+
+
+def _run_on_loop(loop: asyncio.AbstractEventLoop, coro):
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def _get_client(sig: tuple, **kw) -> Tuple[asyncio.AbstractEventLoop, GoogleGeocodeClient]:
+    global _client, _client_sig
+    with _engine_lock:
+        loop = _ensure_loop()
+        if _client is None or _client_sig != sig:
+            old = _client
+
+            async def _make():
+                if old is not None:
+                    await old.aclose()
+                return GoogleGeocodeClient(**kw)
+
+            _client = _run_on_loop(loop, _make())
+            _client_sig = sig
+        return loop, _client
+
+
+def reset_engine() -> None:
+    """關閉共用 client（測試、或改了 key / endpoint 後想立即重建時用）。loop 執行緒保留。"""
+    global _client, _client_sig
+    with _engine_lock:
+        if _client is not None and _loop is not None and _loop.is_running():
+            _run_on_loop(_loop, _client.aclose())
+        _client = None
+        _client_sig = None
+
+
+def iter_geocode(
+    addrs: Iterable[str],
+    *,
+    endpoint: str,
+    api_key: str,
+    region: str,
+    language: str,
+    concurrency: int,
+) -> Iterator[Tuple[str, str, Optional[Tuple[float, float]]]]:
+    """
+    依完成順序逐筆回 (addr, OK|ZERO|FAIL, (lat, lng) | None)。
+
+    呼叫端在自己的執行緒消化結果（寫快取、增量 flush SQL），不佔用 event loop。
+    提早結束迭代（例外 / close）會取消尚未完成的查詢。
+    """
+    addrs = list(addrs)
+    if not addrs:
+        return
+    qps, retries = _google_qps(), _google_retries()
+    sig = (endpoint, api_key, region, language, concurrency, qps, retries)
+    loop, client = _get_client(
+        sig, endpoint=endpoint, api_key=api_key, region=region, language=language,
+        concurrency=concurrency, qps=qps, retries=retries,
+    )
+    before = dict(client.stats)
+    throttles_before = client.bucket.throttles
+    t0 = time.perf_counter()
+    out: "queue.Queue" = queue.Queue()
+    done = object()
+
+    async def _one(a: str):
+        try:
+            status, ll = await client.geocode(a)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[geocode] Google 非預期例外: {type(e).__name__}: {e} addr={a!r}")
+            status, ll = FAIL, None
+        out.put((a, status, ll))
+
+    async def _all():
+        try:
+            await asyncio.gather(*(_one(a) for a in addrs))
+        finally:
+            out.put(done)
+
+    # 帶上呼叫端的 contextvars（request_id），log 才對得回請求
+    ctx = contextvars.copy_context()
+    task_box: list = []
+    loop.call_soon_threadsafe(lambda: task_box.append(loop.create_task(_all(), context=ctx)))
+
+    try:
+        while True:
+            item = out.get()
+            if item is done:
+                break
+            yield item
+    finally:
+        if task_box and not task_box[0].done():
+            loop.call_soon_threadsafe(task_box[0].cancel)
+        delta = {k: client.stats[k] - before.get(k, 0) for k in client.stats}
+        log_info(
+            "geocode.google.batch",
+            addrs=len(addrs),
+            throttles=client.bucket.throttles - throttles_before,
+            rate_qps=round(client.bucket.rate, 1),
+            elapsed_ms=int((time.perf_counter() - t0) * 1000),
+            **delta,
+        )
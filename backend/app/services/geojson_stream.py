@@ -0,0 +1,316 @@
+# backend/app/services/geojson_stream.py
+"""
+地圖 GeoJSON 串流輸出（2026-10；map-layers 與分享頁共用）
+
+為什麼：map-layers / 分享頁原本在 DB 端 jsonb_agg 出整包 FeatureCollection（一份），
+psycopg 解成 Python dict（第二份），FastAPI 再 json 編碼成回應（第三份）。
+5 萬～20 萬點的案件，三份全量同時在記憶體，第一個 byte 要等全部算完才送出。
+
+串流模式：
+  - server-side cursor（DECLARE … 於交易內，每次 fetch _FETCH_ROWS 列），每列在 DB
+    端就組成 Feature 的 JSON 文字（::text），Python 端不解碼、原樣寫出。
+  - 兩種格式：
+      ndjson  每行一個 Feature；最後一行為摘要
+              {"type":"Summary","total":…,"returned":…,"truncated":…}
+      json    分塊輸出的單一 FeatureCollection；total / returned / truncated 作為
+              foreign members 寫在 features 陣列之後（結構同非串流回應）
+  - total 放在結尾（trailer）：returned < limit 時 total = returned，不必另做 count；
+    只有剛好撞到上限才補一次 count(*)。
+  - 回應壓縮：依 Accept-Encoding 選 br（需安裝 brotli 套件）或 gzip，於產生器內逐塊
+    壓縮，累積到 _FLUSH_BYTES 才送出一段，避免每個 Feature 一個 chunk。
+
+分頁游標（2026-10）：map-layers 依 (start_ts NULLS LAST, id) 排序，下一頁游標即本頁
+最後一列的 (start_ts, id)，以 encode_cursor / decode_cursor 在字串與 tuple 間轉換
+（串流與非串流共用，摘要 / 回應截斷時帶 next_after）。
+
+代價：串流期間佔住一條 DB 連線與一個交易（預設 READ COMMITTED：結尾補的 count 與
+已送出的列可能差幾筆同時寫入的列，與原本先 count 再取資料的兩次查詢相同）。
+下載慢的用戶端會讓連線一直掛著，而分享頁是公開端點：幾個同時下載就能吃光連線池
+（DB_POOL_MAX 預設 5），連登入、匯入都拿不到連線。因此（2026-10 補）：
+  - 同時串流數上限 GEOJSON_STREAM_MAX（預設 2，每 process 一份）：滿了直接 503 +
+    Retry-After，不排隊等連線；名額在產生器結束 / 被關閉 / 從未開始就被回收時歸還。
+  - 交易內 SET LOCAL statement_timeout / idle_in_transaction_session_timeout：
+    查詢本身或用戶端停著不讀（產生器停在 yield、交易閒置）超過上限，由 DB 端斷開，
+    連線回池，該次下載中斷（用戶端看到截斷的回應，重抓即可）。
+"""
+from __future__ import annotations
+
+import json
+import threading
+import weakref
+import zlib
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+try:
+    import brotli  # optional
+except Exception:
+    brotli = None
+
+from fastapi import HTTPException
+
+from app.core import metrics
+from app.core.env import env_int
+from app.db.session import get_conn
+
+FORMATS = ("ndjson", "json")
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson; charset=utf-8",
+    "json": "application/geo+json; charset=utf-8",
+}
+
+_FETCH_ROWS = 2000           # server-side cursor 每次 fetch 列數
+_FLUSH_BYTES = 64 * 1024     # 壓縮後累積到這麼多才送出一段
+_CURSOR_NAME = "geojson_stream"
+_RETRY_AFTER_SEC = 5
+
+_m_rejected = metrics.counter(
+    "geojson_stream_rejected_total",
+    "GeoJSON streams refused with 503 because all stream slots were busy",
+)
+
+
+def _max_streams() -> int:
+    """同時串流數上限（env `GEOJSON_STREAM_MAX`，預設 2，合理 1~32）。須小於 DB_POOL_MAX。"""
+    return env_int("GEOJSON_STREAM_MAX", 2, 1, 32)
+
+
+def _statement_timeout_ms() -> int:
+    """串流交易的 statement_timeout（env `GEOJSON_STREAM_STATEMENT_TIMEOUT_MS`，預設 60000）。"""
+    return env_int("GEOJSON_STREAM_STATEMENT_TIMEOUT_MS", 60000, 1000, 600000)
+
+
+def _idle_timeout_ms() -> int:
+    """用戶端停著不讀、交易閒置的上限（env `GEOJSON_STREAM_IDLE_TIMEOUT_MS`，預設 30000）。"""
+    return env_int("GEOJSON_STREAM_IDLE_TIMEOUT_MS", 30000, 1000, 600000)
+
+
+_slots: Optional[threading.BoundedSemaphore] = None
+_slots_lock = threading.Lock()
+
+
+def _semaphore() -> threading.BoundedSemaphore:
+    global _slots
+    with _slots_lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(_max_streams())
+        return _slots
+
+
+def reset_slots() -> None:
+    """下次使用時依 env 重建名額（測試用）。"""
+    global _slots
+    with _slots_lock:
+        _slots = None
+
+
+def _acquire_slot() -> Callable[[], None]:
+    """拿一個串流名額；滿了 → 503。回傳可重複呼叫的 release（只有第一次生效）。"""
+    sem = _semaphore()
+    if not sem.acquire(blocking=False):
+        _m_rejected.inc()
+        raise HTTPException(
+            status_code=503,
+            detail="地圖下載人數過多，請稍後再試",
+            headers={"Retry-After": str(_RETRY_AFTER_SEC)},
+        )
+    done = threading.Lock()
+
+    def release() -> None:
+        if done.acquire(blocking=False):
+            sem.release()
+
+    return release
+
+# 同 map-layers 的 Feature 結構：geometry + jsonb_strip_nulls(properties)
+_FEATURE_SQL = """
+SELECT jsonb_build_object(
+  'type', 'Feature',
+  'geometry', ST_AsGeoJSON(geom)::jsonb,
+  'properties', jsonb_strip_nulls(jsonb_build_object(
+      'target_id',   target_id,   'start_ts',    start_ts,
+      'end_ts',      end_ts,      'cell_id',     cell_id,
+      'cell_addr',   cell_addr,   'sector_name', sector_name,
+      'site_code',   site_code,   'sector_id',   sector_id,
+      'azimuth',     azimuth,     'azimuth_ref', azimuth_ref,
+      'accuracy_m',  accuracy_m))
+)::text, start_ts, id
+  FROM raw_traces
+ WHERE {where}
+ ORDER BY start_ts NULLS LAST, id
+ LIMIT %s
+"""
+
+
+def encode_cursor(start_ts: Optional[datetime], row_id: int) -> str:
+    """(start_ts, id) → 'ISO 時間,id'；start_ts 為 NULL（排在最後）時時間段留空。"""
+    return f"{start_ts.isoformat() if start_ts else ''},{int(row_id)}"
+
+
+def decode_cursor(s: str) -> Tuple[Optional[datetime], int]:
+    """encode_cursor 的反向；格式不符 → ValueError。"""
+    ts_s, sep, id_s = (s or "").rpartition(",")
+    if not sep:
+        raise ValueError("after 應為 'start_ts,id'")
+    row_id = int(id_s)
+    ts = datetime.fromisoformat(ts_s) if ts_s else None
+    if ts is not None and ts.tzinfo is None:
+        raise ValueError("after 的時間需帶時區")
+    return ts, row_id
+
+
+def keyset_sql(after: Tuple[Optional[datetime], int]) -> Tuple[str, list]:
+    """
+    ORDER BY start_ts NULLS LAST, id 的「在 after 之後」條件。
+    (start_ts, id) row comparison 可直接走 (…, start_ts, id) 索引；NULL 時間排在最後，
+    故非 NULL 游標之後還要接上全部 NULL 列。
+    """
+    ts, row_id = after
+    if ts is None:
+        return "(start_ts IS NULL AND id > %s)", [row_id]
+    return "((start_ts, id) > (%s, %s) OR start_ts IS NULL)", [ts, row_id]
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    依 Accept-Encoding 選壓縮：br（有 brotli 套件時）優先於 gzip；都不接受 → None。
+    q=0 視為拒絕；不處理 '*'（瀏覽器都會明列 gzip / br）。
+    """
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for p in params.split(";"):
+            k, _, v = p.strip().partition("=")
+            if k.strip() == "q":
+                try:
+                    q = float(v)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(name)
+    if "br" in accepted and brotli is not None:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def response_headers(encoding: Optional[str]) -> Dict[str, str]:
+    headers = {"Vary": "Accept-Encoding", "X-Content-Type-Options": "nosniff"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return headers
+
+
+def encode(pieces: Iterable[str], encoding: Optional[str]) -> Iterator[bytes]:
+    """把文字片段編成 UTF-8，依 encoding 逐塊壓縮；累積到 _FLUSH_BYTES 才 yield。"""
+    if encoding == "br":
+        comp = brotli.Compressor(quality=5)
+        feed, finish = comp.process, comp.finish
+    elif encoding == "gzip":
+        comp = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 → gzip 容器
+        feed, finish = comp.compress, comp.flush
+    else:
+        feed, finish = (lambda b: b), (lambda: b"")
+
+    buf: list = []
+    size = 0
+    for piece in pieces:
+        out = feed(piece.encode("utf-8"))
+        if out:
+            buf.append(out)
+            size += len(out)
+        if size >= _FLUSH_BYTES:
+            yield b"".join(buf)
+            buf, size = [], 0
+    buf.append(finish())
+    tail = b"".join(buf)
+    if tail:
+        yield tail
+
+
+def _summary(total: int, returned: int, last, extra: Optional[dict]) -> dict:
+    out = dict(extra or {})
+    out.update(total=total, returned=returned, truncated=total > returned)
+    if total > returned and last is not None:
+        out["next_after"] = encode_cursor(*last)
+    return out
+
+
+def stream_features(
+    where_sql: str,
+    params: Sequence,
+    limit: int,
+    fmt: str,
+    *,
+    extra: Optional[dict] = None,
+) -> Iterator[str]:
+    """
+    產出 raw_traces（WHERE {where_sql}）的 GeoJSON 文字片段。
+
+    where_sql / params 由呼叫端組（同 map-layers 的 %s 佔位，分頁時含 keyset_sql 條件）；
+    extra 併入結尾摘要（json 格式為 FeatureCollection 的 foreign members，ndjson 併入
+    Summary 行）。截斷時摘要帶 next_after（本段最後一列的游標）。
+
+    名額在呼叫當下就拿（不是第一次 next 時），沒名額直接拋 503，端點還來得及回錯誤狀態碼。
+    連線在產生器跑完（或被關閉，例如用戶端中斷）時才歸還；產生器從未開始就被丟掉時，
+    名額由 weakref.finalize 在回收時歸還。
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"format 必須是 {FORMATS} 之一")
+    release = _acquire_slot()
+    gen = _generate(where_sql, params, limit, fmt, extra, release)
+    weakref.finalize(gen, release)
+    return gen
+
+
+def _generate(where_sql, params, limit, fmt, extra, release) -> Iterator[str]:
+    sql = _FEATURE_SQL.format(where=where_sql)
+    returned = 0
+    last = None
+
+    try:
+        with get_conn() as conn:
+            # server-side cursor 必須在交易內 DECLARE（pool 連線為 autocommit）
+            with conn.transaction():
+                with conn.cursor() as cur:
+                    # set_config(..., true) = SET LOCAL：交易結束即還原，不污染回池的連線
+                    cur.execute(
+                        "SELECT set_config('statement_timeout', %s, true),"
+                        "       set_config('idle_in_transaction_session_timeout', %s, true)",
+                        (str(_statement_timeout_ms()), str(_idle_timeout_ms())),
+                        prepare=False,
+                    )
+                with conn.cursor(name=_CURSOR_NAME) as cur:
+                    cur.itersize = _FETCH_ROWS
+                    # ServerCursor.execute 不收 prepare 參數（DECLARE 本身不走 prepared）
+                    cur.execute(sql, list(params) + [limit])
+                    if fmt == "json":
+                        yield '{"type":"FeatureCollection","features":['
+                    for feature, start_ts, row_id in cur:
+                        if fmt == "json":
+                            yield feature if returned == 0 else "," + feature
+                        else:
+                            yield feature + "\n"
+                        returned += 1
+                        last = (start_ts, row_id)
+
+                total = returned
+                if returned >= limit:
+                    with conn.cursor() as cur:
+                        cur.execute(f"SELECT count(*) FROM raw_traces WHERE {where_sql}",
+                                    list(params), prepare=False)
+                        total = int((cur.fetchone() or [0])[0])
+    finally:
+        release()
+
+    summary = _summary(total, returned, last, extra)
+    if fmt == "json":
+        yield "]," + json.dumps(summary, ensure_ascii=False, default=str)[1:]
+    else:
+        summary = {"type": "Summary", **summary}
+        yield json.dumps(summary, ensure_ascii=False, default=str) + "\n"
@@ -10,15 +10,17 @@
 # ------------------------------------------------------------
 
 from __future__ import annotations
-import csv, hashlib, io, os, re
+import csv, functools, hashlib, io, itertools, os, re
 from collections import Counter
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, List, Optional, Iterable, Tuple
 
 from fastapi import HTTPException
 from app.db.session import get_conn
+from app.core import metrics
+from app.core.env import env_int
 from app.core.logging_utils import log_info
-from app.services import geocode
+from app.services import geocode, tower_index
 
 # ====== 共用常數與工具 ======
 NA_TOKENS = {"#N/A", "", "NA", "N/A", None}
@@ -95,47 +97,139 @@ def _parse_ts(s: Any) -> Optional[datetime]:
         (1) Python 3.10 之前不接受 'Z' 後綴，行為跨版本不一致；
         (2) 它會吃 '+08:00' 時區資訊，可能跟我們手動加的 TPE_TZ 衝突；
         (3) 我們刻意只接受「無時區後綴」的 naïve 字串，假設都是台北時間。
+
+    效能（2026-10）：格式表不變，但整條 ladder 只在「快路徑失手」時才跑：
+      1. _ts_fast：最常見的 `YYYY/MM/DD HH:MM:SS`、`YYYY-MM-DD HH:MM:SS`、
+         ISO `YYYY-MM-DDTHH:MM:SS[.fff]` 以一支預編譯 regex 切出數字直接組 datetime，
+         不走 strptime（strptime 每次都要過 locale + regex，慢一個數量級）；
+      2. _parse_ts_text 以 lru_cache 記住「清理後字串 → 結果」（有界，
+         _TS_CACHE_SIZE），同一秒重複出現的通聯列直接命中；
+      3. 逐欄熱迴圈改用 _TsColumnParser：鎖定該欄勝出的格式優先試。
+    各格式彼此互斥（分隔符 / 欄位數不同），先試哪個都不會改變解析結果。
     """
     if _is_na(s):
         return None
     if isinstance(s, datetime):
         return s if s.tzinfo else s.replace(tzinfo=TPE_TZ)
-    # NBSP（不間斷空格 \xa0）→ 一般空格；前後 strip
-    s = str(s).strip().replace("\xa0", " ")
-    # 把多重空白壓成單一空白（Excel 偶爾會有兩個空格）
-    s = re.sub(r"[ \t]+", " ", s)
-    for fmt in (
-        "%Y/%m/%d %H:%M:%S",
-        "%Y/%m/%d %H:%M",
-        "%Y/%-m/%-d %H:%M",
-        "%Y-%m-%d %H:%M:%S",  # 「網路歷程.xltx」格式
-        "%Y-%m-%d %H:%M",
-        # ── W2.4：ISO 8601（T 分隔）─────────────────────────────
-        # 順序：先試含毫秒（更嚴格的格式優先），strptime 嚴格匹配所以
-        # "2023-01-12T00:48:02.000" 不會誤 match "%Y-%m-%dT%H:%M:%S"
-        "%Y-%m-%dT%H:%M:%S.%f",  # W2.4：中華上網方言 12869 列實測 100% 命中
-        "%Y-%m-%dT%H:%M:%S",     # W2.4：ISO 8601 無毫秒備援（其他 carrier 可能用）
-        # ── GPS 軌跡格式：M/D/YYYY 12 小時制 + AM/PM（如 "4/18/2026 3:51:09 AM"）──
-        # 來源：車機 / GPS 軌跡匯出（RFL-8271軌跡.xlsx）。%m/%d/%I 在 CPython
-        # strptime 接受非零填補（"4" 等同 "04"），故單位數月/日/時皆可命中。
-        "%m/%d/%Y %I:%M:%S %p",
-        "%m/%d/%Y %I:%M %p",
-    ):
-        try:
-            dt = datetime.strptime(s, fmt)
-            return dt.replace(tzinfo=TPE_TZ)
-        except Exception:
-            continue
+    return _parse_ts_text(_ts_clean(str(s)))[0]
+
+
+_TS_FORMATS = (
+    "%Y/%m/%d %H:%M:%S",
+    "%Y/%m/%d %H:%M",
+    "%Y/%-m/%-d %H:%M",
+    "%Y-%m-%d %H:%M:%S",  # 「網路歷程.xltx」格式
+    "%Y-%m-%d %H:%M",
+    # ── W2.4：ISO 8601（T 分隔）─────────────────────────────
+    # 順序：先試含毫秒（更嚴格的格式優先），strptime 嚴格匹配所以
+    # "2023-01-12T00:48:02.000" 不會誤 match "%Y-%m-%dT%H:%M:%S"
+    "%Y-%m-%dT%H:%M:%S.%f",  # W2.4：中華上網方言 12869 列實測 100% 命中
+    "%Y-%m-%dT%H:%M:%S",     # W2.4：ISO 8601 無毫秒備援（其他 carrier 可能用）
+    # ── GPS 軌跡格式：M/D/YYYY 12 小時制 + AM/PM（如 "4/18/2026 3:51:09 AM"）──
+    # 來源：車機 / GPS 軌跡匯出（RFL-8271軌跡.xlsx）。%m/%d/%I 在 CPython
+    # strptime 接受非零填補（"4" 等同 "04"），故單位數月/日/時皆可命中。
+    "%m/%d/%Y %I:%M:%S %p",
+    "%m/%d/%Y %I:%M %p",
+)
+_TS_FAST = "fast"        # _ts_fast 命中時回報的「格式」代號（供 _TsColumnParser 鎖定）
+_TS_CACHE_SIZE = 65536   # 約數 MB；夠涵蓋單檔常見的重複時間字串
+_TS_WS_RE = re.compile(r"[ \t]+")
+_TS_CJK_RE = re.compile(r"[年月日時分秒]")
+_TS_SPACES_RE = re.compile(r"\s+")
+_TS_FAST_RE = re.compile(
+    r"(\d{4})([/-])(\d\d)\2(\d\d)[ T](\d\d):(\d\d):(\d\d)(?:\.(\d{1,6}))?", re.ASCII
+)
+
+
+def _ts_clean(s: str) -> str:
+    """NBSP（不間斷空格 \xa0）→ 一般空格、前後 strip、多重空白壓成單一空白。"""
+    s = s.strip().replace("\xa0", " ")
+    # 把多重空白壓成單一空白（Excel 偶爾會有兩個空格）；絕大多數字串沒有，先便宜地判斷
+    if "  " in s or "\t" in s:
+        s = _TS_WS_RE.sub(" ", s)
+    return s
+
+
+def _ts_fast(s: str) -> Optional[datetime]:
+    """固定欄寬形狀直接切出數字組 datetime（不走 strptime）；不符或數值非法回 None 交給 ladder。
+
+    只認三種形狀（與 _TS_FORMATS 對應格式逐一等價）：
+      YYYY/MM/DD HH:MM:SS、YYYY-MM-DD HH:MM:SS、YYYY-MM-DDTHH:MM:SS[.f{1,6}]
+    """
+    m = _TS_FAST_RE.fullmatch(s)
+    if m is None:
+        return None
+    y, sep, mo, d, h, mi, sec, frac = m.groups()
+    if sep == "/" and s[10] == "T":
+        return None          # 斜線 + T 不在格式表內
+    if frac is not None and s[10] != "T":
+        return None          # 毫秒只出現在 ISO（T 分隔）
+    try:
+        return datetime(
+            int(y), int(mo), int(d), int(h), int(mi), int(sec),
+            int(frac.ljust(6, "0")) if frac else 0, tzinfo=TPE_TZ,
+        )
+    except ValueError:
+        return None
+
+
+def _ts_try(s: str, fmt: str) -> Optional[datetime]:
+    """只試單一格式（_TS_FAST 或 _TS_FORMATS 其一）。"""
+    if fmt == _TS_FAST:
+        return _ts_fast(s)
+    try:
+        return datetime.strptime(s, fmt).replace(tzinfo=TPE_TZ)
+    except Exception:
+        return None
+
+
+@functools.lru_cache(maxsize=_TS_CACHE_SIZE)
+def _parse_ts_text(s: str) -> Tuple[Optional[datetime], Optional[str]]:
+    """已清理字串 → (datetime, 命中格式)；格式為 None 代表走中文備援或失敗。"""
+    dt = _ts_fast(s)
+    if dt is not None:
+        return dt, _TS_FAST
+    for fmt in _TS_FORMATS:
+        dt = _ts_try(s, fmt)
+        if dt is not None:
+            return dt, fmt
     # 嘗試去除多餘空白或中文標點
-    s2 = re.sub(r"[年月日時分秒]", " ", s)
-    s2 = re.sub(r"\s+", " ", s2).strip(" /-:")
+    s2 = _TS_CJK_RE.sub(" ", s)
+    s2 = _TS_SPACES_RE.sub(" ", s2).strip(" /-:")
     for fmt in ("%Y %m %d %H %M %S", "%Y %m %d %H %M"):
-        try:
-            dt = datetime.strptime(s2, fmt)
-            return dt.replace(tzinfo=TPE_TZ)
-        except Exception:
-            pass
-    return None
+        dt = _ts_try(s2, fmt)
+        if dt is not None:
+            return dt, None
+    return None, None
+
+
+class _TsColumnParser:
+    """單一欄位的時間解析器：鎖定該欄上一次勝出的格式，下一列優先試它。
+
+    電信匯出檔一整欄幾乎都是同一種格式；ladder 排在後面的格式（例如 GPS 軌跡的
+    `%m/%d/%Y %I:%M:%S %p`）每列都要先失敗前面七次 strptime。鎖定後一次命中，
+    失手才回到 _parse_ts_text（含 LRU 與完整 ladder）並改鎖新格式。
+    結果與 _parse_ts 完全一致（格式互斥，順序不影響結果）。
+    """
+    __slots__ = ("fmt",)
+
+    def __init__(self) -> None:
+        self.fmt: Optional[str] = None
+
+    def __call__(self, v: Any) -> Optional[datetime]:
+        if _is_na(v):
+            return None
+        if isinstance(v, datetime):
+            return v if v.tzinfo else v.replace(tzinfo=TPE_TZ)
+        s = _ts_clean(str(v))
+        if self.fmt is not None:
+            dt = _ts_try(s, self.fmt)
+            if dt is not None:
+                return dt
+        dt, fmt = _parse_ts_text(s)
+        if fmt is not None:
+            self.fmt = fmt
+        return dt
 
 def _to_int(s: Any) -> Optional[int]:
     if _is_na(s):
@@ -208,10 +302,14 @@ def _canon(s: str) -> str:
     except Exception:
         pass
     s = s.replace("臺", "台")
-    s = re.sub(r"[\s\u3000]+", "", s)  # 各種空白
-    s = re.sub(r"[•·．\.\-:：;；,/，、\t]", "", s)  # 常見標點
+    s = _CANON_WS_RE.sub("", s)     # 各種空白
+    s = _CANON_PUNCT_RE.sub("", s)  # 常見標點
     return s.lower()
 
+
+_CANON_WS_RE = re.compile(r"[\s\u3000]+")
+_CANON_PUNCT_RE = re.compile(r"[•·．\.\-:：;；,/，、\t]")
+
 # ====== 讀取 CSV / Excel ======
 def _iter_rows_csv(file_bytes: bytes) -> Iterable[Dict[str, Any]]:
     text = file_bytes.decode("utf-8-sig", errors="ignore")
@@ -281,13 +379,16 @@ def _looks_like_addr(s: Any) -> bool:
     return bool(t) and bool(re.search(r"[一-鿿]", t))
 
 
-def _iter_simple_time_location(df_raw) -> Iterable[Dict[str, Any]]:
+def _iter_simple_time_location(rows) -> Iterable[Dict[str, Any]]:
     """simple_time_location fallback（A 欄=時間, B 欄=位置, A/B 以外忽略）。
 
     僅由 _iter_rows_excel 在「規則 B 失敗、本來要 skip sheet」時呼叫。
     **不命中 → 不 yield 任何列**（呼叫端據此維持舊 skip 行為）；電信格式都過規則 B、
     不會進到這裡，故零回歸。
 
+    `rows`：逐列 cell 序列（_iter_rows_excel 串流讀取器給的 list）；也接受整張
+    DataFrame（df_raw，舊呼叫端 / 單元測試），內部一律轉成逐列迭代，只預讀 21 列。
+
     偵測（避免誤判）：
       - 有/無表頭：第 0 列 A 欄能否 _parse_simple_time → 不能則視為表頭、資料從第 1 列；
         能（看起來像資料）→ 無表頭、第 0 列即資料（不誤當表頭）。
@@ -295,8 +396,13 @@ def _iter_simple_time_location(df_raw) -> Iterable[Dict[str, Any]]:
         且至少 1 列「時間且位置皆有效」。少數壞列靠「分母夠大不跌破 80%」+ emit 逐列跳過容忍。
     emit：時間壞列 skip（不讓整檔失敗）；B 為 latlng → 緯/經（免 geocode）；否則 → 基地台地址。
     """
-    if df_raw is None or df_raw.shape[1] < 2 or len(df_raw) < 1:
+    if rows is None:
         return
+    if hasattr(rows, "itertuples"):
+        if rows.shape[1] < 2:
+            return
+        rows = rows.itertuples(index=False, name=None)
+    rows_it = iter(rows)
 
     def _empty(v) -> bool:
         if v is None:
@@ -310,27 +416,27 @@ def _iter_simple_time_location(df_raw) -> Iterable[Dict[str, Any]]:
             return False
 
     def _cell(row, j):
-        try:
-            v = row.iloc[j]
-        except Exception:
-            return None
+        v = row[j] if j < len(row) else None
         return None if _empty(v) else v
 
+    first = next(rows_it, None)
+    if first is None:
+        return
+
     # 有無表頭：第 0 列 A 欄是否為時間（時間值 → 是資料、無表頭）
-    a0 = _cell(df_raw.iloc[0], 0)
+    a0 = _cell(first, 0)
     has_header = (a0 is None) or (_parse_simple_time(a0) is None)
-    data_start = 1 if has_header else 0
-    if len(df_raw) <= data_start:
+    data = rows_it if has_header else itertools.chain([first], rows_it)
+    head = list(itertools.islice(data, 20))
+    if not head:
         return
 
-    data = df_raw.iloc[data_start:]
-
     # 取樣前 20 個「非全空」資料列算命中比例（A、B 皆空的列不計入分母）：
     #   - 時間命中比例 ≥80%、位置命中比例 ≥80%（設計規格，從嚴避免誤判一般業者格式）
     #   - 另要求至少 1 列「時間且位置皆有效」（乾淨列），避免零星巧合命中
     # 壞列容忍靠「分母夠大時少數壞列不致跌破 80%」+ emit 階段逐列跳過，不靠放寬門檻。
     n_sample = n_time = n_loc = n_clean = 0
-    for _, row in data.head(20).iterrows():
+    for row in head:
         a = _cell(row, 0)
         b = _cell(row, 1)
         if a is None and b is None:
@@ -350,7 +456,7 @@ def _iter_simple_time_location(df_raw) -> Iterable[Dict[str, Any]]:
         return
 
     # 命中 → emit（lazy；yield 既有 canonical 別名，下游 normalize/geocode 不需改）
-    for _, row in data.iterrows():
+    for row in itertools.chain(head, data):
         a = _cell(row, 0)
         b = _cell(row, 1)
         t = _parse_simple_time(a)
@@ -363,30 +469,144 @@ def _iter_simple_time_location(df_raw) -> Iterable[Dict[str, Any]]:
             yield {"開始時間": t, "基地台地址": (None if b is None else str(b).strip())}
 
 
-def _materialize_sheet_row(row, columns) -> Dict[str, Any]:
-    """把 pandas 一列轉成 raw row dict（型別正規化）。
+# pandas read_excel 預設當成 NA 的字串（TextParser 的 na_values 預設集合）。串流讀取器
+# 不經 TextParser，必須自己把這些字串收斂成空值，輸出才會與舊 pandas 路徑逐格一致。
+_XLSX_NA_STRINGS = frozenset({
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+})
+# Excel 錯誤值：values_only 會回成字串；pandas 把 error 型儲存格讀成 NaN，這裡比照。
+_XLSX_ERROR_LITERALS = frozenset({
+    "#NULL!", "#DIV/0!", "#VALUE!", "#REF!", "#NAME?", "#NUM!", "#N/A", "#GETTING_DATA",
+})
+
+
+def _excel_reader() -> str:
+    """Excel 讀取器（env `INGEST_EXCEL_READER`）：`stream`（預設）或 `pandas`（舊路徑）。
+
+    保留 pandas 當逃生門：若遇到 openpyxl 串流讀不好、pandas 讀得好的怪檔，
+    改 env 即可退回舊行為。非法值一律視為預設 stream。
+    """
+    raw = (os.getenv("INGEST_EXCEL_READER", "stream") or "").strip().lower()
+    return "pandas" if raw == "pandas" else "stream"
+
+
+def _xlsx_cell(v: Any) -> Any:
+    """單一儲存格值 → python 原生型別；空值（None / NaN / NaT / NA 字串 / 錯誤值）一律為 ""。
+
+    對齊 pandas openpyxl reader 的 _convert_cell：整數值的 float → int
+    （Excel 把 466970108050142 存成 number，不轉會變成 "466970108050142.0"）。
+    型別處理盲點（pandas 讀取器才會遇到）：
+      - pandas.Timestamp → 用 .to_pydatetime()（切忌 .item()，部分版本回 int [ns]，
+        後續 _parse_ts 全部失敗）
+      - 其他 numpy 數值型別才用 .item() 轉原生（跳過 str/bytes）
+    """
+    if v is None:
+        return ""
+    if isinstance(v, str):
+        return "" if (v in _XLSX_NA_STRINGS or v in _XLSX_ERROR_LITERALS) else v
+    if isinstance(v, bool):
+        return v
+    if isinstance(v, float):
+        if v != v:
+            return ""
+        return int(v) if v.is_integer() else v
+    if hasattr(v, "to_pydatetime"):
+        try:
+            if v != v:           # NaT
+                return ""
+            return v.to_pydatetime()
+        except Exception:
+            pass
+    if hasattr(v, "item") and not isinstance(v, bytes):
+        try:
+            return _xlsx_cell(v.item())
+        except Exception:
+            pass
+    return v
+
+
+def _xlsx_row(values) -> List[Any]:
+    """一列儲存格 → list，去掉尾端空格（同 pandas get_sheet_data 的 trim）。"""
+    row = [_xlsx_cell(v) for v in values]
+    while row and row[-1] == "":
+        row.pop()
+    return row
+
+
+def _xlsx_sheets_stream(file_bytes: bytes):
+    """openpyxl read_only + values_only 串流讀取器。
+
+    回傳 ([(sheet_name, open_rows)], close)：open_rows() 每次呼叫都重新串流該分頁，
+    逐列 yield _xlsx_row 轉好的 list。不建 DataFrame、不整張 materialize，
+    記憶體只跟呼叫端手上留住的列數有關。
+
+    - reset_dimensions()：部分電信匯出工具把 <dimension> 寫死成 'A1'，read_only
+      會信任這個邊界而只讀到 1 格（見 _read_xlsx_top_rows 註解）；重設後改以
+      實際 XML 列為準（pandas 的 openpyxl reader 也是這樣做）。
+    - 尾端全空列不 yield、中間空列照 yield []：與 pandas「trim trailing empty rows」
+      一致。連續空列只計數不暫存，遇到下一個非空列才補吐。
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(io.BytesIO(file_bytes), read_only=True, data_only=True, keep_links=False)
+
+    def _opener(ws):
+        def _open():
+            ws.reset_dimensions()
+            pending_empty = 0
+            for values in ws.iter_rows(values_only=True):
+                row = _xlsx_row(values)
+                if not row:
+                    pending_empty += 1
+                    continue
+                for _ in range(pending_empty):
+                    yield []
+                pending_empty = 0
+                yield row
+        return _open
+
+    return [(ws.title, _opener(ws)) for ws in wb.worksheets], wb.close
+
+
+def _xlsx_sheets_pandas(file_bytes: bytes):
+    """舊 pandas 讀取器（INGEST_EXCEL_READER=pandas），介面同 _xlsx_sheets_stream。
+
+    每張分頁仍以 pd.read_excel(header=None) 整張讀入；只快取「目前這張」的
+    DataFrame（規則 A2 兩趟共用），換分頁即釋放，不會整本 workbook 同時駐留。
+    """
+    try:
+        import pandas as pd
+    except Exception as e:
+        raise RuntimeError("請先安裝：pip install pandas openpyxl") from e
+
+    # 用 ExcelFile 列出 sheet 名，避免每張都重新解析整個 workbook
+    xls = pd.ExcelFile(io.BytesIO(file_bytes))
+    cache: Dict[str, Any] = {}
+
+    def _opener(name):
+        def _open():
+            if cache.get("name") != name:
+                cache.clear()
+                cache["df"] = pd.read_excel(xls, sheet_name=name, header=None)
+                cache["name"] = name
+            for tup in cache["df"].itertuples(index=False, name=None):
+                yield _xlsx_row(tup)
+        return _open
+
+    return [(name, _opener(name)) for name in xls.sheet_names], xls.close
+
+
+def _materialize_sheet_row(row: List[Any], header: List[str]) -> Dict[str, Any]:
+    """把一列 cell list 依 header 轉成 raw row dict（短列以 "" 補齊）。
 
     抽成獨立函式的原因：規則 A2（子集分頁去重）需要對同一張 sheet 走兩趟
     —— 第一趟建 fingerprint multiset 以決定要不要整張跳過，第二趟才真的 yield。
     兩趟必須產生「逐欄完全一致」的 row dict，否則 fingerprint 與實際落地資料
     會對不起來；共用同一支函式是保證這件事最直接的方式。
     """
-    d = {str(k).strip(): row[k] for k in columns}
-    for k, v in list(d.items()):
-        # pandas.Timestamp / numpy.datetime64 → python datetime（時區邏輯留給 _parse_ts）
-        if hasattr(v, "to_pydatetime"):
-            try:
-                d[k] = v.to_pydatetime()
-                continue
-            except Exception:
-                pass
-        # 其他 numpy 型別 → python 原生（跳過 str/bytes，避免它們意外實作了 .item()）
-        try:
-            if hasattr(v, "item") and not isinstance(v, (str, bytes)):
-                d[k] = v.item()
-        except Exception:
-            pass
-    return d
+    n = len(row)
+    return {k: (row[i] if i < n else "") for i, k in enumerate(header)}
 
 
 # 進入 fingerprint 的 canonical 欄位：**只取具證據語意、且真的會落進 raw_traces 的欄**。
@@ -427,26 +647,369 @@ def _evidence_fingerprint(raw_row: Dict[str, Any]) -> Optional[bytes]:
         return None
 
     end_ts = _parse_ts(r.get("end_ts")) or start_ts
-    canon = {
-        "start_ts": start_ts.isoformat(),
-        "end_ts": end_ts.isoformat(),
-        "cell_id": cell_id,
-        "cell_addr": cell_addr,
-        "lat": f"{direct_ll[0]:.7f}" if direct_ll else None,
-        "lng": f"{direct_ll[1]:.7f}" if direct_ll else None,
-        "azimuth": _to_int(r.get("azimuth")),
-        "sector_id": (str(r.get("sector_id") or "").strip() or None),
-        "sector_name": (str(r.get("sector_name") or "").strip() or None),
-        "site_code": (str(r.get("site_code") or "").strip() or None),
-    }
-    payload = "\x1f".join(
-        "" if canon[k] is None else str(canon[k]) for k in _FINGERPRINT_FIELDS
+    return _fingerprint_digest(
+        start_ts, end_ts, cell_id, cell_addr, direct_ll,
+        _to_int(r.get("azimuth")),
+        (str(r.get("sector_id") or "").strip() or None),
+        (str(r.get("sector_name") or "").strip() or None),
+        (str(r.get("site_code") or "").strip() or None),
+    )
+
+
+def _fingerprint_digest(start_ts, end_ts, cell_id, cell_addr, direct_ll,
+                        azimuth, sector_id, sector_name, site_code) -> bytes:
+    """已正規化欄位 → 16 bytes fingerprint（_evidence_fingerprint 與 raw_traces.row_fp 共用）。
+
+    欄位順序即 _FINGERPRINT_FIELDS；改動任一欄的 canonical 形式都會讓已落地的
+    row_fp 對不上（重傳不再被認出是同一列），須連同既有資料一起重算。
+    """
+    canon = (
+        start_ts.isoformat(),
+        end_ts.isoformat(),
+        cell_id,
+        cell_addr,
+        f"{direct_ll[0]:.7f}" if direct_ll else None,
+        f"{direct_ll[1]:.7f}" if direct_ll else None,
+        azimuth,
+        sector_id,
+        sector_name,
+        site_code,
     )
+    payload = "\x1f".join("" if v is None else str(v) for v in canon)
     # 只留 16 bytes digest：分頁動輒上萬列，存完整 payload 會把記憶體吃掉；
     # 同時 digest 不可逆，之後即使進 log 也不會外洩證物內容或 PII。
     return hashlib.blake2b(payload.encode("utf-8", "replace"), digest_size=16).digest()
 
 
+class _RowFingerprinter:
+    """一次上傳內逐列產生 raw_traces.row_fp（2026-10，重傳冪等）。
+
+    row_fp = 證據欄位 fingerprint +「同內容第幾次出現」序數：
+      - 檔內兩列內容完全相同（電信匯出偶有真重複）→ 序數不同、row_fp 不同，兩列都落地，
+        與改版前的筆數一致，不因去重而默默少資料；
+      - 同一檔重傳 → 每列的（內容, 序數）與上次相同 → 撞 unique index，ON CONFLICT 略過。
+    第一次出現時 row_fp 就等於 _evidence_fingerprint（序數 0 不進 hash）。
+    記憶體：每個不同內容一個 16 bytes key 的計數，約 100 bytes / 列，與塊大小無關但隨檔案線性成長。
+    """
+
+    __slots__ = ("seen",)
+
+    def __init__(self):
+        self.seen: "Counter[bytes]" = Counter()
+
+    def __call__(self, *fields) -> bytes:
+        fp = _fingerprint_digest(*fields)
+        n = self.seen[fp]
+        self.seen[fp] = n + 1
+        if n == 0:
+            return fp
+        return hashlib.blake2b(fp + n.to_bytes(4, "big"), digest_size=16).digest()
+
+
+def _is_empty_cell(c) -> bool:
+    if c is None:
+        return True
+    if isinstance(c, str):
+        return not c.strip()
+    return False
+
+
+class _ExcelSheet:
+    """單一分頁的表頭偵測與資料列產生（_iter_rows_excel 的逐分頁邏輯）。
+
+    抽成類別是為了讓循序路徑與多程序路徑（_parse_sheet_worker）跑同一份
+    規則 A / B、W2.6 合併表頭修補、dialect 抽樣與 fingerprint 邏輯，兩條路的
+    輸出才保證逐列一致。用法：prepare() 之後看 skip / simple_rows，再取 rows()。
+    """
+
+    def __init__(
+        self,
+        sheet_ref: str,
+        sheet_name: str,
+        open_rows,
+        active_map: Dict[str, str],
+        mapped_canon: set,
+        scan_window: int,
+        min_header_matches: int,
+    ):
+        self.sheet_ref = sheet_ref
+        self.sheet_name = sheet_name
+        self._open_rows = open_rows
+        self._active_map = active_map
+        self._mapped_canon = mapped_canon
+        self._scan_window = scan_window
+        self._min_header_matches = min_header_matches
+        self.skip: Optional[Dict[str, Any]] = None        # 非 None → 整張跳過（結構化紀錄）
+        self.simple_rows: Optional[Iterable[Dict[str, Any]]] = None   # 規則 B 失敗時的 fallback
+        self.simple_skip: Optional[Dict[str, Any]] = None  # fallback 也沒命中時的跳過紀錄
+        self.dialect: Optional[str] = None
+        self.header: List[str] = []
+        self._header_row: List[Any] = []
+        self._best_idx = -1
+        self._pending: Optional[Iterable[List[Any]]] = None   # 第一趟可直接接續的串流
+
+    def prepare(self) -> "_ExcelSheet":
+        # 只預讀表頭掃描窗；其餘列留在 rows_it 裡邊讀邊用
+        rows_it = self._open_rows()
+        head = list(itertools.islice(rows_it, self._scan_window))
+
+        # 規則 A：總列數 < 2（連「1 表頭 + 1 資料」都湊不齊）才當非資料表。
+        # 為什麼從舊的 < 5 放寬到 < 2（2026-06-22）：
+        #   偵查實務上「某對象在調閱期間只有 1～2 筆通聯」是真實且關鍵的資料，
+        #   舊門檻會把這種小檔整個跳過 → 沉默丟證據，違反證據完整性原則。
+        #   擋「封面頁／統計頁／說明頁」這類非資料 sheet 的真正防線是規則 B
+        #   （表頭必須命中 ≥2 個 canonical 別名）＋ 去表頭後須 ≥1 列，
+        #   不是列數本身；故安全地把列數門檻降到「資料表的物理下限」= 2 列。
+        #   （預讀窗 ≥2，故 len(head) < 2 ⇔ 整張 < 2 列。）
+        if len(head) < 2:
+            self.skip = {"sheet": self.sheet_ref, "reason": "row_lt_2", "rows": len(head)}
+            return self
+
+        # W2.2 核心：scan 前 SCAN_WINDOW 列，找命中 header_map 最多的列
+        best_idx = -1
+        best_match = 0
+        for ri, row in enumerate(head):
+            n = 0
+            for c in row:
+                if _is_empty_cell(c):
+                    continue
+                canon = _canon(str(c))
+                if self._active_map.get(canon) or canon in self._mapped_canon:
+                    n += 1
+            if n > best_match:
+                best_match = n
+                best_idx = ri
+
+        # 規則 B：scan 視窗內無夠強的 header → 視為非資料 sheet
+        if best_match < self._min_header_matches:
+            # P8.2-fmt fallback：規則 B 失敗時試 simple_time_location 極簡格式
+            # （A=時間, B=位置）。僅在此嘗試 → 電信格式（過規則 B）零影響、零回歸。
+            # 呼叫端 yield 這些列；一列都沒有才記 simple_skip。
+            self.simple_rows = _iter_simple_time_location(itertools.chain(head, rows_it))
+            self.simple_skip = {
+                "sheet": self.sheet_ref, "reason": "header_matches_below_threshold",
+                "best_match": int(best_match), "threshold": self._min_header_matches,
+            }
+            return self
+
+        # best_idx 是 header row，其下是資料。欄寬取預讀窗內最寬列；之後遇到
+        # 更寬的資料列再由 _grow_header 補欄（同 pandas「補齊到最寬列」語意）。
+        self._best_idx = best_idx
+        self._header_row = head[best_idx]
+        self._grow_header(max(len(r) for r in head))
+
+        # dialect 抽樣要前 20 個資料列：預讀窗內不夠就從串流再補（有界）
+        data_head = head[best_idx + 1:]
+        while len(data_head) < 20:
+            nxt = next(rows_it, None)
+            if nxt is None:
+                break
+            data_head.append(nxt)
+        del head
+
+        # 規則 A 二次校驗：去 header 後資料列若 < 1，跳過（罕見但保險）
+        if not data_head:
+            self.skip = {
+                "sheet": self.sheet_ref, "reason": "no_data_row_after_header",
+                "header_row_idx": int(best_idx),
+            }
+            return self
+
+        # ── W2.4：dialect detection（per-sheet）──────────────────
+        # 在 sheet 進入 yield loop 前一次決定 dialect，避免每 row 重算。
+        # 抽樣前 20 row 給 detector，足以判斷主流類別、又不會讀爆大檔。
+        sample_rows: List[Dict[str, Any]] = [self._row_dict(r) for r in data_head[:20]]
+        self.dialect = _detect_dialect(self.header, sample_rows)
+        self._pending = itertools.chain(data_head, rows_it)
+        return self
+
+    def _grow_header(self, width: int) -> None:
+        header = self.header
+        for i in range(len(header), width):
+            c = self._header_row[i] if i < len(self._header_row) else ""
+            if _is_empty_cell(c):
+                # W2.6：合併表頭偵測 — 若前欄的 canonical mapping 是 cell_id 類，
+                # 當前空欄是「基地台/交換機」合併表頭的右半欄（含基地台地址）。
+                # 根因：雙向通聯格式 H1:I1 合併儲存格，H=數字 cell_id，I=地址，
+                # I1 讀出來是空值，沒名字的欄無法 normalize 到 cell_addr。
+                # 修法：偵測到這個 pattern 就直接補上已知別名「基地台地址」。
+                if i > 0 and self._active_map.get(_canon(header[-1])) in ("cell_id", "cell_id_compound"):
+                    header.append("基地台地址")
+                else:
+                    header.append(f"_unnamed_{i}")
+            else:
+                header.append(str(c).strip())
+
+    def _row_dict(self, row: List[Any]) -> Dict[str, Any]:
+        if len(row) > len(self.header):
+            self._grow_header(len(row))
+        return _materialize_sheet_row(row, self.header)
+
+    def rows(self) -> Iterable[Dict[str, Any]]:
+        """本 sheet 的 raw row dict（含 dialect tag 注入）。
+
+        第一次呼叫接續 prepare() 預讀後的串流；之後每次呼叫都重新串流本分頁、
+        跳過表頭（含）以上各列（規則 A2 第二趟用）。
+        """
+        if self._pending is not None:
+            data_rows, self._pending = self._pending, None
+        else:
+            data_rows = self._open_rows()
+            for _ in range(self._best_idx + 1):
+                next(data_rows, None)
+        for row in data_rows:
+            d = self._row_dict(row)
+            # W2.4：用 reserved key 注入 dialect tag。下游 _normalize_row 會
+            # pop 掉這個 key、決定走 dialect path 或標準 path。命名加雙底線
+            # 前後綴是 magic key 的常見 convention，幾乎不可能撞到真欄名。
+            if self.dialect:
+                d["__celltrail_dialect__"] = self.dialect
+            yield d
+
+    def fingerprints(self) -> Tuple["Counter[bytes]", int]:
+        """規則 A2 第一趟：只留 fingerprint multiset 與有效證據列數。"""
+        return _fingerprint_rows(self.rows())
+
+    def materialize(self) -> "_ParsedSheet":
+        """整張讀完成 _ParsedSheet（多程序 worker 回傳用，可 pickle）。"""
+        if self.skip is not None:
+            return _ParsedSheet(self.sheet_name, skip=self.skip)
+        if self.simple_rows is not None:
+            return _ParsedSheet(
+                self.sheet_name, simple_rows=list(self.simple_rows), simple_skip=self.simple_skip,
+            )
+        rows = list(self.rows())
+        fp_counter, valid_rows = _fingerprint_rows(rows)
+        return _ParsedSheet(
+            self.sheet_name, dialect=self.dialect, rows=rows,
+            fp_counter=fp_counter, valid_rows=valid_rows,
+        )
+
+
+def _fingerprint_rows(rows: Iterable[Dict[str, Any]]) -> Tuple["Counter[bytes]", int]:
+    fp_counter: "Counter[bytes]" = Counter()
+    valid_rows = 0
+    for d in rows:
+        fp = _evidence_fingerprint(d)
+        if fp is None:
+            continue          # 非有效證據列，下游本來就會 skip，不參與比對
+        valid_rows += 1
+        fp_counter[fp] += 1
+    return fp_counter, valid_rows
+
+
+class _ParsedSheet:
+    """worker 已整張解析完的分頁；介面與 _ExcelSheet 相同（skip / simple_rows /
+    dialect / rows() / fingerprints()），讓 _iter_rows_excel 的合併邏輯不分路徑。"""
+
+    def __init__(self, sheet_name: str, skip=None, simple_rows=None, simple_skip=None,
+                 dialect=None, rows=None, fp_counter=None, valid_rows=0):
+        self.sheet_name = sheet_name
+        self.skip = skip
+        self.simple_rows = simple_rows
+        self.simple_skip = simple_skip
+        self.dialect = dialect
+        self._rows = rows or []
+        self._fp = (fp_counter if fp_counter is not None else Counter(), valid_rows)
+
+    def rows(self) -> Iterable[Dict[str, Any]]:
+        return iter(self._rows)
+
+    def fingerprints(self) -> Tuple["Counter[bytes]", int]:
+        return self._fp
+
+
+def _ingest_sheet_workers() -> int:
+    """多分頁平行解析的 worker 數（env `INGEST_SHEET_WORKERS`，預設 1 = 關閉）。
+
+    合理範圍 1~8，非法值 fallback 1。> 1 時每張分頁交給獨立 process 做「讀檔那一半」：
+    xlsx 解壓 + XML 解析（openpyxl，大 workbook 的主要成本）、表頭偵測、dialect 抽樣、
+    規則 A2 的 fingerprint 趟；主程序依分頁順序合併。代價是每張分頁在 worker 內
+    整張 materialize（無法再串流），而且整張 _ParsedSheet 會 pickle 回主程序：
+    主程序同時最多持有 workers 張完整分頁（含正在消費的那張；
+    _iter_parsed_sheets_parallel 消費一張補送一張），峰值記憶體約是最大幾張分頁之和，
+    不再是 user-002 串流路徑的常數上界。記憶體換核心數 —— 所以預設關閉，由部署端
+    依實例規格決定要不要開。
+
+    範圍刻意只到這裡（2026-10 註記）：逐列的 _normalize_row → 時間解析 → 驗證
+    （_iter_tabular_rows）以及 geocode / 寫入仍在主程序單一串流上跑。
+      - _iter_rows_excel 的契約是 yield「原始欄名」的 row dict：使用者手動對應
+        （_apply_user_mapping）在它之後才 rename，worker 先 normalize 會繞過對應；
+      - row_fp 的檔內序數與續跑的「原始列序號」要依整檔順序連續計數（_run_records），
+        normalize 之後的列還是得回到主程序排隊；
+      - normalize 在主程序與 geocode / 寫入的管線重疊（_run_records 的 parse 執行緒），
+        大檔的瓶頸通常在 geocode 而非這一段。
+    需要把 normalize 也搬進 worker 時，得先把 user_mapping 一併傳進 worker、並讓
+    worker 回傳 _iter_tabular_rows 形狀的 dict；在量測證明值得之前不做。
+    """
+    return env_int("INGEST_SHEET_WORKERS", 1, 1, 8)
+
+
+# worker process 內的狀態：initializer 設定一次，之後每個分頁 job 共用
+# （整份 file_bytes 只 pickle 一次到每個 worker，不是每張分頁一次）。
+_SHEET_WORKER_STATE: Dict[str, Any] = {}
+
+
+def _sheet_worker_init(file_bytes: bytes, reader: str, active_map: Dict[str, str],
+                       mapped_canon: set, scan_window: int, min_header_matches: int) -> None:
+    # 子程序沒有主程序的 carrier_profile 快取；直接灌入同一份 header_map，
+    # 避免每個 worker 各自連 DB，也保證與主程序用的是同一版對照表。
+    from app.services.carrier_profile import prime_cache
+    prime_cache(active_map)
+    _SHEET_WORKER_STATE.update(
+        file_bytes=file_bytes, reader=reader, active_map=active_map,
+        mapped_canon=mapped_canon, scan_window=scan_window,
+        min_header_matches=min_header_matches, sheets=None,
+    )
+
+
+def _parse_sheet_worker(sheet_pos: int) -> "_ParsedSheet":
+    st = _SHEET_WORKER_STATE
+    if st["sheets"] is None:
+        opener = _xlsx_sheets_pandas if st["reader"] == "pandas" else _xlsx_sheets_stream
+        st["sheets"], _close = opener(st["file_bytes"])
+    sheet_name, open_rows = st["sheets"][sheet_pos]
+    return _ExcelSheet(
+        f"sheet#{sheet_pos}", sheet_name, open_rows, st["active_map"], st["mapped_canon"],
+        st["scan_window"], st["min_header_matches"],
+    ).prepare().materialize()
+
+
+def _iter_parsed_sheets_parallel(file_bytes: bytes, n_sheets: int, workers: int, reader: str,
+                                 active_map: Dict[str, str], mapped_canon: set,
+                                 scan_window: int, min_header_matches: int):
+    """以 process pool 平行解析各分頁，**依分頁順序** yield _ParsedSheet。
+
+    依序等 future、依序 yield，故規則 A2 的「與先前已採納分頁比對」與 skipped_sheets
+    紀錄順序跟循序路徑完全相同。在途 future 最多 workers 個、消費一張補送一張
+    （不用 Executor.map：它一次送出全部分頁，解析完的整本 workbook 會堆在主程序等
+    管線消費）。提早關閉（消費端中止）→ 取消還沒開始的分頁，只等在跑的那幾張。
+    用 spawn 而非 fork：API process 內有 DB pool / scheduler 執行緒，fork 帶著已上鎖的
+    lock 進子程序會死鎖。
+    """
+    import concurrent.futures as _cf
+    import multiprocessing as _mp
+    from collections import deque
+
+    workers = min(workers, n_sheets)
+    ex = _cf.ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=_mp.get_context("spawn"),
+        initializer=_sheet_worker_init,
+        initargs=(file_bytes, reader, active_map, mapped_canon, scan_window, min_header_matches),
+    )
+    pending: "deque" = deque()
+    next_pos = 0
+    try:
+        while pending or next_pos < n_sheets:
+            while next_pos < n_sheets and len(pending) < workers:
+                pending.append(ex.submit(_parse_sheet_worker, next_pos))
+                next_pos += 1
+            yield pending.popleft().result()
+    finally:
+        ex.shutdown(wait=True, cancel_futures=True)
+
+
 def _iter_rows_excel(
     file_bytes: bytes,
     user_mapping: Optional[Dict[str, str]] = None,
@@ -475,7 +1038,7 @@ def _iter_rows_excel(
       - 嫌2/害 雙向 / 網路歷程：真表頭都在 row 5（前 4 列是查詢條件）
 
     新版演算法（取代舊 Unnamed 偵測，後者是本演算法 N=2 的特例）：
-      1. 用 header=None 讀整張 sheet 為 df_raw
+      1. 串流讀前 SCAN_WINDOW 列（不讀整張；見下方「串流讀取」）
       2. scan 前 N=25 列，逐列計算「該列有幾個 cell 命中 active header_map」
       3. 取「命中數最多」的列當 header（同分時取首次出現）
       4. 若最高命中數 < M=2 → 規則 B 跳過（保留 W2.1 行為的概念）
@@ -500,18 +1063,28 @@ def _iter_rows_excel(
       - row 0 = 跨欄大標、row 1 = 真表頭（W2.1 supertitle）→ best_idx=1
       - row 0~k = metadata、row k+1 = 真表頭（W2.2 buried）→ best_idx=k+1
 
-    型別處理盲點：
-      - pandas.Timestamp / numpy.datetime64 → 用 .to_pydatetime() 轉成
-        python datetime（切忌用 .item()，部分版本會回 int [ns]，後續
-        _parse_ts 全部失敗）
-      - 其他 numpy 數值型別才用 .item() 轉原生
+    串流讀取（2026-10）
+    ──────────────────
+    舊版每張 sheet 都 pd.read_excel(header=None) 整張讀成 df_raw，再 replace /
+    iterrows —— 100 MB 級 workbook 會同時握有好幾份整表副本，逐列也慢。改為
+    openpyxl read_only + values_only 串流（_xlsx_sheets_stream），記憶體上限 ≈
+    表頭掃描窗（SCAN_WINDOW 列）+ dialect 抽樣（20 列）+ 下游一塊 chunk：
+      - 表頭偵測 / 合併表頭修補 / dialect 抽樣只看預讀的前幾十列；
+      - 資料列邊讀邊 yield，不留存；
+      - 規則 A2 仍須「先看完整張才知道要不要跳過」，改為對同一分頁串流兩趟：
+        第一趟只留 16 bytes fingerprint 的 Counter，第二趟重新串流才 yield
+        （單分頁 workbook 不做 A2，只讀一趟）。
+    env INGEST_EXCEL_READER=pandas 可退回舊 pandas 讀取器；兩者共用本函式的
+    偵測邏輯與 _xlsx_cell 型別收斂，輸出逐列一致。
+
+    多分頁平行（2026-10）
+    ────────────────────
+    月報 13 張、6 個對象各一張歷程這類 workbook，循序只吃一顆核心。env
+    INGEST_SHEET_WORKERS > 1 時各分頁交給 process pool（_ExcelSheet 同一套邏輯）
+    讀檔 / 表頭偵測 + 算 fingerprint，主程序**依分頁順序**合併：規則 A2 比對順序與
+    skipped_sheets 紀錄和循序路徑完全相同。預設 1（關閉）。平行的只有讀檔那一半；
+    逐列 normalize 仍由下游在主程序做（理由見 _ingest_sheet_workers）。
     """
-    try:
-        import pandas as pd
-        import numpy as np
-    except Exception as e:
-        raise RuntimeError("請先安裝：pip install pandas openpyxl") from e
-
     # 一次取得 active header_map（W1 架構，DB 為 SoT）；service 內部會
     # 自動 fallback 到 _RAW2CANON。連 service import 都失敗（極端狀況，
     # 例如測試環境完全無 app context）才退到本檔常數
@@ -538,191 +1111,116 @@ def _iter_rows_excel(
         if v and v != "ignore"
     }
 
-    def _is_empty_cell(c) -> bool:
-        if c is None:
-            return True
-        if isinstance(c, str):
-            return not c.strip()
-        try:
-            return bool(pd.isna(c))
-        except Exception:
-            return False
-
-    # 用 ExcelFile 列出 sheet 名，避免每張都重新解析整個 workbook
-    xls = pd.ExcelFile(io.BytesIO(file_bytes))
+    reader = _excel_reader()
+    if reader == "pandas":
+        sheets, close_book = _xlsx_sheets_pandas(file_bytes)
+    else:
+        sheets, close_book = _xlsx_sheets_stream(file_bytes)
     skipped_sheets: List[Dict[str, Any]] = []   # 結構化跳過紀錄（見檔末 log）
     # 規則 A2 用：已採納分頁的 (分頁代號, fingerprint multiset)。
     # **只在單一 workbook 的生命週期內存在** —— 函式區域變數，每次呼叫重建，
     # 因此不可能跨檔案去重（不同單位交付的同批資料是各自獨立的證物）。
     accepted_sheets: List[Tuple[str, "Counter[bytes]"]] = []
     # 單一分頁的 workbook 不可能有分頁間重複 → 直接關掉 A2，省下整整一趟
-    # normalize（大檔上萬列，這趟不便宜）。
-    dedup_enabled = len(xls.sheet_names) > 1
-
-    for sheet_pos, sheet_name in enumerate(xls.sheet_names):
+    # 串流 + normalize（大檔上萬列，這趟不便宜）。
+    dedup_enabled = len(sheets) > 1
+
+    # 多分頁平行（INGEST_SHEET_WORKERS > 1）：各分頁在 worker 內解析完，依序合併；
+    # 否則循序、逐張串流。兩者產生的物件介面相同，下面的合併邏輯不分路徑。
+    workers = _ingest_sheet_workers()
+    if workers > 1 and len(sheets) > 1:
+        parsed_sheets = _iter_parsed_sheets_parallel(
+            file_bytes, len(sheets), workers, reader, active_map, mapped_canon,
+            SCAN_WINDOW, MIN_HEADER_MATCHES,
+        )
+    else:
         # 分頁對外代號一律用「位置」而非名稱：實測分頁名可能直接是門號或對象姓名
         # （例如「0958549697 雙向歷程（嫌1）」），寫進 log 等同外洩 PII。
-        sheet_ref = f"sheet#{sheet_pos}"
-        # 整張 raw 讀（無 header），讓我們可以掃任意列當 header
-        df_raw = pd.read_excel(xls, sheet_name=sheet_name, header=None)
-
-        # 規則 A：總列數 < 2（連「1 表頭 + 1 資料」都湊不齊）才當非資料表。
-        # 為什麼從舊的 < 5 放寬到 < 2（2026-06-22）：
-        #   偵查實務上「某對象在調閱期間只有 1～2 筆通聯」是真實且關鍵的資料，
-        #   舊門檻會把這種小檔整個跳過 → 沉默丟證據，違反證據完整性原則。
-        #   擋「封面頁／統計頁／說明頁」這類非資料 sheet 的真正防線是規則 B
-        #   （表頭必須命中 ≥2 個 canonical 別名）＋ line 350（去表頭後須 ≥1 列），
-        #   不是列數本身；故安全地把列數門檻降到「資料表的物理下限」= 2 列。
-        if len(df_raw) < 2:
-            skipped_sheets.append({
-                "sheet": sheet_ref, "reason": "row_lt_2", "rows": int(len(df_raw)),
-            })
-            continue
-
-        # W2.2 核心：scan 前 SCAN_WINDOW 列，找命中 header_map 最多的列
-        scan_n = min(SCAN_WINDOW, len(df_raw))
-        best_idx = -1
-        best_match = 0
-        for ri in range(scan_n):
-            row = df_raw.iloc[ri]
-            n = 0
-            for c in row:
-                if _is_empty_cell(c):
-                    continue
-                canon = _canon(str(c))
-                if active_map.get(canon) or canon in mapped_canon:
-                    n += 1
-            if n > best_match:
-                best_match = n
-                best_idx = ri
+        parsed_sheets = (
+            _ExcelSheet(
+                f"sheet#{pos}", name, open_rows, active_map, mapped_canon,
+                SCAN_WINDOW, MIN_HEADER_MATCHES,
+            ).prepare()
+            for pos, (name, open_rows) in enumerate(sheets)
+        )
 
-        # 規則 B：scan 視窗內無夠強的 header → 視為非資料 sheet
-        if best_match < MIN_HEADER_MATCHES:
-            # P8.2-fmt fallback：規則 B 失敗時試 simple_time_location 極簡格式
-            # （A=時間, B=位置）。僅在此嘗試 → 電信格式（過規則 B）零影響、零回歸。
-            emitted_simple = False
-            for srow in _iter_simple_time_location(df_raw):
-                emitted_simple = True
-                yield srow
-            if emitted_simple:
+    try:
+        for sheet_pos, sheet in enumerate(parsed_sheets):
+            sheet_ref = f"sheet#{sheet_pos}"
+            if sheet.skip is not None:
+                skipped_sheets.append(sheet.skip)
                 continue
-            skipped_sheets.append({
-                "sheet": sheet_ref, "reason": "header_matches_below_threshold",
-                "best_match": int(best_match), "threshold": MIN_HEADER_MATCHES,
-            })
-            continue
-
-        # 切片：best_idx 是 header row，其下是資料
-        header_row = df_raw.iloc[best_idx]
-        header: List[str] = []
-        for i, c in enumerate(header_row):
-            if _is_empty_cell(c):
-                # W2.6：合併表頭偵測 — 若前欄的 canonical mapping 是 cell_id 類，
-                # 當前空欄是「基地台/交換機」合併表頭的右半欄（含基地台地址）。
-                # 根因：雙向通聯格式 H1:I1 合併儲存格，H=數字 cell_id，I=地址，
-                # pandas 讀 I1=None，沒名字的欄無法 normalize 到 cell_addr。
-                # 修法：偵測到這個 pattern 就直接補上已知別名「基地台地址」。
-                if i > 0 and active_map.get(_canon(header[-1])) in ("cell_id", "cell_id_compound"):
-                    header.append("基地台地址")
-                else:
-                    header.append(f"_unnamed_{i}")
-            else:
-                header.append(str(c).strip())
-        df = df_raw.iloc[best_idx + 1:].copy()
-        df.columns = header
 
-        # 規則 A 二次校驗：去 header 後資料列若 < 1，跳過（罕見但保險）
-        if len(df) < 1:
-            skipped_sheets.append({
-                "sheet": sheet_ref, "reason": "no_data_row_after_header",
-                "header_row_idx": int(best_idx),
-            })
-            continue
+            if sheet.simple_rows is not None:
+                emitted_simple = False
+                for srow in sheet.simple_rows:
+                    emitted_simple = True
+                    yield srow
+                if not emitted_simple:
+                    skipped_sheets.append(sheet.simple_skip)
+                continue
 
-        df = df.replace({np.nan: ""})
+            # 落 log（forensic 系統應可追溯每 sheet 走的 normalize path）
+            if sheet.dialect:
+                import logging
+                logging.getLogger(__name__).info(
+                    "ingest: sheet=%r detected dialect=%r", sheet.sheet_name, sheet.dialect
+                )
+
+            # ── 規則 A2（2026-07-21）：同一 workbook 內的「子集分頁」去重 ──────────
+            # 問題：承辦人常把資料分頁複製一份用來標記重點（實測 031543 的第二張分頁
+            #   是第一張的**純子集**：4,818 個唯一列全部已存在於第一張）。W2.1 多 sheet
+            #   支援會兩張都讀 → 同一筆通聯入庫兩次；raw_traces 沒有內容層級唯一索引，
+            #   DB 不會擋 → 事件頻次被灌水。
+            # 為什麼這是證據完整性問題而非效能問題：「該門號在該時段出現幾次」是實質
+            #   待證事實，翻倍會直接扭曲軌跡密度與停留時間的判讀。
+            # 為什麼先前的「逐格 sha256 相同」規則不夠：承辦人只要在副本上動過一格
+            #   （或刪掉幾列），雜湊就不同 → 規則失效、重複照樣寫進去。實務上副本幾乎
+            #   一定會被動過，所以嚴格相等等於形同虛設。
+            # 判定改用 **multiset（Counter）包含**而非 set：set 會把「A 有 1 筆、B 有
+            #   3 筆」誤判成完全重複，而那多出來的 2 筆是真實的獨立事件，漏存等同證據
+            #   滅失。改成對每個 fingerprint 都要求 count_B <= count_A，多出來的量一定
+            #   被算成 new_rows。
+            # fingerprint 建在 **normalize 之後**：這樣比較的是證據語意欄位，樣式／顏色／
+            #   註解／未映射欄（承辦人另加的標記欄）天然不參與比較 —— 副本被塗色或加註
+            #   仍能正確辨識為子集，而真正多出來的證據列一定會被保留。
+            # 只有 new_rows == 0（B 完全被單一張 A 覆蓋）才整張跳過；只要有一列是新的，
+            #   整張保留 —— 寧可多存不可漏存。
+            # 串流讀取下第一趟只留 fingerprint Counter，第二趟 rows() 重新串流才 yield。
+            if dedup_enabled:
+                fp_counter, valid_rows = sheet.fingerprints()
+
+                subset_of = None
+                if valid_rows > 0:
+                    # 逐一與「先前已採納的單一分頁」比對。刻意不用「所有分頁的聯集」：
+                    # 要求被單一張完整覆蓋更保守，也才能在稽核紀錄裡明確指出參照對象。
+                    for prev_ref, prev_counter in accepted_sheets:
+                        new_rows = sum(
+                            max(0, cnt - prev_counter.get(fp, 0))
+                            for fp, cnt in fp_counter.items()
+                        )
+                        if new_rows == 0:
+                            subset_of = prev_ref
+                            break
+
+                if subset_of is not None:
+                    skipped_sheets.append({
+                        "sheet": sheet_ref,
+                        "reason": "subset_duplicate_sheet",
+                        "reference_sheet": subset_of,
+                        "valid_rows": valid_rows,
+                        "duplicate_rows": valid_rows,   # new_rows==0 → 全數為重複
+                        "new_rows": 0,
+                    })
+                    continue
 
-        # ── W2.4：dialect detection（per-sheet）──────────────────
-        # 在 sheet 進入 yield loop 前一次決定 dialect，避免每 row 重算。
-        # 抽樣前 20 row 給 detector，足以判斷主流類別、又不會讀爆大檔。
-        sample_rows: List[Dict[str, Any]] = []
-        for _, sample_row in df.head(20).iterrows():
-            sample_rows.append({str(k).strip(): sample_row[k] for k in df.columns})
-        sheet_dialect = _detect_dialect(header, sample_rows)
-        # 落 log（forensic 系統應可追溯每 sheet 走的 normalize path）
-        if sheet_dialect:
-            import logging
-            logging.getLogger(__name__).info(
-                "ingest: sheet=%r detected dialect=%r", sheet_name, sheet_dialect
-            )
+                accepted_sheets.append((sheet_ref, fp_counter))
 
-        def _sheet_rows():
-            """產生本 sheet 的 raw row dict（含 dialect tag 注入）。"""
-            for _, row in df.iterrows():
-                d = _materialize_sheet_row(row, df.columns)
-                # W2.4：用 reserved key 注入 dialect tag。下游 _normalize_row 會
-                # pop 掉這個 key、決定走 dialect path 或標準 path。命名加雙底線
-                # 前後綴是 magic key 的常見 convention，幾乎不可能撞到真欄名。
-                if sheet_dialect:
-                    d["__celltrail_dialect__"] = sheet_dialect
+            for d in sheet.rows():
                 yield d
-
-        # ── 規則 A2（2026-07-21）：同一 workbook 內的「子集分頁」去重 ──────────
-        # 問題：承辦人常把資料分頁複製一份用來標記重點（實測 031543 的第二張分頁
-        #   是第一張的**純子集**：4,818 個唯一列全部已存在於第一張）。W2.1 多 sheet
-        #   支援會兩張都讀 → 同一筆通聯入庫兩次；raw_traces 沒有內容層級唯一索引，
-        #   DB 不會擋 → 事件頻次被灌水。
-        # 為什麼這是證據完整性問題而非效能問題：「該門號在該時段出現幾次」是實質
-        #   待證事實，翻倍會直接扭曲軌跡密度與停留時間的判讀。
-        # 為什麼先前的「逐格 sha256 相同」規則不夠：承辦人只要在副本上動過一格
-        #   （或刪掉幾列），雜湊就不同 → 規則失效、重複照樣寫進去。實務上副本幾乎
-        #   一定會被動過，所以嚴格相等等於形同虛設。
-        # 判定改用 **multiset（Counter）包含**而非 set：set 會把「A 有 1 筆、B 有
-        #   3 筆」誤判成完全重複，而那多出來的 2 筆是真實的獨立事件，漏存等同證據
-        #   滅失。改成對每個 fingerprint 都要求 count_B <= count_A，多出來的量一定
-        #   被算成 new_rows。
-        # fingerprint 建在 **normalize 之後**：這樣比較的是證據語意欄位，樣式／顏色／
-        #   註解／未映射欄（承辦人另加的標記欄）天然不參與比較 —— 副本被塗色或加註
-        #   仍能正確辨識為子集，而真正多出來的證據列一定會被保留。
-        # 只有 new_rows == 0（B 完全被單一張 A 覆蓋）才整張跳過；只要有一列是新的，
-        #   整張保留 —— 寧可多存不可漏存。
-        if dedup_enabled:
-            fp_counter: "Counter[bytes]" = Counter()
-            valid_rows = 0
-            for _d in _sheet_rows():
-                fp = _evidence_fingerprint(_d)
-                if fp is None:
-                    continue          # 非有效證據列，下游本來就會 skip，不參與比對
-                valid_rows += 1
-                fp_counter[fp] += 1
-
-            subset_of = None
-            if valid_rows > 0:
-                # 逐一與「先前已採納的單一分頁」比對。刻意不用「所有分頁的聯集」：
-                # 要求被單一張完整覆蓋更保守，也才能在稽核紀錄裡明確指出參照對象。
-                for prev_ref, prev_counter in accepted_sheets:
-                    new_rows = sum(
-                        max(0, cnt - prev_counter.get(fp, 0))
-                        for fp, cnt in fp_counter.items()
-                    )
-                    if new_rows == 0:
-                        subset_of = prev_ref
-                        break
-
-            if subset_of is not None:
-                skipped_sheets.append({
-                    "sheet": sheet_ref,
-                    "reason": "subset_duplicate_sheet",
-                    "reference_sheet": subset_of,
-                    "valid_rows": valid_rows,
-                    "duplicate_rows": valid_rows,   # new_rows==0 → 全數為重複
-                    "new_rows": 0,
-                })
-                continue
-
-            accepted_sheets.append((sheet_ref, fp_counter))
-
-        for d in _sheet_rows():
-            yield d
+    finally:
+        parsed_sheets.close()   # 平行路徑：提早結束時取消還沒開始的分頁
+        close_book()
 
     # 跳過的 sheet 留下軌跡（forensic 系統應該可追溯）。
     # 全部欄位皆為代號／計數，不含分頁名稱、儲存格內容或任何證物資料 ——
@@ -961,11 +1459,60 @@ def _split_compound_cell(v: Any) -> Tuple[Optional[str], Optional[str]]:
     return (s, None)
 
 
-def _normalize_row(
-    r: Dict[str, Any],
-    dialect: Optional[str] = None,
-) -> Dict[str, Any]:
-    """
+_HEX_SHORT_CODE_RE = re.compile(r"[0-9A-Fa-f]{6,12}")
+_COLUMN_PLAN_CACHE_MAX = 256
+
+
+class _ColumnPlan:
+    """一組欄名（依 row 欄序）對某份 header_map 的解析結果。
+
+    direct：(raw_key, canonical_key) 依原欄序，只含 header_map 認得的欄；
+    cell_id_compound 也在其中、由 _normalize_row 延後處理（欄序語意不變）。
+    """
+    __slots__ = ("header_map", "direct")
+
+    def __init__(self, header_map: Dict[str, str], direct: Tuple[Tuple[str, str], ...]):
+        self.header_map = header_map
+        self.direct = direct
+
+
+# 欄名組合 → _ColumnPlan。一個檔案（一張 sheet）只有一組欄名，整份檔案共用同一個
+# plan；上限只是防呆（例如呼叫端餵進每列欄名都不同的 dict）。
+_COLUMN_PLAN_CACHE: Dict[Tuple[Any, ...], _ColumnPlan] = {}
+
+
+def _column_plan(r: Dict[str, Any], header_map: Dict[str, str]) -> _ColumnPlan:
+    """取得（或建立）r 這組欄名的 column plan。
+
+    為什麼需要：舊版每列、每欄都重跑 _canon（NFKC + 兩次 regex）再查 header_map，
+    同一份檔案幾十個欄名被重複正規化數百萬次。plan 以「欄名 tuple」為 key 快取，
+    每份檔案只解析一次；header_map 換了（carrier_profile.invalidate_cache 後
+    會是新物件）就以 identity 判定失效、重建，不會拿舊對照表正規化。
+    """
+    cols = tuple(r)
+    plan = _COLUMN_PLAN_CACHE.get(cols)
+    if plan is not None and plan.header_map is header_map:
+        return plan
+    direct = []
+    for k in cols:
+        # W2.4：跳過 dialect tag injection key（若不慎流入）
+        if k == "__celltrail_dialect__":
+            continue
+        key = header_map.get(_canon(k))
+        if key:
+            direct.append((k, key))
+    plan = _ColumnPlan(header_map, tuple(direct))
+    if len(_COLUMN_PLAN_CACHE) >= _COLUMN_PLAN_CACHE_MAX:
+        _COLUMN_PLAN_CACHE.clear()
+    _COLUMN_PLAN_CACHE[cols] = plan
+    return plan
+
+
+def _normalize_row(
+    r: Dict[str, Any],
+    dialect: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
     把原始 row dict（來源欄名）正規化成 canonical row dict。
     W1 起改從 carrier_profile service 取對照表（DB 為 SoT），
     DB 不可用時 service 會自動 fallback 到本檔的 _RAW2CANON。
@@ -1006,6 +1553,10 @@ def _normalize_row(
       - dialect 是「整批替換規則」、本來就要可預測；繼承會讓行為依賴
         全域 alias 順序，違反 dialect 隔離設計初衷
       - 中華上網方言實測無多源、無複合欄，根本不需這些 fallback 機制
+
+    效能（2026-10）：欄名 → canonical 的解析（_canon + header_map 查表）改由
+    _column_plan 依「欄名組合」快取，每份檔案只做一次；熱迴圈只剩逐欄取值、
+    空值判斷與 hex 防呆，語意與上述各階段完全相同。
     """
     # W2.4：若呼叫端未顯式傳 dialect，從 raw row 中讀取 _iter_rows_excel
     # 注入的 dialect tag。這讓既有呼叫 `_normalize_row(raw)` 完全不需改、
@@ -1022,24 +1573,22 @@ def _normalize_row(
     # ── 以下為原 W1.5 / W2.3 路徑（dialect=None 時的行為，零改動）──
     # lazy import 避免 circular（service 也可能 import ingest 做 fallback）
     from app.services.carrier_profile import get_active_header_map
-    header_map = get_active_header_map()
+    if not r:
+        return {}
+    plan = _column_plan(r, get_active_header_map())
     out: Dict[str, Any] = {}
-    compound_pending: List[Tuple[str, Any]] = []  # (raw_key, value)
+    compound_pending: List[Any] = []  # 複合欄的值（依欄序）
 
-    # Pass 1：直接欄（W1.5 既有邏輯，行為不變）
-    for k, v in (r or {}).items():
-        # W2.4：跳過 dialect tag injection key（若不慎流入）
-        if k == "__celltrail_dialect__":
-            continue
-        key = header_map.get(_canon(k))
-        if not key:
-            continue
+    # Pass 1：直接欄（W1.5 既有邏輯，行為不變）。欄名 → canonical 已由
+    # _column_plan 一次解析好，這裡只剩逐欄取值。
+    for k, key in plan.direct:
+        v = r[k]
         # 多源欄位 fallback：空值（None / 空字串 / 純空白）不覆蓋已有值
         if v is None or (isinstance(v, str) and not v.strip()):
             continue
         if key == "cell_id_compound":
             # 複合欄延後處理（保證直接欄都走完才填空缺）
-            compound_pending.append((k, v))
+            compound_pending.append(v)
             continue
         # 內容驗證：cell_addr 不接受 hex 短碼（LAC+CI 之類，如 `0E2921B7`）。
         # 背景：實測 0517test/台哥大-第二類.xlsx 有 ≥2 欄都映到 cell_addr
@@ -1049,14 +1598,14 @@ def _normalize_row(
         #   留空讓 coverage 把這列正確歸類為 cellid_only（需業者表）而非
         #   addr_geocode_failed（誤以為地址查不到）。
         if key == "cell_addr" and isinstance(v, str) \
-                and re.fullmatch(r"[0-9A-Fa-f]{6,12}", v.strip()):
+                and _HEX_SHORT_CODE_RE.fullmatch(v.strip()):
             if not out.get("sector_id"):
                 out["sector_id"] = v.strip()
             continue
         out[key] = v
 
     # Pass 2：複合欄拆解（W2.3）— 只在對應 canonical key 仍空時填入
-    for _k, v in compound_pending:
+    for v in compound_pending:
         cid, addr = _split_compound_cell(v)
         if cid and not (str(out.get("cell_id") or "").strip()):
             out["cell_id"] = cid
@@ -1100,40 +1649,221 @@ def _normalize_row_dialect(
     return out
 
 # ====== DB 寫入（避免 prepared statement 衝突） ======
+# raw_traces 寫入欄位（順序 = COPY 欄序 = binary set_types 順序，三處必須一致）。
+_INSERT_COLS = (
+    "project_id", "target_id", "start_ts", "end_ts",
+    "cell_id", "cell_addr", "sector_name", "site_code", "sector_id",
+    "azimuth", "lat", "lng", "accuracy_m", "row_fp",
+)
+_INSERT_COL_TYPES = (
+    "text", "text", "timestamptz", "timestamptz",
+    "text", "text", "text", "text", "text",
+    "int4", "float8", "float8", "int4", "bytea",
+)
+
+# raw_traces.row_fp（2026-10）：每列內容 fingerprint（見 _RowFingerprinter），
+# 同 project/target 內 unique → 重傳同一檔時 INSERT ... ON CONFLICT DO NOTHING 略過已有列。
+# partial index 只管「未軟刪」的列：刪掉 target 後重傳，資料會正常重新落地。
+# 舊資料與 save-records 路徑的 row_fp 為 NULL，不參與去重。
+_row_fp_ready = False
+
+
+# 先看 catalog，齊了就不跑 DDL：ALTER TABLE / 非 CONCURRENTLY 的 CREATE INDEX 即使 IF NOT EXISTS
+# 也要先拿 raw_traces 的強鎖（ACCESS EXCLUSIVE / SHARE），每個新 process 第一次匯入都會跟線上讀寫搶鎖。
+_ROW_FP_CATALOG_SQL = """
+SELECT EXISTS (SELECT 1 FROM pg_attribute
+                WHERE attrelid = 'raw_traces'::regclass AND attname = 'row_fp' AND NOT attisdropped),
+       to_regclass('uq_raw_traces_row_fp') IS NOT NULL
+"""
+
+
+def _ensure_row_fp_column() -> bool:
+    """執行期補 row_fp 欄 + unique index（idempotent；仿 geocode._ensure_sql_cache）。
+
+    新環境忘了套 migration_raw_traces_row_fp.sql 也不會壞；大表建議先以
+    CONCURRENTLY 套 migration。已套過（正常情形）只跑一次 catalog 查詢，不碰 DDL；
+    只有真的缺欄 / 缺 index 才補缺的那一項。
+    """
+    global _row_fp_ready
+    if _row_fp_ready:
+        return True
+    try:
+        with get_conn() as conn, conn.cursor() as cur:
+            cur.execute(_ROW_FP_CATALOG_SQL, prepare=False)
+            has_col, has_idx = cur.fetchone()
+            if not has_col:
+                cur.execute("ALTER TABLE raw_traces ADD COLUMN IF NOT EXISTS row_fp BYTEA NULL", prepare=False)
+            if not has_idx:
+                print("[ingest] WARN uq_raw_traces_row_fp 不存在，執行期補建（會鎖寫入；大表請改套 migration）")
+                cur.execute(
+                    "CREATE UNIQUE INDEX IF NOT EXISTS uq_raw_traces_row_fp"
+                    "  ON raw_traces (project_id, target_id, row_fp)"
+                    "  WHERE row_fp IS NOT NULL AND deleted_at IS NULL",
+                    prepare=False,
+                )
+        _row_fp_ready = True
+    except Exception as e:
+        print(f"[ingest] ensure row_fp column failed: {type(e).__name__}: {e}")
+    return _row_fp_ready
+
+
+def _existing_row_fps(project_id: str, target_id: str, fps: List[bytes]) -> set:
+    """查這批 row_fp 中已落地（未軟刪）的那些；查詢失敗回空集合（寫入端 ON CONFLICT 仍會擋）。"""
+    if not fps or not _ensure_row_fp_column():
+        return set()
+    try:
+        with get_conn() as conn, conn.cursor() as cur:
+            cur.execute(
+                "SELECT row_fp FROM raw_traces"
+                " WHERE project_id = %s AND target_id = %s"
+                "   AND row_fp = ANY(%s) AND deleted_at IS NULL",
+                (project_id, target_id, fps),
+                prepare=False,
+            )
+            return {bytes(r[0]) for r in cur.fetchall()}
+    except Exception as e:
+        print(f"[ingest] row_fp precheck failed: {type(e).__name__}: {e}")
+        return set()
+
+
+def _insert_engine() -> str:
+    """寫入引擎（env `INGEST_INSERT_ENGINE`）：`copy`（預設）或 `executemany`（舊路徑）。
+
+    保留 executemany 當逃生門：若某個部署環境的 pooler 不支援 COPY 或 TEMP 表，
+    不需改 code、改 env 即可退回舊行為。非法值一律視為預設 copy。
+    """
+    raw = (os.getenv("INGEST_INSERT_ENGINE", "copy") or "").strip().lower()
+    return "executemany" if raw == "executemany" else "copy"
+
+
 def _insert_records(records: List[Dict[str, Any]]) -> int:
-    """批次寫入 raw_traces；座標自帶 geom"""
+    """批次寫入 raw_traces；座標自帶 geom。依 _insert_engine() 分流。
+
+    失敗一律轉成 HTTPException(400)，_ingest_rows_stream._write_chunk 以此判定「部分匯入」。
+    """
     if not records:
         return 0
+    if _insert_engine() == "executemany":
+        return _insert_records_executemany(records)
+    return _copy_records(records)
+
+
+def _copy_row(rec: Dict[str, Any]) -> Tuple[Any, ...]:
+    """record dict → binary COPY 的一列 tuple（型別嚴格對齊 _INSERT_COL_TYPES）。
+
+    binary COPY 不像 `%s::int` 會在 server 端轉型，送錯 Python 型別會直接失敗；
+    save-records 路徑的 record 來自前端 JSON（azimuth 可能是字串 "30"），故一律
+    在這裡過 _to_int / _to_float 收斂型別。
+    """
+    out: List[Any] = []
+    for col, typ in zip(_INSERT_COLS, _INSERT_COL_TYPES):
+        v = rec.get(col)
+        if typ == "text":
+            out.append(None if v is None else str(v))
+        elif typ == "bytea":
+            out.append(None if v is None else bytes(v))
+        elif typ == "int4":
+            out.append(_to_int(v))
+        elif typ == "float8":
+            out.append(_to_float(v))
+        else:
+            out.append(v)
+    return tuple(out)
+
+
+def _copy_records(records: List[Dict[str, Any]]) -> int:
+    """binary COPY 寫入：COPY 進 TEMP staging 表 → 一次 INSERT ... SELECT 建 geom。
+
+    與 executemany 路徑相比：
+      - 逐列只走 COPY 串流，不再每列解析/規劃一次 INSERT + CASE 運算式；
+      - geom 在 INSERT ... SELECT 內 set-wise 建立（ST_MakePoint 一次跑整塊）；
+      - 整塊包在單一 transaction：staging 表 ON COMMIT DROP，失敗時整塊 rollback、
+        不會留下半塊資料，_write_chunk 的「已成功寫入 N 筆」因此精確到塊。
+    TEMP 表不寫 WAL（等同 unlogged），只活在這個 transaction 內，pooler 交易模式安全。
+
+    ON CONFLICT DO NOTHING（2026-10）：row_fp 撞 uq_raw_traces_row_fp 的列（重傳）略過；
+    回傳值是「真的新寫入」的列數，被略過的不算。
+    """
+    cols_sql = ", ".join(_INSERT_COLS)
+    _ensure_row_fp_column()
+    try:
+        with get_conn() as conn:
+            with conn.transaction():
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "CREATE TEMP TABLE _raw_traces_stage ("
+                        "  project_id text, target_id text,"
+                        "  start_ts timestamptz, end_ts timestamptz,"
+                        "  cell_id text, cell_addr text, sector_name text, site_code text, sector_id text,"
+                        "  azimuth int4, lat float8, lng float8, accuracy_m int4, row_fp bytea"
+                        ") ON COMMIT DROP",
+                        prepare=False,
+                    )
+                    with cur.copy(f"COPY _raw_traces_stage ({cols_sql}) FROM STDIN (FORMAT BINARY)") as cp:
+                        cp.set_types(list(_INSERT_COL_TYPES))
+                        for rec in records:
+                            cp.write_row(_copy_row(rec))
+                    cur.execute(
+                        f"""
+                        INSERT INTO raw_traces ({cols_sql}, geom)
+                        SELECT {cols_sql},
+                               CASE WHEN lat IS NOT NULL AND lng IS NOT NULL
+                                    THEN ST_SetSRID(ST_MakePoint(lng, lat), 4326)
+                               END
+                          FROM _raw_traces_stage
+                        ON CONFLICT DO NOTHING
+                        """,
+                        prepare=False,
+                    )
+                    n = cur.rowcount
+        return n if n is not None and n >= 0 else len(records)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"匯入失敗：{type(e).__name__}: {e}")
+
+
+def _insert_records_executemany(records: List[Dict[str, Any]]) -> int:
+    """舊寫入路徑：逐列 INSERT（executemany）+ 每列 CASE 建 geom。"""
     sql = """
     INSERT INTO raw_traces (
       project_id, target_id, start_ts, end_ts,
       cell_id, cell_addr, sector_name, site_code, sector_id,
-      azimuth, lat, lng, accuracy_m, geom
+      azimuth, lat, lng, accuracy_m, row_fp, geom
     )
     VALUES (
       %(project_id)s::text, %(target_id)s::text,
       %(start_ts)s::timestamptz, %(end_ts)s::timestamptz,
       %(cell_id)s::text, %(cell_addr)s::text, %(sector_name)s::text, %(site_code)s::text, %(sector_id)s::text,
-      %(azimuth)s::int, %(lat)s::float8, %(lng)s::float8, %(accuracy_m)s::int,
+      %(azimuth)s::int, %(lat)s::float8, %(lng)s::float8, %(accuracy_m)s::int, %(row_fp)s::bytea,
       CASE
         WHEN %(lat)s::float8 IS NOT NULL AND %(lng)s::float8 IS NOT NULL
           THEN ST_SetSRID(ST_MakePoint(%(lng)s::float8, %(lat)s::float8), 4326)
         ELSE NULL
       END
     )
+    ON CONFLICT DO NOTHING
     """
+    _ensure_row_fp_column()
     try:
         with get_conn() as conn:
             with conn.cursor() as cur:
                 # psycopg3 預設多次執行後可能 server-side prepare；
                 # 這裡用 executemany 但不手動 prepare，並仰賴 get_conn() 裡的 prepare_threshold=0（已在 session.py 設定）
-                cur.executemany(sql, records)
-        return len(records)
+                # save-records 的 record 沒有 row_fp → 補 None（named param 缺 key 會失敗）
+                cur.executemany(sql, [r if "row_fp" in r else {**r, "row_fp": None} for r in records])
+                n = cur.rowcount
+        return n if n is not None and n >= 0 else len(records)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"匯入失敗：{type(e).__name__}: {e}")
 
 # ====== 主要匯入（自動判斷副檔名；PDF 直接支援） ======
-def ingest_auto(project_id: str, target_id: str, filename: str, file_bytes: bytes) -> Dict[str, Any]:
+def ingest_auto(
+    project_id: str,
+    target_id: str,
+    filename: str,
+    file_bytes: bytes,
+    progress: Optional["IngestProgress"] = None,
+    skip_existing: bool = False,
+) -> Dict[str, Any]:
     """
     前端一律呼叫這支：依副檔名自動分流
     - .csv/.txt/.tsv → 文字表格
@@ -1141,16 +1871,23 @@ def ingest_auto(project_id: str, target_id: str, filename: str, file_bytes: byte
     - .pdf → 走 PDF 解析（手機拍來的 PDF 也可）
 
     加密（密碼保護）的 Office 檔會在此被擋下並回清楚錯誤（不嘗試解密）。
+
+    progress：背景匯入 job（services.ingest_jobs）的進度 / 續跑掛勾，同步上傳不傳。
+    skip_existing：已知是重傳（同 sha256 上傳過、或 job 續跑）時傳 True，見 _ingest_rows_stream。
+    三種格式都走 _run_records，兩者語意一致（PDF 的「原始列序號」= 各頁表格資料列依序編號）。
     """
     _reject_if_encrypted(file_bytes)
     ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
     if ext in {"csv", "txt", "tsv"}:
-        return _ingest_rows_stream(project_id, target_id, _iter_rows_csv(file_bytes))
+        return _ingest_rows_stream(project_id, target_id, _iter_rows_csv(file_bytes),
+                                   progress=progress, skip_existing=skip_existing)
     # xlsx / xltx（Excel 範本）/ xlsm（含巨集）/ xltm（含巨集範本）皆走同一條 openpyxl 路徑
     elif ext in {"xlsx", "xltx", "xlsm", "xltm"}:
-        return _ingest_rows_stream(project_id, target_id, _iter_rows_excel(file_bytes))
+        return _ingest_rows_stream(project_id, target_id, _iter_rows_excel(file_bytes),
+                                   progress=progress, skip_existing=skip_existing)
     elif ext == "pdf":
-        return ingest_pdf(project_id, target_id, file_bytes)
+        return ingest_pdf(project_id, target_id, file_bytes,
+                          progress=progress, skip_existing=skip_existing)
     else:
         raise ValueError("不支援的檔案格式：請使用 CSV / TXT / XLSX / XLTX / PDF")
 
@@ -1169,128 +1906,590 @@ def _ingest_chunk_size() -> int:
     return n if 100 <= n <= 5000 else 800
 
 
-def _ingest_rows_stream(project_id: str, target_id: str, rows_iter: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
-    """chunk-based 串流匯入（P8.1，2026-06-28）：每塊 normalize → bulk geocode → insert → 釋放。
+def _ingest_pipeline_enabled() -> bool:
+    """是否以管線方式重疊 parse / geocode / write（env `INGEST_PIPELINE`，預設開）。
 
-    與舊版（整檔 hold to_insert + 逐筆 geocode.lookup）對比：
-      - 記憶體峰值限於一塊（INGEST_CHUNK_SIZE，預設 800），不再整檔累積 → 解 OOM（七-8）。
-      - geocode 每塊走 lookup_bulk（並行 + SQL 快取 + 去重）→ 解 H1（存檔路徑原本沒並行）。
-      - 統計 total/inserted/skipped 語意與舊版一致；errors 仍保留 [:50] 上限。
-      - 原子性「方案 A」：每塊 _insert_records 後即 commit（autocommit）。某塊寫入失敗即
-        **停止後續、誠實回報「部分匯入」**（errors 首列標明 + inserted < total），由上層
-        以真實 inserted/skipped 回填 evidence_stats/audit，不假裝整檔成功。
+    設 0 / false / off 退回逐塊循序（除錯、或 DB pool 極小的部署用）。
+    """
+    raw = (os.getenv("INGEST_PIPELINE", "1") or "").strip().lower()
+    return raw not in {"0", "false", "off", "no"}
 
-    刻意不動 _normalize_row / _parse_ts / _resolve_latlng / _guess_accuracy 的語意。
+
+class IngestProgress:
+    """_run_records 的進度回報 / 續跑掛勾（2026-10，背景匯入 job 用）。
+
+    預設實作全是 no-op；services.ingest_jobs 繼承後把進度寫回 ingest_jobs 表。
+    「原始列序號」= 列來源的 1-based 位置（含被 skip 的列），續跑時以此對齊。
+
+      resume_rows     ：續跑——前 N 列已由前一次執行寫入並 commit，本次只重算統計、不再寫入
+      resume_inserted ：前一次執行已寫入的筆數（inserted 從這裡接著累加）
+      parsed()        ：parse 階段每交出一塊呼叫一次（目前讀到第幾列、累計 skipped）
+      geocoded()      ：geocode 階段每完成一塊呼叫一次（本塊筆數）
+      committed()     ：write 階段每塊 commit 後呼叫（寫到第幾列為止、累計 inserted）
+
+    geocoded / committed 在管線的 worker 執行緒上被呼叫；實作不可假設在呼叫端執行緒。
+    """
+
+    resume_rows = 0
+    resume_inserted = 0
+
+    def parsed(self, rows: int, skipped: int) -> None:
+        pass
+
+    def geocoded(self, rows: int) -> None:
+        pass
+
+    def committed(self, rows_through: int, inserted: int) -> None:
+        pass
+
+
+# 管線各階段之間的佇列深度（塊數）。1 = 每個階段手上一塊、佇列裡再等一塊：
+# 記憶體峰值固定在「parse 中 1 塊 + 2 個佇列各 1 塊 + geocode 中 1 塊 + write 中 1 塊」
+# ≤ 5 塊，與檔案大小無關；加深佇列只會多吃記憶體，重疊效果不會更好。
+_PIPELINE_QUEUE_DEPTH = 1
+
+
+def _iter_tabular_rows(rows_iter: Iterable[Dict[str, Any]]) -> Iterable[Dict[str, Any]]:
+    """CSV / Excel 的列來源：_normalize_row → 時間 / 欄位驗證，一列一個 dict 交給 _run_records。
+
+    dict 形狀（PDF 的 _iter_pdf_rows 相同）：
+      where ：錯誤訊息用的位置（`row{idx}` / `page{p} row{r}`）
+      skip  ：無法採用的原因；None = 可用，其餘欄位才有意義
+      start_ts / end_ts / cell_id / cell_addr / direct_ll / sector_name / site_code /
+      sector_id / azimuth
+    """
+    parse_start, parse_end = _TsColumnParser(), _TsColumnParser()
+    for idx, raw in enumerate(rows_iter, start=1):
+        r = _normalize_row(raw)
+        start_ts = parse_start(r.get("start_ts"))
+        if not start_ts:
+            yield {"where": f"row{idx}", "skip": "缺少開始連線時間"}
+            continue
+        cell_id = (str(r.get("cell_id") or "").strip() or None)
+        cell_addr = (str(r.get("cell_addr") or "").strip() or None)
+        # 檔案自帶座標（GPS 軌跡 / 經緯度格式）優先；無則走 cell_id/addr geocode
+        direct_ll = _resolve_latlng(r)
+        yield {
+            "where": f"row{idx}",
+            "skip": (None if (cell_addr or cell_id or direct_ll) else "地址、cell_id、經緯度皆空，無法定位"),
+            "start_ts": start_ts,
+            "end_ts": parse_end(r.get("end_ts")) or start_ts,
+            "cell_id": cell_id,
+            "cell_addr": cell_addr,
+            "direct_ll": direct_ll,
+            "sector_name": (str(r.get("sector_name") or "").strip() or None),
+            "site_code": (str(r.get("site_code") or "").strip() or None),
+            "sector_id": (str(r.get("sector_id") or "").strip() or None),
+            "azimuth": _to_int(r.get("azimuth")),
+        }
+
+
+class _RecordSink:
+    """_run_records 的輸出端（2026-10）。
+
+    engine 負責 normalize 之後的一切共通步驟（分塊、fingerprint、續跑、
+    跨塊去重的 bulk geocode、管線、計時）；sink 只決定「一塊 record 去哪裡」。
+    每塊的 record 為 dict：start_ts / end_ts（datetime）、cell_id、cell_addr、
+    sector_name、site_code、sector_id、azimuth、lat、lng、accuracy_m、row_fp。
+    write() 在 write 執行緒上被呼叫（管線模式），實作只能碰自己的狀態。
+    """
+
+    name = "base"
+    # geocode 例外：True = 記一則錯誤、該塊座標留空繼續；False = 重拋給呼叫端
+    soft_geocode = False
+    # OSM 背景佇列開啟時，仍同步查前 GEO_OSM_INLINE_MAX 個地址（不寫 DB 的 sink：
+    # 沒有之後的回填可等，見 geocode.OsmInlineBudget）
+    osm_inline = False
+
+    def prefilter(self, chunk: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """geocode 前丟掉不需處理的列（例如已落地）；回傳剩下的列。"""
+        return chunk
+
+    def write(self, records: List[Dict[str, Any]]) -> int:
+        """寫出一塊，回傳實際接受的筆數（其餘計入 duplicates）。"""
+        raise NotImplementedError
+
+
+class _DbSink(_RecordSink):
+    """raw_traces 寫入（_insert_records：COPY / executemany，ON CONFLICT DO NOTHING）。
+
+    geocode 失敗一律重拋：無座標列一旦落地，重傳時會被 row_fp 當成「已存在」略過、
+    再也補不回座標，不如整個上傳失敗讓使用者重來。
+    """
+
+    name = "db"
+
+    def __init__(self, project_id: str, target_id: str, skip_existing: bool = False):
+        self.project_id = project_id
+        self.target_id = target_id
+        self.skip_existing = skip_existing
+        self.chunks = 0
+
+    def prefilter(self, chunk: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not self.skip_existing:
+            return chunk
+        have = _existing_row_fps(self.project_id, self.target_id, [p["row_fp"] for p in chunk])
+        return [p for p in chunk if p["row_fp"] not in have] if have else chunk
+
+    def write(self, records: List[Dict[str, Any]]) -> int:
+        import time as _time
+
+        for rec in records:
+            rec["project_id"] = self.project_id
+            rec["target_id"] = self.target_id
+        _t0 = _time.perf_counter()
+        n = _insert_records(records)
+        self._late_osm_backfill(records)
+        # 每塊寫入吞吐量（rows/sec）：判斷瓶頸在 DB 寫入還是 geocode 的第一手數據
+        _elapsed = _time.perf_counter() - _t0
+        self.chunks += 1
+        log_info(
+            "ingest.chunk.inserted",
+            chunk=self.chunks, rows=n, duplicates=len(records) - n, engine=_insert_engine(),
+            duration_ms=round(_elapsed * 1000, 1),
+            rows_per_sec=round(n / _elapsed, 1) if _elapsed > 0 else None,
+        )
+        return n
+
+    def _late_osm_backfill(self, records: List[Dict[str, Any]]) -> None:
+        """塊已 commit：背景 OSM worker 可能在寫入前就查到了這些地址，補回填（見 osm_queue.backfill_done）。"""
+        if not (geocode.USE_OSM and geocode._osm_async_enabled()):
+            return
+        addrs = {r["cell_addr"] for r in records if r.get("lat") is None and r.get("cell_addr")}
+        if addrs:
+            from app.services import osm_queue   # osm_queue → geocode；延後 import 同 lookup_bulk
+
+            osm_queue.backfill_done(self.project_id, self.target_id, addrs)
+
+
+def _preview_record(target_id: str, rec: Dict[str, Any]) -> Dict[str, Any]:
+    """engine record → 臨時模式 / 預覽的 record（時間轉 ISO 字串、不含 project / row_fp）。"""
+    return {
+        "target_id":   target_id,
+        "start_ts":    rec["start_ts"].isoformat(),
+        "end_ts":      rec["end_ts"].isoformat(),
+        "cell_id":     rec["cell_id"],
+        "cell_addr":   rec["cell_addr"],
+        "sector_name": rec["sector_name"],
+        "site_code":   rec["site_code"],
+        "sector_id":   rec["sector_id"],
+        "azimuth":     rec["azimuth"],
+        "lat":         rec["lat"],
+        "lng":         rec["lng"],
+        "accuracy_m":  rec["accuracy_m"],
+        "azimuth_ref": "unknown",
+    }
+
+
+def _preview_feature(r: Dict[str, Any]) -> Dict[str, Any]:
+    """預覽 record → GeoJSON Feature（呼叫端先確認 lat / lng 非空）。"""
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [r["lng"], r["lat"]]},
+        "properties": {
+            "target_id":   r["target_id"],
+            "cell_addr":   r.get("cell_addr"),
+            "start_ts":    r.get("start_ts"),
+            "end_ts":      r.get("end_ts"),
+            "cell_id":     r.get("cell_id"),
+            "accuracy_m":  r.get("accuracy_m"),
+            "azimuth":     r.get("azimuth"),
+            "azimuth_ref": r.get("azimuth_ref", "unknown"),
+            "sector_id":   r.get("sector_id"),
+            "sector_name": r.get("sector_name"),
+            "site_code":   r.get("site_code"),
+        },
+    }
+
+
+class _ListSink(_RecordSink):
+    """parse-only：收成預覽 record list（不寫 DB）。geocode 失敗只讓座標留空。"""
+
+    name = "list"
+    soft_geocode = True
+    osm_inline = True
+
+    def __init__(self, target_id: str):
+        self.target_id = target_id
+        self.records: List[Dict[str, Any]] = []
+
+    def write(self, records: List[Dict[str, Any]]) -> int:
+        tid = self.target_id
+        self.records.extend(_preview_record(tid, rec) for rec in records)
+        return len(records)
+
+
+class _GeoJsonSink(_RecordSink):
+    """parse-only 直接組 GeoJSON：每塊轉完 Feature 就丟掉 engine record。
+
+    keep_records=True 時另留預覽 record（parse-temp「儲存為專案」要用，含無座標列）。
+    """
+
+    name = "geojson"
+    soft_geocode = True
+    osm_inline = True
+
+    def __init__(self, target_id: str, keep_records: bool = True):
+        self.target_id = target_id
+        self.keep_records = keep_records
+        self.features: List[Dict[str, Any]] = []
+        self.records: List[Dict[str, Any]] = []
+        self.kept = 0
+        self.no_coords = 0
+
+    def write(self, records: List[Dict[str, Any]]) -> int:
+        tid = self.target_id
+        for rec in records:
+            r = _preview_record(tid, rec)
+            if self.keep_records:
+                self.records.append(r)
+            if r["lat"] is None or r["lng"] is None:
+                self.no_coords += 1
+            else:
+                self.features.append(_preview_feature(r))
+        self.kept += len(records)
+        return len(records)
+
+    def collection(self) -> Dict[str, Any]:
+        out = {
+            "type":     "FeatureCollection",
+            "features": self.features,
+            "total":    self.kept,
+            "plotted":  len(self.features),
+            "skipped":  self.no_coords,
+        }
+        if self.keep_records:
+            out["_records"] = self.records
+        return out
+
+
+# ingest 管線 metrics（2026-10；GET /api/metrics）：每塊 geocode / write 耗時、每次 run
+# 總耗時與列數。與 geocode_tier_seconds 對照即知一次上傳慢在 geocode 哪一層還是寫入。
+_m_stage_seconds = metrics.histogram(
+    "ingest_stage_seconds", "Per-chunk ingest stage latency in seconds", ("stage",),
+)
+_m_run_seconds = metrics.histogram(
+    "ingest_run_seconds", "Whole ingest/parse run latency in seconds", ("sink",),
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0),
+)
+_m_rows = metrics.counter("ingest_rows_total", "Rows processed by the ingest engine", ("sink", "outcome"))
+
+
+def _site_fallback(
+    chunk: List[Dict[str, Any]],
+    geo_memo: Dict[Tuple[Optional[str], Optional[str]], Optional[Tuple[float, float]]],
+    site_memo: Dict[Tuple[str, Optional[str]], Optional[Tuple[float, float, int]]],
+) -> int:
+    """lookup_bulk 解不出、但有 cell_id 的列 → tower_index.get_sites 一次推定同站座標。
+
+    /coverage 的 cellid_only 多半是對照表缺了這個扇區、同站其他扇區卻在表內。推得的
+    座標帶較寬的 accuracy_m（見 tower_index 模組說明）。(cell_id, sector_id) 跨塊記住；
+    回傳本塊可用的推定數（0 → 呼叫端不必逐列查 memo）。
+    """
+    want = {(p["cell_id"], p["sector_id"]) for p in chunk
+            if p["cell_id"] and p["_geo_key"] is not None and not geo_memo.get(p["_geo_key"])}
+    if not want:
+        return 0
+    todo = [q for q in want if q not in site_memo]
+    if todo:
+        try:
+            found = tower_index.get_sites(todo)
+        except Exception as e:
+            print(f"[ingest] site fallback error: {type(e).__name__}: {e}")
+            found = {}
+        for q in todo:
+            site_memo[q] = found.get(q)
+        if found:
+            log_info("ingest.site_fallback", queried=len(todo), resolved=len(found))
+    return sum(1 for q in want if site_memo.get(q))
+
+
+def _run_records(
+    source: Iterable[Dict[str, Any]],
+    sink: _RecordSink,
+    progress: Optional[IngestProgress] = None,
+) -> Dict[str, Any]:
+    """共用串流 record engine（2026-10）：列來源 → 分塊 → geocode → sink。
+
+    四個入口（_ingest_rows_stream / ingest_pdf 寫 DB，_parse_rows_to_records /
+    _parse_pdf_to_records 與 parse_file_* 不寫 DB）原本各自一套 normalize → 驗證 →
+    geocode → 組裝，效能特性也各不相同（分塊 / 整檔 / 逐列 geocode）。現在只差在
+    列來源（_iter_tabular_rows / _iter_pdf_rows）與 sink，以下優化四條路一體適用：
+
+      - 分塊：記憶體峰值限於固定塊數（INGEST_CHUNK_SIZE × 管線深度），不整檔累積；
+      - 管線（2026-10）：parse（本執行緒）→ geocode（執行緒）→ write（執行緒），
+        以深度 _PIPELINE_QUEUE_DEPTH 的佇列串接：第 N 塊寫出時第 N+1 塊在
+        geocode、第 N+2 塊在 parse。塊的寫出順序 = 讀檔順序（每階段單一執行緒、
+        FIFO）。env INGEST_PIPELINE=0 退回逐塊循序；
+      - geocode 每塊走 lookup_bulk，且已查過的 key 跨塊記住（同一基地台常散在
+        整份檔案各處），整檔每個 unique key 最多查一次；
+      - 仍未定位、但有 cell_id 的列，整塊一次走同站推定（_site_fallback）；
+      - 計時：收尾 log 一則 ingest.run.done（各階段耗時、塊數、unique key 數）。
+
+    寫入失敗（sink.write 拋 HTTPException，DB sink 才會）→ 方案 A「部分匯入」：
+    之後的塊一律不寫（已在管線中的只排空），parse 停止讀檔，errors 首列誠實標明。
+    其他非預期例外交回呼叫端執行緒重拋（不吞、不卡死）。
+
+    progress（背景 job 才傳，見 IngestProgress）：每塊寫出後回報「寫到第幾列」；
+    續跑時前 resume_rows 列照常 parse（total / skipped / errors 因此與一次跑完相同），
+    但不 geocode、不寫出。
+
+    重傳冪等：每列帶 row_fp（_RowFingerprinter；序數要連續，故在續跑 skip 之前算）。
+    sink.prefilter 丟掉的列與 write 回報「沒接受」的列合計為 duplicates
+    （兩者分別在 geocode / write 執行緒上累加，各用各的計數器，join 之後才相加；
+    共用一個 += 在管線模式下會互相覆蓋）
+    （有才出現在回傳，避免改動既有回應形狀）。
     """
+    import contextvars
+    import queue
+    import threading
+    import time as _time
+
+    _t_start = _time.perf_counter()
     chunk_size = _ingest_chunk_size()
-    total = inserted = skipped = 0
+    progress = progress or IngestProgress()
+    resume_rows = progress.resume_rows
+    total = skipped = 0
+    inserted = progress.resume_inserted
+    prefiltered = 0                 # geocode 執行緒獨佔
+    conflicts = 0                   # write 執行緒獨佔
+    chunk_no = 0
+    fingerprint = _RowFingerprinter()
+    geo_memo: Dict[Tuple[Optional[str], Optional[str]], Optional[Tuple[float, float]]] = {}
+    site_memo: Dict[Tuple[str, Optional[str]], Optional[Tuple[float, float, int]]] = {}
+    timing = {"geocode": 0.0, "write": 0.0}
     errors: List[str] = []
-    # 一塊內待 geocode/寫入的暫存；每塊 flush 後清空（記憶體不累積整檔）。
-    # 每筆多帶一個 reserved key `_geo_key`：(cell_id, cell_addr) 或 None（已有直給座標）。
-    pending: List[Dict[str, Any]] = []
-
-    def _flush() -> bool:
-        """處理 pending 一塊：bulk geocode → 填座標 → insert。
-        回傳 True=成功；False=寫入失敗（部分匯入，呼叫端應停止後續）。"""
-        nonlocal inserted
-        if not pending:
-            return True
-        # 收集本塊需 geocode 的 unique (cell_id, cell_addr)；
-        # 直給座標者（_geo_key=None）不查 → 同址在同塊內只進 lookup_bulk 一次（set 去重）。
-        keys = list({p["_geo_key"] for p in pending if p["_geo_key"] is not None})
-        bulk = geocode.lookup_bulk(keys) if keys else {}
-        records: List[Dict[str, Any]] = []
-        for p in pending:
+    write_failure: List[str] = []   # 方案 A 的部分匯入訊息（最多一則）
+    stage_errors: List[BaseException] = []   # geocode / write 階段的非預期例外
+    stop = threading.Event()        # 任一塊寫入失敗 → 之後全部停
+    # 整次 run 共用一份額度（不是每塊各一份）：預覽最多同步打 GEO_OSM_INLINE_MAX 次 Nominatim
+    osm_budget = (geocode.OsmInlineBudget(geocode._osm_inline_max())
+                  if sink.osm_inline and geocode.USE_OSM and geocode._osm_async_enabled() else None)
+
+    def _geocode_chunk(chunk: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """一塊：sink.prefilter → bulk geocode（只查沒查過的 key）→ 填座標。"""
+        nonlocal prefiltered
+        _t0 = _time.perf_counter()
+        before = len(chunk)
+        chunk = sink.prefilter(chunk)
+        prefiltered += before - len(chunk)
+        # 直給座標者（_geo_key=None）不查；同址同塊只進 lookup_bulk 一次（set 去重）
+        keys = list({p["_geo_key"] for p in chunk
+                     if p["_geo_key"] is not None and p["_geo_key"] not in geo_memo})
+        geocode_failed = False
+        if keys:
+            try:
+                bulk = (geocode.lookup_bulk(keys, osm_budget) if osm_budget is not None
+                        else geocode.lookup_bulk(keys))
+            except Exception as e:
+                if not sink.soft_geocode:
+                    raise
+                print(f"[ingest] bulk geocode error, fallback to None: {type(e).__name__}: {e}")
+                errors.append(f"geocode 失敗（{len(keys)} 組基地台/地址）：{e}")
+                bulk = {}
+                geocode_failed = True
+            for k in keys:
+                geo_memo[k] = bulk.get(k)
+        # geocode 本身失敗的塊不推定（多半是 DB / 網路出狀況，座標照舊留空）
+        sites = 0 if geocode_failed else _site_fallback(chunk, geo_memo, site_memo)
+        for p in chunk:
             gk = p.pop("_geo_key")
-            lat, lng = p["lat"], p["lng"]
             if gk is not None:
-                ll = bulk.get(gk)
+                ll = geo_memo.get(gk)
                 if ll:
-                    lat, lng = ll
-            p["lat"] = _to_float(lat)
-            p["lng"] = _to_float(lng)
-            records.append(p)
+                    p["lat"], p["lng"] = ll
+                elif sites:
+                    hit = site_memo.get((p["cell_id"], p["sector_id"]))
+                    if hit:
+                        p["lat"], p["lng"], p["accuracy_m"] = hit
+            p["lat"] = _to_float(p["lat"])
+            p["lng"] = _to_float(p["lng"])
+        progress.geocoded(len(chunk))
+        dt = _time.perf_counter() - _t0
+        timing["geocode"] += dt
+        _m_stage_seconds.observe(dt, stage="geocode")
+        return chunk
+
+    def _write_chunk(rows_through: int, records: List[Dict[str, Any]]) -> bool:
+        """一塊：sink.write。回傳 True=成功；False=寫入失敗（部分匯入，之後全停）。"""
+        nonlocal inserted, conflicts, chunk_no
+        if not records:
+            progress.committed(rows_through, inserted)   # 整塊都被 prefilter 丟掉（重傳）
+            return True
+        chunk_no += 1
+        _t0 = _time.perf_counter()
         try:
-            inserted += _insert_records(records)
+            n = sink.write(records)
         except HTTPException as e:
-            # 方案 A：誠實回報部分匯入。插在 errors 首列以 survive [:50] 截斷。
+            # 方案 A：誠實回報部分匯入（收尾時插在 errors 首列以 survive [:50] 截斷）。
             detail = getattr(e, "detail", str(e))
-            errors.insert(0, (
+            write_failure.append(
                 f"⚠ 部分匯入（未完全成功）：寫入資料庫時失敗，已成功寫入 {inserted} 筆、"
-                f"其餘未寫入（原因：{detail}）。請排除問題後，建議用新案件重新上傳整檔，"
-                f"避免與已寫入資料重複。"
-            ))
-            pending.clear()
+                f"其餘未寫入（原因：{detail}）。請排除問題後，直接重新上傳同一檔案即可："
+                f"已寫入的列會自動略過、不會重複。"
+            )
+            stop.set()
             return False
-        pending.clear()
+        finally:
+            dt = _time.perf_counter() - _t0
+            timing["write"] += dt
+            _m_stage_seconds.observe(dt, stage="write")
+        inserted += n
+        conflicts += len(records) - n         # ON CONFLICT 略過的列
+        progress.committed(rows_through, inserted)
         return True
 
-    aborted = False
-    for idx, raw in enumerate(rows_iter, start=1):
-        total += 1
-        r = _normalize_row(raw)
-
-        start_ts = _parse_ts(r.get("start_ts"))
-        end_ts = _parse_ts(r.get("end_ts")) or start_ts
-        if not start_ts:
-            skipped += 1
-            errors.append(f"row{idx}: 缺少開始連線時間")
-            continue
+    # ── 管線：geocode / write 各一條執行緒；None 為結束哨兵 ──────────────
+    # 佇列元素 = (rows_through, chunk)：該塊最後一列的原始列序號（續跑對齊用）+ 該塊。
+    # 失敗後下游仍持續「排空」佇列直到哨兵，上游的 put 因此永遠不會卡死。
+    pipelined = _ingest_pipeline_enabled()
+    geo_q: "queue.Queue[Optional[tuple]]" = queue.Queue(_PIPELINE_QUEUE_DEPTH)
+    write_q: "queue.Queue[Optional[tuple]]" = queue.Queue(_PIPELINE_QUEUE_DEPTH)
+
+    def _geocode_stage() -> None:
+        while True:
+            item = geo_q.get()
+            if item is None:
+                write_q.put(None)
+                return
+            if stop.is_set():
+                continue                     # 已停：排空，不再打 geocode
+            try:
+                rows_through, chunk = item
+                write_q.put((rows_through, _geocode_chunk(chunk)))
+            except BaseException as e:       # 非預期例外：交回呼叫端執行緒重拋
+                stage_errors.append(e)
+                stop.set()
+
+    def _write_stage() -> None:
+        while True:
+            item = write_q.get()
+            if item is None:
+                return
+            if stop.is_set():
+                continue                     # 已停：排空，不再寫入
+            try:
+                _write_chunk(*item)
+            except BaseException as e:
+                stage_errors.append(e)
+                stop.set()
+
+    threads: List[threading.Thread] = []
+    if pipelined:
+        # 複製 contextvars：request_id 等 log context 跟著進 worker 執行緒
+        for fn, name in ((_geocode_stage, "ingest-geocode"), (_write_stage, "ingest-write")):
+            t = threading.Thread(target=contextvars.copy_context().run, args=(fn,), name=name, daemon=True)
+            t.start()
+            threads.append(t)
+
+    def _emit(rows_through: int, chunk: List[Dict[str, Any]]) -> bool:
+        """把 parse 完的一塊交給下游。回傳 False=已停止（寫入失敗），呼叫端應停止讀檔。"""
+        if stop.is_set():
+            return False
+        progress.parsed(rows_through, skipped)
+        if pipelined:
+            geo_q.put((rows_through, chunk))
+            return True
+        return _write_chunk(rows_through, _geocode_chunk(chunk))
 
-        cell_id = (str(r.get("cell_id") or "").strip() or None)
-        cell_addr = (str(r.get("cell_addr") or "").strip() or None)
-        sector_name = (str(r.get("sector_name") or "").strip() or None)
-        site_code = (str(r.get("site_code") or "").strip() or None)
-        sector_id = (str(r.get("sector_id") or "").strip() or None)
-        azimuth = _to_int(r.get("azimuth"))
+    # 一塊內待 geocode/寫出的暫存；交出去後換新 list（記憶體不累積整檔）。
+    # 來源 dict 原地改成 record：拿掉 where / skip / direct_ll，補 lat / lng /
+    # accuracy_m / row_fp，另帶 reserved key `_geo_key`：(cell_id, cell_addr) 或 None。
+    pending: List[Dict[str, Any]] = []
+    try:
+        for idx, p in enumerate(source, start=1):
+            total += 1
+            where = p.pop("where")
+            reason = p.pop("skip")
+            if reason:
+                skipped += 1
+                errors.append(f"{where}: {reason}")
+                continue
 
-        # 檔案自帶座標（GPS 軌跡 / 經緯度格式）優先；無則走 cell_id/addr geocode
-        direct_ll = _resolve_latlng(r)
+            direct_ll = p.pop("direct_ll")
+            cell_id, cell_addr = p["cell_id"], p["cell_addr"]
+            # 序數要連續計數，故在續跑 skip 之前算（前 resume_rows 列也要進計數）
+            p["row_fp"] = fingerprint(p["start_ts"], p["end_ts"], cell_id, cell_addr, direct_ll,
+                                      p["azimuth"], p["sector_id"], p["sector_name"], p["site_code"])
+            if idx <= resume_rows:
+                continue  # 續跑：此列已由前一次執行寫出並 commit
+
+            if direct_ll:
+                # 檔案已含座標 → 直接採用，免 geocode（GPS 定位精度高）
+                p["lat"], p["lng"] = direct_ll
+                p["accuracy_m"] = _to_int(GPS_ACCURACY_M)
+                p["_geo_key"] = None
+            else:
+                # 延後到 geocode 階段用 lookup_bulk 一次解析整塊（含 SQL 快取 + 並行）
+                p["lat"] = p["lng"] = None
+                p["accuracy_m"] = _to_int(_guess_accuracy(cell_addr))
+                p["_geo_key"] = (cell_id, cell_addr)
+            pending.append(p)
+
+            if len(pending) >= chunk_size:
+                chunk, pending = pending, []
+                if not _emit(idx, chunk):
+                    break
+        else:
+            if pending:
+                _emit(total, pending)  # 收尾剩餘（若此塊也失敗，寫入階段已記 write_failure）
+            else:
+                progress.parsed(total, skipped)
+    finally:
+        if pipelined:
+            geo_q.put(None)
+            for t in threads:
+                t.join()
+
+    if stage_errors:
+        raise stage_errors[0]
+    duplicates = prefiltered + conflicts    # 兩階段執行緒都已 join
+    if write_failure:
+        errors.insert(0, write_failure[0])
+    log_info(
+        "ingest.run.done",
+        sink=sink.name, pipelined=pipelined, rows=total, skipped=skipped,
+        written=inserted, duplicates=duplicates, chunks=chunk_no, unique_keys=len(geo_memo),
+        geocode_ms=round(timing["geocode"] * 1000, 1), write_ms=round(timing["write"] * 1000, 1),
+        total_ms=round((_time.perf_counter() - _t_start) * 1000, 1),
+    )
+    _m_run_seconds.observe(_time.perf_counter() - _t_start, sink=sink.name)
+    for outcome, n in (("written", inserted - progress.resume_inserted), ("skipped", skipped),
+                       ("duplicate", duplicates)):
+        _m_rows.inc(n, sink=sink.name, outcome=outcome)
+    out = {"total": total, "inserted": inserted, "skipped": skipped, "errors": errors[:50]}
+    if duplicates:
+        out["duplicates"] = duplicates
+    return out
 
-        if not cell_addr and not cell_id and not direct_ll:
-            skipped += 1
-            errors.append(f"row{idx}: 地址、cell_id、經緯度皆空，無法定位")
-            continue
 
-        lat = lng = None
-        accuracy_m = _guess_accuracy(cell_addr)
-        geo_key: Optional[tuple] = None
-        if direct_ll:
-            # 檔案已含座標 → 直接採用，免 geocode（GPS 定位精度高）
-            lat, lng = direct_ll
-            accuracy_m = GPS_ACCURACY_M
-        else:
-            # 延後到 _flush 用 lookup_bulk 一次解析整塊（含 SQL 快取 + 並行）
-            geo_key = (cell_id, cell_addr)
-
-        pending.append(
-            dict(
-                project_id=project_id,
-                target_id=target_id,
-                start_ts=start_ts,
-                end_ts=end_ts,
-                cell_id=cell_id,
-                cell_addr=cell_addr,
-                sector_name=sector_name,
-                site_code=site_code,
-                sector_id=sector_id,
-                azimuth=azimuth,
-                lat=lat,
-                lng=lng,
-                accuracy_m=_to_int(accuracy_m),
-                _geo_key=geo_key,
-            )
-        )
+def _ingest_rows_stream(
+    project_id: str,
+    target_id: str,
+    rows_iter: Iterable[Dict[str, Any]],
+    progress: Optional[IngestProgress] = None,
+    skip_existing: bool = False,
+) -> Dict[str, Any]:
+    """chunk-based 串流匯入（P8.1，2026-06-28）：CSV / Excel 列 → _run_records → raw_traces。
 
-        if len(pending) >= chunk_size:
-            if not _flush():
-                aborted = True
-                break
+    與舊版（整檔 hold to_insert + 逐筆 geocode.lookup）對比：
+      - 記憶體峰值限於固定塊數（INGEST_CHUNK_SIZE，預設 800），不再整檔累積 → 解 OOM（七-8）。
+      - geocode 每塊走 lookup_bulk（並行 + SQL 快取 + 去重）→ 解 H1（存檔路徑原本沒並行）。
+      - 統計 total/inserted/skipped 語意與舊版一致；errors 仍保留 [:50] 上限。
+      - 原子性「方案 A」：每塊 _insert_records 後即 commit（copy 引擎整塊一個 transaction，
+        失敗整塊 rollback）。某塊寫入失敗即
+        **停止後續、誠實回報「部分匯入」**（errors 首列標明 + inserted < total），由上層
+        以真實 inserted/skipped 回填 evidence_stats/audit，不假裝整檔成功。
 
-    if not aborted:
-        _flush()  # 收尾剩餘（若此塊也失敗，_flush 內已記 errors）
+    重傳冪等（2026-10）：寫入 ON CONFLICT DO NOTHING，已在 DB 的列不會重複落地；
+    inserted 只算真的新寫入，略過的列數以 duplicates 回報。skip_existing=True 時
+    geocode 前先查一次本塊哪些 row_fp 已存在、整列丟掉 → 已匯入過的檔重跑時
+    幾乎不打 geocode、不寫入。管線 / 續跑 / 計時見 _run_records。
 
-    return {"total": total, "inserted": inserted, "skipped": skipped, "errors": errors[:50]}
+    刻意不動 _normalize_row / _parse_ts / _resolve_latlng / _guess_accuracy 的語意。
+    """
+    return _run_records(_iter_tabular_rows(rows_iter),
+                        _DbSink(project_id, target_id, skip_existing), progress)
 
 # ====== PDF 匯入（不需先轉檔） ======
 # pdfplumber 為可選依賴，缺少時給清楚訊息
@@ -1299,6 +2498,14 @@ try:
 except Exception:  # pragma: no cover
     pdfplumber = None
 
+# 欄式解析的向量化（_pdf_ts_column / _pdf_latlng_column）；缺少時逐格解析
+try:
+    import numpy as np  # optional
+    import pandas as pd  # optional
+except Exception:  # pragma: no cover
+    np = None
+    pd = None
+
 def _match_col_idx(headers: List[str]) -> Dict[str, int]:
     """以標準化表頭來找出欄位位置；找不到回傳 -1。
 
@@ -1406,99 +2613,270 @@ def _extract_tables_from_page(page) -> List[List[List[str]]]:
             pass
     return tables
 
-def ingest_pdf(project_id: str, target_id: str, file_bytes: bytes) -> Dict[str, Any]:
-    if pdfplumber is None:
-        raise HTTPException(status_code=400, detail="後端缺少 pdfplumber：請安裝 pip install pdfplumber")
-    total = inserted = skipped = 0
-    errors: List[str] = []
-    rows: List[Dict[str, Any]] = []
+def _ingest_pdf_workers() -> int:
+    """PDF 逐頁抽表的平行 worker 數（env `INGEST_PDF_WORKERS`，預設 1 = 關閉）。
 
-    last_header: Optional[List[str]] = None
-    last_col: Optional[Dict[str, int]] = None
+    合理範圍 1~8，非法值 fallback 1。與 INGEST_SHEET_WORKERS 同樣預設關閉、
+    由部署端依實例核心數決定；頁數不足 _PDF_PARALLEL_MIN_PAGES 時一律循序
+    （spawn 子程序 + import app 的固定成本比抽幾頁表還貴）。
+    """
+    return env_int("INGEST_PDF_WORKERS", 1, 1, 8)
+
+
+_PDF_PARALLEL_MIN_PAGES = 24
+
+# worker process 內的狀態：initializer 只 pickle 一次 file_bytes，pdf 在第一個
+# 頁段 job 時才開、之後同一 worker 的頁段共用（同 _SHEET_WORKER_STATE）。
+_PDF_WORKER_STATE: Dict[str, Any] = {}
+
+
+def _pdf_worker_init(file_bytes: bytes) -> None:
+    _PDF_WORKER_STATE.update(file_bytes=file_bytes, pdf=None)
+
+
+def _extract_pdf_pages_worker(span: Tuple[int, int]) -> List[List[List[List[str]]]]:
+    """子程序：抽 [lo, hi) 頁的表格，回傳每頁的 tables（純 list，可 pickle）。"""
+    st = _PDF_WORKER_STATE
+    if st["pdf"] is None:
+        st["pdf"] = pdfplumber.open(io.BytesIO(st["file_bytes"]))
+    pages = st["pdf"].pages
+    out = []
+    for i in range(*span):
+        out.append(_extract_tables_from_page(pages[i]))
+        pages[i].close()         # 釋放該頁 layout 快取，worker 記憶體不隨頁數成長
+    return out
+
+
+def _iter_pdf_page_tables(file_bytes: bytes) -> Iterable[Tuple[int, List[List[List[str]]]]]:
+    """依頁序 yield (頁碼, 該頁 tables)；頁數夠多且 INGEST_PDF_WORKERS > 1 時平行抽表。
+
+    抽表（pdfplumber layout 分析）佔 PDF 匯入九成以上時間，且各頁彼此獨立 ——
+    真正有頁間相依的只有「表頭只印在首頁」的沿用規則，那一步留在主程序、
+    依頁序在 _iter_pdf_tables 處理，所以平行與否結果完全相同。
+    頁切成約 workers×4 段（攤平 IPC 成本又不讓最後一段拖尾），Executor.map
+    保證結果順序 = 輸入順序；spawn 理由同 _iter_parsed_sheets_parallel。
+    """
     with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
-        for pno, page in enumerate(pdf.pages, start=1):
-            tables = _extract_tables_from_page(page)
-            for t in tables:
-                if not t:
-                    continue
-                header0 = [(c or "").strip() for c in t[0]]
-                col0 = _match_col_idx(header0)
-                if _pdf_cols_useful(col0):
-                    header, col = header0, col0
-                    last_header, last_col = header, col
-                    data_rows = t[1:]
-                elif last_col is not None:
-                    # 此頁無表頭（接續上頁，表頭只印在首頁）→ 沿用上頁對應，t[0] 也是資料
-                    header, col = last_header, last_col
-                    data_rows = t
-                else:
-                    continue  # 尚未遇到任何表頭，無法解析此表
-                for ridx, row in enumerate(data_rows, start=2):
-                    total += 1
-                    rr = [(row[i] if i < len(row) else "") for i in range(len(header))]
-
-                    start_ts = _parse_ts(rr[col["start"]]) if col.get("start", -1) >= 0 else None
-                    end_ts = _parse_ts(rr[col["end"]]) if col.get("end", -1) >= 0 else start_ts
-                    cell_id = (rr[col["cellid"]].strip() if col.get("cellid", -1) >= 0 and rr[col["cellid"]] else None)
-                    cell_addr = (rr[col["addr"]].strip()   if col.get("addr", -1)   >= 0 and rr[col["addr"]]   else None)
-                    sector_name = (
-                        rr[col["sector"]].strip() if col.get("sector", -1) >= 0 and rr[col["sector"]] else None
-                    )
-                    site_code = (rr[col["site"]].strip()   if col.get("site", -1)   >= 0 and rr[col["site"]]   else None)
-                    sector_id = (rr[col["cid"]].strip()    if col.get("cid", -1)    >= 0 and rr[col["cid"]]    else None)
-                    azimuth = _to_int(rr[col["az"]]) if col.get("az", -1) >= 0 else None
-
-                    # GPS 軌跡 / 經緯度直給格式（PDF 版）：取檔案自帶座標
-                    direct_ll = None
-                    if col.get("lat", -1) >= 0 and col.get("lng", -1) >= 0:
-                        direct_ll = _resolve_latlng({
-                            "lat": rr[col["lat"]], "lng": rr[col["lng"]],
-                        })
-
-                    if not start_ts:
-                        skipped += 1
-                        errors.append(f"page{pno} row{ridx}: 缺少開始連線時間")
-                        continue
-                    if not cell_addr and not cell_id and not direct_ll:
-                        skipped += 1
-                        errors.append(f"page{pno} row{ridx}: 地址、cell_id、經緯度皆空，無法定位")
-                        continue
-
-                    lat = lng = None
-                    accuracy_m = _guess_accuracy(cell_addr)
-                    if direct_ll:
-                        lat, lng = direct_ll
-                        accuracy_m = GPS_ACCURACY_M
-                    else:
-                        try:
-                            ll = geocode.lookup(cell_id, cell_addr)
-                            if ll:
-                                lat, lng = ll
-                        except Exception as e:
-                            errors.append(f"page{pno} row{ridx}: geocode 失敗：{e}")
-
-                    rows.append(
-                        dict(
-                            project_id=project_id,
-                            target_id=target_id,
-                            start_ts=start_ts,
-                            end_ts=end_ts,
-                            cell_id=cell_id,
-                            cell_addr=cell_addr,
-                            sector_name=sector_name,
-                            site_code=site_code,
-                            sector_id=sector_id,
-                            azimuth=azimuth,
-                            lat=_to_float(lat),
-                            lng=_to_float(lng),
-                            accuracy_m=_to_int(accuracy_m),
-                        )
-                    )
+        n_pages = len(pdf.pages)
+        workers = min(_ingest_pdf_workers(), n_pages)
+        if workers <= 1 or n_pages < _PDF_PARALLEL_MIN_PAGES:
+            for pno, page in enumerate(pdf.pages, start=1):
+                yield pno, _extract_tables_from_page(page)
+            return
+
+    import concurrent.futures as _cf
+    import multiprocessing as _mp
+
+    step = max(1, -(-n_pages // (workers * 4)))
+    spans = [(lo, min(lo + step, n_pages)) for lo in range(0, n_pages, step)]
+    log_info("ingest.pdf.parallel", pages=n_pages, workers=workers, spans=len(spans))
+    with _cf.ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=_mp.get_context("spawn"),
+        initializer=_pdf_worker_init,
+        initargs=(file_bytes,),
+    ) as ex:
+        for (lo, _hi), page_tables in zip(spans, ex.map(_extract_pdf_pages_worker, spans)):
+            for off, tables in enumerate(page_tables):
+                yield lo + off + 1, tables
+
+
+def _iter_pdf_tables(file_bytes: bytes):
+    """依頁序 yield (頁碼, col, data_rows)，套用「無表頭頁沿用上頁對應」規則。
+
+    多頁 PDF 的表頭常只印在首頁：某表第一列比不出任何欄位（_pdf_cols_useful）
+    且先前已遇過表頭 → 沿用 last_col，t[0] 也是資料；尚未遇過表頭的表直接略過。
+    """
+    last_col: Optional[Dict[str, int]] = None
+    for pno, tables in _iter_pdf_page_tables(file_bytes):
+        for t in tables:
+            if not t:
+                continue
+            header0 = [(c or "").strip() for c in t[0]]
+            col0 = _match_col_idx(header0)
+            if _pdf_cols_useful(col0):
+                last_col = col0
+                yield pno, col0, t[1:]
+            elif last_col is not None:
+                # 此頁無表頭（接續上頁，表頭只印在首頁）→ 沿用上頁對應，t[0] 也是資料
+                yield pno, last_col, t
+            # else：尚未遇到任何表頭，無法解析此表
+
+
+def _pdf_column(data_rows: List[List[Any]], idx: int) -> List[Any]:
+    """整欄取值；列比表頭短（PDF 斷欄常見）補 ""。idx < 0（無此欄）→ 全 None。"""
+    if idx < 0:
+        return [None] * len(data_rows)
+    return [(row[idx] if idx < len(row) else "") for row in data_rows]
+
+
+def _pdf_text_column(data_rows: List[List[Any]], idx: int) -> List[Optional[str]]:
+    return [(v.strip() if v else None) for v in _pdf_column(data_rows, idx)]
+
+
+# ── 欄式解析的向量化（2026-10）────────────────────────────
+# 開始 / 結束時間與經緯度四欄整欄交給 pandas（pd.to_datetime 用 _TsColumnParser 鎖定的
+# 格式、pd.to_numeric），其餘文字欄仍是一趟 strip。pandas 每次呼叫有固定成本（實測
+# 約 0.3ms，逐格解析到 ~150 列才打平），而 PDF 一頁的表通常只有幾十列 ——
+# 所以 _iter_pdf_rows 先把「沿用同一表頭」的連續表（跨頁續表）併成一批再解析，
+# 批次不到 _PDF_VECTOR_MIN_ROWS 列就照舊逐格。
+# 結果與逐格 _TsColumnParser / _resolve_latlng 完全相同：pandas 解不出的格一律退回
+# 逐格解析；pandas 收、CPython strptime 不收的寫法（秒數 60/61、小數秒超過 6 位）
+# 先擋掉再退回。
+_PDF_VECTOR_MIN_ROWS = 128
+_PDF_BATCH_ROWS = 4096
+# 可交給 pd.to_datetime 的格式：pandas 不支援 glibc 的 %-m / %-d
+_PD_TS_FORMATS = frozenset(f for f in _TS_FORMATS if "%-" not in f)
+_PD_TS_REJECT_RE = r"(?::6[01](?:\.\d*)?|\.\d{7,})(?:\s*[AaPp][Mm])?$"
+
+
+def _pd_ts_format(fmt: Optional[str], sample: str) -> Optional[str]:
+    """_TsColumnParser 鎖定的格式 → pd.to_datetime 的 format；_TS_FAST 依樣本換成對應的
+    strptime 格式（三種形狀各自等價於 _TS_FORMATS 的一條）。無法向量化回 None。"""
+    if fmt == _TS_FAST:
+        if sample[4:5] == "/":
+            return "%Y/%m/%d %H:%M:%S"
+        if sample[10:11] == "T":
+            return "%Y-%m-%dT%H:%M:%S.%f" if "." in sample else "%Y-%m-%dT%H:%M:%S"
+        return "%Y-%m-%d %H:%M:%S"
+    return fmt if fmt in _PD_TS_FORMATS else None
+
+
+def _pdf_ts_column(values: List[Any]) -> List[Optional[datetime]]:
+    """整欄時間 → datetime（同逐格 _TsColumnParser）。PDF 儲存格只會是 str / None。"""
+    ts = _TsColumnParser()
+    head: List[Optional[datetime]] = []
+    for v in values:                       # 先逐格到鎖定格式為止（通常第一格）
+        head.append(ts(v))
+        if ts.fmt is not None:
+            break
+    rest = values[len(head):]
+    fmt = _pd_ts_format(ts.fmt, _ts_clean(str(values[len(head) - 1]))) if head else None
+    if pd is None or fmt is None or len(rest) < _PDF_VECTOR_MIN_ROWS:
+        return head + [ts(v) for v in rest]
+    text = (pd.Series(rest, dtype=object).fillna("").astype(str)
+            .str.replace("\xa0", " ", regex=False).str.replace(r"[ \t]+", " ", regex=True).str.strip())
+    parsed = pd.to_datetime(text, format=fmt, errors="coerce")
+    parsed[text.str.contains(_PD_TS_REJECT_RE, regex=True)] = pd.NaT
+    naive = parsed.to_numpy(dtype="datetime64[us]").astype(object)     # NaT → None
+    return head + [(d.replace(tzinfo=TPE_TZ) if d is not None else ts(v)) for d, v in zip(naive, rest)]
+
+
+def _pdf_latlng_column(lat_vals: List[Any], lng_vals: List[Any]) -> List[Optional[Tuple[float, float]]]:
+    """整欄經緯度 → _resolve_latlng 的結果（範圍校正、對調、0,0 無效）；numpy 一次算完。"""
+    n = len(lat_vals)
+    if pd is None or n < _PDF_VECTOR_MIN_ROWS:
+        return [_resolve_latlng({"lat": a, "lng": b}) for a, b in zip(lat_vals, lng_vals)]
+    raw_lat = pd.Series(lat_vals, dtype=object).fillna("").astype(str).str.strip()
+    raw_lng = pd.Series(lng_vals, dtype=object).fillna("").astype(str).str.strip()
+    lat = pd.to_numeric(raw_lat, errors="coerce").to_numpy(dtype=float)
+    lng = pd.to_numeric(raw_lng, errors="coerce").to_numpy(dtype=float)
+    # to_numeric 解不出、但格子非空（全形數字、1_000、NA 字串…）→ 整列退回逐格
+    fallback = ((np.isnan(lat) & (raw_lat != "").to_numpy())
+                | (np.isnan(lng) & (raw_lng != "").to_numpy()))
+    swap = (np.abs(lat) > 90) & (np.abs(lng) <= 90)
+    lat, lng = np.where(swap, lng, lat), np.where(swap, lat, lng)
+    ok = (~np.isnan(lat) & ~np.isnan(lng) & (np.abs(lat) <= 90) & (np.abs(lng) <= 180)
+          & ~((lat == 0) & (lng == 0)))
+    out: List[Optional[Tuple[float, float]]] = [None] * n
+    for i in np.flatnonzero(ok & ~fallback).tolist():
+        out[i] = (float(lat[i]), float(lng[i]))
+    for i in np.flatnonzero(fallback).tolist():
+        out[i] = _resolve_latlng({"lat": lat_vals[i], "lng": lng_vals[i]})
+    return out
 
+
+def _pdf_table_rows(pno: int, col: Dict[str, int], data_rows: List[List[Any]]) -> List[Dict[str, Any]]:
+    """單一表格 → 逐列 dict；where 的列號沿用舊版的「表內序號 + 2」。"""
+    return _pdf_rows_columnar(col, data_rows, [f"page{pno} row{i + 2}" for i in range(len(data_rows))])
+
+
+def _pdf_rows_columnar(col: Dict[str, int], data_rows: List[List[Any]],
+                       wheres: List[str]) -> List[Dict[str, Any]]:
+    """同一表頭的一批資料列 → 逐列 dict（欄式處理：一次解析整欄，不逐列逐格查 col）。
+
+    時間欄與經緯度走 _pdf_ts_column / _pdf_latlng_column（夠多列時交給 pandas），
+    文字欄一次 strip；結果與逐列 _parse_ts / `.strip()` / _resolve_latlng 完全相同。
+    dict 形狀同 _iter_tabular_rows；wheres[i] 為第 i 列的位置標記（錯誤訊息用）。
+    """
+    n = len(data_rows)
+    if not n:
+        return []
+    g = col.get
+    starts = _pdf_ts_column(_pdf_column(data_rows, g("start", -1)))
+    if g("end", -1) >= 0:
+        # 結束欄空白 → 同開始時間（與 CSV / Excel 一致；row_fp 需要兩端都有值）
+        ends = [e or s for e, s in zip(_pdf_ts_column(_pdf_column(data_rows, g("end", -1))), starts)]
+    else:
+        ends = starts
+    cell_ids = _pdf_text_column(data_rows, g("cellid", -1))
+    addrs = _pdf_text_column(data_rows, g("addr", -1))
+    sectors = _pdf_text_column(data_rows, g("sector", -1))
+    sites = _pdf_text_column(data_rows, g("site", -1))
+    cids = _pdf_text_column(data_rows, g("cid", -1))
+    if g("az", -1) >= 0:
+        azs = [_to_int(v) for v in _pdf_column(data_rows, g("az", -1))]
+    else:
+        azs = [None] * n
+    # GPS 軌跡 / 經緯度直給格式（PDF 版）：取檔案自帶座標
+    if g("lat", -1) >= 0 and g("lng", -1) >= 0:
+        lls = _pdf_latlng_column(_pdf_column(data_rows, g("lat", -1)), _pdf_column(data_rows, g("lng", -1)))
+    else:
+        lls = [None] * n
+
+    out: List[Dict[str, Any]] = []
+    for i in range(n):
+        skip = None
+        if not starts[i]:
+            skip = "缺少開始連線時間"
+        elif not addrs[i] and not cell_ids[i] and not lls[i]:
+            skip = "地址、cell_id、經緯度皆空，無法定位"
+        out.append({
+            "where": wheres[i], "skip": skip,
+            "start_ts": starts[i], "end_ts": ends[i],
+            "cell_id": cell_ids[i], "cell_addr": addrs[i], "direct_ll": lls[i],
+            "sector_name": sectors[i], "site_code": sites[i], "sector_id": cids[i],
+            "azimuth": azs[i],
+        })
+    return out
+
+
+def _iter_pdf_rows(file_bytes: bytes) -> Iterable[Dict[str, Any]]:
+    """PDF 的列來源（交給 _run_records）：依頁序 yield 每一資料列（含 skip 原因）。
+
+    沿用同一表頭（同一個 col 物件，見 _iter_pdf_tables）的連續表併成一批再欄式解析，
+    最多 _PDF_BATCH_ROWS 列：跨頁續表一批通常就過向量化門檻，記憶體仍有上界。
+    """
+    batch_col: Optional[Dict[str, int]] = None
+    rows: List[List[Any]] = []
+    wheres: List[str] = []
+    for pno, col, data_rows in _iter_pdf_tables(file_bytes):
+        if col is not batch_col and rows:
+            yield from _pdf_rows_columnar(batch_col, rows, wheres)
+            rows, wheres = [], []
+        batch_col = col
+        rows.extend(data_rows)
+        wheres.extend(f"page{pno} row{i + 2}" for i in range(len(data_rows)))
+        if len(rows) >= _PDF_BATCH_ROWS:
+            yield from _pdf_rows_columnar(batch_col, rows, wheres)
+            rows, wheres = [], []
     if rows:
-        inserted = _insert_records(rows)
+        yield from _pdf_rows_columnar(batch_col, rows, wheres)
+
 
-    return {"total": total, "inserted": inserted, "skipped": skipped, "errors": errors[:50]}
+def ingest_pdf(
+    project_id: str,
+    target_id: str,
+    file_bytes: bytes,
+    progress: Optional[IngestProgress] = None,
+    skip_existing: bool = False,
+) -> Dict[str, Any]:
+    """PDF → raw_traces：_iter_pdf_rows → _run_records（與 CSV / Excel 同一套分塊、
+    管線、bulk geocode、row_fp 冪等、續跑；progress / skip_existing 語意同 _ingest_rows_stream）。"""
+    if pdfplumber is None:
+        raise HTTPException(status_code=400, detail="後端缺少 pdfplumber：請安裝 pip install pdfplumber")
+    return _run_records(_iter_pdf_rows(file_bytes),
+                        _DbSink(project_id, target_id, skip_existing), progress)
 
 
 # ====== Parse-only（臨時模式）：解析 + geocode，不寫 DB ======
@@ -1721,284 +3099,109 @@ def _apply_user_mapping(rows_iter: Iterable[Dict[str, Any]], mapping: Dict[str,
         yield new_row
 
 
-def parse_file_only(
+def _parse_file(
     target_id: str,
     filename: str,
     file_bytes: bytes,
-    mapping: Optional[Dict[str, str]] = None,
-) -> List[Dict[str, Any]]:
-    """
-    解析 + geocode，但不寫入 DB。供前端臨時模式使用。
-    回傳 record dict list（含 lat/lng/start_ts 等所有欄位）。
+    mapping: Optional[Dict[str, str]],
+    sink: _RecordSink,
+) -> Dict[str, Any]:
+    """parse-only 共用：依副檔名選列來源 → _run_records(sink)；0 筆 → ParseDiagnosisError。
 
     `mapping`：使用者「手動欄位對應」傳入時，格式 {raw_column_name: system_field}
               其中 system_field ∈ {'time','cell_id','addr','lat','lng','ignore'}
               system_field 會在 ingest 內部 rename 為 _RAW2CANON 認識的 alias。
 
-    解析後若 records 為空 → raise ParseDiagnosisError（供前端展示診斷 + 回報入口）。
     加密（密碼保護）檔會先被 _reject_if_encrypted 擋下並回清楚錯誤。
     """
     _reject_if_encrypted(file_bytes)
     ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
 
-    # 先取得 rows iterator（PDF 走另一條：mapping 對 PDF 不適用，因為它有專用 table 流程）
+    # 先取得列來源（PDF 走另一條：mapping 對 PDF 不適用，因為它有專用 table 流程）
     if ext in {"csv", "txt", "tsv"}:
         rows = _iter_rows_csv(file_bytes)
         if mapping:
             rows = _apply_user_mapping(rows, mapping)
-        records = _parse_rows_to_records(target_id, rows)
+        source = _iter_tabular_rows(rows)
     elif ext in {"xlsx", "xltx", "xlsm", "xltm"}:
         # user_mapping 同時傳入 _iter_rows_excel：讓使用者指定的欄位在 header
         # detection 規則 B 被算成命中，陌生格式的 sheet 才不會在 rename 前被丟棄。
         rows = _iter_rows_excel(file_bytes, user_mapping=mapping)
         if mapping:
             rows = _apply_user_mapping(rows, mapping)
-        records = _parse_rows_to_records(target_id, rows)
+        source = _iter_tabular_rows(rows)
     elif ext == "pdf":
         if mapping:
             # PDF 暫不支援使用者手動對應（內部用 _match_col_idx 直接讀 table）
             raise ValueError("PDF 暫不支援手動欄位對應，請改用 CSV/Excel")
-        records = _parse_pdf_to_records(target_id, file_bytes)
+        if pdfplumber is None:
+            raise ValueError("後端缺少 pdfplumber")
+        source = _iter_pdf_rows(file_bytes)
     else:
         raise ValueError("不支援的檔案格式：請使用 CSV / TXT / XLSX / XLTX / PDF")
 
+    result = _run_records(source, sink)
+
     # 解析後 0 筆 → 觸發智慧診斷（附前幾列範例值供「問哪欄是時間/地點」UI）
-    if not records:
+    if not result["inserted"]:
         headers = _peek_headers(filename, file_bytes)
         sample_rows = _peek_sample_rows(filename, file_bytes)
         raise ParseDiagnosisError(
             "無法從此檔案解析出任何有效記錄",
             _build_diagnosis(headers, sample_rows),
         )
-
-    return records
+    return result
 
 
-def _parse_rows_to_records(target_id: str, rows_iter: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def parse_file_only(
+    target_id: str,
+    filename: str,
+    file_bytes: bytes,
+    mapping: Optional[Dict[str, str]] = None,
+) -> List[Dict[str, Any]]:
     """
-    把 rows 解析 + geocode，不做 DB insert，回傳 list[dict]。
-
-    B 方案（批次 geocode）：
-      Phase 1：掃過所有 rows → normalize + 時間驗證 → 收集 (cell_id, cell_addr)
-      Phase 2：把 unique (cell_id, cell_addr) 一次丟給 geocode.lookup_bulk
-               （內部一次 SQL ANY + Redis MGET，避免 3000+ round-trip）
-      Phase 3：第二輪用 bulk 結果組裝 records
+    解析 + geocode，但不寫入 DB。供預覽（preview artifact 要存整份 records）使用。
+    回傳 record dict list（含 lat/lng/start_ts 等所有欄位）；mapping / 診斷 / 加密檔見 _parse_file。
     """
-    import time as _time
-    _t_start = _time.perf_counter()
-    _rows_read = 0
+    sink = _ListSink(target_id)
+    _parse_file(target_id, filename, file_bytes, mapping, sink)
+    return sink.records
 
-    # ── Phase 1：normalize + 時間驗證 + 收集 unique geo keys ────────
-    _t_phase1 = _time.perf_counter()
-    parsed: List[Dict[str, Any]] = []   # 暫存解析後且通過篩選的 row
-    for raw in rows_iter:
-        _rows_read += 1
-        r = _normalize_row(raw)
 
-        start_ts = _parse_ts(r.get("start_ts"))
-        if not start_ts:
-            continue
-        end_ts = _parse_ts(r.get("end_ts")) or start_ts
+def parse_file_geojson(
+    target_id: str,
+    filename: str,
+    file_bytes: bytes,
+    mapping: Optional[Dict[str, str]] = None,
+    keep_records: bool = True,
+) -> Dict[str, Any]:
+    """解析 + geocode 後直接回 GeoJSON FeatureCollection（/parse-only、/upload/parse-temp 用）。
 
-        cell_id   = (str(r.get("cell_id")   or "").strip() or None)
-        cell_addr = (str(r.get("cell_addr") or "").strip() or None)
-        # 檔案自帶座標（GPS 軌跡 / 經緯度格式）優先
-        direct_ll = _resolve_latlng(r)
-        if not cell_addr and not cell_id and not direct_ll:
-            continue
+    與「parse_file_only 再逐筆轉 Feature」結果相同，但 Feature 在每塊寫出時就組好，
+    不必先留一份整檔 record list 再轉。形狀：
+      {type, features, total（有效記錄數）, plotted, skipped（無座標）, _records（keep_records 時）}
+    """
+    sink = _GeoJsonSink(target_id, keep_records=keep_records)
+    _parse_file(target_id, filename, file_bytes, mapping, sink)
+    return sink.collection()
 
-        parsed.append({
-            "r":         r,
-            "start_ts":  start_ts,
-            "end_ts":    end_ts,
-            "cell_id":   cell_id,
-            "cell_addr": cell_addr,
-            "direct_ll": direct_ll,
-        })
-    _t_phase1_elapsed = _time.perf_counter() - _t_phase1
 
-    # ── Phase 2：批次 geocode（只查無自帶座標的列）────────────────
-    _t_phase2 = _time.perf_counter()
-    unique_keys = list({(p["cell_id"], p["cell_addr"]) for p in parsed if not p["direct_ll"]})
-    try:
-        bulk = geocode.lookup_bulk(unique_keys)
-    except Exception as e:
-        print(f"[ingest] bulk geocode error, fallback to None for all: {type(e).__name__}: {e}")
-        bulk = {k: None for k in unique_keys}
-    _t_phase2_elapsed = _time.perf_counter() - _t_phase2
-
-    # ── Phase 3：組裝 records ──────────────────────────────────────
-    _t_phase3 = _time.perf_counter()
-    result: List[Dict[str, Any]] = []
-    _n_geo_ok = 0
-    for p in parsed:
-        lat = lng = None
-        accuracy_m = _guess_accuracy(p["cell_addr"])
-        if p["direct_ll"]:
-            # 檔案已含座標 → 直接採用，免 geocode（GPS 精度高）
-            lat, lng = p["direct_ll"]
-            accuracy_m = GPS_ACCURACY_M
-            _n_geo_ok += 1
-        else:
-            ll = bulk.get((p["cell_id"], p["cell_addr"]))
-            if ll:
-                lat, lng = ll
-                _n_geo_ok += 1
-        r = p["r"]
-        result.append({
-            "target_id":   target_id,
-            "start_ts":    p["start_ts"].isoformat(),
-            "end_ts":      p["end_ts"].isoformat(),
-            "cell_id":     p["cell_id"],
-            "cell_addr":   p["cell_addr"],
-            "sector_name": (str(r.get("sector_name") or "").strip() or None),
-            "site_code":   (str(r.get("site_code")   or "").strip() or None),
-            "sector_id":   (str(r.get("sector_id")   or "").strip() or None),
-            "azimuth":     _to_int(r.get("azimuth")),
-            "lat":         _to_float(lat),
-            "lng":         _to_float(lng),
-            "accuracy_m":  _to_int(accuracy_m),
-            "azimuth_ref": "unknown",
-        })
-    _t_phase3_elapsed = _time.perf_counter() - _t_phase3
-
-    _total = _time.perf_counter() - _t_start
-    print(
-        f"[ingest][timing] _parse_rows_to_records: "
-        f"total={_total*1000:.0f}ms "
-        f"rows_read={_rows_read} kept={len(result)} ok={_n_geo_ok} "
-        f"unique_keys={len(unique_keys)} "
-        f"phase1_normalize={_t_phase1_elapsed*1000:.0f}ms "
-        f"phase2_bulk_geocode={_t_phase2_elapsed*1000:.0f}ms "
-        f"phase3_assemble={_t_phase3_elapsed*1000:.0f}ms"
-    )
-    return result
+def _parse_rows_to_records(target_id: str, rows_iter: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """把 CSV / Excel rows 解析 + geocode，不做 DB insert，回傳預覽 record list。
+
+    走共用 engine（_run_records + _ListSink）：分塊 bulk geocode（跨塊記住已查過的
+    key，整檔每個 unique key 仍只查一次），不再先把整檔 normalize 結果 hold 在中間
+    list 才 geocode；geocode 失敗只讓座標留空。
+    """
+    sink = _ListSink(target_id)
+    _run_records(_iter_tabular_rows(rows_iter), sink)
+    return sink.records
 
 
 def _parse_pdf_to_records(target_id: str, file_bytes: bytes) -> List[Dict[str, Any]]:
-    """
-    同 ingest_pdf 但不寫 DB，回傳 list[dict]。
-    B 方案（批次 geocode）：先收集 unique (cell_id, cell_addr) → 一次 bulk → 再組裝。
-    """
+    """同 ingest_pdf 但不寫 DB，回傳預覽 record list（_run_records + _ListSink）。"""
     if pdfplumber is None:
         raise ValueError("後端缺少 pdfplumber")
-    import time as _time
-    _t_start = _time.perf_counter()
-    _t_pdf_open = 0.0
-    _t_extract  = 0.0
-    _rows_read   = 0
-
-    # ── Phase 1：解析 PDF 表格 + 時間驗證 ──────────────────────────
-    _t_phase1 = _time.perf_counter()
-    parsed: List[Dict[str, Any]] = []
-
-    _t0 = _time.perf_counter()
-    pdf = pdfplumber.open(io.BytesIO(file_bytes))
-    _t_pdf_open = _time.perf_counter() - _t0
-    last_header: Optional[List[str]] = None
-    last_col: Optional[Dict[str, int]] = None
-    with pdf:
-        for pno, page in enumerate(pdf.pages, start=1):
-            _t1 = _time.perf_counter()
-            tables = _extract_tables_from_page(page)
-            _t_extract += _time.perf_counter() - _t1
-            for t in tables:
-                if not t:
-                    continue
-                header0 = [(c or "").strip() for c in t[0]]
-                col0 = _match_col_idx(header0)
-                if _pdf_cols_useful(col0):
-                    header, col = header0, col0
-                    last_header, last_col = header, col
-                    data_rows = t[1:]
-                elif last_col is not None:
-                    # 此頁無表頭（接續上頁）→ 沿用上頁對應，t[0] 也是資料
-                    header, col = last_header, last_col
-                    data_rows = t
-                else:
-                    continue
-                for row in data_rows:
-                    _rows_read += 1
-                    rr = [(row[i] if i < len(row) else "") for i in range(len(header))]
-                    start_ts = _parse_ts(rr[col["start"]]) if col.get("start", -1) >= 0 else None
-                    if not start_ts:
-                        continue
-                    end_ts = _parse_ts(rr[col["end"]]) if col.get("end", -1) >= 0 else start_ts
-                    cell_id   = (rr[col["cellid"]].strip() if col.get("cellid", -1) >= 0 and rr[col["cellid"]] else None)
-                    cell_addr = (rr[col["addr"]].strip()   if col.get("addr", -1)   >= 0 and rr[col["addr"]]   else None)
-                    # GPS 軌跡 / 經緯度直給格式（PDF 版）：取檔案自帶座標
-                    direct_ll = None
-                    if col.get("lat", -1) >= 0 and col.get("lng", -1) >= 0:
-                        direct_ll = _resolve_latlng({
-                            "lat": rr[col["lat"]], "lng": rr[col["lng"]],
-                        })
-                    if not cell_addr and not cell_id and not direct_ll:
-                        continue
-                    parsed.append({
-                        "start_ts":    start_ts,
-                        "end_ts":      end_ts,
-                        "cell_id":     cell_id,
-                        "cell_addr":   cell_addr,
-                        "direct_ll":   direct_ll,
-                        "sector_name": (rr[col["sector"]].strip() if col.get("sector", -1) >= 0 and rr[col["sector"]] else None),
-                        "site_code":   (rr[col["site"]].strip()   if col.get("site",   -1) >= 0 and rr[col["site"]]   else None),
-                        "sector_id":   (rr[col["cid"]].strip()    if col.get("cid",    -1) >= 0 and rr[col["cid"]]    else None),
-                        "azimuth":     (_to_int(rr[col["az"]]) if col.get("az", -1) >= 0 else None),
-                    })
-    _t_phase1_elapsed = _time.perf_counter() - _t_phase1
-
-    # ── Phase 2：批次 geocode（只查無自帶座標的列）────────────────
-    _t_phase2 = _time.perf_counter()
-    unique_keys = list({(p["cell_id"], p["cell_addr"]) for p in parsed if not p["direct_ll"]})
-    try:
-        bulk = geocode.lookup_bulk(unique_keys)
-    except Exception as e:
-        print(f"[ingest][pdf] bulk geocode error, fallback to None: {type(e).__name__}: {e}")
-        bulk = {k: None for k in unique_keys}
-    _t_phase2_elapsed = _time.perf_counter() - _t_phase2
-
-    # ── Phase 3：組裝 records ──────────────────────────────────────
-    _t_phase3 = _time.perf_counter()
-    result: List[Dict[str, Any]] = []
-    _n_geo_ok = 0
-    for p in parsed:
-        lat = lng = None
-        accuracy_m = _guess_accuracy(p["cell_addr"])
-        if p["direct_ll"]:
-            lat, lng = p["direct_ll"]
-            accuracy_m = GPS_ACCURACY_M
-            _n_geo_ok += 1
-        else:
-            ll = bulk.get((p["cell_id"], p["cell_addr"]))
-            if ll:
-                lat, lng = ll
-                _n_geo_ok += 1
-        result.append({
-            "target_id":   target_id,
-            "start_ts":    p["start_ts"].isoformat(),
-            "end_ts":      p["end_ts"].isoformat(),
-            "cell_id":     p["cell_id"],
-            "cell_addr":   p["cell_addr"],
-            "sector_name": p["sector_name"],
-            "site_code":   p["site_code"],
-            "sector_id":   p["sector_id"],
-            "azimuth":     p["azimuth"],
-            "lat":         _to_float(lat),
-            "lng":         _to_float(lng),
-            "accuracy_m":  _to_int(accuracy_m),
-            "azimuth_ref": "unknown",
-        })
-    _t_phase3_elapsed = _time.perf_counter() - _t_phase3
-
-    _total = _time.perf_counter() - _t_start
-    print(
-        f"[ingest][timing] _parse_pdf_to_records: "
-        f"total={_total*1000:.0f}ms "
-        f"pdf_open={_t_pdf_open*1000:.0f}ms extract_tables={_t_extract*1000:.0f}ms "
-        f"rows_read={_rows_read} kept={len(result)} ok={_n_geo_ok} "
-        f"unique_keys={len(unique_keys)} "
-        f"phase1_parse_pdf={_t_phase1_elapsed*1000:.0f}ms "
-        f"phase2_bulk_geocode={_t_phase2_elapsed*1000:.0f}ms "
-        f"phase3_assemble={_t_phase3_elapsed*1000:.0f}ms"
-    )
-    return result
\ No newline at end of file
+    sink = _ListSink(target_id)
+    _run_records(_iter_pdf_rows(file_bytes), sink)
+    return sink.records
@@ -0,0 +1,672 @@
+# backend/app/services/ingest_jobs.py
+"""
+背景匯入 job 服務（2026-10）。
+
+為什麼：同步 POST /api/upload 在 request 內 parse + geocode + insert，大檔會撞
+Render 120s 請求上限回 502（geocode_cache 只能讓「重傳」漸進變快，第一次仍可能逾時）。
+改成：register_evidence 之後只把原始檔加密排入 ingest_jobs、立即回 job_id；
+由 in-process worker pool 跑 ingest_auto，前端輪詢 GET /api/upload/jobs/{job_id}。
+
+設計鎖定：
+  - Postgres 即佇列（無 Redis / broker 依賴）：認領用 FOR UPDATE SKIP LOCKED，
+    多 worker 執行緒、多 instance 同時跑也不會重複認領。
+  - 原始檔以 crypto_box 加密存 raw_enc（同 preview_artifacts，金鑰缺失 fail-closed）；
+    job 結束（done / failed）即清空，不長期保留第二份證物。
+  - 續跑：_JobProgress 在每塊 commit 後回寫 rows_committed / rows_inserted。
+    heartbeat 由獨立的 _Heartbeat 執行緒定期更新（不綁在塊 commit 上：第一塊的 geocode
+    可能就要好幾分鐘）。worker 掛掉（deploy、OOM）→ heartbeat 超過 INGEST_JOB_STALE_SEC
+    的 running job 被重新認領，ingest 以 IngestProgress.resume_rows 跳過已 commit 的列。
+  - 所有權：認領後的每個 UPDATE（heartbeat / 進度 / 收尾）都帶 worker_id 條件。萬一 job
+    仍被別的 worker 接手（例如本 process 卡住超過 stale），舊 worker 的 UPDATE 對不到列
+    → JobLostError 中止本次匯入，不收尾、不寫 audit，交給新 owner。
+    塊 commit 與進度回寫是兩個 transaction，兩者之間掛掉 → 該塊會再寫一次；
+    row_fp 唯一索引 + ON CONFLICT DO NOTHING 讓這次重寫不產生重複列。
+  - attempts 上限 _MAX_ATTEMPTS，避免毒檔無限重試。
+  - evidence 統計回填、upload / upload_failed audit 由 worker 在 job 結束時寫，
+    details 與同步路徑相同，另加 job_id。
+  - 所有 cur.execute 帶 prepare=False（pooler 約束）。
+"""
+from __future__ import annotations
+
+import json
+import secrets
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from app.core import logging_utils as clog
+from app.core.env import env_int
+from app.db.session import get_conn
+from app.services import crypto_box
+from app.services.audit import write_audit
+from app.services.evidence import update_evidence_stats
+from app.services.ingest import (
+    EncryptedFileError,
+    IngestProgress,
+    ingest_auto,
+)
+
+# ── env 預設 ───────────────────────────────────────────────
+_DEFAULT_WORKERS = 1
+_DEFAULT_STALE_SEC = 300
+_MAX_ATTEMPTS = 3
+_POLL_SEC = 2.0          # 佇列空時的輪詢間隔（enqueue 會即時喚醒，這只是跨 instance 的保底）
+
+
+def _job_workers() -> int:
+    """worker 執行緒數（env `INGEST_JOB_WORKERS`，預設 1，合理 1~4）。
+
+    每個 job 的管線同時佔 2~3 條 DB 連線（geocode 快取 + 寫入），DB_POOL_MAX 預設 5，
+    故預設只跑 1 個 job；池子開大再調高。
+    """
+    return env_int("INGEST_JOB_WORKERS", _DEFAULT_WORKERS, 1, 4)
+
+
+def _stale_sec() -> int:
+    """running job 的 heartbeat 超過幾秒視為 worker 已死、可重新認領
+    （env `INGEST_JOB_STALE_SEC`，預設 300，合理 60~3600）。
+
+    heartbeat 由 _Heartbeat 每 _heartbeat_sec() 秒更新，與塊大小 / geocode 耗時無關。
+    """
+    return env_int("INGEST_JOB_STALE_SEC", _DEFAULT_STALE_SEC, 60, 3600)
+
+
+def _heartbeat_sec() -> float:
+    """heartbeat 間隔：stale 的 1/4 —— 連續漏掉三次（DB 短暫斷線）仍不會被誤判為死掉。"""
+    return _stale_sec() / 4.0
+
+
+class JobLostError(RuntimeError):
+    """job 已被其他 worker 接手（帶 worker_id 的 UPDATE 對不到列）；本 worker 應放手。"""
+
+
+# ── 建表（idempotent；仿 preview_artifact._ensure_preview_table）─────────
+_table_ready = False
+
+_DDL_TABLE = """
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+  id                BIGSERIAL   PRIMARY KEY,
+  job_id            TEXT UNIQUE NOT NULL,
+  project_id        TEXT        NOT NULL,
+  target_id         TEXT        NOT NULL,
+  filename          TEXT        NOT NULL,
+  ext               TEXT        NULL,
+  evidence_id       BIGINT      NULL,
+  sha256_full       TEXT        NULL,
+  prior_uploads     INT         NOT NULL DEFAULT 0,
+  size_bytes        BIGINT      NOT NULL,
+  mime_hint         TEXT        NULL,
+  raw_enc           BYTEA       NULL,
+  status            TEXT        NOT NULL DEFAULT 'queued',
+  rows_estimate     INT         NULL,
+  rows_parsed       INT         NOT NULL DEFAULT 0,
+  rows_geocoded     INT         NOT NULL DEFAULT 0,
+  rows_inserted     INT         NOT NULL DEFAULT 0,
+  rows_skipped      INT         NOT NULL DEFAULT 0,
+  rows_committed    INT         NOT NULL DEFAULT 0,
+  resume_from       INT         NOT NULL DEFAULT 0,
+  attempts          INT         NOT NULL DEFAULT 0,
+  worker_id         TEXT        NULL,
+  result            JSONB       NULL,
+  error_text        TEXT        NULL,
+  created_by        BIGINT      NULL REFERENCES users(id) ON DELETE SET NULL,
+  created_by_name   TEXT        NULL,
+  created_by_role   TEXT        NULL,
+  created_at        TIMESTAMPTZ NOT NULL DEFAULT now(),
+  started_at        TIMESTAMPTZ NULL,
+  heartbeat_at      TIMESTAMPTZ NULL,
+  finished_at       TIMESTAMPTZ NULL
+)
+"""
+_DDL_INDEXES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_ingest_jobs_jid     ON ingest_jobs (job_id)",
+    "CREATE INDEX        IF NOT EXISTS idx_ingest_jobs_pending ON ingest_jobs (id) WHERE status IN ('queued', 'running')",
+    "CREATE INDEX        IF NOT EXISTS idx_ingest_jobs_project ON ingest_jobs (project_id, created_at DESC)",
+]
+
+
+def _ensure_jobs_table() -> bool:
+    global _table_ready
+    if _table_ready:
+        return True
+    try:
+        with get_conn() as conn, conn.cursor() as cur:
+            cur.execute(_DDL_TABLE, prepare=False)
+            for ddl in _DDL_INDEXES:
+                cur.execute(ddl, prepare=False)
+        _table_ready = True
+    except Exception as e:
+        print(f"[ingest_jobs] ensure table failed: {type(e).__name__}: {e}")
+    return _table_ready
+
+
+# ── 純函式（估列數 / ETA）──────────────────────────────────
+def estimate_rows(ext: str, content: bytes) -> Optional[int]:
+    """排入時粗估總列數，只供 ETA 用（估不出回 None，前端就只顯示已處理筆數）。
+
+    - 文字表格：換行數（含表頭 / 說明列，略高估，ETA 偏保守）
+    - Excel：各分頁 <dimension> 的 max_row 加總（read_only 只讀 XML 開頭，不展開整張）。
+      電信匯出工具常把 dimension 寫死成 A1 → 加總 ≤ 分頁數時視為估不出。
+    - PDF：None（頁數與列數無固定關係）
+    """
+    ext = (ext or "").lower()
+    if ext in {"csv", "txt", "tsv"}:
+        return content.count(b"\n") or None
+    if ext in {"xlsx", "xltx", "xlsm", "xltm"}:
+        try:
+            import io
+
+            import openpyxl
+
+            wb = openpyxl.load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+            try:
+                n = sum(int(ws.max_row or 0) for ws in wb.worksheets)
+                return n if n > len(wb.worksheets) else None
+            finally:
+                wb.close()
+        except Exception:
+            return None
+    return None
+
+
+def eta_seconds(
+    rows_estimate: Optional[int],
+    rows_committed: int,
+    resume_from: int,
+    elapsed_sec: Optional[float],
+) -> Optional[int]:
+    """以「本次 attempt 的 commit 速率」外推剩餘時間；資料不足回 None。
+
+    只算本次 attempt（rows_committed - resume_from）：續跑時前一次已寫的列不計入速率，
+    否則剛重新認領的 job 會顯示離譜的超快 ETA。
+    """
+    if not rows_estimate or elapsed_sec is None or elapsed_sec <= 0:
+        return None
+    done = rows_committed - resume_from
+    if done <= 0:
+        return None
+    remaining = max(rows_estimate - rows_committed, 0)
+    return int(round(remaining / (done / elapsed_sec)))
+
+
+# ── 排入 / 查詢 ────────────────────────────────────────────
+def enqueue(
+    *,
+    project_id: str,
+    target_id: str,
+    filename: str,
+    ext: Optional[str],
+    content: bytes,
+    evidence: Dict[str, Any],
+    mime_hint: Optional[str],
+    user: Dict[str, Any],
+) -> Dict[str, Any]:
+    """把已封存指紋的上傳排入 job。金鑰缺失 → crypto_box.PreviewKeyError（fail-closed）。
+
+    回 {job_id, status, rows_estimate}。排入後喚醒本 process 的 worker。
+    """
+    raw_enc = crypto_box.encrypt_blob(content)      # 可能 raise PreviewKeyError
+    job_id = secrets.token_urlsafe(18)
+    rows_estimate = estimate_rows(ext or "", content)
+
+    _ensure_jobs_table()
+    sql = """
+    INSERT INTO ingest_jobs (
+      job_id, project_id, target_id, filename, ext,
+      evidence_id, sha256_full, prior_uploads, size_bytes, mime_hint, raw_enc,
+      rows_estimate, created_by, created_by_name, created_by_role
+    ) VALUES (
+      %s,%s,%s,%s,%s,
+      %s,%s,%s,%s,%s,%s,
+      %s,%s,%s,%s
+    )
+    """
+    params = (
+        job_id, project_id, target_id, filename, ext,
+        evidence.get("id"), evidence.get("sha256_full"), int(evidence.get("prior_uploads") or 0),
+        len(content), mime_hint, raw_enc,
+        rows_estimate,
+        # 匿名 admin（AUTH_ENABLED=false）id=0 → NULL，否則違反 users(id) FK
+        user["id"] if user.get("id") else None, user.get("username"), user.get("role"),
+    )
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(sql, params, prepare=False)
+
+    clog.log_info(
+        "ingest.job.queued",
+        job_id=job_id, project_id=project_id, target_id=target_id,
+        evidence_id=evidence.get("id"), size_bytes=len(content), rows_estimate=rows_estimate,
+    )
+    notify()
+    return {"job_id": job_id, "status": "queued", "rows_estimate": rows_estimate}
+
+
+# get_job 的 SELECT 順序（不含 raw_enc）
+_META_COLS = [
+    "job_id", "status", "project_id", "target_id", "filename", "evidence_id",
+    "rows_estimate", "rows_parsed", "rows_geocoded", "rows_inserted", "rows_skipped",
+    "rows_committed", "resume_from", "attempts", "result", "error_text",
+    "created_at", "started_at", "heartbeat_at", "finished_at",
+]
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """依 job_id 查進度（含 ETA）。找不到回 None。"""
+    _ensure_jobs_table()
+    sql = f"SELECT {', '.join(_META_COLS)}, now() FROM ingest_jobs WHERE job_id = %s"
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(sql, (job_id,), prepare=False)
+        row = cur.fetchone()
+    if not row:
+        return None
+    meta = dict(zip(_META_COLS, row[:-1]))
+    db_now = row[-1]
+    return _present(meta, db_now)
+
+
+def pending_count() -> int:
+    """queued + running 的數量（/api/metrics 的 queue_depth）。"""
+    if not _ensure_jobs_table():
+        return 0
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT count(*) FROM ingest_jobs WHERE status IN ('queued', 'running')", prepare=False)
+        return int((cur.fetchone() or [0])[0])
+
+
+def _present(meta: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    """DB 列 → API 回應（加 progress / eta_sec；內部欄位不外露）。"""
+    status = meta["status"]
+    est = meta.get("rows_estimate")
+    committed = int(meta.get("rows_committed") or 0)
+    started = meta.get("started_at")
+    elapsed = (now - started).total_seconds() if (started and status == "running") else None
+
+    if status == "done":
+        progress: Optional[float] = 1.0
+    elif est:
+        progress = round(min(committed / est, 0.99), 3)
+    else:
+        progress = None
+
+    out = {
+        "job_id":        meta["job_id"],
+        "status":        status,
+        "project_id":    meta["project_id"],
+        "target_id":     meta["target_id"],
+        "filename":      meta["filename"],
+        "evidence_id":   meta.get("evidence_id"),
+        "rows_estimate": est,
+        "rows_parsed":   int(meta.get("rows_parsed") or 0),
+        "rows_geocoded": int(meta.get("rows_geocoded") or 0),
+        "rows_inserted": int(meta.get("rows_inserted") or 0),
+        "rows_skipped":  int(meta.get("rows_skipped") or 0),
+        "progress":      progress,
+        "eta_sec":       eta_seconds(est, committed, int(meta.get("resume_from") or 0), elapsed)
+                         if status == "running" else None,
+        "attempts":      int(meta.get("attempts") or 0),
+        "created_at":    meta.get("created_at"),
+        "started_at":    started,
+        "finished_at":   meta.get("finished_at"),
+    }
+    if status == "done":
+        out["result"] = meta.get("result")
+    if status == "failed":
+        out["error"] = meta.get("error_text")
+    return out
+
+
+# ── 認領 / 進度 / 收尾 ──────────────────────────────────────
+_CLAIM_COLS = [
+    "id", "job_id", "project_id", "target_id", "filename", "ext",
+    "evidence_id", "sha256_full", "prior_uploads", "size_bytes", "mime_hint", "raw_enc",
+    "rows_committed", "rows_inserted", "rows_geocoded", "rows_skipped", "attempts",
+    "created_by", "created_by_name", "created_by_role", "worker_id",
+]
+
+
+def claim_next(worker_id: str) -> Optional[Dict[str, Any]]:
+    """認領下一個 job：queued，或 heartbeat 過期的 running（前一個 worker 已死）。
+
+    FOR UPDATE SKIP LOCKED：同時認領的 worker 各拿不同列，不互等。
+    認領即 attempts+1、resume_from=rows_committed、started_at/heartbeat=now()。
+    """
+    _ensure_jobs_table()
+    sql = f"""
+    UPDATE ingest_jobs
+       SET status = 'running', attempts = attempts + 1, worker_id = %s,
+           resume_from = rows_committed, started_at = now(), heartbeat_at = now()
+     WHERE id = (
+        SELECT id FROM ingest_jobs
+         WHERE status = 'queued'
+            OR (status = 'running' AND heartbeat_at < now() - make_interval(secs => %s))
+         ORDER BY id
+         FOR UPDATE SKIP LOCKED
+         LIMIT 1
+     )
+    RETURNING {', '.join(_CLAIM_COLS)}
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(sql, (worker_id, _stale_sec()), prepare=False)
+        row = cur.fetchone()
+    return dict(zip(_CLAIM_COLS, row)) if row else None
+
+
+class _Heartbeat:
+    """running job 的 heartbeat 執行緒：每 _heartbeat_sec() 秒 UPDATE heartbeat_at。
+
+    只在 worker_id 仍是自己時更新；對不到列 → lost 並停止（_JobProgress 據此中止匯入）。
+    單次失敗（DB 斷線）只記錄、下一輪再試。
+    """
+
+    def __init__(self, pk: int, worker_id: Optional[str]):
+        self.pk = pk
+        self.worker_id = worker_id
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name=f"ingest-job-hb-{pk}", daemon=True)
+
+    def __enter__(self) -> "_Heartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join(5.0)
+
+    def beat(self) -> bool:
+        """更新一次；回傳是否仍擁有此 job（例外視為仍擁有）。"""
+        try:
+            with get_conn() as conn, conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE ingest_jobs SET heartbeat_at = now() "
+                    "WHERE id = %s AND worker_id = %s AND status = 'running'",
+                    (self.pk, self.worker_id),
+                    prepare=False,
+                )
+                owned = cur.rowcount != 0
+        except Exception as e:
+            print(f"[ingest_jobs] WARN heartbeat 失敗 id={self.pk}: {type(e).__name__}: {e}")
+            return True
+        if not owned:
+            self.lost.set()
+        return owned
+
+    def _loop(self) -> None:
+        while not self._stop.wait(_heartbeat_sec()):
+            if not self.beat():
+                return
+
+
+class _JobProgress(IngestProgress):
+    """把 _ingest_rows_stream 的進度回寫 ingest_jobs（每塊 commit 一次 UPDATE）。
+
+    parsed / geocoded 只記在記憶體，隨下一次 committed 一起寫，避免每塊多兩次 round-trip。
+    續跑時 rows_geocoded / rows_skipped 從表上的值接續（committed 會整欄覆寫，不能從 0 或
+    rows_inserted 起算：有重複列、無法定位列時 inserted ≠ geocoded）。
+    UPDATE 帶 worker_id 條件；對不到列、或 heartbeat 已發現 job 被接手 → JobLostError
+    （parsed 在讀檔執行緒上拋 → 停止讀檔；committed 在 write 執行緒上拋 → engine 交回重拋）。
+    """
+
+    def __init__(self, pk: int, rows_committed: int, rows_inserted: int,
+                 rows_geocoded: int = 0, rows_skipped: int = 0,
+                 worker_id: Optional[str] = None, lost: Optional[threading.Event] = None):
+        self.pk = pk
+        self.worker_id = worker_id
+        self.lost = lost or threading.Event()
+        self.resume_rows = rows_committed
+        self.resume_inserted = rows_inserted
+        self.rows_parsed = rows_committed
+        self.rows_skipped = rows_skipped
+        self.rows_geocoded = rows_geocoded
+
+    def _check_owned(self) -> None:
+        if self.lost.is_set():
+            raise JobLostError(f"ingest job id={self.pk} 已被其他 worker 接手")
+
+    def parsed(self, rows: int, skipped: int) -> None:
+        self._check_owned()
+        self.rows_parsed = rows
+        self.rows_skipped = skipped
+
+    def geocoded(self, rows: int) -> None:
+        self.rows_geocoded += rows
+
+    def committed(self, rows_through: int, inserted: int) -> None:
+        sql = """
+        UPDATE ingest_jobs
+           SET rows_committed = %s, rows_inserted = %s,
+               rows_parsed = %s, rows_skipped = %s, rows_geocoded = %s,
+               heartbeat_at = now()
+         WHERE id = %s AND worker_id = %s AND status = 'running'
+        """
+        try:
+            with get_conn() as conn, conn.cursor() as cur:
+                cur.execute(
+                    sql,
+                    (rows_through, inserted, self.rows_parsed, self.rows_skipped,
+                     self.rows_geocoded, self.pk, self.worker_id),
+                    prepare=False,
+                )
+                owned = cur.rowcount != 0
+        except Exception as e:
+            # 進度回寫失敗不中斷匯入；代價只是續跑時多重寫幾塊
+            print(f"[ingest_jobs] WARN 進度回寫失敗 id={self.pk}: {type(e).__name__}: {e}")
+            return
+        if not owned:
+            self.lost.set()
+        self._check_owned()
+
+
+def _finish(pk: int, status: str, *, worker_id: Optional[str] = None,
+            result: Optional[Dict[str, Any]] = None, error_text: Optional[str] = None) -> bool:
+    """job 收尾：寫最終狀態、清空 raw_enc。回傳是否仍擁有此 job（False = 已被接手，沒有寫）。"""
+    sql = """
+    UPDATE ingest_jobs
+       SET status = %s, result = %s::jsonb, error_text = %s,
+           raw_enc = NULL, finished_at = now(), heartbeat_at = now()
+     WHERE id = %s AND worker_id = %s AND status = 'running'
+    """
+    payload = json.dumps(result, ensure_ascii=False, default=str) if result is not None else None
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(sql, (status, payload, error_text, pk, worker_id), prepare=False)
+        owned = cur.rowcount != 0
+    if not owned:
+        clog.log_error("ingest.job.lost", job_pk=pk, stage="finish", status=status)
+    return owned
+
+
+def run_job(job: Dict[str, Any]) -> str:
+    """執行一個已認領的 job；回最終 status（'done' | 'failed'），被其他 worker 接手回 'lost'。
+
+    行為對齊同步 /upload：evidence 統計回填 + upload audit；失敗寫 upload_failed audit。
+    audit 只在收尾 UPDATE 確實由本 worker 寫入後才寫（被接手時交給新 owner 寫，不重複）。
+    """
+    from time import perf_counter as _pc
+
+    pk = int(job["id"])
+    worker_id = job.get("worker_id")
+    t0 = _pc()
+    user = {"id": job.get("created_by"), "username": job.get("created_by_name"),
+            "role": job.get("created_by_role")}
+    base_details = {
+        "filename":    job["filename"],
+        "evidence_id": job.get("evidence_id"),
+        "sha256_full": job.get("sha256_full"),
+        "job_id":      job["job_id"],
+    }
+
+    if int(job.get("attempts") or 0) > _MAX_ATTEMPTS:
+        if not _finish(pk, "failed", worker_id=worker_id,
+                       error_text=f"重試 {_MAX_ATTEMPTS} 次仍未完成，已放棄"):
+            return "lost"
+        write_audit(
+            action="upload_failed", user=user,
+            target_type="raw_traces", target_ref=job["target_id"], project_id=job["project_id"],
+            details={**base_details, "stage": "ingest_job", "exc_type": "MaxAttempts"},
+            status_code=500, error_text="max attempts exceeded",
+        )
+        return "failed"
+
+    heartbeat = _Heartbeat(pk, worker_id)
+    progress = _JobProgress(pk, int(job.get("rows_committed") or 0), int(job.get("rows_inserted") or 0),
+                            rows_geocoded=int(job.get("rows_geocoded") or 0),
+                            rows_skipped=int(job.get("rows_skipped") or 0),
+                            worker_id=worker_id, lost=heartbeat.lost)
+    try:
+        content = crypto_box.decrypt_blob(bytes(job["raw_enc"]))
+        with heartbeat:
+            result = ingest_auto(
+                job["project_id"], job["target_id"], job["filename"], content,
+                progress=progress,
+                # 續跑或重傳：先以 row_fp 丟掉已落地的列（省 geocode / 寫入）
+                skip_existing=int(job.get("attempts") or 0) > 1 or int(job.get("prior_uploads") or 0) > 0,
+            )
+    except JobLostError:
+        clog.log_error("ingest.job.lost", job_id=job["job_id"], stage="ingest",
+                       duration_ms=round((_pc() - t0) * 1000, 1))
+        return "lost"
+    except Exception as e:
+        if isinstance(e, EncryptedFileError):
+            code, text = 422, str(e)
+        elif isinstance(e, HTTPException):
+            code, text = e.status_code, str(e.detail)
+        else:
+            code, text = 400, f"匯入失敗：{type(e).__name__}: {e}"
+        if not _finish(pk, "failed", worker_id=worker_id, error_text=text):
+            return "lost"
+        write_audit(
+            action="upload_failed", user=user,
+            target_type="raw_traces", target_ref=job["target_id"], project_id=job["project_id"],
+            details={**base_details, "stage": "ingest_job", "exc_type": type(e).__name__},
+            status_code=code, error_text=text,
+        )
+        clog.log_error(
+            "ingest.job.failed",
+            job_id=job["job_id"], error_type=type(e).__name__,
+            duration_ms=round((_pc() - t0) * 1000, 1),
+        )
+        return "failed"
+
+    # 與同步 /upload 成功回應同形，前端輪詢到 done 後可直接沿用收據顯示
+    if not _finish(pk, "done", worker_id=worker_id, result={
+        "ok": True,
+        "filename":      job["filename"],
+        "project_id":    job["project_id"],
+        "target_id":     job["target_id"],
+        "evidence_id":   job.get("evidence_id"),
+        "sha256_full":   job.get("sha256_full"),
+        "prior_uploads": job.get("prior_uploads"),
+        **(result or {}),
+    }):
+        return "lost"
+    if job.get("evidence_id") is not None:
+        update_evidence_stats(
+            evidence_id=job["evidence_id"],
+            rows_total=int(result.get("total") or 0),
+            rows_inserted=int(result.get("inserted") or 0),
+            rows_skipped=int(result.get("skipped") or 0),
+        )
+    write_audit(
+        action="upload", user=user,
+        target_type="raw_traces", target_ref=job["target_id"], project_id=job["project_id"],
+        details={
+            **base_details,
+            "ext":           job.get("ext"),
+            "size_bytes":    job.get("size_bytes"),
+            "prior_uploads": job.get("prior_uploads"),
+            "mime_hint":     job.get("mime_hint"),
+            "total":    result.get("total"),
+            "inserted": result.get("inserted"),
+            "skipped":  result.get("skipped"),
+            "errors_n": len(result.get("errors") or []),
+            "attempts": job.get("attempts"),
+        },
+        status_code=200,
+    )
+    clog.log_info(
+        "ingest.job.done",
+        job_id=job["job_id"], attempts=job.get("attempts"),
+        resumed_from=progress.resume_rows,
+        total=result.get("total"), inserted=result.get("inserted"),
+        duration_ms=round((_pc() - t0) * 1000, 1),
+    )
+    return "done"
+
+
+# ── in-process worker pool ─────────────────────────────────
+class JobWorkerPool:
+    """N 條 daemon 執行緒輪流認領 / 執行 job。
+
+    enqueue() 透過 notify() 即時喚醒；佇列空時每 _POLL_SEC 輪詢一次（撿別的 instance
+    排入的 job、以及 heartbeat 過期待續跑的 job）。單一 job 的例外不會殺掉 worker。
+    """
+
+    def __init__(self, n: int):
+        self.n = n
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._prefix = uuid.uuid4().hex[:8]
+
+    def start(self) -> None:
+        for i in range(self.n):
+            t = threading.Thread(target=self._loop, args=(f"{self._prefix}-{i}",),
+                                 name=f"ingest-job-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+
+    def _loop(self, worker_id: str) -> None:
+        while not self._stop.is_set():
+            try:
+                job = claim_next(worker_id)
+            except Exception as e:
+                print(f"[ingest_jobs] claim failed: {type(e).__name__}: {e}")
+                job = None
+            if job is None:
+                self._wake.wait(_POLL_SEC)
+                self._wake.clear()
+                continue
+            try:
+                run_job(job)
+            except Exception as e:
+                # run_job 自己收尾所有匯入例外；到這裡代表收尾本身壞了（DB 斷線等）→
+                # 不動狀態，等 heartbeat 過期後被重新認領
+                print(f"[ingest_jobs] job {job.get('job_id')} crashed: {type(e).__name__}: {e}")
+
+
+_workers: Optional[JobWorkerPool] = None
+
+
+def start_workers() -> JobWorkerPool:
+    """啟動本 process 的 worker pool（main.lifespan 呼叫；pytest 下不啟動）。"""
+    global _workers
+    if _workers is None:
+        _ensure_jobs_table()
+        _workers = JobWorkerPool(_job_workers())
+        _workers.start()
+    return _workers
+
+
+def stop_workers() -> None:
+    global _workers
+    if _workers is not None:
+        _workers.stop()
+        _workers = None
+
+
+def notify() -> None:
+    """喚醒本 process 的 worker（沒有啟動 pool 時為 no-op，job 會被其他 instance 撿走）。"""
+    if _workers is not None:
+        _workers.notify()
@@ -0,0 +1,388 @@
+# backend/app/services/osm_queue.py
+"""
+OSM（Nominatim）背景補座標 worker（2026-10）。
+
+為什麼：lookup_bulk 的 OSM 備援原本在 request 內序列查詢 —— 每址最多兩次請求、每次後
+sleep 1 秒。Google 查不到的尾巴若有 500 個地址，單次上傳就卡十幾分鐘（背景 job 也一樣
+佔著 worker）。Nominatim 的 1 req/s 是「整個服務」的預算，多個上傳 / 多個 instance 各自
+sleep 也守不住。
+
+改成：
+  - lookup_bulk 把 Google 未命中的地址排入 geocode_osm_queue（清洗後地址為 key，
+    raw_addrs 收集原始 cell_addr 供回填），本次回 None → 那些列先無座標落地。
+  - 全域只有一個 worker 在打 Nominatim：geocode_osm_lease 單列租約（_LEASE_SEC 續租），
+    拿到租約的 process 才認領佇列；節流沿用 _osm_geocode 內每次請求後的 1 秒 sleep，
+    單一串流 → 跨 request、跨 process 都是 1 req/s。
+  - 查到 → 寫各層快取 + UPDATE raw_traces 回填 lat / lng / geom（只動 geom IS NULL 的列，
+    不覆蓋人工定位）。查無 → 依 neg_ok 記負快取。暫時性失敗 → 指數延後重試，
+    _MAX_ATTEMPTS 次後放棄（列維持未定位，歸 addr_geocode_failed）。
+  - 排入時那塊列還沒寫入：worker 先標 done 再回填，匯入端每塊 commit 後再以
+    backfill_done() 補一次，兩邊至少一邊對得到列（見該函式）。
+  - 不寫 DB 的預覽沒有回填可等：lookup_bulk 另給少量 request 內額度
+    （geocode.OsmInlineBudget / GEO_OSM_INLINE_MAX），超出的才排入。
+  - /coverage 以 pending / running 的 raw_addrs 算出 geocode_pending 桶。
+
+Postgres 即佇列（同 ingest_jobs）：認領 FOR UPDATE SKIP LOCKED；running 超過
+_STALE_SEC 沒收尾（worker 掛了）視為可重新認領。所有 cur.execute 帶 prepare=False。
+"""
+from __future__ import annotations
+
+import json
+import threading
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core import logging_utils as clog
+from app.db.session import get_conn
+from app.services import data_version, geocode
+
+_POLL_SEC = 5.0          # 佇列空 / 沒拿到租約時的輪詢間隔（enqueue 會即時喚醒本 process）
+_LEASE_SEC = 30          # 租約長度；每處理一址續租一次（單址最壞 2 × (6s 逾時 + 1s)）
+_STALE_SEC = 120         # running 超過此秒數未收尾 → 視為 worker 已死
+_MAX_ATTEMPTS = 3
+_RETRY_BASE_SEC = 60     # 暫時性失敗第 n 次後延 60 × 2^(n-1) 秒再試
+
+# ── 建表（idempotent；仿 ingest_jobs._ensure_jobs_table）──────────────
+_table_ready = False
+
+_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS geocode_osm_queue (
+      addr         TEXT        PRIMARY KEY,
+      raw_addrs    TEXT[]      NOT NULL DEFAULT '{}',
+      neg_ok       BOOLEAN     NOT NULL DEFAULT TRUE,
+      status       TEXT        NOT NULL DEFAULT 'pending',   -- pending|running|done|none|failed
+      attempts     INT         NOT NULL DEFAULT 0,
+      not_before   TIMESTAMPTZ NOT NULL DEFAULT now(),
+      lat          DOUBLE PRECISION NULL,
+      lng          DOUBLE PRECISION NULL,
+      rows_filled  INT         NOT NULL DEFAULT 0,
+      worker_id    TEXT        NULL,
+      created_at   TIMESTAMPTZ NOT NULL DEFAULT now(),
+      claimed_at   TIMESTAMPTZ NULL,
+      finished_at  TIMESTAMPTZ NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_geocode_osm_queue_pending "
+    "ON geocode_osm_queue (not_before) WHERE status IN ('pending', 'running')",
+    """
+    CREATE TABLE IF NOT EXISTS geocode_osm_lease (
+      id          INT         PRIMARY KEY,
+      holder      TEXT        NULL,
+      expires_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    "INSERT INTO geocode_osm_lease (id) VALUES (1) ON CONFLICT DO NOTHING",
+]
+
+
+def _ensure_queue_table() -> bool:
+    global _table_ready
+    if _table_ready:
+        return True
+    try:
+        with get_conn() as conn, conn.cursor() as cur:
+            for ddl in _DDL:
+                cur.execute(ddl, prepare=False)
+        _table_ready = True
+    except Exception as e:
+        print(f"[osm_queue] ensure table failed: {type(e).__name__}: {e}")
+    return _table_ready
+
+
+# ── 排入 ───────────────────────────────────────────────────
+def enqueue(items: Iterable[Tuple[str, List[str], bool]]) -> int:
+    """
+    排入 (清洗後地址, 原始 cell_addr 清單, neg_ok)。回傳排入筆數；失敗回 0（不 raise ——
+    排不進去只是這些列維持未定位，不該讓整個上傳失敗）。
+
+    同址重複排入：raw_addrs 取聯集、neg_ok 取 AND；已結束（done / none / failed）的重新排回 pending
+    （能走到這裡代表快取沒擋下來：負快取過期，或回填後又有新列）。
+    """
+    payload = [{"addr": a, "raw_addrs": list(raws), "neg_ok": bool(ok)} for a, raws, ok in items]
+    if not payload:
+        return 0
+    if not _ensure_queue_table():
+        return 0
+    sql = """
+    INSERT INTO geocode_osm_queue AS q (addr, raw_addrs, neg_ok)
+    SELECT x.addr, COALESCE(x.raw_addrs, '{}'), x.neg_ok
+      FROM jsonb_to_recordset(%s::jsonb) AS x(addr text, raw_addrs text[], neg_ok boolean)
+    ON CONFLICT (addr) DO UPDATE SET
+      raw_addrs   = ARRAY(SELECT DISTINCT unnest(q.raw_addrs || EXCLUDED.raw_addrs)),
+      neg_ok      = q.neg_ok AND EXCLUDED.neg_ok,
+      attempts    = CASE WHEN q.status IN ('done', 'none', 'failed') THEN 0 ELSE q.attempts END,
+      not_before  = CASE WHEN q.status IN ('done', 'none', 'failed') THEN now() ELSE q.not_before END,
+      finished_at = CASE WHEN q.status IN ('done', 'none', 'failed') THEN NULL ELSE q.finished_at END,
+      status      = CASE WHEN q.status IN ('done', 'none', 'failed') THEN 'pending' ELSE q.status END
+    """
+    try:
+        with get_conn() as conn, conn.cursor() as cur:
+            cur.execute(sql, (json.dumps(payload, ensure_ascii=False),), prepare=False)
+            conn.commit()
+            # 已在表裡、歸 addr_geocode_failed 的列（regeocode 重排）改算 geocode_pending
+            data_version.bump_for_addrs(cur, (r for p in payload for r in p["raw_addrs"]))
+    except Exception as e:
+        print(f"[osm_queue] enqueue failed: {type(e).__name__}: {e}")
+        return 0
+    notify()
+    return len(payload)
+
+
+def pending_count() -> int:
+    if not _ensure_queue_table():
+        return 0
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT count(*) FROM geocode_osm_queue WHERE status IN ('pending', 'running')",
+                    prepare=False)
+        return int((cur.fetchone() or [0])[0])
+
+
+# ── 租約 + 認領 ────────────────────────────────────────────
+def acquire_lease(worker_id: str) -> bool:
+    """拿到（或續租）全域唯一的 OSM 租約。同一時間只有一個 worker 在打 Nominatim。"""
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE geocode_osm_lease
+               SET holder = %s, expires_at = now() + make_interval(secs => %s)
+             WHERE id = 1 AND (holder IS NULL OR holder = %s OR expires_at < now())
+            RETURNING 1
+            """,
+            (worker_id, _LEASE_SEC, worker_id),
+            prepare=False,
+        )
+        ok = cur.fetchone() is not None
+        conn.commit()
+    return ok
+
+
+def release_lease(worker_id: str) -> None:
+    try:
+        with get_conn() as conn, conn.cursor() as cur:
+            cur.execute("UPDATE geocode_osm_lease SET holder = NULL WHERE id = 1 AND holder = %s",
+                        (worker_id,), prepare=False)
+            conn.commit()
+    except Exception as e:
+        print(f"[osm_queue] release lease failed: {type(e).__name__}: {e}")
+
+
+_CLAIM_COLS = ["addr", "raw_addrs", "neg_ok", "attempts"]
+
+
+def claim_next(worker_id: str) -> Optional[Dict[str, Any]]:
+    sql = f"""
+    UPDATE geocode_osm_queue
+       SET status = 'running', attempts = attempts + 1, worker_id = %s, claimed_at = now()
+     WHERE addr = (
+        SELECT addr FROM geocode_osm_queue
+         WHERE (status = 'pending' AND not_before <= now())
+            OR (status = 'running' AND claimed_at < now() - make_interval(secs => %s))
+         ORDER BY not_before, created_at
+         FOR UPDATE SKIP LOCKED
+         LIMIT 1
+     )
+    RETURNING {', '.join(_CLAIM_COLS)}
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(sql, (worker_id, _STALE_SEC), prepare=False)
+        row = cur.fetchone()
+        conn.commit()
+    return dict(zip(_CLAIM_COLS, row)) if row else None
+
+
+# ── 收尾 ───────────────────────────────────────────────────
+def _backfill(addr: str, raw_addrs: List[str], ll: Tuple[float, float]) -> int:
+    """回填尚未定位的列。只動 geom IS NULL：人工定位（manual-locate）過的列不覆蓋。
+
+    呼叫前佇列項必須已標 done（含座標），理由見 backfill_done()。回填列數累加進 rows_filled。
+    """
+    if not raw_addrs:
+        return 0
+    lat, lng = ll
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE raw_traces
+               SET lat = %s, lng = %s, geom = ST_SetSRID(ST_MakePoint(%s, %s), 4326)
+             WHERE geom IS NULL AND deleted_at IS NULL AND cell_addr = ANY(%s)
+            """,
+            (lat, lng, lng, lat, list(raw_addrs)),
+            prepare=False,
+        )
+        n = cur.rowcount
+        if n > 0:
+            cur.execute("UPDATE geocode_osm_queue SET rows_filled = rows_filled + %s WHERE addr = %s",
+                        (n, addr), prepare=False)
+        conn.commit()
+    return n
+
+
+def backfill_done(project_id: str, target_id: str, raw_addrs: Iterable[str]) -> int:
+    """
+    匯入端：一塊 commit 之後，把塊內「已排入、但 worker 已查到（done）」的地址回填到這塊的列。
+
+    為什麼需要：lookup_bulk 排入佇列時那塊列還沒寫入（先 geocode、後寫入），worker 可能在
+    該塊 commit 之前就查完並回填 —— 那次 UPDATE 對不到列，而正快取已寫入，同址之後不會
+    再排入，這些列就永遠未定位。
+    順序保證（READ COMMITTED，每個語句看得到開始前已 commit 的資料）：worker 先 commit
+    done（含座標）再跑回填 UPDATE；匯入端先 commit 該塊再跑本函式。
+      - 塊在回填 UPDATE 開始前已 commit → worker 的回填對得到；
+      - 否則本函式開始時 done 已 commit → 這裡對得到。
+    失敗只記錄：最壞是這些列留在未定位，可由 regeocode 補回。
+    """
+    addrs = sorted({a for a in raw_addrs if a})
+    if not addrs or not _ensure_queue_table():
+        return 0
+    try:
+        with get_conn() as conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE raw_traces t
+                   SET lat = q.lat, lng = q.lng, geom = ST_SetSRID(ST_MakePoint(q.lng, q.lat), 4326)
+                  FROM geocode_osm_queue q
+                 WHERE q.status = 'done' AND q.lat IS NOT NULL
+                   AND t.cell_addr = ANY(q.raw_addrs)
+                   AND t.cell_addr = ANY(%s)
+                   AND t.project_id = %s AND t.target_id = %s
+                   AND t.geom IS NULL AND t.deleted_at IS NULL
+                """,
+                (addrs, project_id, target_id),
+                prepare=False,
+            )
+            n = max(cur.rowcount, 0)
+    except Exception as e:
+        print(f"[osm_queue] backfill_done failed: {type(e).__name__}: {e}")
+        return 0
+    if n:
+        clog.log_info("geocode.osm.late_backfill", project_id=project_id, target_id=target_id, rows=n)
+    return n
+
+
+def _finish(addr: str, status: str, *, ll: Optional[Tuple[float, float]] = None,
+            retry_in: Optional[int] = None) -> None:
+    if status == "pending":
+        sql = ("UPDATE geocode_osm_queue SET status = 'pending', worker_id = NULL, "
+               "not_before = now() + make_interval(secs => %s) WHERE addr = %s")
+        params: tuple = (retry_in or 0, addr)
+    else:
+        sql = ("UPDATE geocode_osm_queue SET status = %s, lat = %s, lng = %s, "
+               "rows_filled = 0, finished_at = now() WHERE addr = %s RETURNING raw_addrs")
+        params = (status, ll[0] if ll else None, ll[1] if ll else None, addr)
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(sql, params, prepare=False)
+        conn.commit()
+        if status in ("none", "failed"):
+            # 這些列從 geocode_pending 落到 addr_geocode_failed：/coverage 的 ETag 要換
+            # （done 的回填 UPDATE 已由 raw_traces trigger 遞增版本）
+            row = cur.fetchone()
+            data_version.bump_for_addrs(cur, (row[0] if row else None) or [])
+
+
+def process(item: Dict[str, Any]) -> str:
+    """查一個佇列項目並收尾；回傳 done / none / retry / failed。"""
+    addr = item["addr"]
+    status, ll = geocode.resolve_osm(addr, neg_ok=bool(item["neg_ok"]))
+    if status == "ok":
+        # 先 commit done 再回填：與匯入端 backfill_done() 的順序保證配對
+        _finish(addr, "done", ll=ll)
+        filled = _backfill(addr, item["raw_addrs"] or [], ll)
+        clog.log_info("geocode.osm.resolved", status="done", rows_filled=filled,
+                      attempts=item["attempts"])
+        return "done"
+    if status == "transient":
+        if item["attempts"] < _MAX_ATTEMPTS:
+            _finish(addr, "pending", retry_in=_RETRY_BASE_SEC * 2 ** (item["attempts"] - 1))
+            return "retry"
+        _finish(addr, "failed")
+        clog.log_info("geocode.osm.resolved", status="failed", attempts=item["attempts"])
+        return "failed"
+    _finish(addr, "none")
+    clog.log_info("geocode.osm.resolved", status="none", attempts=item["attempts"])
+    return "none"
+
+
+# ── in-process worker ──────────────────────────────────────
+class OsmWorker:
+    """單一 daemon 執行緒：拿租約 → 認領 → 查 → 收尾，一次一址。
+
+    同 process 只需一條：全域 1 req/s 的預算本來就只夠一個串流用。
+    沒拿到租約（別的 instance 在跑）就每 _POLL_SEC 再試。
+    """
+
+    def __init__(self):
+        self.worker_id = f"osm-{uuid.uuid4().hex[:8]}"
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._loop, name="geocode-osm", daemon=True)
+        self._thread.start()
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        release_lease(self.worker_id)
+
+    def _idle(self) -> None:
+        self._wake.wait(_POLL_SEC)
+        self._wake.clear()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                item = claim_next(self.worker_id) if acquire_lease(self.worker_id) else None
+            except Exception as e:
+                print(f"[osm_queue] claim failed: {type(e).__name__}: {e}")
+                item = None
+            if item is None:
+                self._idle()
+                continue
+            try:
+                process(item)
+            except Exception as e:
+                # 收尾本身壞了（DB 斷線等）→ 不動狀態，等 _STALE_SEC 後被重新認領
+                print(f"[osm_queue] process crashed: {type(e).__name__}: {e}")
+
+
+_worker: Optional[OsmWorker] = None
+
+
+def start_worker() -> Optional[OsmWorker]:
+    """啟動本 process 的 OSM worker（main.lifespan 呼叫；OSM 備援關閉時不啟動）。"""
+    global _worker
+    if not geocode.USE_OSM or not geocode._osm_async_enabled():
+        return None
+    if _worker is None:
+        _ensure_queue_table()
+        _worker = OsmWorker()
+        _worker.start()
+    return _worker
+
+
+def stop_worker() -> None:
+    global _worker
+    if _worker is not None:
+        _worker.stop()
+        _worker = None
+
+
+def notify() -> None:
+    """喚醒本 process 的 worker（沒啟動時 no-op，由持有租約的 instance 輪詢撿走）。"""
+    if _worker is not None:
+        _worker.notify()
+
+
+def pending_addrs_sql() -> str:
+    """回傳「排隊中原始 cell_addr」的子查詢 SQL，供 /coverage、/unlocated 歸 geocode_pending。
+    佇列表建不起來（DB 權限等）時回空集合，讓那些端點照舊運作。"""
+    if not _ensure_queue_table():
+        return "SELECT NULL::text WHERE false"
+    return ("SELECT a FROM geocode_osm_queue, unnest(raw_addrs) AS a "
+            "WHERE status IN ('pending', 'running')")
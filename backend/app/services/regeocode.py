@@ -0,0 +1,467 @@
+# backend/app/services/regeocode.py
+"""
+未定位 raw_traces 重新 geocode 回填（2026-10）。
+
+為什麼：匯入新的 cell_towers 對照表（或 Google 金鑰修好、geocode 規則改進）之後，
+/coverage 的 cellid_only / addr_geocode_failed 桶理論上救得回來，但過去只有一次性的
+scripts/backfill_hex_celladdr.py 可用。案件動輒百萬列，需要能中斷續跑、記憶體有界的
+正式流程。
+
+流程（每個 run 對應一個 project）：
+  - keyset 分批：`id > last_id AND geom IS NULL AND deleted_at IS NULL ORDER BY id LIMIT n`，
+    每批最多 REGEOCODE_BATCH_ROWS 列，記憶體只跟批次大小有關。
+  - 批內以 (cell_id, normalize_addr(cell_addr)) 去重 → geocode.lookup_bulk 一次解（本地
+    對照 / 各層快取 / Google；OSM 照舊排背景佇列，之後由 osm_queue 回填）。
+  - 解到的列一次 `UPDATE raw_traces … FROM (VALUES (id, lat, lng), …)`，只動仍是
+    geom IS NULL 的列（不覆蓋人工定位、也不跟 OSM worker 搶）。
+  - 回填與 checkpoint（last_id + 計數 + heartbeat）在同一 transaction：續跑精確到批，
+    不會重做也不會漏。checkpoint 條件帶 status='running' AND worker_id=本 worker，
+    被取消或被別的 worker 接手時該批整批回滾、本 worker 停手。
+
+Postgres 即佇列（同 ingest_jobs）：認領 FOR UPDATE SKIP LOCKED；heartbeat 超過
+REGEOCODE_STALE_SEC 的 running run 視為 worker 已死、可重新認領並從 last_id 續跑。
+同一 project 同時只允許一個進行中的 run（partial unique index）。
+排入 / 結束 / 取消都寫 audit。所有 cur.execute 帶 prepare=False。
+"""
+from __future__ import annotations
+
+import secrets
+import threading
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core import logging_utils as clog
+from app.core.env import env_int
+from app.db.session import get_conn
+from app.services import geocode
+from app.services.audit import write_audit
+
+_DEFAULT_BATCH_ROWS = 5000
+_DEFAULT_STALE_SEC = 300
+_MAX_ATTEMPTS = 3
+_POLL_SEC = 10.0
+
+
+def _batch_rows() -> int:
+    """每批列數（env `REGEOCODE_BATCH_ROWS`，預設 5000，合理 100~50000）。"""
+    return env_int("REGEOCODE_BATCH_ROWS", _DEFAULT_BATCH_ROWS, 100, 50000)
+
+
+def _stale_sec() -> int:
+    """running run 的 heartbeat 超過幾秒視為 worker 已死（env `REGEOCODE_STALE_SEC`，
+    預設 300，合理 60~3600）。須大於一批 lookup_bulk 的最壞耗時。"""
+    return env_int("REGEOCODE_STALE_SEC", _DEFAULT_STALE_SEC, 60, 3600)
+
+
+# ── 建表（idempotent；仿 ingest_jobs._ensure_jobs_table）──────────────
+_table_ready = False
+
+_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS regeocode_runs (
+      id               BIGSERIAL   PRIMARY KEY,
+      run_id           TEXT UNIQUE NOT NULL,
+      project_id       TEXT        NOT NULL,
+      status           TEXT        NOT NULL DEFAULT 'queued',   -- queued|running|done|failed|cancelled
+      rows_estimate    BIGINT      NULL,
+      last_id          BIGINT      NOT NULL DEFAULT 0,
+      rows_scanned     BIGINT      NOT NULL DEFAULT 0,
+      rows_located     BIGINT      NOT NULL DEFAULT 0,
+      keys_resolved    BIGINT      NOT NULL DEFAULT 0,
+      keys_unresolved  BIGINT      NOT NULL DEFAULT 0,
+      batches          INT         NOT NULL DEFAULT 0,
+      attempts         INT         NOT NULL DEFAULT 0,
+      worker_id        TEXT        NULL,
+      error_text       TEXT        NULL,
+      created_by       BIGINT      NULL REFERENCES users(id) ON DELETE SET NULL,
+      created_by_name  TEXT        NULL,
+      created_by_role  TEXT        NULL,
+      created_at       TIMESTAMPTZ NOT NULL DEFAULT now(),
+      started_at       TIMESTAMPTZ NULL,
+      heartbeat_at     TIMESTAMPTZ NULL,
+      finished_at      TIMESTAMPTZ NULL
+    )
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_regeocode_runs_active "
+    "ON regeocode_runs (project_id) WHERE status IN ('queued', 'running')",
+    "CREATE INDEX IF NOT EXISTS idx_regeocode_runs_project ON regeocode_runs (project_id, created_at DESC)",
+]
+
+
+def _ensure_runs_table() -> bool:
+    global _table_ready
+    if _table_ready:
+        return True
+    try:
+        with get_conn() as conn, conn.cursor() as cur:
+            for ddl in _DDL:
+                cur.execute(ddl, prepare=False)
+        _table_ready = True
+    except Exception as e:
+        print(f"[regeocode] ensure table failed: {type(e).__name__}: {e}")
+    return _table_ready
+
+
+# 未定位且「有東西可查」的列（no_signal 那種 cell_id / cell_addr 都空的列查了也沒用）
+_UNLOCATED_WHERE = (
+    "project_id = %s AND geom IS NULL AND deleted_at IS NULL "
+    "AND (cell_id IS NOT NULL OR cell_addr IS NOT NULL)"
+)
+
+_META_COLS = [
+    "run_id", "project_id", "status", "rows_estimate", "last_id",
+    "rows_scanned", "rows_located", "keys_resolved", "keys_unresolved", "batches",
+    "attempts", "error_text", "created_by_name", "created_at", "started_at",
+    "heartbeat_at", "finished_at",
+]
+
+
+# ── 排入 / 查詢 / 取消 ──────────────────────────────────────
+def enqueue(project_id: str, user: Dict[str, Any], request=None) -> Dict[str, Any]:
+    """排入一個 project 的回填 run。該 project 已有進行中的 run → 直接回那個（created=False）。"""
+    _ensure_runs_table()
+    run_id = secrets.token_urlsafe(12)
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(f"SELECT count(*) FROM raw_traces WHERE {_UNLOCATED_WHERE}", (project_id,),
+                    prepare=False)
+        estimate = int((cur.fetchone() or [0])[0])
+        cur.execute(
+            """
+            INSERT INTO regeocode_runs (run_id, project_id, rows_estimate,
+                                        created_by, created_by_name, created_by_role)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (project_id) WHERE status IN ('queued', 'running') DO NOTHING
+            RETURNING run_id
+            """,
+            # 匿名 admin（AUTH_ENABLED=false）id=0 → NULL，否則違反 users(id) FK
+            (run_id, project_id, estimate, user["id"] if user.get("id") else None,
+             user.get("username"), user.get("role")),
+            prepare=False,
+        )
+        created = cur.fetchone() is not None
+    if not created:
+        active = list_runs(project_id, active_only=True)
+        return {**active[0], "created": False} if active else {"run_id": None, "created": False}
+
+    write_audit(
+        action="regeocode_queued", user=user, request=request,
+        target_type="raw_traces", target_ref=project_id, project_id=project_id,
+        details={"run_id": run_id, "rows_estimate": estimate}, status_code=202,
+    )
+    clog.log_info("geocode.regeocode.queued", run_id=run_id, project_id=project_id,
+                  rows_estimate=estimate)
+    notify()
+    return {**(get_run(run_id) or {"run_id": run_id}), "created": True}
+
+
+def get_run(run_id: str) -> Optional[Dict[str, Any]]:
+    _ensure_runs_table()
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(f"SELECT {', '.join(_META_COLS)} FROM regeocode_runs WHERE run_id = %s",
+                    (run_id,), prepare=False)
+        row = cur.fetchone()
+    return _present(dict(zip(_META_COLS, row))) if row else None
+
+
+def list_runs(project_id: Optional[str] = None, *, active_only: bool = False,
+              limit: int = 50) -> List[Dict[str, Any]]:
+    _ensure_runs_table()
+    where, params = [], []
+    if project_id:
+        where.append("project_id = %s")
+        params.append(project_id)
+    if active_only:
+        where.append("status IN ('queued', 'running')")
+    sql = (f"SELECT {', '.join(_META_COLS)} FROM regeocode_runs"
+           + (" WHERE " + " AND ".join(where) if where else "")
+           + " ORDER BY created_at DESC LIMIT %s")
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(sql, (*params, limit), prepare=False)
+        return [_present(dict(zip(_META_COLS, r))) for r in cur.fetchall()]
+
+
+def pending_count() -> int:
+    """queued + running 的數量（/api/metrics 的 queue_depth）。"""
+    if not _ensure_runs_table():
+        return 0
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT count(*) FROM regeocode_runs WHERE status IN ('queued', 'running')", prepare=False)
+        return int((cur.fetchone() or [0])[0])
+
+
+def cancel(run_id: str, user: Dict[str, Any], request=None) -> bool:
+    """取消進行中的 run；已 commit 的批不回滾（回填本來就是冪等的補座標）。"""
+    _ensure_runs_table()
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            "UPDATE regeocode_runs SET status = 'cancelled', finished_at = now() "
+            "WHERE run_id = %s AND status IN ('queued', 'running') RETURNING project_id, rows_located",
+            (run_id,), prepare=False,
+        )
+        row = cur.fetchone()
+    if not row:
+        return False
+    write_audit(
+        action="regeocode_cancelled", user=user, request=request,
+        target_type="raw_traces", target_ref=row[0], project_id=row[0],
+        details={"run_id": run_id, "rows_located": int(row[1] or 0)}, status_code=200,
+    )
+    return True
+
+
+def _present(meta: Dict[str, Any]) -> Dict[str, Any]:
+    est = meta.get("rows_estimate")
+    scanned = int(meta.get("rows_scanned") or 0)
+    if meta["status"] == "done":
+        progress: Optional[float] = 1.0
+    elif est:
+        progress = round(min(scanned / est, 0.99), 3)
+    else:
+        progress = None
+    return {**meta, "progress": progress}
+
+
+# ── 認領 / 分批 / 收尾 ──────────────────────────────────────
+_CLAIM_COLS = ["id", "run_id", "project_id", "last_id", "attempts",
+               "created_by", "created_by_name", "created_by_role"]
+
+
+def claim_next(worker_id: str) -> Optional[Dict[str, Any]]:
+    """認領 queued，或 heartbeat 過期的 running（前一個 worker 已死）；同 ingest_jobs.claim_next。"""
+    _ensure_runs_table()
+    sql = f"""
+    UPDATE regeocode_runs
+       SET status = 'running', attempts = attempts + 1, worker_id = %s,
+           started_at = COALESCE(started_at, now()), heartbeat_at = now()
+     WHERE id = (
+        SELECT id FROM regeocode_runs
+         WHERE status = 'queued'
+            OR (status = 'running' AND heartbeat_at < now() - make_interval(secs => %s))
+         ORDER BY id
+         FOR UPDATE SKIP LOCKED
+         LIMIT 1
+     )
+    RETURNING {', '.join(_CLAIM_COLS)}
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(sql, (worker_id, _stale_sec()), prepare=False)
+        row = cur.fetchone()
+    return dict(zip(_CLAIM_COLS, row)) if row else None
+
+
+class _Preempted(Exception):
+    """checkpoint 沒寫進去：run 已被取消，或 heartbeat 過期後被別的 worker 接手。"""
+
+
+def _fetch_batch(project_id: str, last_id: int, n: int) -> List[Tuple[int, Optional[str], Optional[str]]]:
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            f"SELECT id, cell_id, cell_addr FROM raw_traces WHERE {_UNLOCATED_WHERE} "
+            "AND id > %s ORDER BY id LIMIT %s",
+            (project_id, last_id, n),
+            prepare=False,
+        )
+        return [(int(r[0]), r[1], r[2]) for r in cur.fetchall()]
+
+
+def _resolve(rows: List[Tuple[int, Optional[str], Optional[str]]]) -> Tuple[List[Tuple[int, float, float]], int, int]:
+    """批內去重後丟 lookup_bulk；回傳 ([(id, lat, lng)], 解到的 key 數, 沒解到的 key 數)。"""
+    groups: Dict[Tuple[Optional[str], str], List[int]] = {}
+    rep: Dict[Tuple[Optional[str], str], Tuple[Optional[str], Optional[str]]] = {}
+    for rid, cell_id, cell_addr in rows:
+        cid = (str(cell_id).strip() or None) if cell_id is not None else None
+        k = (cid, geocode.normalize_addr(cell_addr or ""))
+        groups.setdefault(k, []).append(rid)
+        rep.setdefault(k, (cid, cell_addr))
+    resolved = geocode.lookup_bulk(list(rep.values()))
+    values: List[Tuple[int, float, float]] = []
+    n_ok = 0
+    for k, ids in groups.items():
+        ll = resolved.get(rep[k])
+        if ll is None:
+            continue
+        n_ok += 1
+        values.extend((rid, ll[0], ll[1]) for rid in ids)
+    return values, n_ok, len(groups) - n_ok
+
+
+def _apply_batch(pk: int, worker_id: str, last_id: int, scanned: int,
+                 values: List[Tuple[int, float, float]], keys_ok: int, keys_miss: int) -> int:
+    """回填 + checkpoint 同一 transaction；回傳實際回填列數。checkpoint 失敗 → _Preempted。
+
+    回填以三個陣列參數 unnest 成 (id, lat, lng)：參數個數固定 3，與批次大小無關
+    （VALUES 每列 3 個佔位，REGEOCODE_BATCH_ROWS 上限 50000 會超過協定的 65535 個參數）。
+    """
+    with get_conn() as conn:
+        with conn.transaction():
+            with conn.cursor() as cur:
+                located = 0
+                if values:
+                    ids, lats, lngs = (list(col) for col in zip(*values))
+                    cur.execute(
+                        "UPDATE raw_traces AS t "
+                        "   SET lat = v.lat, lng = v.lng, "
+                        "       geom = ST_SetSRID(ST_MakePoint(v.lng, v.lat), 4326) "
+                        "  FROM unnest(%s::bigint[], %s::float8[], %s::float8[]) AS v(id, lat, lng) "
+                        " WHERE t.id = v.id AND t.geom IS NULL AND t.deleted_at IS NULL",
+                        (ids, lats, lngs),
+                        prepare=False,
+                    )
+                    located = max(cur.rowcount, 0)
+                cur.execute(
+                    """
+                    UPDATE regeocode_runs
+                       SET last_id = %s, rows_scanned = rows_scanned + %s,
+                           rows_located = rows_located + %s,
+                           keys_resolved = keys_resolved + %s, keys_unresolved = keys_unresolved + %s,
+                           batches = batches + 1, heartbeat_at = now()
+                     WHERE id = %s AND status = 'running' AND worker_id = %s
+                    """,
+                    (last_id, scanned, located, keys_ok, keys_miss, pk, worker_id),
+                    prepare=False,
+                )
+                if cur.rowcount != 1:
+                    raise _Preempted()
+    return located
+
+
+def _finish(pk: int, status: str, *, error_text: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            f"""
+            UPDATE regeocode_runs SET status = %s, error_text = %s, finished_at = now(), heartbeat_at = now()
+             WHERE id = %s AND status = 'running'
+            RETURNING {', '.join(_META_COLS)}
+            """,
+            (status, error_text, pk),
+            prepare=False,
+        )
+        row = cur.fetchone()
+    return dict(zip(_META_COLS, row)) if row else None
+
+
+def run(job: Dict[str, Any], worker_id: str, stop: Optional[threading.Event] = None) -> str:
+    """跑一個已認領的 run 直到做完 / 被取消 / 被叫停；回傳 done | failed | preempted | stopped。"""
+    from time import perf_counter as _pc
+
+    pk = int(job["id"])
+    t0 = _pc()
+    user = {"id": job.get("created_by"), "username": job.get("created_by_name"),
+            "role": job.get("created_by_role")}
+    project_id = job["project_id"]
+
+    def _audit(action: str, meta: Optional[Dict[str, Any]], code: int, err: Optional[str] = None) -> None:
+        details = {k: (meta or {}).get(k) for k in
+                   ("rows_scanned", "rows_located", "keys_resolved", "keys_unresolved", "batches")}
+        write_audit(action=action, user=user, target_type="raw_traces", target_ref=project_id,
+                    project_id=project_id, details={"run_id": job["run_id"], **details,
+                                                    "attempts": job.get("attempts")},
+                    status_code=code, error_text=err)
+
+    if int(job.get("attempts") or 0) > _MAX_ATTEMPTS:
+        meta = _finish(pk, "failed", error_text=f"重試 {_MAX_ATTEMPTS} 次仍未完成，已放棄")
+        _audit("regeocode_failed", meta, 500, "max attempts exceeded")
+        return "failed"
+
+    last_id = int(job.get("last_id") or 0)
+    n = _batch_rows()
+    try:
+        while True:
+            if stop is not None and stop.is_set():
+                return "stopped"            # 不動狀態：heartbeat 過期後從 last_id 續跑
+            rows = _fetch_batch(project_id, last_id, n)
+            if not rows:
+                break
+            values, keys_ok, keys_miss = _resolve(rows)
+            last_id = rows[-1][0]
+            located = _apply_batch(pk, worker_id, last_id, len(rows), values, keys_ok, keys_miss)
+            clog.log_info("geocode.regeocode.batch", run_id=job["run_id"], last_id=last_id,
+                          rows=len(rows), located=located, keys_ok=keys_ok, keys_miss=keys_miss)
+    except _Preempted:
+        clog.log_info("geocode.regeocode.preempted", run_id=job["run_id"], last_id=last_id)
+        return "preempted"
+    except Exception as e:
+        text = f"{type(e).__name__}: {e}"
+        meta = _finish(pk, "failed", error_text=text)
+        _audit("regeocode_failed", meta, 500, text)
+        clog.log_error("geocode.regeocode.failed", run_id=job["run_id"], error_type=type(e).__name__)
+        return "failed"
+
+    meta = _finish(pk, "done")
+    if meta is None:                        # 收尾前一刻被取消
+        return "preempted"
+    _audit("regeocode_done", meta, 200)
+    clog.log_info(
+        "geocode.regeocode.done",
+        run_id=job["run_id"], project_id=project_id,
+        rows_scanned=meta.get("rows_scanned"), rows_located=meta.get("rows_located"),
+        duration_ms=round((_pc() - t0) * 1000, 1),
+    )
+    return "done"
+
+
+# ── in-process worker ──────────────────────────────────────
+class RegeocodeWorker:
+    """單一 daemon 執行緒：認領 → 分批回填。一次一個 run（lookup_bulk 本身已並行打 Google）。"""
+
+    def __init__(self):
+        self.worker_id = f"regeo-{uuid.uuid4().hex[:8]}"
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._loop, name="regeocode", daemon=True)
+        self._thread.start()
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                job = claim_next(self.worker_id)
+            except Exception as e:
+                print(f"[regeocode] claim failed: {type(e).__name__}: {e}")
+                job = None
+            if job is None:
+                self._wake.wait(_POLL_SEC)
+                self._wake.clear()
+                continue
+            try:
+                run(job, self.worker_id, self._stop)
+            except Exception as e:
+                # run 自己收尾所有例外；到這裡代表收尾本身壞了 → 等 heartbeat 過期後被重新認領
+                print(f"[regeocode] run {job.get('run_id')} crashed: {type(e).__name__}: {e}")
+
+
+_worker: Optional[RegeocodeWorker] = None
+
+
+def start_worker() -> RegeocodeWorker:
+    """啟動本 process 的回填 worker（main.lifespan 呼叫；pytest 下不啟動）。"""
+    global _worker
+    if _worker is None:
+        _ensure_runs_table()
+        _worker = RegeocodeWorker()
+        _worker.start()
+    return _worker
+
+
+def stop_worker() -> None:
+    global _worker
+    if _worker is not None:
+        _worker.stop()
+        _worker = None
+
+
+def notify() -> None:
+    """喚醒本 process 的 worker（沒啟動時 no-op，run 會被其他 instance 撿走）。"""
+    if _worker is not None:
+        _worker.notify()
@@ -0,0 +1,170 @@
+# backend/app/services/response_cache.py
+"""
+條件式 GET 與回應快取（2026-10；版本來源見 services/data_version.py）。
+
+用於 map-layers、coverage、azimuth-ref 彙總與分享頁：
+
+  tag, early = response_cache.precheck(request, "coverage", project_id)
+  if early is not None:
+      return early                      # 304 或快取命中
+  ...照舊計算 payload...
+  return response_cache.finish(tag, payload)
+
+  - ETag：強 ETag "<版本>-<摘要>"，摘要 = sha256(端點, project_id, 正規化查詢參數, extra)。
+    同案、同版本、同一組參數的回應由同一段 code 決定性地產生，逐位元組相同，故用強 ETag；
+    串流壓縮時 extra 帶 Content-Encoding（不同編碼是不同表示）。
+  - If-None-Match 相符 → 304，不碰資料。權限檢查仍在 precheck 之前由端點自己做。
+  - Cache-Control: private, no-cache —— 瀏覽器可存，但每次都要帶 ETag 回來驗證。
+  - 伺服端快取：以 ETag 為 key（已含案件 / 版本 / 參數）的 in-process LRU，存編好的 JSON
+    位元組，總量上限 RESPONSE_CACHE_MB（預設 64，0 = 關閉）。多個 worker process 各自
+    一份；版本一變舊 key 就不會再被查到，留給 LRU 擠掉，不需主動失效。
+    串流模式只發 ETag、不進快取（串流本來就是為了不把整包留在記憶體）。
+  - 版本不可用（表未建、DB 讀取失敗）→ 照舊計算、回原本的 dict，不發 ETag。
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+from urllib.parse import urlencode
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+from app.core import metrics
+from app.core.env import env_int
+from app.services import data_version
+
+_CACHE_CONTROL = "private, no-cache"
+
+_m_requests = metrics.counter(
+    "response_cache_requests_total",
+    "Conditional GETs on versioned project endpoints by outcome",
+    ("scope", "outcome"),
+)
+
+
+def _cache_bytes() -> int:
+    """伺服端回應快取總量上限（env `RESPONSE_CACHE_MB`，預設 64，0 = 關閉，上限 4096）。"""
+    return env_int("RESPONSE_CACHE_MB", 64, 0, 4096) * 1024 * 1024
+
+
+class _BodyCache:
+    """有界 LRU：ETag → JSON 位元組；以總位元組數而非筆數計上限（回應大小差異很大）。"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._data.get(key)
+            if body is not None:
+                self._data.move_to_end(key)
+            return body
+
+    def put(self, key: str, body: bytes) -> None:
+        if len(body) > self.max_bytes // 4:  # 單筆過大（20 萬點的圖層）不佔掉整個快取
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._data[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_cache: Optional[_BodyCache] = None
+
+
+def _body_cache() -> Optional[_BodyCache]:
+    """第一次使用時依 env 建立；RESPONSE_CACHE_MB=0 → None（只做 ETag / 304）。"""
+    global _cache
+    if _cache is None:
+        size = _cache_bytes()
+        if size <= 0:
+            return None
+        _cache = _BodyCache(size)
+    return _cache
+
+
+def reset_cache() -> None:
+    """清掉伺服端快取並在下次使用時重讀 env（測試用）。"""
+    global _cache
+    _cache = None
+
+
+# ── ETag ───────────────────────────────────────────────────
+def etag(scope: str, project_id: str, version: int, query: str, *extra: str) -> str:
+    h = hashlib.sha256("\x1f".join((scope, project_id, query) + extra).encode("utf-8"))
+    return f'"{version}-{h.hexdigest()[:20]}"'
+
+
+def _canonical_query(request) -> str:
+    """查詢參數排序後重編，參數順序不同的同一查詢得到同一 ETag。"""
+    return urlencode(sorted(request.query_params.multi_items()))
+
+
+def matches(if_none_match: Optional[str], tag: str) -> bool:
+    """If-None-Match 是否命中 tag（逗號分隔清單、'*'；依 RFC 9110 用弱比較，忽略 W/）。"""
+    for candidate in (if_none_match or "").split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate and candidate == tag:
+            return True
+    return False
+
+
+def headers(tag: Optional[str]) -> dict:
+    return {"ETag": tag, "Cache-Control": _CACHE_CONTROL} if tag else {}
+
+
+# ── 端點用 ─────────────────────────────────────────────────
+def precheck(request, scope: str, project_id: str, *extra: str) -> Tuple[Optional[str], Optional[Response]]:
+    """
+    回 (ETag, 可直接回的回應)。版本須在計算之前讀（見 data_version 模組說明）。
+    If-None-Match 命中 → 304；伺服端快取命中 → 200 + 快取的位元組；否則 (ETag, None)。
+    版本不可用 → (None, None)。
+    """
+    version = data_version.current(project_id)
+    if version is None:
+        return None, None
+    tag = etag(scope, project_id, version, _canonical_query(request), *extra)
+    if matches(request.headers.get("if-none-match"), tag):
+        _m_requests.inc(scope=scope, outcome="not_modified")
+        return tag, Response(status_code=304, headers=headers(tag))
+    cache = _body_cache()
+    body = cache.get(tag) if cache is not None else None
+    if body is not None:
+        _m_requests.inc(scope=scope, outcome="hit")
+        return tag, Response(content=body, media_type="application/json", headers=headers(tag))
+    _m_requests.inc(scope=scope, outcome="miss")
+    return tag, None
+
+
+def finish(tag: Optional[str], payload: Any) -> Any:
+    """tag 為 None（版本不可用）→ 原樣回 payload（交給 FastAPI 編碼）；否則編成 JSON、存快取、帶 ETag 回。"""
+    if tag is None:
+        return payload
+    resp = JSONResponse(jsonable_encoder(payload), headers=headers(tag))
+    cache = _body_cache()
+    if cache is not None:
+        cache.put(tag, resp.body)
+    return resp
@@ -0,0 +1,315 @@
+# backend/app/services/tower_index.py
+"""
+cell_towers 行程內常駐索引（2026-10）。
+
+為什麼：lookup_bulk 每塊都打一次 `SELECT … FROM cell_towers WHERE cell_id = ANY(%s)`，
+geocode.lookup 更是逐列一次 SELECT。對照表一般是數十萬列、幾乎不變（只有管理員
+匯入 / 清空才會動），每次 round-trip 去問同一份資料是純浪費。
+
+做法：
+  - 整表載入成排序好的陣列：cell_id（utf-8 bytes，numpy 'S' 定長）+ lat / lng
+    （float64 —— 座標本身是證據，不為省幾 MB 而讓數值在回傳時偏掉）；
+    查詢用 np.searchsorted 二分搜尋，get_many 一次向量化完成。
+  - 快照不可變：重載時先在旁邊建好新陣列再整個換上，查詢端不必加鎖。
+  - 版本戳：cell_towers_version 單列（id=1）。POST /admin/cell-towers/import、
+    DELETE /admin/cell-towers 在同一交易內 bump_version()，提交後 invalidate() 讓本
+    process 下次查詢立即重載；其他 process 每 CELL_TOWER_INDEX_CHECK_SEC 秒最多比對
+    一次版本號（一個極小的 SELECT），不同才重載。查詢本身不碰 DB。
+  - 載入時先讀版本號、再讀資料：中間若有人 bump，只會多重載一次，不會卡在舊資料。
+
+CELL_TOWER_INDEX=0 或 numpy 不可用 → available() 為 False，geocode 退回原本的 SQL 查詢。
+所有 cur.execute 帶 prepare=False。
+
+同站推定（get_sites，2026-10）：cell_id 精確查不到時，業者的 cell_id 通常是「站台碼 +
+扇區碼」串成的，同站其他扇區多半在表內。排序陣列本身就是前綴索引 —— 前綴 p 的所有
+key 落在 [searchsorted(p), searchsorted(p + 0xFF)) 區間，一次 O(log n)。
+  - 站台前綴：該列 sector_id 恰是 cell_id 的尾碼 → 去掉它（結構已知，不再猜）；否則
+    依序去掉尾端 1..CELL_SITE_STRIP_MAX 個字元，取第一個有同前綴兄弟的。前綴至少
+    _SITE_MIN_PREFIX 字，兄弟超過 _SITE_MAX_SIBLINGS 個視為前綴太寬。
+  - 兄弟們彼此須在 CELL_SITE_MAX_SPREAD_M 公尺內（同一實體站台）才採用其中心點；
+    散開代表前綴不是站台碼，寧可不定位（不亂猜）。
+  - 推得的座標誤差圈較寬：CELL_SITE_ACCURACY_M + 兄弟散布半徑。
+CELL_SITE_FALLBACK=0 關閉；索引停用或從未載入成功時不推定。
+"""
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from app.core import logging_utils as clog
+
+try:
+    import numpy as np  # optional
+except Exception:
+    np = None
+
+_CHECK_SEC_DEFAULT = 30.0
+
+
+_SITE_MIN_PREFIX = 4
+_SITE_MAX_SIBLINGS = 64
+_SITE_SEPARATORS = "-_:/. "
+
+
+def _env_num(name: str, default: float, lo: float, hi: float) -> float:
+    try:
+        v = float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+    return v if lo <= v <= hi else default
+
+
+def _site_fallback_enabled() -> bool:
+    return os.getenv("CELL_SITE_FALLBACK", "1") != "0"
+
+
+def _enabled() -> bool:
+    return np is not None and os.getenv("CELL_TOWER_INDEX", "1") != "0"
+
+
+def _check_sec() -> float:
+    """CELL_TOWER_INDEX_CHECK_SEC：比對版本號的最短間隔（1–3600 秒，預設 30）。"""
+    try:
+        v = float(os.getenv("CELL_TOWER_INDEX_CHECK_SEC", str(_CHECK_SEC_DEFAULT)))
+    except ValueError:
+        return _CHECK_SEC_DEFAULT
+    return v if 1.0 <= v <= 3600.0 else _CHECK_SEC_DEFAULT
+
+
+# ── 版本戳表（idempotent）──────────────────────────────────
+_table_ready = False
+
+_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS cell_towers_version (
+      id          INT         PRIMARY KEY,
+      version     BIGINT      NOT NULL DEFAULT 0,
+      updated_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    "INSERT INTO cell_towers_version (id) VALUES (1) ON CONFLICT DO NOTHING",
+]
+
+
+def _ensure_version_table(cur) -> None:
+    global _table_ready
+    if _table_ready:
+        return
+    for ddl in _DDL:
+        cur.execute(ddl, prepare=False)
+    _table_ready = True
+
+
+def bump_version(cur) -> None:
+    """對照表有異動：在呼叫端的交易內把版本號 +1（隨該交易一起提交 / 回滾）。"""
+    _ensure_version_table(cur)
+    cur.execute(
+        "UPDATE cell_towers_version SET version = version + 1, updated_at = now() WHERE id = 1",
+        prepare=False,
+    )
+
+
+def _read_version(cur) -> int:
+    _ensure_version_table(cur)
+    cur.execute("SELECT version FROM cell_towers_version WHERE id = 1", prepare=False)
+    row = cur.fetchone()
+    return int(row[0]) if row else 0
+
+
+# ── 快照 ───────────────────────────────────────────────────
+class TowerSnapshot:
+    """排序好的 cell_id → (lat, lng) 不可變快照。"""
+
+    __slots__ = ("version", "keys", "lat", "lng")
+
+    def __init__(self, version: int, cell_ids: Iterable[str], lats: Iterable[float], lngs: Iterable[float]):
+        keys = np.array([str(c).strip().encode("utf-8") for c in cell_ids], dtype=np.bytes_)
+        lat = np.asarray(list(lats), dtype=np.float64)
+        lng = np.asarray(list(lngs), dtype=np.float64)
+        order = np.argsort(keys, kind="stable")
+        self.version = version
+        self.keys = keys[order]
+        self.lat = lat[order]
+        self.lng = lng[order]
+
+    def __len__(self) -> int:
+        return int(self.keys.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.keys.nbytes + self.lat.nbytes + self.lng.nbytes)
+
+    def prefix_range(self, prefix: bytes) -> Tuple[int, int]:
+        """以 prefix 開頭的 key 在排序陣列中的 [lo, hi)（utf-8 不會出現 0xFF）。"""
+        lo = int(np.searchsorted(self.keys, prefix, side="left"))
+        hi = int(np.searchsorted(self.keys, prefix + b"\xff", side="left"))
+        return lo, hi
+
+    def site_of(self, cell_id: str, sector_id: Optional[str], *, strip_max: int,
+                max_spread_m: float) -> Optional[Tuple[float, float, float]]:
+        """同站推定 → (lat, lng, 散布半徑 m)；推不出或兄弟太分散回 None。"""
+        for prefix in _site_prefixes(cell_id, sector_id, strip_max):
+            lo, hi = self.prefix_range(prefix.encode("utf-8"))
+            if hi <= lo:
+                continue
+            if hi - lo > _SITE_MAX_SIBLINGS:
+                return None
+            lat, lng = self.lat[lo:hi], self.lng[lo:hi]
+            lat0, lng0 = float(lat.mean()), float(lng.mean())
+            dy = (lat - lat0) * 110540.0
+            dx = (lng - lng0) * 111320.0 * math.cos(math.radians(lat0))
+            spread = float(np.sqrt(dx * dx + dy * dy).max())
+            return (lat0, lng0, spread) if spread <= max_spread_m else None
+        return None
+
+    def get_many(self, cell_ids: Iterable[str]) -> Dict[str, Tuple[float, float]]:
+        """cell_id → (lat, lng)；查不到的不在回傳 dict 內。"""
+        ids = [str(c).strip() for c in cell_ids if c is not None and str(c).strip()]
+        if not ids or not len(self):
+            return {}
+        q = np.array([c.encode("utf-8") for c in ids], dtype=np.bytes_)
+        pos = np.searchsorted(self.keys, q)
+        pos_c = np.minimum(pos, len(self) - 1)
+        hit = self.keys[pos_c] == q
+        return {
+            ids[i]: (float(self.lat[pos_c[i]]), float(self.lng[pos_c[i]]))
+            for i in np.flatnonzero(hit)
+        }
+
+
+def _site_prefixes(cell_id: str, sector_id: Optional[str], strip_max: int) -> Iterator[str]:
+    """由長到短的候選站台前綴（見模組說明）。"""
+    cid = cell_id.strip()
+    sid = (sector_id or "").strip()
+    if sid and cid.endswith(sid) and len(cid) > len(sid):
+        p = cid[:-len(sid)]
+        if len(p.rstrip(_SITE_SEPARATORS)) >= _SITE_MIN_PREFIX:
+            yield p
+        return
+    for k in range(1, strip_max + 1):
+        p = cid[:-k]
+        if len(p.rstrip(_SITE_SEPARATORS)) < _SITE_MIN_PREFIX:
+            return
+        yield p
+
+
+_snap: Optional[TowerSnapshot] = None
+_stale = True                 # 本 process 剛改過對照表 → 下次查詢前強制比對版本
+_checked_at = 0.0
+_load_lock = threading.Lock()
+
+
+def _load(version: int, cur) -> TowerSnapshot:
+    t0 = time.perf_counter()
+    cur.execute("SELECT cell_id, lat, lng FROM cell_towers", prepare=False)
+    rows = cur.fetchall()
+    snap = TowerSnapshot(version, (r[0] for r in rows), (r[1] for r in rows), (r[2] for r in rows))
+    clog.log_info(
+        "geocode.tower_index.loaded",
+        version=version, towers=len(snap), bytes=snap.nbytes,
+        ms=round((time.perf_counter() - t0) * 1000, 1),
+    )
+    return snap
+
+
+def _refresh() -> Optional[TowerSnapshot]:
+    """需要時比對版本並重載；回傳目前可用的快照（失敗沿用舊快照，從沒載入成功則 None）。"""
+    global _snap, _stale, _checked_at
+    snap = _snap
+    if not _stale and time.monotonic() - _checked_at < _check_sec():
+        return snap
+    # 已有快照時別讓查詢排隊等重載：拿不到鎖就先用舊的
+    if not _load_lock.acquire(blocking=snap is None):
+        return snap
+    try:
+        snap = _snap
+        if not _stale and time.monotonic() - _checked_at < _check_sec():
+            return snap
+        from app.db.session import get_conn  # lazy import：避免 test 環境循環依賴
+        with get_conn() as conn, conn.cursor() as cur:
+            version = _read_version(cur)
+            if snap is None or snap.version != version:
+                snap = _load(version, cur)
+        _snap = snap
+        _stale = False
+        _checked_at = time.monotonic()
+    except Exception as e:
+        print(f"[tower_index] refresh failed: {type(e).__name__}: {e}")
+        _stale = False                    # 失敗也算檢查過，別每次查詢都重試打 DB
+        _checked_at = time.monotonic()
+    finally:
+        _load_lock.release()
+    return _snap
+
+
+# ── 對外 ───────────────────────────────────────────────────
+def available() -> bool:
+    """索引可用（啟用且至少載入成功過一次）；False 時呼叫端應退回 SQL 查詢。"""
+    return _enabled() and _refresh() is not None
+
+
+def get_many(cell_ids: Iterable[str]) -> Dict[str, Tuple[float, float]]:
+    snap = _refresh() if _enabled() else None
+    return snap.get_many(cell_ids) if snap is not None else {}
+
+
+def get(cell_id: Optional[str]) -> Optional[Tuple[float, float]]:
+    if not cell_id or not str(cell_id).strip():
+        return None
+    return get_many([cell_id]).get(str(cell_id).strip())
+
+
+def get_sites(
+    queries: Iterable[Tuple[str, Optional[str]]],
+) -> Dict[Tuple[str, Optional[str]], Tuple[float, float, int]]:
+    """(cell_id, sector_id) → (lat, lng, accuracy_m)：精確查不到的 cell_id 依同站兄弟推定。
+
+    只收精確查無的 cell_id（呼叫端先走 get_many / lookup_bulk）；推不出的不在回傳內。
+    """
+    # 只用已載入過的快照（lookup_bulk 第一步就會載入）：推定本身不多打一趟 DB
+    if not _site_fallback_enabled() or not _enabled() or _snap is None:
+        return {}
+    snap = _refresh()
+    if snap is None or not len(snap):
+        return {}
+    strip_max = int(_env_num("CELL_SITE_STRIP_MAX", 2, 1, 6))
+    max_spread = _env_num("CELL_SITE_MAX_SPREAD_M", 300.0, 0.0, 5000.0)
+    base_acc = _env_num("CELL_SITE_ACCURACY_M", 1000.0, 100.0, 10000.0)
+    out: Dict[Tuple[str, Optional[str]], Tuple[float, float, int]] = {}
+    for q in set(queries):
+        cid, sid = q
+        if not cid or not str(cid).strip():
+            continue
+        hit = snap.site_of(str(cid), sid, strip_max=strip_max, max_spread_m=max_spread)
+        if hit is not None:
+            out[q] = (hit[0], hit[1], int(round(base_acc + hit[2])))
+    return out
+
+
+def invalidate() -> None:
+    """本 process 剛改過對照表（交易已提交）：下次查詢前重新比對版本。"""
+    global _stale
+    _stale = True
+
+
+def stats() -> Dict[str, object]:
+    snap = _snap
+    return {
+        "enabled": _enabled(),
+        "loaded": snap is not None,
+        "version": snap.version if snap is not None else None,
+        "towers": len(snap) if snap is not None else 0,
+        "bytes": snap.nbytes if snap is not None else 0,
+    }
+
+
+def reset() -> None:
+    """丟掉快照（測試用）。"""
+    global _snap, _stale, _checked_at
+    with _load_lock:
+        _snap = None
+        _stale = True
+        _checked_at = 0.0
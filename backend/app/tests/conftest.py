@@ -0,0 +1,178 @@
+# backend/app/tests/conftest.py
+"""
+測試共用的假 DB（2026-10）。
+
+各測試檔原本各自手刻一套假 cursor / connection / COPY（regeocode、geocode_bundle、
+trace_coverage、COPY 寫入、基地台匯入、tower_index），行為大同小異。這裡收成一個
+可參數化的 FakeDB，只模擬 services 實際用到的 psycopg 介面：
+
+  with get_conn() as conn:
+      with conn.transaction(): ...          # tx 計數；例外 → rolled_back，正常結束 → committed
+      with conn.cursor() as cur:
+          cur.execute(sql, params, prepare=False)   # 漏帶 prepare=False → AssertionError
+      with conn.cursor(name=…) as cur:      # server-side cursor：execute 不可帶 prepare
+          cur.execute(sql, params); for row in cur: ...
+          cur.fetchone() / cur.fetchall() / cur.rowcount
+          with cur.copy(sql) as cp:         # COPY FROM：set_types / write_row / write
+              ...                           # COPY TO：iter(cp)
+      conn.commit()
+
+參數（皆可在建立後改屬性）：
+  results  ：callable(sql, params) → 該語句的結果列（list）；回 None 代表「沒有結果」，
+             fetchone 改從 one 佇列依序取
+  one      ：fetchone 佇列（不看 SQL，依呼叫順序）
+  rowcount ：int，或 callable(sql, params) → int
+  copy_out ：callable(sql) → COPY … TO STDOUT 讀出的區塊
+  fail     ：例外實例；設了之後每次 execute 都拋
+  fail_on  ：SQL 含此字串 → RuntimeError
+
+紀錄：calls（(sql, params)；cursor.copy 記 (sql, None)）、sql / params（同上拆開）、
+named（具名 cursor 的名稱）、copied（write_row 的列）、written（(sql, write 的 bytes)）、types、tx、committed、
+rolled_back、commits。
+
+不碰真 DB：真連線在本機會卡約 30 秒才逾時，任何漏 patch 的 get_conn 都會拖慢整個套件。
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, List, Optional, Tuple, Union
+
+import pytest
+
+
+class FakeDB:
+    def __init__(
+        self,
+        *,
+        results: Optional[Callable[[str, Any], Optional[List[Any]]]] = None,
+        one: Optional[Iterable[Any]] = None,
+        rowcount: Union[int, Callable[[str, Any], int]] = 0,
+        copy_out: Optional[Callable[[str], Iterable[Any]]] = None,
+        fail: Optional[BaseException] = None,
+        fail_on: Optional[str] = None,
+    ):
+        self.results = results
+        self.one = list(one or [])
+        self.rowcount = rowcount
+        self.copy_out = copy_out
+        self.fail = fail
+        self.fail_on = fail_on
+        self.calls: List[Tuple[str, Any]] = []
+        self.named: List[str] = []
+        self.copied: List[Any] = []
+        self.written: List[Tuple[str, bytes]] = []
+        self.types: Optional[List[Any]] = None
+        self.tx = 0
+        self.committed = False
+        self.rolled_back = False
+        self.commits = 0
+
+    @property
+    def sql(self) -> List[str]:
+        return [s for s, _ in self.calls]
+
+    @property
+    def params(self) -> List[Any]:
+        return [p for _, p in self.calls]
+
+    @contextmanager
+    def get_conn(self):
+        yield _Conn(self)
+
+
+class _Conn:
+    def __init__(self, db: FakeDB):
+        self.db = db
+
+    def cursor(self, name: Optional[str] = None, **kw) -> "_Cur":
+        if name:
+            self.db.named.append(name)
+        return _Cur(self.db, name)
+
+    @contextmanager
+    def transaction(self):
+        self.db.tx += 1
+        try:
+            yield
+        except BaseException:
+            self.db.rolled_back = True
+            raise
+        self.db.committed = True
+
+    def commit(self) -> None:
+        self.db.commits += 1
+
+
+class _Cur:
+    def __init__(self, db: FakeDB, name: Optional[str] = None):
+        self.db = db
+        self.name = name
+        self.rowcount = -1
+        self._rows: Optional[List[Any]] = None
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+    def execute(self, sql, params=None, **kw):
+        if self.name:
+            assert "prepare" not in kw, "ServerCursor.execute 不收 prepare"
+        else:
+            assert kw.get("prepare") is False, "cur.execute 一律帶 prepare=False（pooler 不支援 server-side prepared statements）"
+        db = self.db
+        if db.fail is not None:
+            raise db.fail
+        db.calls.append((sql, params))
+        if db.fail_on and db.fail_on in sql:
+            raise RuntimeError("模擬 DB 失敗")
+        rows = db.results(sql, params) if db.results is not None else None
+        self._rows = list(rows) if rows is not None else None
+        self.rowcount = db.rowcount(sql, params) if callable(db.rowcount) else db.rowcount
+
+    def fetchone(self):
+        if self._rows is not None:
+            return self._rows.pop(0) if self._rows else None
+        return self.db.one.pop(0) if self.db.one else None
+
+    def fetchall(self):
+        rows, self._rows = (self._rows or []), []
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def copy(self, sql):
+        self.db.calls.append((sql, None))
+        return _Copy(self.db, sql)
+
+
+class _Copy:
+    def __init__(self, db: FakeDB, sql: str):
+        self.db = db
+        self.sql = sql
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+    def set_types(self, types):
+        self.db.types = list(types)
+
+    def write_row(self, row):
+        self.db.copied.append(row)
+
+    def write(self, data):
+        self.db.written.append((self.sql, bytes(data)))
+
+    def __iter__(self):
+        return iter(self.db.copy_out(self.sql) if self.db.copy_out else [])
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """fake_db(module, **FakeDB 參數)：建一個 FakeDB 並把 module.get_conn 換成它。"""
+
+    def install(module, **kw) -> FakeDB:
+        db = FakeDB(**kw)
+        monkeypatch.setattr(module, "get_conn", db.get_conn)
+        return db
+
+    return install
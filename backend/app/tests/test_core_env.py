@@ -0,0 +1,35 @@
+# backend/app/tests/test_core_env.py
+"""
+core/env.env_int / env_float（2026-10，由 ingest_jobs._env_int 搬來共用）測試。
+
+驗證：未設 / 空白 / 非法 / 超出範圍（含 nan、inf）一律 fallback default；邊界值含在內。
+"""
+from __future__ import annotations
+
+import pytest
+
+from app.core.env import env_float, env_int
+
+
+@pytest.mark.parametrize("raw,want", [
+    (None, 7), ("", 7), ("  ", 7), ("abc", 7), ("3.5", 7),
+    ("1", 1), (" 10 ", 10), ("0", 7), ("11", 7),
+])
+def test_env_int_fallbacks(monkeypatch, raw, want):
+    if raw is None:
+        monkeypatch.delenv("X_TEST_ENV_INT", raising=False)
+    else:
+        monkeypatch.setenv("X_TEST_ENV_INT", raw)
+    assert env_int("X_TEST_ENV_INT", 7, 1, 10) == want
+
+
+@pytest.mark.parametrize("raw,want", [
+    (None, 40.0), ("", 40.0), ("abc", 40.0), ("nan", 40.0), ("inf", 40.0),
+    ("1", 1.0), (" 2.5 ", 2.5), ("500", 500.0), ("0.5", 40.0), ("501", 40.0),
+])
+def test_env_float_fallbacks(monkeypatch, raw, want):
+    if raw is None:
+        monkeypatch.delenv("X_TEST_ENV_FLOAT", raising=False)
+    else:
+        monkeypatch.setenv("X_TEST_ENV_FLOAT", raw)
+    assert env_float("X_TEST_ENV_FLOAT", 40.0, 1.0, 500.0) == want
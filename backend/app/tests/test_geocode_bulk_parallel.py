@@ -31,6 +31,7 @@ def _no_sql_cache(monkeypatch):
 
     monkeypatch.setattr(geo, "_sql_cache_get_bulk", lambda addrs: {})
     monkeypatch.setattr(geo, "_sql_cache_set_bulk", lambda items: None)
+    geo.reset_cache()              # 行程內 LRU 是模組層級，測試間不可互相污染
 
 
 def test_bulk_parallel_dedup_and_mapping(monkeypatch):
@@ -40,14 +41,14 @@ def test_bulk_parallel_dedup_and_mapping(monkeypatch):
     calls = []
     lock = threading.Lock()
 
-    def fake_google(addr):
+    def fake_google(addr, transient=None):
         with lock:
             calls.append(addr)
         time.sleep(0.05)  # 模擬網路延遲，凸顯並行效果
         return (25.0, 121.5)
 
     monkeypatch.setattr(geo, "_google_geocode", fake_google)
-    monkeypatch.setattr(geo, "_osm_geocode", lambda a: None)
+    monkeypatch.setattr(geo, "_osm_geocode", lambda a, t=None: None)
 
     # 5 個 key，但其中兩個地址清洗後同址 → 應只打 4 次 Google
     keys = [
@@ -77,13 +78,13 @@ def test_bulk_osm_fallback_sequential(monkeypatch):
     """Google 失敗者走 OSM 備援，且 OSM 仍被呼叫到。"""
     import app.services.geocode as geo
 
-    def fake_google(addr):
+    def fake_google(addr, transient=None):
         # 只有 B 路 Google 查得到，其餘失敗
         return (25.0, 121.5) if "B路" in addr else None
 
     osm_called = []
 
-    def fake_osm(addr):
+    def fake_osm(addr, transient=None):
         osm_called.append(addr)
         return (24.0, 120.0)
 
@@ -108,8 +109,8 @@ def test_bulk_empty_and_no_addr(monkeypatch):
     import app.services.geocode as geo
 
     called = []
-    monkeypatch.setattr(geo, "_google_geocode", lambda a: called.append(a) or (1.0, 2.0))
-    monkeypatch.setattr(geo, "_osm_geocode", lambda a: None)
+    monkeypatch.setattr(geo, "_google_geocode", lambda a, t=None: called.append(a) or (1.0, 2.0))
+    monkeypatch.setattr(geo, "_osm_geocode", lambda a, t=None: None)
 
     assert geo.lookup_bulk([]) == {}
 
@@ -137,8 +138,8 @@ def test_sql_cache_hit_skips_google(monkeypatch):
     monkeypatch.setattr(geo, "_sql_cache_set_bulk", lambda items: None)
 
     google_calls = []
-    monkeypatch.setattr(geo, "_google_geocode", lambda a: google_calls.append(a) or (25.0, 121.5))
-    monkeypatch.setattr(geo, "_osm_geocode", lambda a: None)
+    monkeypatch.setattr(geo, "_google_geocode", lambda a, t=None: google_calls.append(a) or (25.0, 121.5))
+    monkeypatch.setattr(geo, "_osm_geocode", lambda a, t=None: None)
 
     keys = [(None, "台北市A路1號"), (None, "台北市B路2號")]
     out = geo.lookup_bulk(keys)
@@ -155,8 +156,8 @@ def test_sql_cache_writes_new_geocodes(monkeypatch):
     written = []
     monkeypatch.setattr(geo, "_sql_cache_get_bulk", lambda addrs: {})
     monkeypatch.setattr(geo, "_sql_cache_set_bulk", lambda items: written.extend(items))
-    monkeypatch.setattr(geo, "_google_geocode", lambda a: (25.0, 121.5))
-    monkeypatch.setattr(geo, "_osm_geocode", lambda a: None)
+    monkeypatch.setattr(geo, "_google_geocode", lambda a, t=None: (25.0, 121.5))
+    monkeypatch.setattr(geo, "_osm_geocode", lambda a, t=None: None)
 
     geo.lookup_bulk([(None, "台北市A路1號"), (None, "台北市C路3號")])
 
@@ -27,6 +27,7 @@ def _no_sql_cache(monkeypatch):
     """停用 SQL 快取（避免碰 DB）；個別測試可覆寫。"""
     monkeypatch.setattr(geo, "_sql_cache_get_bulk", lambda addrs: {})
     monkeypatch.setattr(geo, "_sql_cache_set_bulk", lambda items: None)
+    geo.reset_cache()              # 行程內 LRU 是模組層級，測試間不可互相污染
 
 
 def _http_boom(*a, **k):
@@ -63,8 +64,8 @@ def test_disabled_single_zero_http(monkeypatch):
 def test_disabled_bulk_no_google_task(monkeypatch):
     monkeypatch.setenv("GEO_GOOGLE_ENABLED", "0")
     monkeypatch.setattr(geo, "_google_geocode",
-                        lambda a: pytest.fail("_google_geocode 不應被呼叫"))
-    monkeypatch.setattr(geo, "_osm_geocode", lambda a: None)      # OSM 也查不到
+                        lambda a, t=None: pytest.fail("_google_geocode 不應被呼叫"))
+    monkeypatch.setattr(geo, "_osm_geocode", lambda a, t=None: None)      # OSM 也查不到
     out = geo.lookup_bulk([(None, "台北市A路1號")])
     assert out[(None, "台北市A路1號")] is None                     # 走到 unlocated
 
@@ -73,10 +74,10 @@ def test_disabled_bulk_no_google_task(monkeypatch):
 def test_disabled_osm_enabled(monkeypatch):
     monkeypatch.setenv("GEO_GOOGLE_ENABLED", "0")
     monkeypatch.setattr(geo, "_google_geocode",
-                        lambda a: pytest.fail("Google 不應被呼叫"))
+                        lambda a, t=None: pytest.fail("Google 不應被呼叫"))
     osm_calls = []
     monkeypatch.setattr(geo, "_osm_geocode",
-                        lambda a: (osm_calls.append(a) or (24.0, 120.0)))
+                        lambda a, t=None: (osm_calls.append(a) or (24.0, 120.0)))
     out = geo.lookup_bulk([(None, "台北市A路1號")])
     assert osm_calls == ["台北市A路1號"]
     assert out[(None, "台北市A路1號")] == (24.0, 120.0)
@@ -114,9 +115,9 @@ def test_default_google_path_runs(monkeypatch):
 def test_cache_hit_no_external_regardless(monkeypatch):
     monkeypatch.setenv("GEO_GOOGLE_ENABLED", "1")                 # 即使啟用
     monkeypatch.setattr(geo, "_google_geocode",
-                        lambda a: pytest.fail("cache 命中不應打 Google"))
+                        lambda a, t=None: pytest.fail("cache 命中不應打 Google"))
     monkeypatch.setattr(geo, "_osm_geocode",
-                        lambda a: pytest.fail("cache 命中不應打 OSM"))
+                        lambda a, t=None: pytest.fail("cache 命中不應打 OSM"))
     monkeypatch.setattr(geo, "_sql_cache_get_bulk",
                         lambda addrs: {"台北市A路1號": (22.6, 120.3)})
     out = geo.lookup_bulk([(None, "台北市A路1號")])
@@ -198,6 +198,7 @@ def test_share_view_valid_returns_200_with_geojson(client, monkeypatch):
         lambda project_id, *a, **k: {"type": "FeatureCollection", "features": [{"id": 1}]},
     )
     monkeypatch.setattr(share, "write_audit", lambda *a, **k: None)
+    monkeypatch.setattr(share.response_cache.data_version, "current", lambda pid: None)
 
     r = client.get("/api/share/tok")
     assert r.status_code == 200